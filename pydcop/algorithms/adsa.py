@@ -94,6 +94,10 @@ from pydcop.infrastructure.computations import (
 # Type of computations graph that must be used with dsa
 GRAPH_TYPE = "constraints_hypergraph"
 
+# Computations can be re-created on another agent at run time, a new
+# computation simply starts with a random value.
+MIGRATABLE = True
+
 
 def build_computation(comp_def: ComputationDef) -> DcopComputation:
     """Build a DSA computation
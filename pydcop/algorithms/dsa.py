@@ -115,6 +115,10 @@ UNIT_SIZE = 1
 # Type of computations graph that must be used with dsa
 GRAPH_TYPE = "constraints_hypergraph"
 
+# Computations can be re-created on another agent at run time, a new
+# computation simply starts with a random value.
+MIGRATABLE = True
+
 # Dsa supports several parameters:
 #
 #     variant: str
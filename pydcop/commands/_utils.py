@@ -32,15 +32,15 @@ import json
 import logging
 import os
 import traceback
-from functools import partial
 from importlib import import_module
 
 import sys
-from queue import Queue, Empty
 from types import FunctionType
 from typing import List
 
 from pydcop.algorithms import AlgorithmDef, prepare_algo_params, load_algorithm_module
+from pydcop.distribution.traffic import save_traffic_profile, traffic_profile
+from pydcop.infrastructure.metricssinks import metrics_sink
 
 logger = logging.getLogger("pydcop")
 
@@ -138,26 +138,19 @@ columns = {
 def prepare_metrics_files(run, end, mode):
     """
     Prepare files for storing metrics, if requested.
-    Returns a cb that can be used to log metrics in the run_metrics file.
+    Returns a sink that can be used to log metrics in the run_metrics file.
     """
     global run_metrics, end_metrics
     if run is not None:
         run_metrics = run
-        # delete run_metrics file if it exists, create intermediate
-        # directory if needed
-        if os.path.exists(run_metrics):
-            os.remove(run_metrics)
-        else:
-            f_dir = os.path.dirname(run_metrics)
-            if f_dir and not os.path.exists(f_dir):
-                os.makedirs(f_dir)
-        # Add column labels in file:
-        with open(run_metrics, "w", encoding="utf-8", newline="") as f:
-            csvwriter = csv.writer(f)
-            csvwriter.writerow(columns[mode])
-        csv_cb = partial(add_csvline, run_metrics, mode)
+        # create intermediate directory if needed, the file itself is
+        # truncated by the sink.
+        f_dir = os.path.dirname(run_metrics)
+        if f_dir and not os.path.exists(f_dir):
+            os.makedirs(f_dir)
+        run_sink = metrics_sink(run_metrics, columns[mode])
     else:
-        csv_cb = None
+        run_sink = None
 
     if end is not None:
         end_metrics = end
@@ -169,7 +162,7 @@ def prepare_metrics_files(run, end, mode):
                 csvwriter = csv.writer(f)
                 csvwriter.writerow(columns[mode])
 
-    return csv_cb
+    return run_sink
 
 
 def add_csvline(file, mode, metrics):
@@ -179,6 +172,22 @@ def add_csvline(file, mode, metrics):
         csvwriter.writerow(data)
 
 
+def write_traffic_profile(filename, metrics, inputs):
+    """
+    Write the traffic profile found in agents' metrics to `filename`, and
+    remove the per-link metrics from `metrics`, they are too large to be
+    printed with the other metrics.
+    """
+    agt_metrics = metrics.get("agt_metrics", {})
+    f_dir = os.path.dirname(filename)
+    if f_dir and not os.path.exists(f_dir):
+        os.makedirs(f_dir)
+    save_traffic_profile(filename, traffic_profile(agt_metrics, inputs))
+    for agt in agt_metrics.values():
+        agt.pop("count_link_msg", None)
+        agt.pop("size_link_msg", None)
+
+
 def _error(msg, e=None):
     print("Error: {}".format(msg))
     if e is not None:
@@ -214,16 +223,3 @@ def _load_modules(dist, algo):
         )
 
     return dist_module, algo_module, graph_module
-
-
-def collect_tread(collect_queue: Queue, csv_cb):
-    while True:
-        try:
-            t, metrics = collect_queue.get()
-
-            if csv_cb is not None:
-                csv_cb(metrics)
-
-        except Empty:
-            pass
-        # FIXME : end of run ?
@@ -0,0 +1,374 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""
+Warm workers for the batch command.
+
+A warm worker is a long-lived process, with pydcop modules already imported,
+that runs ``solve``, ``run`` and ``distribute`` cli commands without starting
+a new python interpreter for each of them.
+For each job, the worker first prepares the command (importing the command and
+algorithm modules and loading the dcop, which is kept in memory for the next
+jobs) and then forks a new process, which runs the command.
+This way each job still runs in its own process, and a crash or a timeout of a
+job never affects the worker or the other jobs.
+
+The batch command communicates with its warm workers through their standard
+input and output, using one json object per line.
+
+"""
+import json
+import logging
+import os
+import select
+import shlex
+import signal
+import sys
+import time
+import traceback
+from subprocess import CalledProcessError, TimeoutExpired, Popen, PIPE
+from typing import List, Optional, Set
+
+logger = logging.getLogger("pydcop.cli.batch")
+
+# Commands that can run in a warm worker.
+WARM_COMMANDS = {"solve", "run", "distribute"}
+
+# These commands need a shell and always run in a sub-process.
+SHELL_OPERATORS = {"|", "||", "&", "&&", ";", "<", ">", ">>", "2>", "2>&1"}
+
+# Number of dcops kept in memory by each worker
+DCOPS_IN_MEMORY = 8
+
+
+def warm_argv(cli_command: str) -> Optional[List[str]]:
+    """
+    Arguments for running a cli command in a warm worker.
+
+    Parameters
+    ----------
+    cli_command: str
+        a pydcop command line, as built by the batch command
+
+    Returns
+    -------
+    The command line arguments, without the program name, or None if the command
+    cannot run in a warm worker.
+
+    Examples
+    --------
+
+    >>> warm_argv("pydcop -t 5 solve --algo dsa dcop.yaml")
+    ['-t', '5', 'solve', '--algo', 'dsa', 'dcop.yaml']
+    >>> warm_argv("pydcop generate graph_coloring -v 10") is None
+    True
+    >>> warm_argv("pydcop solve --algo dsa dcop.yaml > out.txt") is None
+    True
+    """
+    from pydcop.dcop_cli import selected_command
+
+    try:
+        argv = shlex.split(cli_command)
+    except ValueError:
+        return None
+    if not argv or argv[0] != "pydcop" or "$" in cli_command:
+        return None
+    argv = argv[1:]
+    if any(arg in SHELL_OPERATORS for arg in argv):
+        return None
+    if selected_command(argv) not in WARM_COMMANDS:
+        return None
+    return argv
+
+
+class WarmWorker:
+    """
+    Run cli commands in a warm worker process.
+
+    The worker process is started on the first command and re-started if it
+    ever dies.
+
+    Parameters
+    ----------
+    cpus: set of int
+        if given, the worker, and all the jobs it runs, are pinned to these CPUs.
+    """
+
+    def __init__(self, cpus: Set[int] = None):
+        self.cpus = cpus
+        self._process = None
+
+    def run(self, cli_command: str, command_dir: str, timeout=None):
+        """
+        Run a cli command in the worker.
+
+        Raises the same errors as `subprocess.check_output`: `TimeoutExpired`
+        if the command did not finish before timeout, and `CalledProcessError`
+        if it failed.
+
+        Parameters
+        ----------
+        cli_command: str
+            the command, which must be accepted by `warm_argv`
+        command_dir: str
+            the directory the command runs in, relative to the current directory
+        timeout: float
+            timeout in seconds, None for no timeout
+        """
+        argv = warm_argv(cli_command)
+        if argv is None:
+            raise ValueError(f"Cannot run {cli_command} in a warm worker")
+        if self._process is None or self._process.poll() is not None:
+            self._start()
+        job = {
+            "argv": argv,
+            "dir": os.path.abspath(command_dir) if command_dir else os.getcwd(),
+            "timeout": timeout,
+        }
+        try:
+            self._process.stdin.write(json.dumps(job) + "\n")
+            self._process.stdin.flush()
+            result = self._process.stdout.readline()
+        except (BrokenPipeError, OSError):
+            result = ""
+        if not result:
+            self.close()
+            raise CalledProcessError(
+                -1, cli_command, output="Warm worker process died"
+            )
+        result = json.loads(result)
+        if result["timeout"]:
+            raise TimeoutExpired(cli_command, timeout, output=result["output"])
+        if result["returncode"]:
+            raise CalledProcessError(
+                result["returncode"], cli_command, output=result["output"]
+            )
+
+    def kill(self):
+        """
+        Kill the worker and the job it is running, if any.
+        """
+        if self._process is not None and self._process.poll() is None:
+            # The worker kills its running job when terminated
+            self._process.terminate()
+
+    def close(self):
+        """
+        Stop the worker, once its current job has finished.
+        """
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(5)
+        except TimeoutExpired:
+            process.terminate()
+            process.wait()
+        process.stdout.close()
+
+    def _start(self):
+        def preexec():
+            # Interrupting the batch must not interrupt the worker, which is
+            # stopped by the batch command.
+            os.setsid()
+            if self.cpus:
+                os.sched_setaffinity(0, self.cpus)
+
+        # The worker must import the same pydcop package as the batch command
+        import pydcop
+
+        env = dict(os.environ)
+        pydcop_root = os.path.dirname(os.path.dirname(pydcop.__file__))
+        env["PYTHONPATH"] = os.pathsep.join(
+            p for p in [pydcop_root, env.get("PYTHONPATH")] if p
+        )
+        self._process = Popen(
+            [sys.executable, "-m", __name__],
+            stdin=PIPE,
+            stdout=PIPE,
+            universal_newlines=True,
+            preexec_fn=preexec,
+            env=env,
+        )
+
+
+# Pid of the job currently running in the worker process
+_job_pid = None
+
+
+def serve():
+    """
+    Worker process main loop: run the jobs received on stdin.
+    """
+    # Keep stdout for the results, anything printed by the worker itself goes
+    # to stderr.
+    results = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    signal.signal(signal.SIGTERM, _on_terminate)
+
+    from pydcop import dcop_cli  # noqa: F401, imported once for all jobs
+    from pydcop.dcop.yamldcop import keep_dcops_in_memory
+
+    keep_dcops_in_memory(DCOPS_IN_MEMORY)
+    for line in sys.stdin:
+        job = json.loads(line)
+        result = run_job(job["argv"], job["dir"], job["timeout"])
+        results.write(json.dumps(result) + "\n")
+        results.flush()
+
+
+def run_job(argv: List[str], command_dir: str, timeout=None):
+    """
+    Run a job in a forked process and wait for it.
+    """
+    global _job_pid
+    prepare_job(argv, command_dir)
+
+    read_fd, write_fd = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _run_forked(argv, command_dir, write_fd)
+    _job_pid = pid
+    try:
+        # Also set in the job, whichever runs first, so that the job's process
+        # group always exists when killing it.
+        os.setpgid(pid, pid)
+    except OSError:
+        pass
+    os.close(write_fd)
+
+    output, timed_out = _read_output(read_fd, timeout)
+    os.close(read_fd)
+    if timed_out:
+        _kill_job(pid)
+    _, status = os.waitpid(pid, 0)
+    _job_pid = None
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timeout": timed_out,
+        "output": output.decode("utf-8", errors="replace"),
+    }
+
+
+def prepare_job(argv: List[str], command_dir: str):
+    """
+    Import everything the job needs and load its dcop in the worker process,
+    so that they are inherited by the forked jobs.
+
+    Errors are ignored here, they will be reported by the job itself.
+    """
+    from pydcop.algorithms import load_algorithm_module
+    from pydcop.dcop.yamldcop import load_dcop_from_file
+    from pydcop.dcop_cli import build_parser, selected_command
+
+    try:
+        args = build_parser(selected_command(argv)).parse_args(argv)
+    except SystemExit:
+        return
+    try:
+        if getattr(args, "algo", None):
+            load_algorithm_module(args.algo)
+        if getattr(args, "dcop_files", None):
+            dcop_files = [os.path.join(command_dir, f) for f in args.dcop_files]
+            load_dcop_from_file(dcop_files, cache_dir=args.dcop_cache)
+    except Exception:
+        logger.debug("Could not prepare job %s", argv, exc_info=True)
+
+
+def _run_forked(argv: List[str], command_dir: str, output_fd: int):
+    # Runs in the forked process, never returns.
+    code = 1
+    try:
+        os.setpgid(0, 0)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.dup2(output_fd, 1)
+        os.dup2(output_fd, 2)
+        os.close(output_fd)
+        sys.stdin.close()
+        # commands may exit with os._exit, which does not flush.
+        sys.stdout.reconfigure(line_buffering=True)
+        os.chdir(command_dir)
+
+        from pydcop.dcop_cli import main
+
+        try:
+            main(argv)
+            code = 0
+        except SystemExit as se:
+            if se.code is None or isinstance(se.code, int):
+                code = se.code or 0
+            else:
+                print(se.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _read_output(fd: int, timeout=None):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    chunks = []
+    while True:
+        wait = None if deadline is None else deadline - time.monotonic()
+        if wait is not None and wait <= 0:
+            return b"".join(chunks), True
+        readable, _, _ = select.select([fd], [], [], wait)
+        if readable:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return b"".join(chunks), False
+            chunks.append(chunk)
+
+
+def _kill_job(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _on_terminate(sig, frame):
+    if _job_pid is not None:
+        _kill_job(_job_pid)
+    os._exit(1)
+
+
+if __name__ == "__main__":
+    serve()
@@ -42,7 +42,8 @@ Synopsis
 
 ::
 
-  pydcop batch <batches_description_file>
+  pydcop batch [--simulate] [--parallel <jobs_count>] [--pin_cpus] [--warm]
+               <batches_description_file>
 
 
 Description
@@ -63,8 +64,41 @@ to "done_<batches_description_file>_<date>"  where <date> is the date and time o
 If you really want to re-run an interrupted batch from scratch, you must delete the `progress`
 file.
 
+By default, jobs run one after the other. With ``--parallel <jobs_count>``, up to
+``jobs_count`` jobs run at the same time. Jobs are still registered in the `progress`
+file only once they have finished, in the order they finish, which means that an
+interrupted parallel batch can be resumed just like a sequential one.
+When running jobs in parallel, make sure that they do not write to the same files.
+If one of the jobs fails, no new job is started and the batch stops once the running
+jobs have finished.
+
+By default, each job starts a new ``pydcop`` process, which must import pyDCOP and parse
+the DCOP again. For short jobs, this start-up time can be longer than the time needed to
+actually solve the DCOP. With ``--warm``, ``solve``, ``run`` and ``distribute`` jobs run
+in long-lived worker processes (one per parallel job), which keep pyDCOP modules
+imported and the last loaded DCOPs in memory. Each job still runs in its own
+process, forked from the worker, which means that a job crashing or reaching its timeout
+does not affect the other jobs. Other commands, and commands using shell features like
+redirections or pipes, are still run in a new process.
+
+Options
+-------
+
+``--simulate``
+  Print the commands instead of running them.
+
+``--parallel <jobs_count>``
+  Number of jobs to run in parallel, defaults to 1.
+
+``--pin_cpus``
+  Pin each job to a subset of the CPUs available to the batch command: the CPUs are
+  divided evenly among the ``jobs_count`` workers (Linux only).
+
+``--warm``
+  Run ``solve``, ``run`` and ``distribute`` jobs in warm worker processes, instead of
+  starting a new process for each job (Linux and Mac OS only).
+
 TODO: in simulate, emit warning if some path / file overlap
-TODO: run in parallel
 
 """
 import datetime
@@ -74,6 +108,9 @@ import shutil
 import re
 import os
 import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
 
 from subprocess import (
     check_output,
@@ -84,13 +121,15 @@ from subprocess import (
     Popen,
     PIPE,
 )
-from typing import Dict, Tuple, Union, List
+from typing import Dict, Tuple, Union, List, Optional, Set
 
 import itertools
 
 import tqdm
 import yaml
 
+from pydcop.commands._warm_worker import WarmWorker, warm_argv
+
 logger = logging.getLogger("pydcop.cli.batch")
 
 
@@ -109,9 +148,33 @@ def set_parser(subparsers):
         action="store_true",
         help="Simulate the bench by printing the commands instead of running them",
     )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="Number of jobs to run in parallel",
+    )
+    parser.add_argument(
+        "--pin_cpus",
+        default=False,
+        action="store_true",
+        help="Pin each parallel job to its own subset of the available CPUs",
+    )
+    parser.add_argument(
+        "--warm",
+        default=False,
+        action="store_true",
+        help="Run solve, run and distribute jobs in long-lived worker processes",
+    )
 
 
 progress_file = None
+# Jobs may finish, and be registered, concurrently when running in parallel:
+progress_lock = threading.Lock()
+# Pool of workers when running jobs in parallel, None otherwise
+job_pool = None
+# Warm worker when running jobs sequentially with --warm, None otherwise
+warm_worker = None
 
 
 def run_cmd(args):
@@ -135,7 +198,9 @@ def run_cmd(args):
             f.write(f"{batch_file}_{now:%Y%m%d_%H%M}\n")
         jobs = set()
 
-    run_batches(bench_def, args.simulate, jobs)
+    run_batches(
+        bench_def, args.simulate, jobs, args.parallel, args.pin_cpus, args.warm
+    )
 
     # As everything went well, we can rename the progress file
     now = datetime.datetime.now()
@@ -145,7 +210,37 @@ def run_cmd(args):
 global pbar
 
 
-def run_batches(batches_definition, simulate: bool, jobs=None):
+def run_batches(
+    batches_definition,
+    simulate: bool,
+    jobs=None,
+    parallel: int = 1,
+    pin_cpus: bool = False,
+    warm: bool = False,
+):
+    global job_pool, warm_worker
+    if parallel > 1 and not simulate:
+        job_pool = JobPool(parallel, pin_cpus, warm)
+    elif warm and not simulate:
+        warm_worker = WarmWorker()
+    try:
+        _run_batches(batches_definition, simulate, jobs)
+    except KeyboardInterrupt:
+        if job_pool:
+            job_pool.kill()
+        if warm_worker:
+            warm_worker.kill()
+        raise
+    finally:
+        if job_pool:
+            pool, job_pool = job_pool, None
+            pool.wait()
+        if warm_worker:
+            worker, warm_worker = warm_worker, None
+            worker.close()
+
+
+def _run_batches(batches_definition, simulate: bool, jobs=None):
     jobs = set() if not jobs else jobs
     context: Dict[str, str] = {"jobs": jobs}
     problems_sets = batches_definition["sets"]
@@ -402,44 +497,167 @@ def run_batch(
         else:
             jid = job_id(context, command_option_combination)
             if jid not in context["jobs"]:
-                log_cmd(cli_command, command_dir)
                 if "timeout" in global_options:
                     timeout = int(global_options["timeout"]) + 20
                 else:
                     timeout = None
-                try:
-                    run_cli_command(cli_command, command_dir, timeout)
-                except TimeoutExpired as te:
-                    global progress_file
-                    if progress_file:
-                        with open(progress_file, encoding="utf-8", mode="a") as f:
-                            f.write(f"TIMEOUT: {jid} \n")
-                            f.write(f"JID: {jid} \n")
-                            now_time = datetime.datetime.time(datetime.datetime.now())
-                            f.write(f"END: {now_time} \n\n")
-
-                register_job(jid)
+                if job_pool:
+                    job_pool.submit(jid, cli_command, command_dir, timeout)
+                elif warm_worker:
+                    run_job(jid, cli_command, command_dir, timeout, worker=warm_worker)
+                else:
+                    run_job(jid, cli_command, command_dir, timeout)
             else:
-                logger.warning(f"Skipping already registered job {id}")
+                logger.warning(f"Skipping already registered job {jid}")
+
+
+def run_job(
+    jid: str,
+    cli_command: str,
+    command_dir: str,
+    timeout,
+    cpus: Set[int] = None,
+    worker: WarmWorker = None,
+):
+    """
+    Run a job and register it in the progress file once it has finished.
+
+    When a warm `worker` is given, the job runs in this worker if it supports the
+    job's command.
+    """
+    log_cmd(cli_command, command_dir)
+    try:
+        if worker and warm_argv(cli_command) is not None:
+            run_warm_command(worker, cli_command, command_dir, timeout)
+        else:
+            # cpus is only given when the job is pinned
+            pinning = {"cpus": cpus} if cpus else {}
+            run_cli_command(cli_command, command_dir, timeout, **pinning)
+    except TimeoutExpired as te:
+        with progress_lock:
+            if progress_file:
+                with open(progress_file, encoding="utf-8", mode="a") as f:
+                    f.write(f"TIMEOUT: {jid} \n")
+                    f.write(f"JID: {jid} \n")
+                    now_time = datetime.datetime.time(datetime.datetime.now())
+                    f.write(f"END: {now_time} \n\n")
+
+    register_job(jid)
+
+
+class JobPool:
+    """
+    Run jobs in parallel.
+
+    Each job runs its cli command in a sub-process, or in the worker's warm worker
+    process, from a pool of worker threads.
+    Submitting a job blocks until a worker is available. Once a job has failed, no
+    new job is accepted and the error is raised when waiting for the pool.
+
+    Parameters
+    ----------
+    workers: int
+        number of jobs running in parallel.
+    pin_cpus: bool
+        if True, each worker's jobs are pinned to a subset of the available CPUs.
+    warm: bool
+        if True, each worker runs its jobs in its own `WarmWorker`, when possible.
+    """
+
+    def __init__(self, workers: int, pin_cpus: bool = False, warm: bool = False):
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="batch_job")
+        self._error = None
+        # Free workers, with the CPUs their jobs are pinned to:
+        self._workers = Queue()
+        if pin_cpus and not hasattr(os, "sched_setaffinity"):
+            logger.warning("CPU pinning is not supported on this platform")
+            pin_cpus = False
+        cpus = sorted(os.sched_getaffinity(0)) if pin_cpus else None
+        self._warm_workers = []
+        for i in range(workers):
+            w_cpus = worker_cpus(cpus, workers, i) if pin_cpus else None
+            if warm:
+                self._warm_workers.append(WarmWorker(w_cpus))
+            self._workers.put((w_cpus, self._warm_workers[i] if warm else None))
+
+    def submit(self, jid: str, cli_command: str, command_dir: str, timeout):
+        worker = self._workers.get()
+        if self._error:
+            self._workers.put(worker)
+            raise self._error
+        cpus, warm_worker = worker
+        if warm_worker:
+            future = self._executor.submit(
+                run_job, jid, cli_command, command_dir, timeout, cpus, warm_worker
+            )
+        else:
+            future = self._executor.submit(
+                run_job, jid, cli_command, command_dir, timeout, cpus
+            )
+        future.add_done_callback(lambda f: self._job_done(f, worker))
+
+    def _job_done(self, future, worker):
+        if future.exception() and not self._error:
+            logger.error(f"Error in batch job: {future.exception()}")
+            self._error = future.exception()
+        self._workers.put(worker)
+
+    def kill(self):
+        """
+        Kill the running jobs, e.g. when the batch is interrupted.
+        """
+        with running_processes_lock:
+            for process in running_processes:
+                kill_process_group(process)
+        for warm_worker in self._warm_workers:
+            warm_worker.kill()
+
+    def wait(self):
+        """
+        Wait for the running jobs, and raise the error of the first failed job, if any.
+        """
+        self._executor.shutdown(wait=True)
+        for warm_worker in self._warm_workers:
+            warm_worker.close()
+        if self._error:
+            raise self._error
+
+
+def worker_cpus(cpus: List[int], workers: int, index: int) -> Set[int]:
+    """
+    CPUs for a worker, when dividing the available CPUs among all workers.
+
+    Examples
+    --------
+
+    >>> worker_cpus([0, 1, 2, 3, 4, 5], 3, 1)
+    {2, 3}
+    >>> worker_cpus([0, 1], 3, 2)
+    {0}
+    """
+    if len(cpus) <= workers:
+        return {cpus[index % len(cpus)]}
+    size = len(cpus) // workers
+    return set(cpus[index * size : (index + 1) * size])
 
 
 def register_job(jid):
-    global progress_file
-    if progress_file:
-        with open(progress_file, encoding="utf-8", mode="a") as f:
-            f.write(f"JID: {jid} \n")
-            now_time = datetime.datetime.time(datetime.datetime.now())
-            f.write(f"END: {now_time} \n\n")
+    with progress_lock:
+        if progress_file:
+            with open(progress_file, encoding="utf-8", mode="a") as f:
+                f.write(f"JID: {jid} \n")
+                now_time = datetime.datetime.time(datetime.datetime.now())
+                f.write(f"END: {now_time} \n\n")
 
 
 def log_cmd(cmd_str, command_dir):
-    global progress_file
-    if progress_file:
-        with open(progress_file, encoding="utf-8", mode="a") as f:
-            now_time = datetime.datetime.time(datetime.datetime.now())
-            f.write(f"START: {now_time} \n")
-            f.write(f"CD: {command_dir} \n")
-            f.write(f"CMD: {cmd_str} \n")
+    with progress_lock:
+        if progress_file:
+            with open(progress_file, encoding="utf-8", mode="a") as f:
+                now_time = datetime.datetime.time(datetime.datetime.now())
+                f.write(f"START: {now_time} \n")
+                f.write(f"CD: {command_dir} \n")
+                f.write(f"CMD: {cmd_str} \n")
 
 
 def job_id(context: dict, combination: dict):
@@ -449,36 +667,74 @@ def job_id(context: dict, combination: dict):
         return f"{context['set']}__{context['iteration']}_{combination}"
 
 
-def run_cli_command(cli_command: str, command_dir: str, timeout):
-    with cd_and_create(command_dir):
-        try:
-            check_output_group_kill(
-                cli_command,
-                stderr=STDOUT,
-                shell=True,
-                universal_newlines=True,
-                timeout=timeout,
-            )
-        except CalledProcessError as cpe:
-            # Dump output for diagnosis
-            with open("cmd_error.log", mode="w", encoding="utf-8") as ef:
-                ef.write(
-                    f"When running:\n"
-                    f" * command: {cli_command}\n"
-                    f" * in dir: '{command_dir}'\n\n"
-                    f"Error:  \n   {cpe} \n\n"
-                )
-                ef.write(f"Command returned: \n\n{cpe.output}")
-            raise
+def run_cli_command(
+    cli_command: str, command_dir: str, timeout, cpus: Set[int] = None
+):
+    # The command runs in command_dir, without changing the current directory
+    # of this process, as several commands may run in parallel.
+    command_dir = os.path.expanduser(command_dir) if command_dir else ""
+    if command_dir:
+        os.makedirs(command_dir, exist_ok=True)
+    try:
+        check_output_group_kill(
+            cli_command,
+            stderr=STDOUT,
+            shell=True,
+            universal_newlines=True,
+            timeout=timeout,
+            cwd=command_dir if command_dir else None,
+            cpus=cpus,
+        )
+    except CalledProcessError as cpe:
+        write_error_log(cli_command, command_dir, cpe)
+        raise
 
 
-def check_output_group_kill(*popenargs, timeout=None, **kwargs):
+def run_warm_command(
+    worker: WarmWorker, cli_command: str, command_dir: str, timeout
+):
+    """
+    Same as `run_cli_command`, but runs the command in a warm worker.
+    """
+    command_dir = os.path.expanduser(command_dir) if command_dir else ""
+    if command_dir:
+        os.makedirs(command_dir, exist_ok=True)
+    try:
+        worker.run(cli_command, command_dir, timeout)
+    except CalledProcessError as cpe:
+        write_error_log(cli_command, command_dir, cpe)
+        raise
+
+
+def write_error_log(cli_command: str, command_dir: str, cpe: CalledProcessError):
+    # Dump output for diagnosis
+    error_log = os.path.join(command_dir, "cmd_error.log")
+    with open(error_log, mode="w", encoding="utf-8") as ef:
+        ef.write(
+            f"When running:\n"
+            f" * command: {cli_command}\n"
+            f" * in dir: '{command_dir}'\n\n"
+            f"Error:  \n   {cpe} \n\n"
+        )
+        ef.write(f"Command returned: \n\n{cpe.output}")
+
+
+# Processes started by check_output_group_kill and still running:
+running_processes: Set[Popen] = set()
+running_processes_lock = threading.Lock()
+
+
+def check_output_group_kill(
+    *popenargs, timeout=None, cpus: Optional[Set[int]] = None, **kwargs
+):
     """
     Custom check_output implementation that kill the whole process tree instead of
     simply it's head.
 
     Idea taken from
     https://stackoverflow.com/questions/36952245/subprocess-timeout-failure
+
+    When `cpus` is given, the process (and its children) is pinned to these CPUs.
     """
     if "stdout" in kwargs:
         raise ValueError("stdout argument not allowed, it will be overridden.")
@@ -487,18 +743,28 @@ def check_output_group_kill(*popenargs, timeout=None, **kwargs):
 
     kwargs["stdin"] = PIPE
 
-    with Popen(*popenargs, **kwargs, stdout=PIPE, preexec_fn=os.setsid) as process:
+    def preexec():
+        os.setsid()
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+
+    with Popen(*popenargs, **kwargs, stdout=PIPE, preexec_fn=preexec) as process:
+        with running_processes_lock:
+            running_processes.add(process)
         try:
             stdout, stderr = process.communicate(input, timeout=timeout)
         except TimeoutExpired:
             process.kill()
-            os.killpg(process.pid, signal.SIGKILL)  # send signal to the process group
+            kill_process_group(process)
             stdout, stderr = process.communicate()
             raise TimeoutExpired(process.args, timeout, output=stdout, stderr=stderr)
         except:
             process.kill()
             process.wait()
             raise
+        finally:
+            with running_processes_lock:
+                running_processes.discard(process)
         retcode = process.poll()
         if retcode:
             raise CalledProcessError(
@@ -508,6 +774,13 @@ def check_output_group_kill(*popenargs, timeout=None, **kwargs):
     return CompletedProcess(process.args, retcode, stdout, stderr)
 
 
+def kill_process_group(process: Popen):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)  # send signal to the process group
+    except ProcessLookupError:
+        pass
+
+
 def build_final_command(
     command: str,
     context: Dict[str, str],
@@ -651,26 +924,3 @@ def expand_variables(
         return ""
 
     raise ValueError("Invalid input for expand_variables")
-
-
-class cd_and_create:
-    """
-    cd_and_create context manager.
-
-    Creates a directory if needed and switch to it.
-    When exiting the context mlanager, the initial directory is restored.
-    """
-
-    def __init__(self, target_path):
-        self.target_path = os.path.expanduser(target_path)
-
-    def __enter__(self):
-        self.previous_path = os.getcwd()
-        if not self.target_path:
-            return
-        if not os.path.exists(self.target_path):
-            os.makedirs(self.target_path)
-        os.chdir(self.target_path)
-
-    def __exit__(self, etype, value, traceback):
-        os.chdir(self.previous_path)
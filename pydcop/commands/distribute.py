@@ -46,7 +46,8 @@ Synopsis
     pydcop distribute --distribution <distribution_method>
                       [--cost <distribution_method_for cost>]
                       [--graph <graph_model>]
-                      [--algo <dcop_algorithm>] <dcop-files>
+                      [--algo <dcop_algorithm>]
+                      [--traffic_profile <profile_file>] <dcop-files>
 
 Description
 -----------
@@ -95,6 +96,15 @@ Options
   When the ``--algo`` option is used, it is not required as the graph model
   can be deduced from the DCOP algorithm.
 
+``--traffic_profile <profile_file>``
+  An optional traffic profile, written by the ``--dump_traffic`` option of
+  the :ref:`solve<pydcop_commands_solve>` and
+  :ref:`run<pydcop_commands_run>` commands. When given, the communication
+  load between computations is the size of the messages actually exchanged
+  during the profiled run (per cycle), instead of the estimate given by the
+  algorithm. The estimate is still used for computations that did not send
+  any message during that run.
+
 ``<dcop-files>``
   One or several paths to the files containing the dcop. If several paths are
   given, their content is concatenated as used a the yaml definition for the
@@ -156,6 +166,8 @@ from pydcop.algorithms import list_available_algorithms, load_algorithm_module
 from pydcop.commands._utils import _error
 from pydcop.dcop.yamldcop import load_dcop_from_file
 from pydcop.distribution.objects import ImpossibleDistributionException
+from pydcop.distribution.traffic import load_traffic_profile, \
+    profile_communication_load
 
 logger = logging.getLogger("pydcop.cli.distribute")
 
@@ -199,6 +211,7 @@ def set_parser(subparsers):
             "oilp_secp_cgdp",
             "oilp_cgdp",
             "gh_cgdp",
+            "mlgp",
         ],
         required=True,
         help="Algorithm for distributing the computation " "graph.",
@@ -222,13 +235,22 @@ def set_parser(subparsers):
         "communication load for computations",
     )
 
+    parser.add_argument(
+        "--traffic_profile",
+        type=str,
+        default=None,
+        help="Optional traffic profile (written by solve or run with "
+        "--dump_traffic), used as communication load between "
+        "computations instead of the algorithm's estimates",
+    )
+
 
 def run_cmd(args, timer=None, timeout=None):
     logger.debug('dcop command "distribute" with arguments {} '.format(args))
 
     dcop_yaml_files = args.dcop_files
     logger.info("loading dcop from {}".format(dcop_yaml_files))
-    dcop = load_dcop_from_file(dcop_yaml_files)
+    dcop = load_dcop_from_file(dcop_yaml_files, cache_dir=args.dcop_cache)
 
     dist_module = load_distribution_module(args.distribution)
     if args.cost:
@@ -269,6 +291,13 @@ def run_cmd(args, timer=None, timeout=None):
     else:
         computation_memory = algo_module.computation_memory
         communication_load = algo_module.communication_load
+    if args.traffic_profile is not None:
+        try:
+            profile = load_traffic_profile(args.traffic_profile)
+        except (OSError, ValueError) as e:
+            _error("Could not load traffic profile", e)
+        communication_load = profile_communication_load(
+            profile, default=communication_load)
 
     global result
     result.update({
@@ -277,6 +306,7 @@ def run_cmd(args, timer=None, timeout=None):
                 "dcop": args.dcop_files,
                 "graph": graph_type,
                 "algo": args.algo,
+                "traffic_profile": args.traffic_profile,
             },
             "status": "PROGRESS"
         })
@@ -318,6 +348,7 @@ def run_cmd(args, timer=None, timeout=None):
                 "dcop": args.dcop_files,
                 "graph": graph_type,
                 "algo": args.algo,
+                "traffic_profile": args.traffic_profile,
                 "duration": duration,
             },
             "distribution": dist,
@@ -51,6 +51,7 @@ Synopsis
                 [--soft]
                 [--extensive]
                 [--noagents]
+                [--tables]
                 [--p_edge <p_edge>]
                 [--m_edge <m_edge>]
 
@@ -112,6 +113,11 @@ Options
   If this flag is set, no agent definition is generated in the dcop file,
   otherwise one agent is created for each variable.
 
+``--tables``
+  If this flag is set, the tables of extensive constraints are written in
+  ``.npy`` files, next to the output file, instead of being written in the
+  yaml dcop file. Requires the ``--output`` global option.
+
 ``--p_edge <p_edge>`` / ``--p <p_edge>``
   Only used for random graph, probability for edge creation in the random
   Erdős-Rényi graph creation model.
@@ -124,6 +130,10 @@ Options
 
 
 
+The graph and the costs tables are generated with numpy and the dcop is
+written incrementally, which allows generating problems with millions of
+variables.
+
 Examples
 --------
 
@@ -138,18 +148,23 @@ Generating a random soft graph coloring problem with 10 variables::
 import logging
 import math
 import random
+import sys
+from os import path
+from typing import List, TextIO
 
 import networkx as nx
+import numpy as np
 
-from pydcop.dcop.dcop import DCOP
-from pydcop.dcop.objects import VariableDomain, Variable, AgentDef
 from pydcop.dcop.relations import relation_from_str, NAryMatrixRelation
-from pydcop.dcop.yamldcop import dcop_yaml
+from pydcop.dcop.yamlstream import DcopYamlWriter
 
 logger = logging.getLogger("pydcop.cli.generate")
 
 COLORS = ["R", "G", "B", "O", "F", "Y", "L", "C"]
 
+# Number of edges for which costs tables are generated at once.
+CHUNK_SIZE = 100000
+
 
 def init_cli_parser(parent_parser):
     parser = parent_parser.add_parser(
@@ -211,6 +226,15 @@ def init_cli_parser(parent_parser):
         help="Do not generate agents",
     )
 
+    parser.add_argument(
+        "--tables",
+        default=False,
+        required=False,
+        action="store_true",
+        help="write the tables of extensive constraints in .npy files, "
+        "next to the output file",
+    )
+
     # For random graphs
     parser.add_argument(
         "-p",
@@ -241,6 +265,12 @@ def generate(args):
     """
     if args.colors_count > len(COLORS):
         raise ValueError("Too many colors!")
+    if args.soft and args.intentional:
+        raise ValueError(
+            "Cannot generate soft intentional " "graph coloring constraints"
+        )
+    if args.tables and not args.output:
+        raise ValueError("Option --tables requires an --output file")
 
     if args.graph == "random":
         if not args.p_edge:
@@ -248,7 +278,7 @@ def generate(args):
                 "Option --p_edge is mandatory when generating a graph coloring "
                 "problem based on a random graph."
             )
-        graph = generate_random_graph(
+        edges = random_graph_edges(
             args.variables_count, args.p_edge, args.allow_subgraph
         )
         name = "Random "
@@ -258,53 +288,263 @@ def generate(args):
                 "Option --m_edge is mandatory when generating a graph coloring "
                 "problem based on a barabasi graph."
             )
-        graph = generate_scalefree_graph(
-            args.variables_count, args.m_edge, args.allow_subgraph
-        )
+        edges = scalefree_graph_edges(args.variables_count, args.m_edge)
         name = "Scale-free "
     elif args.graph == "grid":
-        graph = generate_grid_graph(args.variables_count)
-        name = "Grid"
+        edges = grid_graph_edges(args.variables_count)
+        name = "Grid "
     else:
         raise ValueError("Invalid graph type for graphcoloring: " + args.graph)
-
-    domain = VariableDomain("colors", "color", COLORS[: args.colors_count])
-
-    variables = {}
-    for i, node in enumerate(sorted(graph.nodes)):
-        logger.debug("node %s - %s", node, i)
-        name = f"v{i:02d}"
-        # Networkx's nodes may be index or tuple, but are guaranteed to be
-        # hashable, we can use them as key in our map:
-        variables[node] = Variable(name, domain)
-
-    agents = {}
-    if not args.noagents:
-        for i, _ in enumerate(variables):
-            agt = AgentDef(f"a{i:02d}")
-            agents[agt.name] = agt
-
-    if args.soft:
-        constraints = generate_soft_constraints(graph, variables, args.intentional)
-        name += "soft graph coloring"
-    else:
-        constraints = generate_hard_constraints(graph, variables, args.intentional)
-        name += "hard graph coloring"
-
-    dcop = DCOP(
-        name,
-        domains={"colors": domain},
-        variables={v.name: v for v in variables.values()},
-        agents=agents,
-        constraints=constraints,
-    )
+    name += "soft graph coloring" if args.soft else "hard graph coloring"
 
     if args.output:
         output_file = args.output
+        tables_prefix = path.splitext(output_file)[0] if args.tables else None
         with open(output_file, encoding="utf-8", mode="w") as fo:
-            fo.write(dcop_yaml(dcop))
+            write_graph_coloring(
+                fo,
+                name,
+                args.variables_count,
+                edges,
+                COLORS[: args.colors_count],
+                soft=args.soft,
+                intentional=args.intentional,
+                agents=not args.noagents,
+                tables_prefix=tables_prefix,
+                yaml_dir=path.dirname(output_file),
+            )
+    else:
+        write_graph_coloring(
+            sys.stdout,
+            name,
+            args.variables_count,
+            edges,
+            COLORS[: args.colors_count],
+            soft=args.soft,
+            intentional=args.intentional,
+            agents=not args.noagents,
+        )
+
+
+def write_graph_coloring(
+    stream: TextIO,
+    name: str,
+    variables_count: int,
+    edges: np.ndarray,
+    colors: List[str],
+    soft: bool = False,
+    intentional: bool = False,
+    agents: bool = True,
+    tables_prefix: str = None,
+    yaml_dir: str = ".",
+):
+    """
+    Write a graph coloring dcop in yaml, without building it in memory.
+
+    Parameters
+    ----------
+    stream: TextIO
+        the stream the dcop is written to.
+    name: str
+        name of the dcop.
+    variables_count: int
+        number of variables, i.e. nodes in the graph.
+    edges: np.ndarray
+        the edges of the graph, as a (m, 2) array of nodes indexes.
+    colors: list of str
+        the colors.
+    soft: bool
+        if true, generate a weighted graph coloring problem, with random
+        costs in [0, 9].
+    intentional: bool
+        if true, hard constraints are written in intentional form.
+    agents: bool
+        if true, generate one agent for each variable.
+    tables_prefix: str
+        when given, the tables of extensive constraints are written in
+        ``.npy`` files starting with this prefix.
+    yaml_dir: str
+        directory of the yaml dcop file.
+    """
+    domain_values = [colors, colors]
+    with DcopYamlWriter(
+        stream, name, tables_prefix=tables_prefix, yaml_dir=yaml_dir
+    ) as writer:
+        writer.domain("colors", colors, "color")
+        for i in range(variables_count):
+            writer.variable(f"v{i:02d}", "colors")
+
+        hard_table = np.eye(len(colors), dtype=np.int64) * 1000
+        for chunk_start in range(0, len(edges), CHUNK_SIZE):
+            chunk = edges[chunk_start : chunk_start + CHUNK_SIZE].tolist()
+            if soft:
+                tables = np.random.randint(0, 10, (len(chunk), len(colors), len(colors)))
+            for i, (u, v) in enumerate(chunk, chunk_start):
+                c_name = f"c{i}"
+                v1, v2 = f"v{u:02d}", f"v{v:02d}"
+                if soft:
+                    writer.extensional_constraint(
+                        c_name, [v1, v2], domain_values, tables[i - chunk_start]
+                    )
+                elif intentional:
+                    writer.intention_constraint(
+                        c_name, f"1000 if {v1} == {v2} else 0"
+                    )
+                else:
+                    writer.extensional_constraint(
+                        c_name, [v1, v2], domain_values, hard_table, default=0
+                    )
+
+        if agents:
+            for i in range(variables_count):
+                writer.agent(f"a{i:02d}")
+
+
+def random_graph_edges(
+    variables_count: int, p_edge: float, allow_subgraph: bool = False
+) -> np.ndarray:
+    """
+    Edges of a random Erdős-Rényi graph.
+
+    Instead of drawing each of the n(n-1)/2 possible edges, the gaps between
+    selected edges are drawn from a geometric distribution, which only
+    requires O(m) time and memory for m edges.
+
+    Parameters
+    ----------
+    variables_count: int
+        number of nodes in the graph.
+    p_edge: float
+        probability of each edge.
+    allow_subgraph: bool
+        if false, graphs are generated until a connected one is found.
+
+    Returns
+    -------
+    np.ndarray:
+        the edges, as a (m, 2) array of nodes indexes.
+    """
+    while True:
+        edges = _gnp_edges(variables_count, p_edge)
+        if allow_subgraph or is_connected(variables_count, edges):
+            return edges
+
+
+def _gnp_edges(n: int, p: float) -> np.ndarray:
+    pairs_count = n * (n - 1) // 2
+    if p >= 1:
+        indexes = np.arange(pairs_count, dtype=np.int64)
+    elif p <= 0 or pairs_count == 0:
+        indexes = np.empty(0, dtype=np.int64)
     else:
-        print(dcop_yaml(dcop))
+        expected = pairs_count * p
+        size = int(expected + 5 * math.sqrt(expected)) + 16
+        chunks = []
+        last = -1
+        while last < pairs_count:
+            chunk = last + np.cumsum(np.random.geometric(p, size))
+            chunks.append(chunk)
+            last = chunk[-1]
+        indexes = np.concatenate(chunks)
+        indexes = indexes[indexes < pairs_count]
+
+    # Index k is the pair (i, j), with j < i and k = i (i-1) / 2 + j
+    i = ((1 + np.sqrt(1 + 8 * indexes.astype(np.float64))) / 2).astype(np.int64)
+    i -= i * (i - 1) // 2 > indexes
+    i += (i + 1) * i // 2 <= indexes
+    j = indexes - i * (i - 1) // 2
+    return np.column_stack([j, i])
+
+
+def scalefree_graph_edges(variables_count: int, m_edge: int) -> np.ndarray:
+    """
+    Edges of a scale-free graph, based on the Barabási–Albert model.
+
+    The graph is connected by construction. Nodes are shuffled, as in
+    `generate_scalefree_graph`, to avoid low rank nodes having much more
+    edges than high rank nodes.
+
+    Parameters
+    ----------
+    variables_count: int
+        number of nodes in the graph.
+    m_edge: int
+        number of edges to attach from a new node to existing nodes.
+
+    Returns
+    -------
+    np.ndarray:
+        the edges, as a (m, 2) array of nodes indexes.
+    """
+    if m_edge < 1 or m_edge >= variables_count:
+        raise ValueError(
+            f"Invalid m_edge {m_edge}, must be >= 1 and < {variables_count}"
+        )
+    edges = np.empty(((variables_count - m_edge) * m_edge, 2), dtype=np.int64)
+    # Each node is repeated once for each of its edges, selecting nodes
+    # uniformly in this list gives a probability proportional to their degree:
+    repeated_nodes = []
+    targets = list(range(m_edge))
+    for k, source in enumerate(range(m_edge, variables_count)):
+        edges[k * m_edge : (k + 1) * m_edge, 0] = source
+        edges[k * m_edge : (k + 1) * m_edge, 1] = targets
+        repeated_nodes.extend(targets)
+        repeated_nodes.extend([source] * m_edge)
+        selected = set()
+        while len(selected) < m_edge:
+            selected.add(random.choice(repeated_nodes))
+        targets = list(selected)
+
+    return np.random.permutation(variables_count)[edges]
+
+
+def grid_graph_edges(variables_count: int) -> np.ndarray:
+    """
+    Edges of a square grid graph.
+
+    Parameters
+    ----------
+    variables_count: int
+        number of nodes in the graph, must be a square.
+
+    Returns
+    -------
+    np.ndarray:
+        the edges, as a (m, 2) array of nodes indexes, the node at row r and
+        column c having index r * side + c.
+    """
+    side = _grid_side(variables_count)
+    nodes = np.arange(variables_count, dtype=np.int64).reshape(side, side)
+    horizontal = np.column_stack([nodes[:, :-1].ravel(), nodes[:, 1:].ravel()])
+    vertical = np.column_stack([nodes[:-1, :].ravel(), nodes[1:, :].ravel()])
+    return np.concatenate([horizontal, vertical])
+
+
+def is_connected(nodes_count: int, edges: np.ndarray) -> bool:
+    """
+    Check if a graph, given as an array of edges, is connected.
+
+    Connected components are labelled by propagating the smallest node index
+    along edges, with pointer jumping, using only numpy operations.
+    """
+    if nodes_count <= 1:
+        return True
+    labels = np.arange(nodes_count)
+    u, v = edges[:, 0], edges[:, 1]
+    while True:
+        lu, lv = labels[u], labels[v]
+        smallest = np.minimum(lu, lv)
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, lu, smallest)
+        np.minimum.at(new_labels, lv, smallest)
+        while True:
+            jumped = new_labels[new_labels]
+            if np.array_equal(jumped, new_labels):
+                break
+            new_labels = jumped
+        if np.array_equal(new_labels, labels):
+            return not labels.any()
+        labels = new_labels
 
 
 def generate_random_graph(variables_count, p_edge, allow_subgraph):
@@ -340,6 +580,12 @@ def generate_scalefree_graph(variables_count, m_edge, allow_subgraph):
 
 
 def generate_grid_graph(variables_count):
+    side = _grid_side(variables_count)
+    graph = nx.grid_2d_graph(side, side)
+    return graph
+
+
+def _grid_side(variables_count: int) -> int:
     side = math.sqrt(variables_count)
     if int(side) != side:
         raise ValueError(
@@ -347,9 +593,7 @@ def generate_grid_graph(variables_count):
             "the option --variables_count is not a valid square"
             "grid size"
         )
-    side = int(side)
-    graph = nx.grid_2d_graph(side, side)
-    return graph
+    return int(side)
 
 
 def generate_soft_constraints(graph, variables, intentional):
@@ -363,13 +607,8 @@ def generate_soft_constraints(graph, variables, intentional):
         name = "c" + str(i)
         u, v = edge
         v1, v2 = variables[u], variables[v]
-        constraint = NAryMatrixRelation([v1, v2], name=name)
-        for val1 in v1.domain:
-            for val2 in v2.domain:
-                constraint = constraint.set_value_for_assignment(
-                    {v1.name: val1, v2.name: val2}, random.randint(0, 9)
-                )
-        constraints[name] = constraint
+        table = np.random.randint(0, 10, (len(v1.domain), len(v2.domain)))
+        constraints[name] = NAryMatrixRelation([v1, v2], table, name=name)
         logger.debug(repr(constraints[name]))
 
     return constraints
@@ -402,12 +641,8 @@ def generate_hard_constraints(graph, variables, intentional):
             expression = f"1000 if {v1.name} == {v2.name} else 0"
             constraints[name] = relation_from_str(name, expression, [v1, v2])
         else:
-            constraint = NAryMatrixRelation([v1, v2], name=name)
-            for val in v1.domain:
-                constraint = constraint.set_value_for_assignment(
-                    {v1.name: val, v2.name: val}, 1000
-                )
-            constraints[name] = constraint
+            table = np.eye(len(v1.domain), dtype=np.int64) * 1000
+            constraints[name] = NAryMatrixRelation([v1, v2], table, name=name)
         logger.debug(repr(constraints[name]))
 
     return constraints
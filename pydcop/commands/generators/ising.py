@@ -46,6 +46,7 @@ Ising benchmark problem generator
                 [--bin_range <bin_range>]
                 {--un_range <un_range>]
                 [-intentional]
+                [--tables]
                 [--fg_dist]
 
 
@@ -106,6 +107,11 @@ Options
   When using this flag, constraints are generated in the intentional form
   (default is extensive).
 
+``--tables``
+  When using this flag, the tables of extensive constraints are written in ``.npy``
+  files, next to the output file, instead of being written in the yaml dcop file.
+  Requires the ``--output`` global option.
+
 ``--fg_dist``
   When using this flag, the agents and distribution are generated for factor-graph
   based algorithms where computations are needed for variables and constraints.
@@ -121,6 +127,9 @@ Options
   to a file ``<dcop_name>_vardist.yaml``.
 
 
+The dcop and distributions are written incrementally, without building the dcop in
+memory, which allows generating grids with millions of variables.
+
 Examples
 --------
 
@@ -139,20 +148,24 @@ Generate a DCOP representing a 3x4 ising problem, in intentional form and writte
 """
 import logging
 import random
+import sys
 from collections import defaultdict
-from os.path import splitext
-from typing import Any, Dict, Tuple
+from os import path
+from typing import Any, Dict, Iterator, List, TextIO, Tuple
 
 import networkx as nx
-import yaml
+import numpy as np
 
 from pydcop.dcop.dcop import DCOP
 from pydcop.dcop.objects import Variable, Domain, AgentDef
 from pydcop.dcop.relations import NAryMatrixRelation, Constraint, constraint_from_str
-from pydcop.dcop.yamldcop import dcop_yaml
+from pydcop.dcop.yamlstream import DcopYamlWriter, write_distribution_yaml
 
 logger = logging.getLogger("pydcop.cli.generate")
 
+# Number of binary constraints for which costs are generated at once.
+CHUNK_SIZE = 100000
+
 
 def init_cli_parser(parent_parser):
     parser = parent_parser.add_parser(
@@ -180,6 +193,14 @@ def init_cli_parser(parent_parser):
         action="store_true",
         help="generate the problem in intentional form (default is extensive form)",
     )
+    parser.add_argument(
+        "--tables",
+        default=False,
+        required=False,
+        action="store_true",
+        help="write the tables of extensive constraints in .npy files, next to the "
+        "output file",
+    )
     parser.add_argument(
         "--no_agents",
         default=False,
@@ -222,53 +243,209 @@ def generate(args):
     else:
         col_count = args.row_count
 
-    dcop, var_mapping, fg_mapping = generate_ising(
+    if args.tables and not args.output:
+        raise ValueError("Option --tables requires an --output file")
+
+    graph = "factor_graph" if args.fg_dist else "constraints_graph"
+    output_file = args.output if args.output else "NA"
+    inputs = {
+        "dist_algo": "NA",
+        "dcop": output_file,
+        "graph": graph,
+        "algo": "NA",
+    }
+    write_args = (
         args.row_count,
         col_count,
         args.bin_range,
         args.un_range,
         not args.intentional,
-        no_agents=args.no_agents,
-        fg_dist=args.fg_dist,
-        var_dist=args.var_dist,
+        not args.no_agents,
     )
 
-    graph = "factor_graph" if args.fg_dist else "constraints_graph"
-    output_file = args.output if args.output else "NA"
-    dist_result = {
-        "inputs": {
-            "dist_algo": "NA",
-            "dcop": output_file,
-            "graph": graph,
-            "algo": "NA",
-        },
-        "cost": None,
-    }
-
-    # TODO: generate and output distribution
     if args.output:
+        file_path, ext = path.splitext(output_file)
         with open(output_file, encoding="utf-8", mode="w") as fo:
-            fo.write(dcop_yaml(dcop))
-        path, ext = splitext(output_file)
+            write_ising(
+                fo,
+                *write_args,
+                tables_prefix=file_path if args.tables else None,
+                yaml_dir=path.dirname(output_file),
+            )
         if args.fg_dist:
-            dist_result["distribution"] = fg_mapping
-            dist_output_file = f"{path}_fgdist{ext}"
+            dist_output_file = f"{file_path}_fgdist{ext}"
             with open(dist_output_file, encoding="utf-8", mode="w") as fo:
-                fo.write(yaml.dump(dist_result))
+                write_distribution_yaml(
+                    fo, ising_fg_mapping(args.row_count, col_count), inputs
+                )
         if args.var_dist:
-            dist_result["distribution"] = var_mapping
-            dist_output_file = f"{path}_vardist{ext}"
+            dist_output_file = f"{file_path}_vardist{ext}"
             with open(dist_output_file, encoding="utf-8", mode="w") as fo:
-                fo.write(yaml.dump(dist_result))
+                write_distribution_yaml(
+                    fo, ising_var_mapping(args.row_count, col_count), inputs
+                )
 
     else:
-        print(dcop_yaml(dcop))
+        write_ising(sys.stdout, *write_args)
         if args.fg_dist:
-            dist_result["distribution"] = fg_mapping
-            print(yaml.dump(dist_result))
+            print()
+            write_distribution_yaml(
+                sys.stdout, ising_fg_mapping(args.row_count, col_count), inputs
+            )
         if args.var_dist:
-            dist_result["distribution"] = fg_mapping
-            print(yaml.dump(dist_result))
+            print()
+            write_distribution_yaml(
+                sys.stdout, ising_var_mapping(args.row_count, col_count), inputs
+            )
+
+
+def write_ising(
+    stream: TextIO,
+    row_count: int,
+    col_count: int,
+    bin_range: float,
+    un_range: float,
+    extensive: bool,
+    agents: bool = True,
+    tables_prefix: str = None,
+    yaml_dir: str = ".",
+):
+    """
+    Write an ising dcop in yaml, without building it in memory.
+
+    The dcop is the same as the one built by `generate_ising`.
+
+    Parameters
+    ----------
+    stream: TextIO
+        the stream the dcop is written to.
+    row_count: int
+        number of rows in the grid.
+    col_count: int
+        number of columns in the grid.
+    bin_range: float
+        range of binary constraints.
+    un_range: float
+        range of unary constraints.
+    extensive: bool
+        if true, constraints are written in extensive form, otherwise in
+        intentional form.
+    agents: bool
+        if true, generate one agent for each variable.
+    tables_prefix: str
+        when given, the tables of extensive constraints are written in
+        ``.npy`` files starting with this prefix.
+    yaml_dir: str
+        directory of the yaml dcop file.
+    """
+    name = f"Ising_{row_count}_{col_count}_{bin_range}_{un_range}"
+    domain = [0, 1]
+    domains = [domain, domain]
+    with DcopYamlWriter(
+        stream, name, tables_prefix=tables_prefix, yaml_dir=yaml_dir
+    ) as writer:
+        writer.domain("var_domain", domain, "binary")
+        for row in range(row_count):
+            for col in range(col_count):
+                writer.variable(f"v_{row}_{col}", "var_domain")
+
+        for row in range(row_count):
+            values = np.random.uniform(-un_range, un_range, col_count)
+            tables = np.column_stack([values, -values])
+            for col, value in enumerate(values.tolist()):
+                variable = f"v_{row}_{col}"
+                c_name = f"cu_{variable}"
+                if extensive:
+                    writer.extensional_constraint(
+                        c_name, [variable], [domain], tables[col]
+                    )
+                else:
+                    writer.intention_constraint(
+                        c_name, f" -{value} if {variable} == 1 else {value}"
+                    )
+
+        edges = ising_edges(row_count, col_count)
+        for start in range(0, len(edges), CHUNK_SIZE):
+            chunk = edges[start : start + CHUNK_SIZE].tolist()
+            values = np.random.uniform(-bin_range, bin_range, len(chunk))
+            tables = np.stack([values, -values, -values, values], axis=1)
+            tables = tables.reshape(len(chunk), 2, 2)
+            for (r1, c1, r2, c2), value, table in zip(chunk, values.tolist(), tables):
+                v1, v2 = f"v_{r1}_{c1}", f"v_{r2}_{c2}"
+                c_name = f"cb_{v1}_{v2}"
+                if extensive:
+                    writer.extensional_constraint(c_name, [v1, v2], domains, table)
+                else:
+                    writer.intention_constraint(
+                        c_name, f"{value} if {v1} == {v2} else -{value}"
+                    )
+
+        if agents:
+            for row in range(row_count):
+                for col in range(col_count):
+                    writer.agent(f"a_{row}_{col}")
+
+
+def ising_edges(row_count: int, col_count: int) -> np.ndarray:
+    """
+    Edges of the toroidal grid of an ising problem.
+
+    Returns
+    -------
+    np.ndarray:
+        a (m, 4) array, each row ``(r1, c1, r2, c2)`` giving the coordinates
+        of the two ends of an edge, with ``(r1, c1) < (r2, c2)``. Like with
+        ``nx.grid_2d_graph(periodic=True)``, each edge is only given once and
+        there is no self-loop, even when a dimension is 1 or 2.
+    """
+    rows, cols = np.meshgrid(
+        np.arange(row_count), np.arange(col_count), indexing="ij"
+    )
+    rows, cols = rows.ravel(), cols.ravel()
+    right = np.column_stack([rows, cols, rows, (cols + 1) % col_count])
+    down = np.column_stack([rows, cols, (rows + 1) % row_count, cols])
+    edges = np.concatenate([right, down])
+    # Sort coordinates, for wrapping edges:
+    swap = (edges[:, 0] > edges[:, 2]) | (
+        (edges[:, 0] == edges[:, 2]) & (edges[:, 1] > edges[:, 3])
+    )
+    edges[swap] = edges[swap][:, [2, 3, 0, 1]]
+    # Wrapping edges are self-loops when a dimension is 1, and duplicate the
+    # direct edges when it is 2:
+    loops = (edges[:, 0] == edges[:, 2]) & (edges[:, 1] == edges[:, 3])
+    return np.unique(edges[~loops], axis=0)
+
+
+def ising_fg_mapping(row_count: int, col_count: int) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Distribution of an ising problem for factor-graph based algorithms.
+
+    Each agent hosts one variable, its unary constraint and the binary
+    constraints with the variables above it and on its right in the grid.
+    """
+    for row in range(row_count):
+        for col in range(col_count):
+            left = (row - 1) % row_count
+            down = (col + 1) % col_count
+            (r1, c1), (r2, c2) = sorted([(row, col), (left, col)])
+            (r3, c3), (r4, c4) = sorted([(row, col), (row, down)])
+            yield f"a_{row}_{col}", [
+                f"v_{row}_{col}",
+                f"cu_v_{row}_{col}",
+                f"cb_v_{r1}_{c1}_v_{r2}_{c2}",
+                f"cb_v_{r3}_{c3}_v_{r4}_{c4}",
+            ]
+
+
+def ising_var_mapping(
+    row_count: int, col_count: int
+) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Distribution of an ising problem where each agent hosts one variable.
+    """
+    for row in range(row_count):
+        for col in range(col_count):
+            yield f"a_{row}_{col}", [f"v_{row}_{col}"]
 
 
 def generate_ising(
@@ -363,23 +540,12 @@ def generate_binary_extensive_constraint(
     variable1: Variable, variable2: Variable, bin_range: float
 ) -> Constraint:
 
-    constraint = NAryMatrixRelation(
-        [variable1, variable2], name=f"cb_{variable1.name}_{variable2.name}"
-    )
     value = random.uniform(-bin_range, bin_range)
-    constraint = constraint.set_value_for_assignment(
-        {variable1.name: 0, variable2.name: 0}, value
-    )
-    constraint = constraint.set_value_for_assignment(
-        {variable1.name: 1, variable2.name: 1}, value
-    )
-    constraint = constraint.set_value_for_assignment(
-        {variable1.name: 0, variable2.name: 1}, -value
-    )
-    constraint = constraint.set_value_for_assignment(
-        {variable1.name: 1, variable2.name: 0}, -value
+    return NAryMatrixRelation(
+        [variable1, variable2],
+        np.array([[value, -value], [-value, value]]),
+        name=f"cb_{variable1.name}_{variable2.name}",
     )
-    return constraint
 
 
 def generate_binary_intentional_constraint(
@@ -413,11 +579,10 @@ def generate_unary_extensive_constraint(
     variable: Variable, un_range: float
 ) -> Constraint:
 
-    constraint = NAryMatrixRelation([variable], name=f"cu_{variable.name}")
     value = random.uniform(-un_range, un_range)
-    constraint = constraint.set_value_for_assignment({variable.name: 0}, value)
-    constraint = constraint.set_value_for_assignment({variable.name: 1}, -value)
-    return constraint
+    return NAryMatrixRelation(
+        [variable], np.array([value, -value]), name=f"cu_{variable.name}"
+    )
 
 
 def generate_unary_intentional_constraint(variable: Variable, un_range: float):
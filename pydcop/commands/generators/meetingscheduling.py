@@ -50,6 +50,7 @@ Synopsis
           --max_resources_event <max_resources_event>
           [--max_length_event <max_length_event>]
           [--max_resource_value <max_resource_value>]
+          [--tables]
 
 
 Description
@@ -92,6 +93,14 @@ Options
   each time slot and a value for being kept free (in [1, max_resource_value])
   at a given time slot. Optional, defaults to 10.
 
+``--tables``
+  When using this flag, the tables of the constraints are written in ``.npy``
+  files, next to the output file, instead of being written in the yaml dcop file.
+  Requires the ``--output`` global option.
+
+The dcop is written incrementally, without building it in memory, and the costs
+tables are computed with numpy, which allows generating large problems.
+
 
 Examples
 --------
@@ -110,18 +119,17 @@ distribution is written in ``meetings_dist.yaml``::
 
 """
 import random
-from os.path import splitext
-from typing import Dict, List, Tuple, NamedTuple
+import sys
+from os import path
+from typing import Dict, List, Tuple, NamedTuple, TextIO
 
 import itertools
 
-import yaml
+import numpy as np
 
-from pydcop.dcop.dcop import DCOP
-from pydcop.dcop.objects import Variable, Domain, AgentDef
+from pydcop.dcop.objects import Variable, Domain
 from pydcop.dcop.relations import NAryMatrixRelation, Constraint
-from pydcop.dcop.yamldcop import dcop_yaml
-from pydcop.distribution.objects import Distribution
+from pydcop.dcop.yamlstream import DcopYamlWriter, write_distribution_yaml
 
 
 def init_cli_parser(parent_parser):
@@ -167,6 +175,14 @@ def init_cli_parser(parent_parser):
         "(in [1, max_resource_value]) at a given time slot",
     )
 
+    parser.add_argument(
+        "--tables",
+        default=False,
+        required=False,
+        action="store_true",
+        help="write the tables of constraints in .npy files, next to the output file",
+    )
+
     parser.add_argument(
         "--no_agents",
         default=False,
@@ -208,6 +224,9 @@ def init_cli_parser(parent_parser):
 
 
 def generate(args):
+    if args.tables and not args.output:
+        raise ValueError("Option --tables requires an --output file")
+
     slots, events, resources = generate_problem_definition(
         args.slots_count,
         args.resources_count,
@@ -218,79 +237,50 @@ def generate(args):
     )
 
     penalty = args.max_resource_value * args.slots_count * args.resources_count
-    variables, constraints, agents = peav_model(slots, events, resources, penalty)
-
-    domains = {variable.domain.name: variable.domain for variable in variables.values()}
-    variables = {variable.name: variable for variable in variables.values()}
-    # agents_defs = {agent.name: agent for agent, _ in agents.values()}
-    # Generate agents hosting and route costs
-    agents_defs = {}
-    if not args.no_agents:
-        for agent, agt_variables in agents.items():
-            kw = {}
-            kw["hosting_costs"] = {v.name: 0 for v in agt_variables}
-            if args.hosting_default:
-                kw["default_hosting_cost"] = args.hosting_default
-            if args.capacity:
-                kw["capacity"] = args.capacity
-            if args.routes_default:
-                kw["default_route"] = args.routes_default
-            agents_defs[agent] = AgentDef(agent, **kw)
-
-    dcop = DCOP(
-        "MeetingSceduling",
-        objective="max",
-        domains=domains,
-        variables=variables,
-        constraints=constraints,
-        agents=agents_defs,
-    )
-
-    if not args.no_agents:
-        distribution = Distribution(
-            {
-                agent.name: [v.name for v in agents[agent.name]]
-                for agent in agents_defs.values()
-            }
-        )
+    agents_kw = {}
+    if args.hosting_default:
+        agents_kw["default_hosting_cost"] = args.hosting_default
+    if args.capacity:
+        agents_kw["capacity"] = args.capacity
+    if args.routes_default:
+        agents_kw["default_route"] = args.routes_default
+    agents_kw = None if args.no_agents else agents_kw
+
+    output_file = args.output if args.output else "NA"
+    dist_inputs = {
+        "dist_algo": "peav",
+        "dcop": output_file,
+        "graph": "constraints_graph",
+        "algo": "NA",
+    }
 
     if args.output:
-        output_file = args.output
+        file_path, ext = path.splitext(output_file)
         with open(output_file, encoding="utf-8", mode="w") as fo:
-            fo.write(dcop_yaml(dcop))
-
+            write_peav_model(
+                fo,
+                slots,
+                events,
+                resources,
+                penalty,
+                agents_kw,
+                tables_prefix=file_path if args.tables else None,
+                yaml_dir=path.dirname(output_file),
+            )
         if not args.no_agents:
-            dist_result = {
-                "inputs": {
-                    "dist_algo": "peav",
-                    "dcop": output_file,
-                    "graph": "constraints_graph",
-                    "algo": "NA",
-                },
-                "distribution": distribution.mapping(),
-                "cost": None,
-            }
-            path, ext = splitext(output_file)
-            dist_output_file = f"{path}_dist{ext}"
+            dist_output_file = f"{file_path}_dist{ext}"
             with open(dist_output_file, encoding="utf-8", mode="w") as fo:
-                fo.write(yaml.dump(dist_result))
+                write_distribution_yaml(
+                    fo, peav_distribution(events, resources), dist_inputs
+                )
 
     else:
-        print(dcop_yaml(dcop))
-
+        write_peav_model(sys.stdout, slots, events, resources, penalty, agents_kw)
         if not args.no_agents:
-            dist_result = {
-                "inputs": {
-                    "dist_algo": "peav",
-                    "dcop": "NA",
-                    "graph": "constraints_graph",
-                    "algo": "NA",
-                },
-                "distribution": distribution.mapping(),
-                "cost": None,
-            }
-            # FIXME proper serialization of the distribution:
-            print(yaml.dump(dist_result))
+            print()
+            write_distribution_yaml(
+                sys.stdout, peav_distribution(events, resources), dist_inputs
+            )
 
 
 # Semantic type definitions:
@@ -365,6 +355,154 @@ def peav_model(
     return all_variables, all_constraints, all_agents
 
 
+def write_peav_model(
+    stream: TextIO,
+    slots: List[SLOT],
+    events: Dict[EVT, Event],
+    resources: Dict[RESOURCE, Resource],
+    penalty,
+    agents_kw: Dict = None,
+    tables_prefix: str = None,
+    yaml_dir: str = ".",
+):
+    """
+    Write the DCOP for the PEAV model in yaml, without building it in memory.
+
+    The DCOP is the same as the one built by `peav_model`, the costs tables are
+    computed with numpy.
+
+    Parameters
+    ----------
+    stream: TextIO
+        the stream the dcop is written to.
+    slots: list of slots
+    events: dict of events
+    resources: dict of resources
+    penalty:
+        penalty for conflicting schedules.
+    agents_kw: dict
+        when not None, one agent is written for each resource, the dict can
+        contain ``capacity``, ``default_hosting_cost`` and ``default_route``.
+    tables_prefix: str
+        when given, the tables of the constraints are written in ``.npy`` files
+        starting with this prefix.
+    yaml_dir: str
+        directory of the yaml dcop file.
+    """
+    slots_count = len(slots)
+    resource_events = _events_by_resource(events, resources)
+
+    def var_name(resource_id, event_id):
+        return f"v_{resource_id:02d}_{event_id:02d}"
+
+    def domain_values(event_id):
+        return range(0, slots_count - events[event_id].length + 2)
+
+    with DcopYamlWriter(
+        stream,
+        "MeetingSceduling",
+        objective="max",
+        tables_prefix=tables_prefix,
+        yaml_dir=yaml_dir,
+    ) as writer:
+        for resource_id, event_ids in resource_events.items():
+            for event_id in event_ids:
+                name = var_name(resource_id, event_id)
+                writer.domain(f"d_{name}", domain_values(event_id), "time_slot")
+        for resource_id, event_ids in resource_events.items():
+            for event_id in event_ids:
+                name = var_name(resource_id, event_id)
+                writer.variable(name, f"d_{name}")
+
+        for resource_id, event_ids in resource_events.items():
+            resource = resources[resource_id]
+            values = {
+                event_id: resource_values_for_event(
+                    resource, events[event_id], slots_count
+                )
+                for event_id in event_ids
+            }
+            for event_id1, event_id2 in itertools.combinations(event_ids, 2):
+                var1 = var_name(resource_id, event_id1)
+                var2 = var_name(resource_id, event_id2)
+                table = peav_intra_table(
+                    values[event_id1],
+                    events[event_id1].length,
+                    values[event_id2],
+                    events[event_id2].length,
+                    penalty,
+                    len(event_ids),
+                )
+                writer.extensional_constraint(
+                    f"ci_{var1}_{var2}",
+                    [var1, var2],
+                    [domain_values(event_id1), domain_values(event_id2)],
+                    table,
+                )
+            if len(event_ids) == 1:
+                # Unary constraint for the utility of the single event of this
+                # resource, see peav_intra_extensive_constraints
+                event_id = event_ids[0]
+                var = var_name(resource_id, event_id)
+                writer.extensional_constraint(
+                    f"cu_{var}", [var], [domain_values(event_id)], values[event_id]
+                )
+
+        for event in events.values():
+            domain = domain_values(event.id)
+            table = peav_inter_table(len(domain), penalty)
+            for resource_id1, resource_id2 in itertools.combinations(
+                event.resources, 2
+            ):
+                var1 = var_name(resource_id1, event.id)
+                var2 = var_name(resource_id2, event.id)
+                writer.extensional_constraint(
+                    f"ce_{var1}_{var2}", [var1, var2], [domain, domain], table, default=0
+                )
+
+        if agents_kw is None:
+            return
+        capacity = agents_kw.get("capacity")
+        for resource_id in resource_events:
+            if capacity:
+                writer.agent(f"a_{resource_id}", capacity=capacity)
+            else:
+                writer.agent(f"a_{resource_id}")
+        writer.default_route(agents_kw.get("default_route", 1))
+        for resource_id, event_ids in resource_events.items():
+            writer.hosting_costs(
+                f"a_{resource_id}",
+                agents_kw.get("default_hosting_cost", 0),
+                {var_name(resource_id, event_id): 0 for event_id in event_ids},
+            )
+
+
+def peav_distribution(events: Dict[EVT, Event], resources: Dict[RESOURCE, Resource]):
+    """
+    Distribution for the PEAV model: each resource's agent hosts the variables
+    for the events of this resource.
+
+    Returns
+    -------
+    iterator:
+        (agent, variables) pairs
+    """
+    for resource_id, event_ids in _events_by_resource(events, resources).items():
+        yield f"a_{resource_id}", [
+            f"v_{resource_id:02d}_{event_id:02d}" for event_id in event_ids
+        ]
+
+
+def _events_by_resource(
+    events: Dict[EVT, Event], resources: Dict[RESOURCE, Resource]
+) -> Dict[RESOURCE, List[EVT]]:
+    resource_events = {resource_id: [] for resource_id in resources}
+    for event in events.values():
+        for resource_id in event.resources:
+            resource_events[resource_id].append(event.id)
+    return resource_events
+
+
 def generate_problem_definition(
     slots_count: int,
     resources_count: int,
@@ -491,11 +629,9 @@ def peav_intra_extensive_constraints(
         #  unary-constraint approach makes more sense to me and fits pydcop better.
         (_, event_id), variable = variables.popitem()
         event = events[event_id]
-        constraint = NAryMatrixRelation([variable], name=f"cu_{variable.name}")
-        for t in variable.domain:
-            value = resource_value_for_event(resource, event, t)
-            constraint = constraint.set_value_for_assignment({variable.name: t}, value)
-            constraints[constraint.name] = constraint
+        values = resource_values_for_event(resource, event, len(resource.value_free))
+        constraint = NAryMatrixRelation([variable], values, name=f"cu_{variable.name}")
+        constraints[constraint.name] = constraint
 
     return constraints
 
@@ -510,19 +646,65 @@ def peav_intra_extensive_constraint(
     resource_events_count: int,
 ) -> Constraint:
 
-    constraint = NAryMatrixRelation([var1, var2], name=f"ci_{var1.name}_{var2.name}")
+    slots_count = len(resource.value_free)
+    table = peav_intra_table(
+        resource_values_for_event(resource, event1, slots_count),
+        event1.length,
+        resource_values_for_event(resource, event2, slots_count),
+        event2.length,
+        penalty,
+        resource_events_count,
+    )
+    return NAryMatrixRelation(
+        [var1, var2], table, name=f"ci_{var1.name}_{var2.name}"
+    )
 
-    # For each possible partial assignment (t1, t2) to (var1, var2)
-    # we compute the utility (or penalty)
-    for t1 in var1.domain:
-        for t2 in var2.domain:
-            value = peav_intra_extensive_constraint_value(
-                resource, event1, event2, penalty, resource_events_count, t1, t2
-            )
-            constraint = constraint.set_value_for_assignment(
-                {var1.name: t1, var2.name: t2}, value
-            )
-    return constraint
+
+def peav_intra_table(
+    values1: np.ndarray,
+    length1: LENGTH,
+    values2: np.ndarray,
+    length2: LENGTH,
+    penalty: int,
+    resource_events_count: int,
+) -> np.ndarray:
+    """
+    Table of an intra-agent constraint, between the variables of a resource
+    for two different events.
+
+    This is the vectorized version of `peav_intra_extensive_constraint_value`.
+
+    Parameters
+    ----------
+    values1: np.ndarray
+        utility of the resource for the first event, for each start time slot,
+        see `resource_values_for_event`.
+    length1: int
+        length of the first event
+    values2: np.ndarray
+        utility of the resource for the second event.
+    length2: int
+        length of the second event
+    penalty: int
+        Penalty in case of conflict
+    resource_events_count
+        The number of events this resources is participating to.
+
+    Returns
+    -------
+    np.ndarray:
+        the table, indexed by the start time slots of the two events.
+    """
+    t1 = np.arange(len(values1))[:, np.newaxis]
+    t2 = np.arange(len(values2))[np.newaxis, :]
+    conflict = (t1 != 0) & (t2 != 0)
+    conflict &= ((t1 <= t2) & (t2 <= t1 + length1 - 1)) | (
+        (t2 <= t1) & (t1 <= t2 + length2 - 1)
+    )
+    utility = (
+        1 / (resource_events_count - 1) * (values1[:, np.newaxis] + values2[np.newaxis, :])
+    )
+    return np.where(conflict, -penalty, utility)
 
 
 def peav_intra_extensive_constraint_value(
@@ -586,18 +768,53 @@ def peav_intra_extensive_constraint_value(
 
 
 def peav_inter_extensive_constraint(var1, var2, penalty):
+    return NAryMatrixRelation(
+        [var1, var2],
+        peav_inter_table(len(var1.domain), penalty),
+        name=f"ce_{var1.name}_{var2.name}",
+    )
 
-    constraint = NAryMatrixRelation([var1, var2], name=f"ce_{var1.name}_{var2.name}")
 
-    # For each possible partial assignment (t1, t2) to (var1, var2)
-    # we compute the utility (or penalty)
-    for t1 in var1.domain:
-        for t2 in var2.domain:
-            if t1 != t2:
-                constraint = constraint.set_value_for_assignment(
-                    {var1.name: t1, var2.name: t2}, -penalty
-                )
-    return constraint
+def peav_inter_table(domain_size: int, penalty: int) -> np.ndarray:
+    """
+    Table of an inter-agent constraint, between the variables of two resources
+    for the same event: penalty if the event is scheduled at different times.
+    """
+    return np.where(np.eye(domain_size, dtype=bool), 0, -penalty)
+
+
+def resource_values_for_event(
+    resource: Resource, event: Event, slots_count: int
+) -> np.ndarray:
+    """
+    The utility of affecting a resource to a given event, for all time slots.
+
+    This is the vectorized version of `resource_value_for_event`.
+
+    Parameters
+    ----------
+    resource: Resource
+        the resource
+    event: Event
+        the event
+    slots_count: int
+        the number of time slots
+
+    Returns
+    -------
+    np.ndarray:
+        the utility of affecting the resource to this event, for each value in
+        the domain of the event's variables, 0 meaning the event is not
+        scheduled.
+    """
+    free = np.array([resource.value_free[t] for t in range(1, slots_count + 1)])
+    free = np.concatenate([[0], np.cumsum(free)])
+    starts = np.arange(1, slots_count - event.length + 2)
+    values = np.zeros(slots_count - event.length + 2, dtype=free.dtype)
+    values[1:] = event.resources[resource.id] * event.length - (
+        free[starts + event.length - 1] - free[starts - 1]
+    )
+    return values
 
 
 def resource_value_for_event(resource: Resource, event: Event, t: SLOT) -> float:
@@ -146,7 +146,7 @@ def run_cmd(args):
 
     dcop_yaml_file = args.dcop_file
     logger.info("loading dcop from {}".format(dcop_yaml_file))
-    dcop = load_dcop_from_file(dcop_yaml_file)
+    dcop = load_dcop_from_file(dcop_yaml_file, cache_dir=args.dcop_cache)
 
     if args.display:
         if args.graph == "factor_graph":
@@ -290,7 +290,7 @@ def set_parser(subparsers):
     )
 
 
-DISTRIBUTION_METHODS = ["oneagent", "adhoc", "ilp_fgdp", "heur_comhost", "oilp_secp_fgdp", "gh_secp_fgdp", "gh_secp_cgdp", "oilp_cgdp", "gh_cgdp"]
+DISTRIBUTION_METHODS = ["oneagent", "adhoc", "ilp_fgdp", "heur_comhost", "oilp_secp_fgdp", "gh_secp_fgdp", "gh_secp_cgdp", "oilp_cgdp", "gh_cgdp", "mlgp"]
 
 orchestrator = None
 start_time = 0
@@ -417,7 +417,7 @@ def run_cmd(args, timer=None, timeout=None):
         dist_module, algo_module, graph_module = _load_modules(None, args.algo)
 
     logger.info("loading dcop from {}".format(dcop_yaml_files))
-    dcop = load_dcop_from_file(dcop_yaml_files)
+    dcop = load_dcop_from_file(dcop_yaml_files, cache_dir=args.dcop_cache)
 
     if args.scenario:
         logger.info("loading scenario from {}".format(args.scenario))
@@ -163,7 +163,7 @@ def run_cmd(args, timer: Timer = None, timeout= None):
 
     # global dcop
     logger.info("loading dcop from {}".format(args.dcop_files))
-    dcop = load_dcop_from_file(args.dcop_files)
+    dcop = load_dcop_from_file(args.dcop_files, cache_dir=args.dcop_cache)
 
     try:
         algo_module = load_algorithm_module(args.algo)
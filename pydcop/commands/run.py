@@ -48,10 +48,15 @@ Synopsis
                [--replication_method <replication method>]
                [--ktarget <resiliency_level>]
                [--mode <mode>]
+               [--nb_process <n>]
+               [--nb_workers <n>]
+               [--rebalance_period <p>]
                [--collect_on <collect_mode>]
                [--period <p>]
+               [--digest_period <p>]
                [--run_metrics <file>]
                [--end_metrics <file>]
+               [--dump_traffic <file>]
                --scenario <scenario_file>
                <dcop_files>
 
@@ -114,6 +119,21 @@ Options
     Indicated if agents must be run as threads (default) or processes.
     either ``thread`` or ``process``
 
+``--nb_process <n>``
+    When using ``--mode process``, the number of worker processes agents
+    are sharded on. Defaults to the number of cpu cores.
+
+``--nb_workers <n>``
+    If given, agents are run on a cooperative runtime where they share a pool
+    of ``<n>`` worker threads (in each process, with ``--mode process``)
+    and are only scheduled when they have messages to handle. Otherwise each
+    agent runs on its own thread. Useful when running thousands of agents.
+
+``--rebalance_period <p>``
+    If given, computations are migrated from overloaded agents to
+    underloaded agents every ``<p>`` seconds,
+    see :ref:`pydcop_commands_solve`.
+
 ``--collect_on <collect_mode>`` / ``-c``
     Metric collection mode, one of ``value_change``, ``cycle_change``,
     ``period``.
@@ -124,10 +144,23 @@ Options
     collection.
     See :ref:`tutorials_analysing_results` for details.
 
+``--digest_period <p>``
+    If given, agents do not report each value change and metrics update
+    to the orchestrator but buffer them and send a single digest every
+    ``<p>`` seconds (and at the end of each cycle with
+    ``--collect_on cycle_change``). This greatly reduces the number of
+    management messages when running many agents.
+
 ``--run_metrics <file>``
-    File to store store metrics.
+    File to store store metrics. Metrics are written in csv format or, if the
+    file has the ``.npz`` extension, as numpy ``.npz`` chunks.
     See :ref:`tutorials_analysing_results` for details.
 
+``--dump_traffic <file>``
+    If given, the number and size of the messages sent on each link between
+    computations are counted during the run and written, in yaml, to that
+    file at the end of the run, see :ref:`pydcop_commands_solve`.
+
 ``--replication_method <replication method>``
     Optional replication method. Defaults to ``replication method``, which is
     the only replication method currently implemented in pyDCOP.
@@ -168,9 +201,7 @@ import logging
 import multiprocessing
 import threading
 import traceback
-from functools import partial
-from queue import Queue, Empty
-from threading import Thread
+from queue import Queue
 import numpy as np
 
 import sys
@@ -181,12 +212,13 @@ from pydcop.commands._utils import (
     prepare_metrics_files,
     _load_modules,
     build_algo_def,
-    collect_tread,
     add_csvline,
+    write_traffic_profile,
 )
 from pydcop.dcop.dcop import filter_dcop
 from pydcop.dcop.yamldcop import load_dcop_from_file, load_scenario_from_file
 from pydcop.distribution.yamlformat import load_dist_from_file
+from pydcop.infrastructure.metricssinks import MetricsCollector
 from pydcop.infrastructure.run import run_local_thread_dcop, run_local_process_dcop
 from pydcop.replication.yamlformat import load_replica_dist, load_replica_dist_from_file
 
@@ -254,6 +286,28 @@ def set_parser(subparsers):
         choices=["thread", "process"],
         help="run agents as threads or processes",
     )
+    parser.add_argument(
+        "--nb_process",
+        type=int,
+        default=None,
+        help="number of worker processes used with '--mode process', "
+        "defaults to the number of cpu cores",
+    )
+    parser.add_argument(
+        "--nb_workers",
+        type=int,
+        default=None,
+        help="if given, agents share a pool of this number of worker "
+        "threads (in each process), instead of using one thread for each "
+        "agent",
+    )
+    parser.add_argument(
+        "--rebalance_period",
+        type=float,
+        default=None,
+        help="if given, computations are migrated from overloaded agents "
+        "to underloaded agents every rebalance_period seconds",
+    )
 
     # Statistics collection arguments:
     parser.add_argument(
@@ -271,6 +325,13 @@ def set_parser(subparsers):
         "when using --collect_on period. Defaults to 1 "
         "second if not specified",
     )
+    parser.add_argument(
+        "--digest_period",
+        type=float,
+        default=None,
+        help="if given, agents send value changes and metrics to the "
+        "orchestrator as digests, at most every digest_period seconds",
+    )
     parser.add_argument(
         "--run_metrics",
         type=str,
@@ -284,6 +345,14 @@ def set_parser(subparsers):
         help="Use this option to append the metrics of the "
         "end of the run to a csv file.",
     )
+    parser.add_argument(
+        "--dump_traffic",
+        type=str,
+        default=None,
+        help="Path to a file where the number and size of the messages "
+        "sent on each link between computations will be written (yaml), "
+        "to be used as a traffic profile by the distribute command.",
+    )
 
     # TODO : remove, this should no be at this level
     parser.add_argument(
@@ -305,19 +374,26 @@ INFINITY = None
 collect_on = None
 run_metrics = None
 end_metrics = None
+dump_traffic = None
+traffic_inputs = None
+metrics_collector = None
 
 timeout_stopped = False
 output_file = None
 
-DISTRIBUTION_METHODS = ["oneagent", "adhoc", "ilp_fgdp", "heur_comhost", "oilp_secp_fgdp", "gh_secp_fgdp", "gh_secp_cgdp", "oilp_cgdp", "gh_cgdp"]
+DISTRIBUTION_METHODS = ["oneagent", "adhoc", "ilp_fgdp", "heur_comhost", "oilp_secp_fgdp", "gh_secp_fgdp", "gh_secp_cgdp", "oilp_cgdp", "gh_cgdp", "mlgp"]
 
 def run_cmd(args, timer=None, timeout=None):
     logger.debug('dcop command "run" with arguments {}'.format(args))
 
-    global INFINITY, collect_on, output_file
+    global INFINITY, collect_on, output_file, run_metrics, end_metrics
+    global dump_traffic, traffic_inputs
     INFINITY = args.infinity
     collect_on = args.collect_on
     output_file = args.output
+    run_metrics, end_metrics = args.run_metrics, args.end_metrics
+    dump_traffic = args.dump_traffic
+    traffic_inputs = {"algo": args.algo, "dcop": args.dcop_files}
 
     period = None
     if args.collect_on == "period":
@@ -326,13 +402,13 @@ def run_cmd(args, timer=None, timeout=None):
         if args.period is not None:
             _error('Cannot use "period" argument when collect_on is not ' '"period"')
 
-    csv_cb = prepare_metrics_files(args.run_metrics, args.end_metrics, collect_on)
+    run_sink = prepare_metrics_files(args.run_metrics, args.end_metrics, collect_on)
 
     _, algo_module, graph_module = _load_modules(None, args.algo)
 
     global dcop
     logger.info("loading dcop from {}".format(args.dcop_files))
-    dcop = load_dcop_from_file(args.dcop_files)
+    dcop = load_dcop_from_file(args.dcop_files, cache_dir=args.dcop_cache)
 
     dcop = filter_dcop(dcop)
 
@@ -365,11 +441,12 @@ def run_cmd(args, timer=None, timeout=None):
     algo = build_algo_def(algo_module, args.algo, dcop.objective, args.algo_params)
 
     # Setup metrics collection
+    global metrics_collector
     collector_queue = Queue()
-    collect_t = Thread(
-        target=collect_tread, args=[collector_queue, csv_cb], daemon=True
+    metrics_collector = MetricsCollector(
+        collector_queue, [run_sink] if run_sink is not None else []
     )
-    collect_t.start()
+    metrics_collector.start()
 
     global orchestrator
     if args.mode == "thread":
@@ -383,6 +460,10 @@ def run_cmd(args, timer=None, timeout=None):
             collect_moment=args.collect_on,
             period=period,
             replication=args.replication_method,
+            nb_workers=args.nb_workers,
+            digest_period=args.digest_period,
+            link_metrics=dump_traffic is not None,
+            rebalance_period=args.rebalance_period,
         )
     elif args.mode == "process":
 
@@ -390,8 +471,8 @@ def run_cmd(args, timer=None, timeout=None):
         agt_logs = logging.getLogger("pydcop.agent")
         agt_logs.disabled = True
 
-        # When using the (default) 'fork' start method, http servers on agent's
-        # processes do not work (why ?)
+        # When using the (default) 'fork' start method, the communication
+        # servers on agent's processes do not work (why ?)
         multiprocessing.set_start_method("spawn")
         orchestrator = run_local_process_dcop(
             algo,
@@ -402,6 +483,11 @@ def run_cmd(args, timer=None, timeout=None):
             collector=collector_queue,
             collect_moment=args.collect_on,
             period=period,
+            nb_process=args.nb_process,
+            nb_workers=args.nb_workers,
+            digest_period=args.digest_period,
+            link_metrics=dump_traffic is not None,
+            rebalance_period=args.rebalance_period,
         )
 
     orchestrator.set_error_handler(_orchestrator_error)
@@ -460,10 +546,13 @@ def _results(status):
     metrics = orchestrator.end_metrics()
     metrics["status"] = status
     global end_metrics, run_metrics
+    if dump_traffic is not None:
+        write_traffic_profile(dump_traffic, metrics, traffic_inputs)
     if end_metrics is not None:
         add_csvline(end_metrics, collect_on, metrics)
-    if run_metrics is not None:
-        add_csvline(run_metrics, collect_on, metrics)
+    if metrics_collector is not None:
+        # Write pending metrics, and the last ones, in the run_metrics file
+        metrics_collector.stop(metrics if run_metrics is not None else None)
 
     if output_file:
         with open(output_file, encoding="utf-8", mode="w") as fo:
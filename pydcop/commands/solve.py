@@ -45,10 +45,17 @@ Synopsis
   pydcop solve --algo <algo> [--algo_params <params>]
                [--distribution <distribution>]
                [--mode <mode>]
+               [--nb_process <n>]
+               [--nb_workers <n>]
+               [--rebalance_period <p>]
+               [--seed <seed>]
+               [--sim_timeout <time>]
                [--collect_on <collect_mode>]
                [--period <p>]
+               [--digest_period <p>]
                [--run_metrics <file>]
                [--end_metrics <file>]
+               [--dump_traffic <file>]
                [--delay <delay>]
                [--uiport <port>]
                <dcop_files>
@@ -70,6 +77,22 @@ When using ``solve`` all agents run on the same machine.  Depending on the
 or as process (heavier, but better parallelism on a multi-core cpu).
 Using ``--mode thread`` (the default) agents communicate in memory (without
 network), which scales easily to more than 100 agents.
+Using ``--mode process``, agents are sharded over a fixed pool of worker
+processes (one for each cpu core, by default) and communicate through local
+pipes (unix domain sockets or named pipes), which is much cheaper than the
+http communication used when running agents on several machines.
+Agents hosted in the same worker process exchange their messages in memory.
+Using ``--mode simulation``, no agent is created at all: the computations are
+run in a single thread and exchange their messages through an in-memory event
+queue, in logical time. This is much faster than the other modes and, with
+``--seed``, gives exactly reproducible runs ; the ``time`` metric is then the
+simulated time, where each message takes 1ms to be delivered.
+As the global ``--timeout`` is measured in wall-clock time, use
+``--sim_timeout`` to stop the simulation after a given simulated time.
+Synchronous algorithms (e.g. maxsum) are run in lock-step, without any
+synchronization message, in this mode and in thread mode. In process mode, each
+worker process runs the computations it hosts in lock-step and rounds are only
+synchronized with messages between computations hosted in different processes.
 
 
 Notes
@@ -141,8 +164,41 @@ Options
   If not given, ``oneagent`` is used.
 
 ``--mode <mode>`` / ``-m``
-    Indicated if agents must be run as threads (default) or processes.
-    either ``thread`` or ``process``
+    Indicated if agents must be run as threads (default) or processes,
+    or if the DCOP algorithm must only be simulated.
+    either ``thread``, ``process`` or ``simulation``
+
+``--nb_process <n>``
+    When using ``--mode process``, the number of worker processes agents
+    are sharded on. Defaults to the number of cpu cores. Use a number greater
+    or equal to the number of agents to run each agent in its own process.
+
+``--nb_workers <n>``
+    If given, agents are run on a cooperative runtime where they share a pool
+    of ``<n>`` worker threads (in each process, with ``--mode process``)
+    and are only scheduled when they have messages to handle. Otherwise each
+    agent runs on its own thread. Useful when running thousands of agents.
+
+``--rebalance_period <p>``
+    If given, every ``<p>`` seconds, the orchestrator looks at the time
+    agents spent handling messages and at the size of their message queue,
+    and migrates computations from overloaded agents to underloaded agents.
+    All computations are paused during a migration, and migrated
+    computations are re-created on their new agent, like when repairing
+    the system. Only used with algorithms that support it (e.g. ``dsa``),
+    not supported with ``--mode simulation``.
+
+``--seed <seed>``
+    Seed for the random number generators. Only supported with
+    ``--mode simulation``, where runs with the same seed give exactly the
+    same results (when the run is stopped by the algorithm, e.g. with
+    ``stop_cycle``, or by ``--sim_timeout``, and not by the global timeout).
+
+``--sim_timeout <time>``
+    Simulated time, in seconds, after which the simulation is stopped, with
+    the ``TIMEOUT`` status. Only supported with ``--mode simulation``.
+    Unlike the global ``--timeout``, which is still honored, it does not
+    depend on the speed of the machine.
 
 ``--collect_on <collect_mode>`` / ``-c``
     Metric collection mode, one of ``value_change``, ``cycle_change``,
@@ -154,16 +210,37 @@ Options
     collection.
     See :ref:`tutorials_analysing_results` for details.
 
+``--digest_period <p>``
+    If given, agents do not report each value change and metrics update
+    to the orchestrator but buffer them and send a single digest every
+    ``<p>`` seconds (and at the end of each cycle with
+    ``--collect_on cycle_change``). This greatly reduces the number of
+    management messages when running many agents.
+
 ``--run_metrics <file>``
     Path to a file or file name. Run-time metrics will be written to that file
     (csv format). If the value is a path, the directory will be created if it does
     not exist. Otherwise the file will be created in the current directory.
+    Metrics are buffered and written by batches. If the file has the ``.npz``
+    extension, metrics are written in a compact binary format instead, as
+    numpy ``.npz`` chunks (``run.0.npz``, ``run.1.npz``, etc. for
+    ``run.npz``), which can be loaded with
+    :func:`pydcop.infrastructure.metricssinks.load_npz_metrics`.
 
 ``--end_metrics <file>``
     Path to a file or file name. Result's metrics will be appended to that file
     (csv format). If the value is a path, the directory will be created if it does not
     exist. Otherwise the file will be created in the current directory.
 
+``--dump_traffic <file>``
+    If given, the number and size of the messages sent on each link between
+    computations (including links between computations hosted on the same
+    agent) are counted during the run and written, in yaml, to that file at
+    the end of the run. This traffic profile can be given to the
+    :ref:`distribute<pydcop_commands_distribute>` command, with its
+    ``--traffic_profile`` option, to distribute the computations using the
+    measured traffic instead of the algorithm's estimates.
+
 ``--delay <delay>``
   An optional delay between message delivery, in second. This delay
   only applies to algorithm's messages and is useful when you want to
@@ -209,15 +286,16 @@ import multiprocessing
 import sys
 import threading
 import traceback
-from functools import partial
-from queue import Queue, Empty
-from threading import Thread
+from queue import Queue
 
 from pydcop.algorithms import list_available_algorithms
-from pydcop.commands._utils import build_algo_def, _error, _load_modules
+from pydcop.commands._utils import build_algo_def, _error, _load_modules, \
+    write_traffic_profile
 from pydcop.dcop.yamldcop import load_dcop_from_file
 from pydcop.distribution.yamlformat import load_dist_from_file
-from pydcop.infrastructure.run import run_local_thread_dcop, run_local_process_dcop
+from pydcop.infrastructure.metricssinks import MetricsCollector, metrics_sink
+from pydcop.infrastructure.run import run_local_thread_dcop, \
+    run_local_process_dcop, run_simulated_dcop
 
 
 logger = logging.getLogger("pydcop.cli.solve")
@@ -271,8 +349,45 @@ def set_parser(subparsers):
         "-m",
         "--mode",
         default="thread",
-        choices=["thread", "process"],
-        help="run agents as threads or processes",
+        choices=["thread", "process", "simulation"],
+        help="run agents as threads or processes, or simulate the algorithm "
+        "in a single thread",
+    )
+    parser.add_argument(
+        "--nb_process",
+        type=int,
+        default=None,
+        help="number of worker processes used with '--mode process', "
+        "defaults to the number of cpu cores",
+    )
+    parser.add_argument(
+        "--nb_workers",
+        type=int,
+        default=None,
+        help="if given, agents share a pool of this number of worker "
+        "threads (in each process), instead of using one thread for each "
+        "agent",
+    )
+    parser.add_argument(
+        "--rebalance_period",
+        type=float,
+        default=None,
+        help="if given, computations are migrated from overloaded agents "
+        "to underloaded agents every rebalance_period seconds",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="seed for random number generators, only used with "
+        "'--mode simulation'",
+    )
+    parser.add_argument(
+        "--sim_timeout",
+        type=float,
+        default=None,
+        help="simulated time, in seconds, after which the simulation is "
+        "stopped, only used with '--mode simulation'",
     )
 
     parser.add_argument(
@@ -291,6 +406,13 @@ def set_parser(subparsers):
         "when using --collect_on period. Defaults to 1 "
         "second if not specified",
     )
+    parser.add_argument(
+        "--digest_period",
+        type=float,
+        default=None,
+        help="if given, agents send value changes and metrics to the "
+        "orchestrator as digests, at most every digest_period seconds",
+    )
 
     parser.add_argument(
         "--run_metrics",
@@ -312,6 +434,15 @@ def set_parser(subparsers):
         "Otherwise the file will be created in the current directory.",
     )
 
+    parser.add_argument(
+        "--dump_traffic",
+        type=str,
+        default=None,
+        help="Path to a file where the number and size of the messages "
+        "sent on each link between computations will be written (yaml), "
+        "to be used as a traffic profile by the distribute command.",
+    )
+
     parser.add_argument(
         "--infinity",
         "-i",
@@ -345,7 +476,7 @@ def set_parser(subparsers):
         "agent.",
     )
 
-DISTRIBUTION_METHODS = ["oneagent", "adhoc", "ilp_fgdp", "heur_comhost", "oilp_secp_fgdp", "gh_secp_fgdp", "gh_secp_cgdp", "oilp_cgdp", "gh_cgdp"]
+DISTRIBUTION_METHODS = ["oneagent", "adhoc", "ilp_fgdp", "heur_comhost", "oilp_secp_fgdp", "gh_secp_fgdp", "gh_secp_cgdp", "oilp_cgdp", "gh_cgdp", "mlgp"]
 
 
 dcop = None
@@ -378,6 +509,9 @@ columns = {
 collect_on = None
 run_metrics = None
 end_metrics = None
+dump_traffic = None
+traffic_inputs = None
+metrics_collector = None
 
 timeout_stopped = False
 output_file = None
@@ -390,42 +524,22 @@ def add_csvline(file, mode, metrics):
         csvwriter.writerow(data)
 
 
-def collect_tread(collect_queue: Queue, csv_cb):
-    while True:
-        try:
-            t, metrics = collect_queue.get()
-
-            if csv_cb is not None:
-                csv_cb(metrics)
-
-        except Empty:
-            pass
-        # FIXME : end of run ?
-
-
 def prepare_metrics_files(run, end, mode):
     """
     Prepare files for storing metrics, if requested.
-    Returns a cb that can be used to log metrics in the run_metrics file.
+    Returns a sink that can be used to log metrics in the run_metrics file.
     """
     global run_metrics, end_metrics
     if run is not None:
         run_metrics = run
-        # delete run_metrics file if it exists, create intermediate
-        # directory if needed
-        if os.path.exists(run_metrics):
-            os.remove(run_metrics)
-        else:
-            f_dir = os.path.dirname(run_metrics)
-            if f_dir and not os.path.exists(f_dir):
-                os.makedirs(f_dir)
-        # Add column labels in file:
-        with open(run_metrics, "w", encoding="utf-8", newline="") as f:
-            csvwriter = csv.writer(f)
-            csvwriter.writerow(columns[mode])
-        csv_cb = partial(add_csvline, run_metrics, mode)
+        # create intermediate directory if needed, the file itself is
+        # truncated by the sink.
+        f_dir = os.path.dirname(run_metrics)
+        if f_dir and not os.path.exists(f_dir):
+            os.makedirs(f_dir)
+        run_sink = metrics_sink(run_metrics, columns[mode])
     else:
-        csv_cb = None
+        run_sink = None
 
     if end is not None:
         end_metrics = end
@@ -438,16 +552,18 @@ def prepare_metrics_files(run, end, mode):
                 csvwriter = csv.writer(f)
                 csvwriter.writerow(columns[mode])
 
-    return csv_cb
+    return run_sink
 
 
 def run_cmd(args, timer=None, timeout=None):
     logger.debug('dcop command "solve" with arguments {}'.format(args))
 
-    global INFINITY, collect_on, output_file
+    global INFINITY, collect_on, output_file, dump_traffic, traffic_inputs
     INFINITY = args.infinity
     output_file = args.output
     collect_on = args.collect_on
+    dump_traffic = args.dump_traffic
+    traffic_inputs = {"algo": args.algo, "dcop": args.dcop_files}
 
     period = None
     if args.collect_on == "period":
@@ -456,7 +572,20 @@ def run_cmd(args, timer=None, timeout=None):
         if args.period is not None:
             _error('Cannot use "period" argument when collect_on is not ' '"period"')
 
-    csv_cb = prepare_metrics_files(args.run_metrics, args.end_metrics, collect_on)
+    if args.nb_process is not None:
+        if args.mode != "process":
+            _error('Cannot use "nb_process" argument when mode is not "process"')
+        if args.nb_process < 1:
+            _error('"nb_process" must be at least 1')
+    if args.seed is not None and args.mode != "simulation":
+        _error('Cannot use "seed" argument when mode is not "simulation"')
+    if args.sim_timeout is not None and args.mode != "simulation":
+        _error('Cannot use "sim_timeout" argument when mode is not '
+               '"simulation"')
+    if args.rebalance_period is not None and args.mode == "simulation":
+        _error('Cannot use "rebalance_period" argument with mode "simulation"')
+
+    run_sink = prepare_metrics_files(args.run_metrics, args.end_metrics, collect_on)
 
     if args.distribution in DISTRIBUTION_METHODS:
         dist_module, algo_module, graph_module = _load_modules(
@@ -467,7 +596,7 @@ def run_cmd(args, timer=None, timeout=None):
 
     global dcop
     logger.info("loading dcop from {}".format(args.dcop_files))
-    dcop = load_dcop_from_file(args.dcop_files)
+    dcop = load_dcop_from_file(args.dcop_files, cache_dir=args.dcop_cache)
 
     # Build factor-graph computation graph
     logger.info("Building computation graph ")
@@ -498,11 +627,12 @@ def run_cmd(args, timer=None, timeout=None):
     algo = build_algo_def(algo_module, args.algo, dcop.objective, args.algo_params)
 
     # Setup metrics collection
+    global metrics_collector
     collector_queue = Queue()
-    collect_t = Thread(
-        target=collect_tread, args=[collector_queue, csv_cb], daemon=True
+    metrics_collector = MetricsCollector(
+        collector_queue, [run_sink] if run_sink is not None else []
     )
-    collect_t.start()
+    metrics_collector.start()
 
     global orchestrator
     if args.mode == "thread":
@@ -517,6 +647,10 @@ def run_cmd(args, timer=None, timeout=None):
             period=period,
             delay=args.delay,
             uiport=args.uiport,
+            nb_workers=args.nb_workers,
+            digest_period=args.digest_period,
+            link_metrics=dump_traffic is not None,
+            rebalance_period=args.rebalance_period,
         )
     elif args.mode == "process":
 
@@ -524,8 +658,8 @@ def run_cmd(args, timer=None, timeout=None):
         agt_logs = logging.getLogger("pydcop.agent")
         agt_logs.disabled = True
 
-        # When using the (default) 'fork' start method, http servers on agent's
-        # processes do not work (why ?)
+        # When using the (default) 'fork' start method, the communication
+        # servers on agent's processes do not work (why ?)
         multiprocessing.set_start_method("spawn")
         orchestrator = run_local_process_dcop(
             algo,
@@ -538,10 +672,33 @@ def run_cmd(args, timer=None, timeout=None):
             period=period,
             delay=args.delay,
             uiport=args.uiport,
+            nb_process=args.nb_process,
+            nb_workers=args.nb_workers,
+            digest_period=args.digest_period,
+            link_metrics=dump_traffic is not None,
+            rebalance_period=args.rebalance_period,
+        )
+    elif args.mode == "simulation":
+        # Only collect run-time metrics if they are actually written
+        # somewhere, computing them is costly compared to the simulation.
+        orchestrator = run_simulated_dcop(
+            algo,
+            cg,
+            distribution,
+            dcop,
+            INFINITY,
+            collector=collector_queue if run_sink is not None else None,
+            collect_moment=args.collect_on,
+            period=period,
+            seed=args.seed,
+            link_metrics=dump_traffic is not None,
         )
     try:
         orchestrator.deploy_computations()
-        orchestrator.run(timeout=timeout)
+        if args.mode == "simulation":
+            orchestrator.run(timeout=timeout, max_time=args.sim_timeout)
+        else:
+            orchestrator.run(timeout=timeout)
         if timer:
             timer.cancel()
         if not timeout_stopped:
@@ -619,10 +776,13 @@ def _results(status):
     metrics = orchestrator.end_metrics()
     metrics["status"] = status
     global end_metrics, run_metrics
+    if dump_traffic is not None:
+        write_traffic_profile(dump_traffic, metrics, traffic_inputs)
     if end_metrics is not None:
         add_csvline(end_metrics, collect_on, metrics)
-    if run_metrics is not None:
-        add_csvline(run_metrics, collect_on, metrics)
+    if metrics_collector is not None:
+        # Write pending metrics, and the last ones, in the run_metrics file
+        metrics_collector.stop(metrics if run_metrics is not None else None)
 
     if output_file:
         with open(output_file, encoding="utf-8", mode="w") as fo:
@@ -90,8 +90,10 @@ class ComputationNode(SimpleRepr):
             self._links = [Link([name, n]) for n in self.neighbors]
         elif links is not None:
             self._links = list(links)
-            self._neighbors = list(set(n for l in links for n in l.nodes
-                                       if n != self._name))
+            # Use a dict, not a set, to de-duplicate neighbors: the order
+            # must not depend on hash randomization, to get reproducible runs.
+            self._neighbors = list(dict.fromkeys(
+                n for l in links for n in l.nodes if n != self._name))
         else:
             self._links = []
             self._neighbors = []
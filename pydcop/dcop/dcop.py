@@ -367,6 +367,144 @@ def solution_cost(relations, variables, assignment, infinity):
     return cost_hard, cost_soft
 
 
+class IncrementalSolutionCost(object):
+    """
+    Running cost of an assignment, updated incrementally.
+
+    Maintains the same cost and violation count as `solution_cost`, but
+    changing the value of a variable only costs O(degree) instead of
+    re-evaluating all constraints: an index from each variable to the
+    constraints it is involved in is used to only re-evaluate these
+    constraints.
+
+    Notes
+    -----
+    Costs are updated by deltas: with float costs, the running cost may
+    differ from the one computed by `solution_cost` by a rounding error.
+
+    Parameters
+    ----------
+    dcop: DCOP
+        the dcop the assignment is for
+    infinity: float
+        value used to represent infinity for hard constraints
+
+    Examples
+    --------
+
+    >>> from pydcop.dcop.objects import create_variables
+    >>> dcop = DCOP()
+    >>> d = Domain('d', '', [0, 1])
+    >>> vs = create_variables('v', ['1', '2'], d)
+    >>> dcop += 'c1', '1 if v1 == v2 else 0', vs
+    >>> running = IncrementalSolutionCost(dcop, float('inf'))
+    >>> running.is_complete
+    False
+    >>> running.set_value('v1', 0)
+    >>> running.set_value('v2', 0)
+    >>> running.solution_cost()
+    (0, 1)
+    >>> running.set_value('v2', 1)
+    >>> running.solution_cost()
+    (0, 0)
+    """
+
+    def __init__(self, dcop: DCOP, infinity: float):
+        self.infinity = infinity
+        self._variables = dict(dcop.variables)
+        self._assignment = {v.name: v.value
+                            for v in dcop.external_variables.values()}
+        self._unassigned = set(dcop.variables)
+
+        self._scopes = {}  # type: Dict[str, List[str]]
+        self._constraints = {}  # type: Dict[str, Constraint]
+        self._index = collections.defaultdict(list)
+        for c in dcop.constraints.values():
+            self._constraints[c.name] = c
+            self._scopes[c.name] = [v.name for v in c.dimensions]
+            for v in c.dimensions:
+                self._index[v.name].append(c.name)
+
+        # cost (or None if not all its variables have a value) for each
+        # constraint and each variable
+        self._costs = {}  # type: Dict[str, float]
+        self._var_costs = {}  # type: Dict[str, float]
+        self._cost_soft = 0
+        self._cost_hard = 0
+
+    @property
+    def assignment(self) -> Dict[str, object]:
+        """The current assignment, including external variables."""
+        return self._assignment
+
+    @property
+    def is_complete(self) -> bool:
+        """True if all decision variables have a value."""
+        return not self._unassigned
+
+    def solution_cost(self) -> Tuple[int, float]:
+        """
+        Current (violation, cost) of the assignment.
+
+        Raises a ValueError if not all variables have a value yet, like
+        `solution_cost`.
+        """
+        if self._unassigned:
+            raise ValueError('Cannot compute solution cost : incomplete '
+                             'assignment, missing values for vars {}'
+                             .format(self._unassigned))
+        return self._cost_hard, self._cost_soft
+
+    def set_value(self, variable: str, value):
+        """
+        Set the value of a variable and update the cost of the assignment.
+
+        Values for unknown variables are ignored. Setting `None` as a value
+        makes the variable unassigned.
+        """
+        assignment = self._assignment
+        if variable not in self._variables and variable not in assignment:
+            return
+        if value is None:
+            if variable not in assignment:
+                return
+            del assignment[variable]
+            if variable in self._variables:
+                self._unassigned.add(variable)
+        else:
+            if variable in assignment and assignment[variable] == value:
+                return
+            assignment[variable] = value
+            self._unassigned.discard(variable)
+
+        if variable in self._variables:
+            self._update(self._var_costs, variable,
+                         None if value is None else
+                         self._variables[variable].cost_for_val(value))
+        for c_name in self._index.get(variable, ()):
+            try:
+                values = {v: assignment[v] for v in self._scopes[c_name]}
+            except KeyError:
+                cost = None
+            else:
+                cost = self._constraints[c_name](**values)
+            self._update(self._costs, c_name, cost)
+
+    def _update(self, costs: Dict, name: str, cost):
+        previous = costs.get(name)
+        if previous is not None:
+            if previous != self.infinity:
+                self._cost_soft -= previous
+            else:
+                self._cost_hard -= 1
+        if cost is not None:
+            if cost != self.infinity:
+                self._cost_soft += cost
+            else:
+                self._cost_hard += 1
+        costs[name] = cost
+
+
 def filter_dcop(dcop: DCOP, accept_unary=False):
     """
     Filters out variables that are not involved in any constraint.
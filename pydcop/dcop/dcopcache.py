@@ -0,0 +1,221 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""
+On-disk cache for DCOPs parsed from yaml files.
+
+Parsing a yaml DCOP file and building its variables and constraints can take
+much longer than solving a small DCOP, which matters when running many short
+commands (e.g. in a batch) on the same instance. The cache stores the built
+DCOP object in a binary form, in a directory named after a hash of the
+content and location of the yaml files, so that it is only parsed once:
+
+* the DCOP is pickled, with the compiled code of its expression functions,
+* other files used by the DCOP, like external tables, are checked for
+  modification when loading the DCOP from the cache,
+* large numpy tables (e.g. the matrices of extensional constraints) are saved
+  as ``.npy`` files and memory-mapped, in copy-on-write mode, when loading
+  the DCOP from the cache.
+
+The cache is opt-in: it is only used when a cache directory is given to
+:func:`pydcop.dcop.yamldcop.load_dcop_from_file`, with the ``--dcop_cache``
+cli option.
+
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from os import path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from pydcop.dcop.dcop import DCOP
+from pydcop.version import __version__
+
+logger = logging.getLogger("pydcop.dcop.cache")
+
+# Tables with fewer elements are stored in the pickle file, which is faster
+# than using one file for each small table.
+TABLE_MIN_SIZE = 4096
+
+DCOP_FILE = "dcop.pickle"
+DEPENDENCIES_FILE = "dependencies.json"
+
+
+def dcop_cache_key(content: str, base_dir: str = "") -> str:
+    """
+    Key for a DCOP in the cache.
+
+    Pickled objects and marshaled code depend on pydcop and python versions,
+    which are part of the key.
+
+    Parameters
+    ----------
+    content: str
+        the content of the files the DCOP is parsed from.
+    base_dir: str
+        the directory of these files, relative paths in the files (e.g. to
+        external tables) depend on it.
+
+    Returns
+    -------
+    str:
+        the hex digest of the key.
+    """
+    h = hashlib.sha256()
+    h.update(__version__.encode("utf-8"))
+    h.update(sys.version.encode("utf-8"))
+    h.update(base_dir.encode("utf-8"))
+    h.update(content.encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_cached_dcop(cache_dir: str, key: str) -> Optional[DCOP]:
+    """
+    Load a DCOP from the cache.
+
+    Parameters
+    ----------
+    cache_dir: str
+        the cache directory.
+    key: str
+        the key of the DCOP, see :func:`dcop_cache_key`.
+
+    Returns
+    -------
+    DCOP:
+        the cached DCOP, or None if it is not in the cache or if the cache
+        entry cannot be read.
+    """
+    entry_dir = path.join(cache_dir, key)
+    dcop_file = path.join(entry_dir, DCOP_FILE)
+    if not path.exists(dcop_file):
+        return None
+    try:
+        with open(path.join(entry_dir, DEPENDENCIES_FILE)) as f:
+            dependencies = json.load(f)
+        if any(_file_stat(file) != stat for file, stat in dependencies):
+            logger.info("Outdated entry %s in dcop cache", entry_dir)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        with open(dcop_file, mode="rb") as f:
+            dcop = _DcopUnpickler(f, entry_dir).load()
+    except Exception as e:
+        logger.warning("Invalid entry %s in dcop cache: %s", entry_dir, e)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+    logger.info("Loaded dcop from cache %s", entry_dir)
+    return dcop
+
+
+def store_cached_dcop(
+    cache_dir: str, key: str, dcop: DCOP, dependencies: Iterable[str] = ()
+) -> None:
+    """
+    Store a DCOP in the cache.
+
+    The entry is written in a temporary directory and then renamed, which
+    makes it safe to fill the cache from several processes at the same time.
+
+    Parameters
+    ----------
+    cache_dir: str
+        the cache directory, created if needed.
+    key: str
+        the key of the DCOP, see :func:`dcop_cache_key`.
+    dcop: DCOP
+        the DCOP to store.
+    dependencies: iterable of str
+        other files the DCOP was built from (e.g. external tables). The
+        entry is discarded if one of these files is modified.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = path.join(cache_dir, key)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp_")
+    try:
+        with open(path.join(tmp_dir, DEPENDENCIES_FILE), mode="w") as f:
+            json.dump([(d, _file_stat(d)) for d in dependencies], f)
+        with open(path.join(tmp_dir, DCOP_FILE), mode="wb") as f:
+            _DcopPickler(f, tmp_dir).dump(dcop)
+        os.rename(tmp_dir, entry_dir)
+        logger.info("Stored dcop in cache %s", entry_dir)
+    except OSError as e:
+        # Most likely stored at the same time by another process.
+        logger.debug("Could not store dcop in cache %s : %s", entry_dir, e)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _file_stat(file: str) -> List[int]:
+    try:
+        stat = os.stat(file)
+    except OSError:
+        return []
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class _DcopPickler(pickle.Pickler):
+    """
+    Pickler saving large numpy tables in separate ``.npy`` files.
+    """
+
+    def __init__(self, file, tables_dir: str):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._tables_dir = tables_dir
+        self._count = 0
+
+    def persistent_id(self, obj):
+        if (
+            isinstance(obj, np.ndarray)
+            and obj.size >= TABLE_MIN_SIZE
+            and not obj.dtype.hasobject
+        ):
+            table_file = "table_{}.npy".format(self._count)
+            self._count += 1
+            np.save(path.join(self._tables_dir, table_file), obj)
+            return table_file
+        return None
+
+
+class _DcopUnpickler(pickle.Unpickler):
+    """
+    Unpickler memory-mapping the tables saved by `_DcopPickler`.
+    """
+
+    def __init__(self, file, tables_dir: str):
+        super().__init__(file)
+        self._tables_dir = tables_dir
+
+    def persistent_load(self, pid):
+        return np.load(path.join(self._tables_dir, pid), mmap_mode="c")
@@ -847,13 +847,22 @@ class AgentDef(SimpleRepr):
     # for pickle support.
 
     def __getstate__(self):
-        return (self._name, self._hosting_costs, self.default_hosting_cost, self._attr)
+        return (
+            self._name,
+            self._hosting_costs,
+            self.default_hosting_cost,
+            self._routes,
+            self._default_route,
+            self._attr,
+        )
 
     def __setstate__(self, state):
         (
             self._name,
             self._hosting_costs,
             self._default_hosting_cost,
+            self._routes,
+            self._default_route,
             self._attr,
         ) = state
 
@@ -724,7 +724,7 @@ class NAryMatrixRelation(AbstractBaseRelation, SimpleRepr):
             self._m = np.zeros(shape=shape, dtype=np.float64)
 
         else:
-            if not isinstance(matrix, np.array.__class__):
+            if not isinstance(matrix, np.ndarray):
                 matrix = np.array(matrix)
             if shape != matrix.shape:
                 raise AttributeError(
@@ -29,10 +29,12 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
-from collections import defaultdict
-from collections import Iterable as CollectionIterable
-from typing import Dict, Iterable, Union, List
+import os
+from collections import defaultdict, OrderedDict
+from os import path
+from typing import Dict, Iterable, Union, List, Optional, Tuple
 
+import numpy as np
 import yaml
 
 from pydcop.dcop.objects import (
@@ -45,6 +47,7 @@ from pydcop.dcop.objects import (
 )
 from pydcop.dcop.scenario import EventAction, DcopEvent, Scenario
 from pydcop.dcop.dcop import DCOP
+from pydcop.dcop.dcopcache import dcop_cache_key, load_cached_dcop, store_cached_dcop
 from pydcop.dcop.relations import (
     relation_from_str,
     RelationProtocol,
@@ -55,12 +58,21 @@ from pydcop.dcop.relations import (
 from pydcop.utils.expressionfunction import ExpressionFunction
 from pydcop.distribution.objects import DistributionHints
 
+# Use the libyaml-based loader when available, it is several times faster.
+YamlLoader = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
+# Minimum number of assignments for writing the table of an extensional
+# constraint in an external file, see `dcop_yaml`.
+TABLE_MIN_SIZE = 10000
+
 
 class DcopInvalidFormatError(Exception):
     pass
 
 
-def load_dcop_from_file(filenames: Union[str, Iterable[str]]):
+def load_dcop_from_file(
+    filenames: Union[str, Iterable[str]], cache_dir: str = None
+):
     """
     load a dcop from one or several files
 
@@ -71,28 +83,106 @@ def load_dcop_from_file(filenames: Union[str, Iterable[str]]):
         passing an iterable of file names, their content is concatenated
         before parsing. This can be usefull when you want to define the
         agents in a separate file.
+    cache_dir: str
+        optional cache directory. When given, the dcop is only parsed if it
+        is not already in the cache, which is keyed by the content of the
+        files and their directory. See :mod:`pydcop.dcop.dcopcache`.
 
     Returns
     -------
     A DCOP object built by parsing the files
 
     """
+    filenames = [filenames] if isinstance(filenames, str) else list(filenames)
+    if _memory_cache is not None:
+        memory_key = _memory_cache_key(filenames)
+        if memory_key in _memory_cache:
+            _memory_cache.move_to_end(memory_key)
+            return _memory_cache[memory_key]
+        dcop = _load_dcop_from_file(filenames, cache_dir)
+        _memory_cache[memory_key] = dcop
+        while len(_memory_cache) > _memory_cache_size:
+            _memory_cache.popitem(last=False)
+        return dcop
+    return _load_dcop_from_file(filenames, cache_dir)
+
+
+def _load_dcop_from_file(filenames: List[str], cache_dir: str = None):
     content = ""
-    if isinstance(filenames, CollectionIterable):
-        for filename in filenames:
-            with open(filename, mode="r", encoding="utf-8") as f:
-                content += f.read()
-    else:
-        with open(filenames, mode="r", encoding="utf-8") as f:
+    for filename in filenames:
+        with open(filename, mode="r", encoding="utf-8") as f:
             content += f.read()
 
-    if content:
-        return load_dcop(content)
+    if not content:
+        return None
+    # External tables are relative to the directory of the (first) file.
+    base_dir = path.dirname(path.abspath(filenames[0]))
+    if cache_dir is None:
+        return load_dcop(content, base_dir)
+
+    key = dcop_cache_key(content, base_dir)
+    dcop = load_cached_dcop(cache_dir, key)
+    if dcop is None:
+        loaded = yaml.load(content, Loader=YamlLoader)
+        dcop = _build_dcop(loaded, base_dir)
+        store_cached_dcop(cache_dir, key, dcop, _table_files(loaded, base_dir))
+    return dcop
+
+
+# DCOPs kept in memory by load_dcop_from_file, see keep_dcops_in_memory.
+_memory_cache: Optional[OrderedDict] = None
+_memory_cache_size = 0
+
+
+def keep_dcops_in_memory(size: int):
+    """
+    Keep the most recently loaded dcops in memory.
+
+    Once enabled, `load_dcop_from_file` returns the same DCOP object when
+    loading again the same files, as long as they have not been modified.
+    This is useful for long-running processes that run many commands on the
+    same dcops, like the warm workers of the batch command (which fork a new
+    process for each command, so that commands never share DCOP objects).
+
+    Parameters
+    ----------
+    size: int
+        maximum number of dcops kept in memory, 0 disables the memory cache.
+    """
+    global _memory_cache, _memory_cache_size
+    _memory_cache = OrderedDict() if size > 0 else None
+    _memory_cache_size = size
 
 
-def load_dcop(dcop_str: str) -> DCOP:
-    loaded = yaml.load(dcop_str, Loader=yaml.FullLoader)
+def _memory_cache_key(filenames: List[str]) -> Tuple:
+    key = []
+    for filename in filenames:
+        stat = os.stat(filename)
+        key.append((path.abspath(filename), stat.st_size, stat.st_mtime_ns))
+    return tuple(key)
 
+
+def load_dcop(dcop_str: str, base_dir: str = None) -> DCOP:
+    """
+    load a dcop from a yaml string.
+
+    Parameters
+    ----------
+    dcop_str: str
+        the yaml definition of the dcop
+    base_dir: str
+        directory relative paths to external tables are resolved against,
+        defaults to the current directory.
+
+    Returns
+    -------
+    A DCOP object built by parsing the string
+    """
+    loaded = yaml.load(dcop_str, Loader=YamlLoader)
+    return _build_dcop(loaded, base_dir)
+
+
+def _build_dcop(loaded, base_dir: str = None) -> DCOP:
     if "name" not in loaded:
         raise ValueError("Missing name in dcop string")
     if "objective" not in loaded or loaded["objective"] not in ["min", "max"]:
@@ -107,14 +197,41 @@ def load_dcop(dcop_str: str) -> DCOP:
     dcop.domains = _build_domains(loaded)
     dcop.variables = _build_variables(loaded, dcop)
     dcop.external_variables = _build_external_variables(loaded, dcop)
-    dcop._constraints = _build_constraints(loaded, dcop)
+    dcop._constraints = _build_constraints(loaded, dcop, base_dir)
     dcop._agents_def = _build_agents(loaded)
     dcop.dist_hints = _build_dist_hints(loaded, dcop)
     return dcop
 
 
-def dcop_yaml(dcop: DCOP) -> str:
+def dcop_yaml(
+    dcop: DCOP,
+    tables_dir: str = None,
+    yaml_dir: str = ".",
+    table_min_size: int = TABLE_MIN_SIZE,
+) -> str:
+    """
+    Serialize a dcop in yaml.
+
+    Parameters
+    ----------
+    dcop: DCOP
+        the dcop
+    tables_dir: str
+        optional directory for external tables. When given, the table of
+        extensional constraints with at least `table_min_size` assignments
+        are written in ``.npy`` files in this directory, instead of being
+        written in the yaml string.
+    yaml_dir: str
+        the directory the yaml string will be written to, paths to
+        external tables are written relative to this directory.
+    table_min_size: int
+        minimum number of assignments for using an external table.
 
+    Returns
+    -------
+    str:
+        the yaml definition of the dcop.
+    """
     dcop_dict = {"name": dcop.name, "objective": dcop.objective}
     dcop_str = yaml.dump(dcop_dict, default_flow_style=False)
     dcop_str += "\n"
@@ -122,7 +239,9 @@ def dcop_yaml(dcop: DCOP) -> str:
     dcop_str += "\n"
     dcop_str += _yaml_variables(dcop.variables.values())
     dcop_str += "\n"
-    dcop_str += _yaml_constraints(dcop.constraints.values())
+    dcop_str += _yaml_constraints(
+        dcop.constraints.values(), tables_dir, yaml_dir, table_min_size
+    )
     dcop_str += "\n"
     dcop_str += yaml_agents(dcop.agents.values())
 
@@ -211,8 +330,10 @@ def _build_external_variables(loaded, dcop) -> Dict[str, ExternalVariable]:
     return ext_vars
 
 
-def _build_constraints(loaded, dcop) -> Dict[str, RelationProtocol]:
+def _build_constraints(loaded, dcop, base_dir=None) -> Dict[str, RelationProtocol]:
     constraints = {}
+    # Stacked table files, opened only once for all their constraints
+    stacks = {}
     if "constraints" in loaded:
         for c_name in loaded["constraints"]:
             c = loaded["constraints"][c_name]
@@ -226,6 +347,19 @@ def _build_constraints(loaded, dcop) -> Dict[str, RelationProtocol]:
                 constraints[c_name] = relation_from_str(
                     c_name, c["function"], dcop.all_variables
                 )
+            elif c["type"] == "extensional" and "table" in c:
+                variables = c["variables"]
+                if type(variables) != list:
+                    variables = [variables.strip()]
+                vars = [dcop.variable(v) for v in variables]
+                table = load_table(
+                    _table_path(c["table"], base_dir),
+                    vars,
+                    index=c.get("table_index"),
+                    stacks=stacks,
+                )
+                constraints[c_name] = NAryMatrixRelation(vars, table, name=c_name)
+
             elif c["type"] == "extensional":
                 values_def = c["values"]
                 default = None if "default" not in c else c["default"]
@@ -274,34 +408,173 @@ def _build_constraints(loaded, dcop) -> Dict[str, RelationProtocol]:
     return constraints
 
 
-def _yaml_constraints(constraints: Iterable[RelationProtocol]):
+def load_table(
+    table_file: str, variables: List[Variable], index: int = None, stacks=None
+) -> np.ndarray:
+    """
+    Load the table of an extensional constraint from a file.
+
+    The table has one dimension for each variable, in the same order as the
+    variables, indexed by the index of the values in the variables' domains.
+    It can be given as:
+
+    * a ``.npy`` file, which is memory-mapped (in copy-on-write mode),
+    * a ``.csv`` file, containing the values of the table in row-major
+      order. For a binary constraint, each row of the file gives the costs
+      for one value of the first variable.
+
+    A ``.npy`` file can also contain a stack of tables with the same shape,
+    for several constraints, with an extra leading dimension: the table of
+    the constraint is then selected with `index`.
+
+    Parameters
+    ----------
+    table_file: str
+        path to the table file.
+    variables: list of Variable
+        the variables of the constraint.
+    index: int
+        index of the table, for a file containing a stack of tables.
+    stacks: dict
+        optional dict used to keep the stacked tables files opened between
+        calls, when loading many constraints from the same file.
+
+    Returns
+    -------
+    np.ndarray:
+        the table.
+    """
+    shape = tuple(len(v.domain) for v in variables)
+    if index is not None:
+        if not table_file.endswith(".npy"):
+            raise DcopInvalidFormatError(
+                "Invalid table file {}, only .npy files can contain "
+                "several tables".format(table_file)
+            )
+        stacks = {} if stacks is None else stacks
+        if table_file not in stacks:
+            stacks[table_file] = np.load(table_file, mmap_mode="c")
+        stack = stacks[table_file]
+        if not 0 <= index < len(stack):
+            raise DcopInvalidFormatError(
+                "Invalid index {} for table {} with {} tables".format(
+                    index, table_file, len(stack)
+                )
+            )
+        table = stack[index]
+    elif table_file.endswith(".npy"):
+        table = np.load(table_file, mmap_mode="c")
+    elif table_file.endswith(".csv"):
+        table = np.loadtxt(table_file, delimiter=",", ndmin=1)
+        if table.size == np.prod(shape):
+            table = table.reshape(shape)
+    else:
+        raise DcopInvalidFormatError(
+            "Invalid table file {}, only .npy and .csv files are "
+            "supported".format(table_file)
+        )
+    if table.shape != shape:
+        raise DcopInvalidFormatError(
+            "Invalid shape {} for table {}, expected {}".format(
+                table.shape, table_file, shape
+            )
+        )
+    return table
+
+
+def _table_path(table_file: str, base_dir: str = None) -> str:
+    if base_dir is None or path.isabs(table_file):
+        return table_file
+    return path.join(base_dir, table_file)
+
+
+def _table_files(loaded, base_dir: str = None) -> List[str]:
+    """
+    Paths of the external tables used in a loaded yaml dcop.
+    """
+    constraints = loaded.get("constraints") or {}
+    files = {
+        _table_path(c["table"], base_dir): None
+        for c in constraints.values()
+        if "table" in c
+    }
+    return list(files)
+
+
+def _yaml_constraints(
+    constraints: Iterable[RelationProtocol],
+    tables_dir: str = None,
+    yaml_dir: str = ".",
+    table_min_size: int = TABLE_MIN_SIZE,
+):
     constraints_dict = {}
     for r in constraints:
         if hasattr(r, "expression"):
 
             constraints_dict[r.name] = {"type": "intention", "function": r.expression}
+        elif tables_dir is not None and _table_size(r) >= table_min_size:
+            constraints_dict[r.name] = _yaml_table_constraint(r, tables_dir, yaml_dir)
         else:
-            # fallback to extensional constraint
-            variables = [v.name for v in r.dimensions]
-            values = defaultdict(lambda: [])
-
-            for assignment in generate_assignment_as_dict(r.dimensions):
-                val = r(**assignment)
-                ass_str = " ".join([str(assignment[var]) for var in variables])
-                values[val].append(ass_str)
-
-            for val in values:
-                values[val] = " | ".join(values[val])
-            values = dict(values)
-            constraints_dict[r.name] = {
-                "type": "extensional",
-                "variables": variables,
-                "values": values,
-            }
+            constraints_dict[r.name] = _yaml_extensional_constraint(r)
 
     return yaml.dump({"constraints": constraints_dict}, default_flow_style=False)
 
 
+def _yaml_extensional_constraint(r: RelationProtocol) -> Dict:
+    # fallback to extensional constraint
+    variables = [v.name for v in r.dimensions]
+    values = defaultdict(lambda: [])
+
+    for assignment in generate_assignment_as_dict(r.dimensions):
+        val = r(**assignment)
+        ass_str = " ".join([str(assignment[var]) for var in variables])
+        values[val].append(ass_str)
+
+    for val in values:
+        values[val] = " | ".join(values[val])
+    values = dict(values)
+    return {
+        "type": "extensional",
+        "variables": variables,
+        "values": values,
+    }
+
+
+def _yaml_table_constraint(r: RelationProtocol, tables_dir: str, yaml_dir: str) -> Dict:
+    table = _relation_table(r)
+    if table.dtype.hasobject:
+        # e.g. when some assignments have no value, cannot be saved as npy
+        return _yaml_extensional_constraint(r)
+    os.makedirs(tables_dir, exist_ok=True)
+    table_file = path.join(tables_dir, r.name + ".npy")
+    np.save(table_file, table)
+    return {
+        "type": "extensional",
+        "variables": [v.name for v in r.dimensions],
+        "table": path.relpath(table_file, yaml_dir),
+    }
+
+
+def _table_size(relation: RelationProtocol) -> int:
+    size = 1
+    for v in relation.dimensions:
+        size *= len(v.domain)
+    return size
+
+
+def _relation_table(relation: RelationProtocol) -> np.ndarray:
+    if isinstance(relation, NAryMatrixRelation):
+        return relation._m
+    # assignments are generated with the first variable changing fastest
+    values = [
+        relation(**assignment)
+        for assignment in generate_assignment_as_dict(relation.dimensions)
+    ]
+    return np.array(values).reshape(
+        [len(v.domain) for v in relation.dimensions], order="F"
+    )
+
+
 def _build_agents(loaded) -> Dict[str, AgentDef]:
 
     # Read agents list, without creating AgentDef object yet.
@@ -508,7 +781,7 @@ def load_scenario(scenario_str) -> Scenario:
     :param scenario_str:
     :return:
     """
-    loaded = yaml.load(scenario_str, Loader=yaml.FullLoader)
+    loaded = yaml.load(scenario_str, Loader=YamlLoader)
     evts = []
     for evt in loaded["events"]:
         id_evt = evt["id"]
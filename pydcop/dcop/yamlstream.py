@@ -0,0 +1,460 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Streaming writer for yaml DCOP files.
+
+:func:`pydcop.dcop.yamldcop.dcop_yaml` serializes a :class:`DCOP` object, which
+must be entirely built in memory beforehand. For very large problems, e.g.
+benchmark instances with millions of variables, :class:`DcopYamlWriter` writes
+the yaml file incrementally, section by section, directly from plain names
+and numpy tables, without building any `Variable` or relation object.
+
+The tables of extensional constraints can either be written in the yaml file,
+like `dcop_yaml` does, or appended to stacked ``.npy`` files (see
+:class:`TableStack`) that are referenced with the ``table`` and
+``table_index`` keys.
+
+"""
+import json
+import math
+import re
+from collections import defaultdict
+from itertools import product
+from os import path
+from typing import Any, Dict, Iterable, List, Sequence, TextIO, Tuple
+
+import numpy as np
+
+# Sections of a yaml dcop file, in the order they are written. Each section
+# must be written in one go.
+SECTIONS = ["domains", "variables", "constraints", "agents", "routes", "hosting_costs"]
+
+# Number of yaml chunks buffered before writing them to the stream.
+BUFFER_SIZE = 10000
+
+_PLAIN_STR = re.compile(r"^[A-Za-z_][A-Za-z0-9_\-]*$")
+_YAML_KEYWORDS = {"y", "yes", "n", "no", "true", "false", "on", "off", "null"}
+
+
+class TableStack:
+    """
+    A ``.npy`` file containing a stack of tables, written incrementally.
+
+    All tables in the stack have the same shape and dtype, the array in the
+    file has an extra leading dimension, for the index of the table in the
+    stack. The header of the file is only completed when closing the stack,
+    once the number of tables is known.
+
+    Parameters
+    ----------
+    filename: str
+        path of the ``.npy`` file.
+    shape: tuple
+        shape of the tables.
+    dtype:
+        dtype of the tables.
+    """
+
+    # Space reserved for the npy header, a multiple of 64 as numpy uses for
+    # aligning data.
+    HEADER_SIZE = 128
+
+    def __init__(self, filename: str, shape: Tuple[int, ...], dtype):
+        self.filename = filename
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._file = open(filename, "wb")
+        self._write_header()
+
+    def append(self, table) -> int:
+        """
+        Append a table to the stack.
+
+        Returns
+        -------
+        int:
+            the index of the table in the stack.
+        """
+        return self.extend(np.asarray(table)[np.newaxis])[0]
+
+    def extend(self, tables) -> range:
+        """
+        Append several tables, given as one array with an extra leading
+        dimension, to the stack.
+
+        Returns
+        -------
+        range:
+            the indexes of the tables in the stack.
+        """
+        tables = np.ascontiguousarray(tables, dtype=self.dtype)
+        if tables.shape[1:] != self.shape:
+            raise ValueError(
+                "Invalid shape {} for table stack {}, expected {}".format(
+                    tables.shape[1:], self.filename, self.shape
+                )
+            )
+        self._file.write(tables.tobytes())
+        start = self.count
+        self.count += len(tables)
+        return range(start, self.count)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._write_header()
+        self._file.close()
+
+    def _write_header(self):
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (self.count,) + self.shape,
+            }
+        )
+        # magic string (6 bytes), version (2 bytes), header length (2 bytes)
+        header_len = self.HEADER_SIZE - 10
+        header = header.ljust(header_len - 1) + "\n"
+        if len(header) != header_len:
+            raise ValueError("Table shape too large for npy header")
+        self._file.write(b"\x93NUMPY\x01\x00")
+        self._file.write(header_len.to_bytes(2, "little"))
+        self._file.write(header.encode("latin1"))
+
+
+class DcopYamlWriter:
+    """
+    Write a yaml dcop file incrementally.
+
+    The sections of the file (domains, variables, constraints, agents, etc.)
+    must be written in order, and each of them in one go: e.g. all variables
+    must be written before the first constraint.
+
+    Parameters
+    ----------
+    stream: TextIO
+        the stream the yaml dcop is written to.
+    name: str
+        the name of the dcop.
+    objective: str
+        "min" or "max".
+    tables_prefix: str
+        when given, the tables of extensional constraints are written in
+        stacked ``.npy`` files named ``<tables_prefix>_table<n>.npy``,
+        instead of being written in the yaml stream.
+    yaml_dir: str
+        the directory of the yaml file, paths to the tables files are written
+        relative to this directory.
+
+    Examples
+    --------
+
+    >>> import io
+    >>> out = io.StringIO()
+    >>> with DcopYamlWriter(out, "test") as writer:
+    ...     writer.domain("d", [0, 1])
+    ...     writer.variable("v1", "d")
+    ...     writer.intention_constraint("c1", "v1 * 2")
+    >>> from pydcop.dcop.yamldcop import load_dcop
+    >>> load_dcop(out.getvalue()).constraint("c1")(1)
+    2
+    """
+
+    def __init__(
+        self,
+        stream: TextIO,
+        name: str,
+        objective: str = "min",
+        tables_prefix: str = None,
+        yaml_dir: str = ".",
+    ):
+        self._stream = stream
+        self._tables_prefix = tables_prefix
+        self._yaml_dir = yaml_dir
+        self._stacks: Dict[Tuple, TableStack] = {}
+        self._stacks_paths: Dict[Tuple, str] = {}
+        self._section = None
+        self._buffer = []
+        self._write(f"name: {yaml_scalar(name)}\nobjective: {objective}\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def table_files(self) -> List[str]:
+        """Paths of the stacked tables files written so far."""
+        return [stack.filename for stack in self._stacks.values()]
+
+    def close(self):
+        """
+        Flush the yaml stream and complete the stacked tables files.
+
+        The stream itself is not closed.
+        """
+        self._flush()
+        for stack in self._stacks.values():
+            stack.close()
+
+    def domain(self, name: str, values: Iterable, d_type: str = ""):
+        self._open("domains")
+        self._write(
+            f"  {yaml_scalar(name)}:\n"
+            f"    type: {yaml_scalar(d_type)}\n"
+            f"    values: {_yaml_list(values)}\n"
+        )
+
+    def variable(self, name: str, domain: str, initial_value: Any = None):
+        self._open("variables")
+        if initial_value is None:
+            self._write(f"  {yaml_scalar(name)}: {{domain: {yaml_scalar(domain)}}}\n")
+        else:
+            self._write(
+                f"  {yaml_scalar(name)}: {{domain: {yaml_scalar(domain)}, "
+                f"initial_value: {yaml_scalar(initial_value)}}}\n"
+            )
+
+    def intention_constraint(self, name: str, expression: str):
+        self._open("constraints")
+        self._write(
+            f"  {yaml_scalar(name)}: {{type: intention, "
+            f"function: {json.dumps(expression)}}}\n"
+        )
+
+    def extensional_constraint(
+        self,
+        name: str,
+        variables: Sequence[str],
+        domains: Sequence[Sequence],
+        table,
+        default=None,
+    ):
+        """
+        Write an extensional constraint.
+
+        Parameters
+        ----------
+        name: str
+            name of the constraint
+        variables: list of str
+            names of the variables of the constraint.
+        domains: list of sequences
+            the domain values of these variables, used to write the table in
+            the yaml file.
+        table: array-like
+            the table of the constraint, with one dimension for each variable.
+        default:
+            when writing the table in the yaml file, assignments with this
+            value are not written.
+        """
+        self._open("constraints")
+        table = np.asarray(table)
+        variables_str = _yaml_list(variables)
+        if self._tables_prefix is not None and not table.dtype.hasobject:
+            stack, table_file = self._table_stack(table.shape, table.dtype)
+            index = stack.append(table)
+            self._write(
+                f"  {yaml_scalar(name)}:\n"
+                f"    type: extensional\n"
+                f"    variables: {variables_str}\n"
+                f"    table: {table_file}\n"
+                f"    table_index: {index}\n"
+            )
+            return
+
+        values = defaultdict(list)
+        for assignment, value in zip(_assignments(domains), table.ravel().tolist()):
+            if value != default:
+                values[value].append(assignment)
+        lines = [
+            f"  {yaml_scalar(name)}:\n"
+            f"    type: extensional\n"
+            f"    variables: {variables_str}\n"
+        ]
+        if default is not None:
+            lines.append(f"    default: {yaml_scalar(default)}\n")
+        lines.append("    values:\n")
+        for value, assignments in values.items():
+            lines.append(
+                f"      {yaml_scalar(value)}: {json.dumps(' | '.join(assignments))}\n"
+            )
+        self._write("".join(lines))
+
+    def agent(self, name: str, **attributes):
+        """
+        Write an agent definition, with optional attributes (e.g. capacity).
+        """
+        self._open("agents")
+        attributes = ", ".join(
+            f"{yaml_scalar(k)}: {yaml_scalar(v)}" for k, v in attributes.items()
+        )
+        self._write(f"  {yaml_scalar(name)}: {{{attributes}}}\n")
+
+    def default_route(self, cost: float):
+        self._open("routes")
+        self._write(f"  default: {yaml_scalar(cost)}\n")
+
+    def hosting_costs(
+        self, agent: str, default: float = 0, computations: Dict[str, float] = None
+    ):
+        self._open("hosting_costs")
+        computations = computations if computations else {}
+        computations = ", ".join(
+            f"{yaml_scalar(c)}: {yaml_scalar(v)}" for c, v in computations.items()
+        )
+        self._write(
+            f"  {yaml_scalar(agent)}:\n"
+            f"    default: {yaml_scalar(default)}\n"
+            f"    computations: {{{computations}}}\n"
+        )
+
+    def _table_stack(self, shape, dtype) -> Tuple[TableStack, str]:
+        # Returns the stack for these tables, and its path, as written in yaml
+        key = (shape, dtype.str)
+        try:
+            return self._stacks[key], self._stacks_paths[key]
+        except KeyError:
+            filename = f"{self._tables_prefix}_table{len(self._stacks)}.npy"
+            self._stacks[key] = TableStack(filename, shape, dtype)
+            self._stacks_paths[key] = json.dumps(
+                path.relpath(filename, self._yaml_dir)
+            )
+            return self._stacks[key], self._stacks_paths[key]
+
+    def _open(self, section: str):
+        if section == self._section:
+            return
+        if self._section is not None and SECTIONS.index(
+            section
+        ) < SECTIONS.index(self._section):
+            raise ValueError(
+                f"Cannot write {section} after {self._section} in yaml dcop"
+            )
+        self._section = section
+        self._write(f"\n{section}:\n")
+
+    def _write(self, chunk: str):
+        self._buffer.append(chunk)
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._stream.write("".join(self._buffer))
+        self._buffer.clear()
+
+
+def write_distribution_yaml(
+    stream: TextIO, mapping: Iterable[Tuple[str, List[str]]], inputs: Dict[str, Any]
+):
+    """
+    Write a distribution in yaml, incrementally.
+
+    The format is the same as the one used by the ``distribute`` command.
+
+    Parameters
+    ----------
+    stream: TextIO
+        the stream the distribution is written to.
+    mapping: iterable of (agent, computations) pairs
+        the distribution.
+    inputs: dict
+        the parameters used to generate the distribution.
+    """
+    buffer = ["cost: null\ndistribution:\n"]
+    for agent, computations in mapping:
+        buffer.append(f"  {yaml_scalar(agent)}: {_yaml_list(computations)}\n")
+        if len(buffer) >= BUFFER_SIZE:
+            stream.write("".join(buffer))
+            buffer.clear()
+    buffer.append("inputs:\n")
+    for k, v in sorted(inputs.items()):
+        buffer.append(f"  {yaml_scalar(k)}: {yaml_scalar(v)}\n")
+    stream.write("".join(buffer))
+
+
+def yaml_scalar(value) -> str:
+    """
+    Yaml representation of a scalar value.
+
+    Strings are quoted, unless they are simple identifiers that yaml would not
+    interpret as another type, and floats always contain a dot, to be read as
+    floats by pyyaml.
+    """
+    if isinstance(value, str):
+        if _PLAIN_STR.match(value) and value.lower() not in _YAML_KEYWORDS:
+            return value
+        return json.dumps(value)
+    if value is None:
+        return "null"
+    if isinstance(value, (bool, np.bool_)):
+        return "true" if value else "false"
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        if math.isnan(value):
+            return ".nan"
+        if math.isinf(value):
+            return ".inf" if value > 0 else "-.inf"
+        value = repr(value)
+        if "." not in value:
+            # e.g. 1e-05, which pyyaml would read as a string
+            value = value.replace("e", ".0e")
+        return value
+    return json.dumps(str(value))
+
+
+def _yaml_list(values: Iterable) -> str:
+    return "[" + ", ".join(yaml_scalar(v) for v in values) + "]"
+
+
+_assignments_cache: Dict[Tuple, List[str]] = {}
+
+
+def _assignments(domains: Sequence[Sequence]) -> List[str]:
+    # Assignments strings, in the order of the elements of a table in C
+    # order, i.e. with the last variable changing fastest.
+    key = tuple(tuple(d) for d in domains)
+    try:
+        return _assignments_cache[key]
+    except KeyError:
+        assignments = [
+            " ".join(str(v) for v in assignment) for assignment in product(*key)
+        ]
+        if len(_assignments_cache) > 1000:
+            _assignments_cache.clear()
+        _assignments_cache[key] = assignments
+        return assignments
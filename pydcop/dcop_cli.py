@@ -37,6 +37,7 @@ Main command-line interface for pydcop.
 
 
 """
+import ast
 import logging
 import signal
 import argparse
@@ -46,22 +47,106 @@ from logging.config import fileConfig
 from threading import Timer
 
 import functools
+from importlib import import_module
+from importlib.util import find_spec
+from typing import Optional
 
 from pydcop.version import __version__
-from pydcop.commands import solve, orchestrator, agent, replica_dist, batch
-from pydcop.commands import distribute
-from pydcop.commands import graph
-from pydcop.commands import generate
-from pydcop.commands import run
-from pydcop.commands import consolidate
 
 cli_timer = None
 TIMEOUT_SLACK = 40
 
+# Commands available in the cli.
+# Command modules (and their heavy dependencies) are only imported when the
+# command is actually selected, as importing all of them at start-up takes
+# much longer than running many short commands. The help messages of other
+# commands are read from their modules' source, see `command_help`.
+COMMANDS = ('solve', 'distribute', 'graph', 'agent', 'orchestrator',
+            'generate', 'replica_dist', 'run', 'batch', 'consolidate')
 
-def main():
 
+def main(argv=None):
+    """
+    Run a pydcop cli command.
+
+    Parameters
+    ----------
+    argv: list of str
+        command line arguments, without the program name, defaults to
+        ``sys.argv[1:]``.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser(selected_command(argv))
+
+    # parse command line options
+    args = parser.parse_args(argv)
+    run_args(args, parser)
+
+
+def build_parser(selected: str = None) -> argparse.ArgumentParser:
+    """
+    Build the cli parser, with the full options of the `selected` command.
+    """
     parser = argparse.ArgumentParser(description='pydcop')
+    _add_global_options(parser)
+
+    subparsers = parser.add_subparsers(title='Actions', dest='action',
+                                       description='To get help on a command, '
+                                                   'use pydcop <command> -h')
+
+    # Register commands for dcop cli: only the selected command is imported,
+    # others are registered with their name and, when the global help may be
+    # displayed, their help message.
+    for command in COMMANDS:
+        if command == selected:
+            module = import_module('pydcop.commands.' + command)
+            module.set_parser(subparsers)
+        elif selected is None:
+            subparsers.add_parser(command, help=command_help(command))
+        else:
+            subparsers.add_parser(command)
+
+    return parser
+
+
+def command_help(command: str) -> Optional[str]:
+    """
+    Help message of a command, without importing the command's module.
+
+    The help message is the one given when registering the command's parser
+    in the ``set_parser`` function of its module, i.e. the ``help``
+    argument of the ``subparsers.add_parser(<command>, help=...)`` call,
+    read from the module's source.
+
+    Parameters
+    ----------
+    command: str
+        the name of the command
+
+    Returns
+    -------
+    str:
+        the help message, or None if it could not be found.
+    """
+    spec = find_spec('pydcop.commands.' + command)
+    if spec is None or spec.origin is None:
+        return None
+    with open(spec.origin, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), spec.origin)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) \
+                and isinstance(node.func, ast.Attribute) \
+                and node.func.attr == 'add_parser' \
+                and node.args and isinstance(node.args[0], ast.Constant) \
+                and node.args[0].value == command:
+            for keyword in node.keywords:
+                if keyword.arg == 'help' \
+                        and isinstance(keyword.value, ast.Constant):
+                    return keyword.value.value
+    return None
+
+
+def _add_global_options(parser: argparse.ArgumentParser):
     parser.add_argument('-v', '--verbose', default='0',
                         choices=[0, 1, 2, 3], type=int,
                         help='verbosity, 0 means only errors will be '
@@ -82,26 +167,16 @@ def main():
                         help='output file')
     parser.add_argument('--log', type=str,
                         help='log configuration file')
+    parser.add_argument('--dcop_cache', type=str, default=None,
+                        help='cache directory for parsed dcop files, '
+                             'useful when running many commands on the '
+                             'same dcop.')
 
-    subparsers = parser.add_subparsers(title='Actions', dest='action',
-                                       description='To get help on a command, '
-                                                   'use pydcop <command> -h')
-
-    # Register commands for dcop cli
-    solve.set_parser(subparsers)
-    distribute.set_parser(subparsers)
-    graph.set_parser(subparsers)
-    agent.set_parser(subparsers)
-    orchestrator.set_parser(subparsers)
-    generate.set_parser(subparsers)
-    replica_dist.set_parser(subparsers)
-    run.set_parser(subparsers)
-    batch.set_parser(subparsers)
-    consolidate.set_parser(subparsers)
-
-    # parse command line options
-    args = parser.parse_args()
 
+def run_args(args, parser):
+    """
+    Run a command from its parsed arguments.
+    """
     if args.version:
         print('pydcop', __version__ )
         return
@@ -149,6 +224,57 @@ def main():
         sys.exit(2)
 
 
+class _ProbeError(Exception):
+    pass
+
+
+class _ProbeParser(argparse.ArgumentParser):
+    """
+    Parser used to find the selected command: errors are reported by the
+    full parser.
+    """
+
+    def error(self, message):
+        raise _ProbeError(message)
+
+
+def selected_command(argv):
+    """
+    Find the command selected on a command line, without importing the
+    commands modules.
+
+    The command line is parsed with the global options, like the full cli
+    parser (which also accepts abbreviated options), but options of the
+    commands are ignored.
+
+    Parameters
+    ----------
+    argv: list of str
+        command line arguments, without the program name.
+
+    Returns
+    -------
+    str:
+        the name of the selected command, or None if the command line does
+        not contain any known command or requests the global help.
+    """
+    parser = _ProbeParser(add_help=False)
+    _add_global_options(parser)
+    subparsers = parser.add_subparsers(dest='action')
+    for command in COMMANDS:
+        subparsers.add_parser(command, add_help=False)
+    try:
+        args, _ = parser.parse_known_args(argv)
+    except _ProbeError:
+        return None
+    if args.action is None:
+        return None
+    # Global help, given before the command
+    if {'-h', '--help'} & set(argv[:argv.index(args.action)]):
+        return None
+    return args.action
+
+
 def _on_force_exit(sub_exit_func, sig, frame):
 
     if cli_timer is not None:
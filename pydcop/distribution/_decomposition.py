@@ -0,0 +1,362 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Decomposition of ILP-based distribution problems.
+
+ILP models for the distribution grow with the product of the number of
+computations and the number of agents (and the square of the number of agents
+for models with route costs) and cannot be solved for large computation graphs.
+
+For these graphs, the problem is split into independent sub-problems:
+
+* an initial distribution is computed with the greedy ``gh_cgdp`` method,
+* agents are grouped, merging first agents that exchange the most messages
+  in the initial distribution, in groups hosting at most `MAX_PART_SIZE`
+  computations. Agents that exchange no messages (e.g. they host different
+  connected components of the graph) are packed in the same groups. Agents
+  that host no computation are spread over the groups.
+* for each group, the computations hosted by the agents of the group are
+  distributed on these agents by the ILP method, using the agents' full
+  capacity. Sub-problems are solved in parallel, in a pool of processes.
+
+Links between computations of different sub-problems are not taken into
+account by the sub-problems, their cost is the cost they have in the initial
+distribution.
+
+When a sub-problem cannot be solved before the timeout, the best solution found
+by the solver is used if it is feasible, otherwise the computations of the
+sub-problem keep the placement they have in the initial distribution.
+
+Computation graphs with at most `MAX_PART_SIZE` computations are distributed by
+solving a single ILP, like before, and the ``gh_cgdp`` distribution is only used
+if this ILP cannot be solved before the timeout.
+"""
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from itertools import combinations
+from typing import Callable, Iterable, List, Dict
+
+from pydcop.computations_graph.objects import ComputationGraph, ComputationNode
+from pydcop.dcop.objects import AgentDef
+from pydcop.distribution.objects import Distribution, ImpossibleDistributionException
+
+logger = logging.getLogger("distribution.decomposition")
+
+# Maximum number of computations in a sub-problem
+MAX_PART_SIZE = 100
+
+# Maximum number of processes used to solve sub-problems, defaults to the number
+# of cpus.
+MAX_PROCESSES = None
+
+# Extra time given to a sub-problem process, after the timeout, to return the
+# solution found by the solver.
+TIMEOUT_GRACE = 5
+
+
+def distribute_by_parts(
+    distribute_part: Callable[..., Distribution],
+    computation_graph: ComputationGraph,
+    agentsdef: Iterable[AgentDef],
+    hints=None,
+    computation_memory: Callable[[ComputationNode], float] = None,
+    communication_load: Callable[[ComputationNode, str], float] = None,
+    timeout: float = 600,
+) -> Distribution:
+    """
+    Distribute a computation graph by solving independent sub-problems.
+
+    Parameters
+    ----------
+    distribute_part: callable
+        the ILP distribution of a (sub-)problem. It is called with the same
+        arguments as a distribution method's `distribute` function and must
+        raise `TimeoutError` when no solution was found before the timeout.
+        It must be a module-level function, as it is sent to sub-processes.
+    computation_graph: ComputationGraph
+        the computation graph to distribute
+    agentsdef: iterable of AgentDef
+        the agents
+    hints
+        distribution hints, passed to `distribute_part`
+    computation_memory: callable
+        memory footprint of a computation
+    communication_load: callable
+        communication load between two computations
+    timeout: float
+        timeout for the whole distribution, in seconds
+
+    Returns
+    -------
+    Distribution:
+        The distribution for the computation graph.
+    """
+    # Imported here as gh_cgdp depends on oilp_cgdp, which uses this module.
+    from pydcop.distribution import gh_cgdp
+
+    start_t = time.time()
+    agents = list(agentsdef)
+    timeout = 600 if timeout is None else timeout
+
+    if len(computation_graph.nodes) <= MAX_PART_SIZE:
+        try:
+            return distribute_part(
+                computation_graph,
+                agents,
+                hints=hints,
+                computation_memory=computation_memory,
+                communication_load=communication_load,
+                timeout=timeout,
+            )
+        except TimeoutError:
+            logger.warning(
+                "No solution found in %ss, using gh_cgdp distribution", timeout
+            )
+            return gh_cgdp.distribute(
+                computation_graph,
+                agents,
+                hints=hints,
+                computation_memory=computation_memory,
+                communication_load=communication_load,
+            )
+
+    initial = gh_cgdp.distribute(
+        computation_graph,
+        agents,
+        hints=hints,
+        computation_memory=computation_memory,
+        communication_load=communication_load,
+    )
+    groups = agent_groups(computation_graph, agents, initial, communication_load)
+    agents_by_name = {a.name: a for a in agents}
+
+    mapping = {}
+    parts = []
+    for group in groups:
+        computations = [c for a in group for c in initial.computations_hosted(a)]
+        if len(group) == 1 or not computations:
+            # Nothing to optimize, keep the initial placement
+            for a in group:
+                mapping[a] = initial.computations_hosted(a)
+            continue
+        parts.append((group, computations))
+    logger.info(
+        "Distributing %s computations in %s sub-problems",
+        len(computation_graph.nodes),
+        len(parts),
+    )
+
+    remaining = max(1, timeout - (time.time() - start_t))
+    workers = min(len(parts), MAX_PROCESSES or os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(workers) if parts else None
+    futures = []
+    try:
+        futures = [
+            pool.submit(
+                distribute_part,
+                SubComputationGraph(computation_graph, computations),
+                [agents_by_name[a] for a in group],
+                hints=hints,
+                computation_memory=computation_memory,
+                communication_load=communication_load,
+                timeout=remaining,
+            )
+            for group, computations in parts
+        ]
+        for (group, _), future in zip(parts, futures):
+            wait = max(0, timeout - (time.time() - start_t)) + TIMEOUT_GRACE
+            try:
+                part_mapping = future.result(timeout=wait).mapping()
+            except (
+                TimeoutError,
+                FutureTimeoutError,
+                ImpossibleDistributionException,
+            ) as e:
+                logger.warning(
+                    "No solution for sub-problem on agents %s (%r), "
+                    "keeping gh_cgdp distribution",
+                    group,
+                    e,
+                )
+                part_mapping = {a: initial.computations_hosted(a) for a in group}
+            for a in group:
+                mapping[a] = list(part_mapping.get(a, []))
+    finally:
+        if pool is not None:
+            # Do not wait for sub-problems still running after the timeout
+            # (the solver also has a time limit).
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    return Distribution(mapping)
+
+
+def agent_groups(
+    computation_graph: ComputationGraph,
+    agents: List[AgentDef],
+    distribution: Distribution,
+    communication_load: Callable[[ComputationNode, str], float],
+    max_size: int = None,
+) -> List[List[str]]:
+    """
+    Group agents into independent sub-problems.
+
+    Agents are merged by decreasing communication load between them in
+    `distribution`, as long as the group hosts at most `max_size` computations.
+    Resulting groups are then packed together (first-fit decreasing) and agents
+    that host no computation are spread over the groups.
+
+    Parameters
+    ----------
+    computation_graph: ComputationGraph
+        the computation graph
+    agents: list of AgentDef
+        the agents
+    distribution: Distribution
+        a distribution of the computation graph on these agents
+    communication_load: callable
+        communication load between two computations
+    max_size: int
+        maximum number of computations hosted by the agents of a group,
+        defaults to `MAX_PART_SIZE`.
+
+    Returns
+    -------
+    list:
+        a list of groups, each group being a list of agents names.
+    """
+    max_size = MAX_PART_SIZE if max_size is None else max_size
+    sizes = {a.name: len(distribution.computations_hosted(a.name)) for a in agents}
+
+    traffic = defaultdict(float)  # type: Dict[tuple, float]
+    for link in computation_graph.links:
+        # As we support hypergraph, we may have more than 2 ends to a link
+        for c1, c2 in combinations(link.nodes, 2):
+            a1, a2 = distribution.agent_for(c1), distribution.agent_for(c2)
+            if a1 != a2:
+                load = communication_load(computation_graph.computation(c1), c2)
+                traffic[(min(a1, a2), max(a1, a2))] += load
+
+    # Union-find on agents, merging heaviest links first
+    roots = {a: a for a in sizes}
+
+    def find(a):
+        while roots[a] != a:
+            roots[a] = roots[roots[a]]
+            a = roots[a]
+        return a
+
+    group_sizes = dict(sizes)
+    for (a1, a2), _ in sorted(traffic.items(), key=lambda t: -t[1]):
+        r1, r2 = find(a1), find(a2)
+        if r1 != r2 and group_sizes[r1] + group_sizes[r2] <= max_size:
+            roots[r2] = r1
+            group_sizes[r1] += group_sizes[r2]
+
+    groups = defaultdict(list)
+    for a in sizes:
+        groups[find(a)].append(a)
+    used = sorted(
+        (g for g in groups.values() if group_sizes[find(g[0])] > 0),
+        key=lambda g: -group_sizes[find(g[0])],
+    )
+    unused = [a for g in groups.values() if group_sizes[find(g[0])] == 0 for a in g]
+
+    bins, bin_sizes = [], []
+    for group in used:
+        size = group_sizes[find(group[0])]
+        for i, bin_size in enumerate(bin_sizes):
+            if bin_size + size <= max_size:
+                bins[i].extend(group)
+                bin_sizes[i] += size
+                break
+        else:
+            bins.append(list(group))
+            bin_sizes.append(size)
+    if not bins:
+        return [unused] if unused else []
+    for i, a in enumerate(unused):
+        bins[i % len(bins)].append(a)
+    return bins
+
+
+class SubComputationGraph(ComputationGraph):
+    """
+    The part of a computation graph made of some of its computations.
+
+    Only links between these computations are part of the sub-graph. Nodes are
+    the nodes of the original graph (so their own `links` may still reference
+    computations outside of the sub-graph).
+
+    Parameters
+    ----------
+    computation_graph: ComputationGraph
+        the original computation graph
+    computations: iterable of str
+        names of the computations in the sub-graph
+    """
+
+    def __init__(
+        self, computation_graph: ComputationGraph, computations: Iterable[str]
+    ):
+        names = set(computations)
+        nodes = [n for n in computation_graph.nodes if n.name in names]
+        super().__init__(computation_graph.type, nodes=nodes)
+        self._nodes = {n.name: n for n in nodes}
+        self._links = {
+            l: None
+            for n in nodes
+            for l in n.links
+            if all(m in self._nodes for m in l.nodes)
+        }
+
+    @property
+    def links(self):
+        return set(self._links)
+
+    def computation(self, node_name: str) -> ComputationNode:
+        try:
+            return self._nodes[node_name]
+        except KeyError:
+            raise KeyError("no computation named {} found".format(node_name))
+
+    def links_for_node(self, node_name: str):
+        return [l for l in self.computation(node_name).links if l in self._links]
+
+    def neighbors(self, node_name: str) -> Iterable[str]:
+        return [
+            m for l in self.links_for_node(node_name) for m in l.nodes if m != node_name
+        ]
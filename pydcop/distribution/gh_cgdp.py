@@ -46,6 +46,7 @@ evaluate their communication cost.
 
 
 """
+import heapq
 import logging
 import random
 from collections import defaultdict
@@ -95,17 +96,14 @@ def distribute(
 
     """
 
+    agentsdef = list(agentsdef)
+
     # Place computations with hosting costs == 0
     # For SECP, this assign actuators var and factor to the right device.
+    nodes = {n.name: n for n in computation_graph.nodes}
     fixed_mapping = {}
-    for comp in computation_graph.node_names():
-        for agent in agentsdef:
-            if agent.hosting_cost(comp) == 0:
-                fixed_mapping[comp] = (
-                    agent.name,
-                    computation_memory(computation_graph.computation(comp)),
-                )
-                break
+    for comp, agent in zero_cost_hosts(nodes, agentsdef).items():
+        fixed_mapping[comp] = (agent, computation_memory(nodes[comp]))
 
     # Sort computation by footprint, but add a random element to avoid sorting on names
     computations = [
@@ -117,6 +115,16 @@ def distribute(
     computations = [t[:-1] for t in computations]
     logger.info("placing computations %s", [(f, c.name) for f, c, _ in computations])
 
+    # Indexes, updated each time a computation is placed or removed when
+    # backtracking: remaining capacity of agents and neighbours of computations
+    # (which are placed when they are in current_mapping).
+    remaining_capacity = {agt.name: agt.capacity for agt in agentsdef}
+    for agt, footprint in fixed_mapping.values():
+        remaining_capacity[agt] -= footprint
+    neighbours = {
+        c.name: [n for l in c.links for n in l.nodes] for _, c, _ in computations
+    }
+
     current_mapping = {}  # Type: Dict[str, str]
     i = 0
     while len(current_mapping) != len(computations):
@@ -127,16 +135,15 @@ def distribute(
             footprint,
         )
         # look for cancidiate agents for computation c
-        # TODO: keep a list of remaining capacities for agents ?
         if candidates is None:
             candidates = candidate_hosts(
                 computation,
                 footprint,
-                computations,
+                neighbours[computation.name],
                 agentsdef,
                 communication_load,
                 current_mapping,
-                fixed_mapping,
+                remaining_capacity,
             )
             computations[i] = footprint, computation, candidates
         logger.debug("Candidates for computation %s : %s", computation.name, candidates)
@@ -153,19 +160,22 @@ def distribute(
 
             # no candidate : backtrack !
             i -= 1
+            previous_footprint, previous, _ = computations[i]
             logger.info(
                 "No candidate for %s, backtrack placement "
                 "of computation %s (was on %s",
                 computation.name,
-                computations[i][1].name,
-                current_mapping[computations[i][1].name],
+                previous.name,
+                current_mapping[previous.name],
             )
-            current_mapping.pop(computations[i][1].name)
+            agt = current_mapping.pop(previous.name)
+            remaining_capacity[agt] += previous_footprint
 
             # FIXME : eliminate selected agent for previous computation
         else:
-            _, selected = candidates.pop()
+            _, _, _, selected = heapq.heappop(candidates)
             current_mapping[computation.name] = selected.name
+            remaining_capacity[selected.name] -= footprint
             computations[i] = footprint, computation, candidates
             logger.debug(
                 "Place computation %s on agent %s", computation.name, selected.name
@@ -199,20 +209,75 @@ def distribution_cost(
     )
 
 
+def zero_cost_hosts(
+    computations: Iterable[str], agents: List[AgentDef]
+) -> Dict[str, str]:
+    """
+    Find the first agent with a zero hosting cost for each computation.
+
+    Parameters
+    ----------
+    computations: iterable of str
+        names of the computations
+    agents: list of AgentDef
+        the agents, in the order they are considered
+
+    Returns
+    -------
+    dict:
+        the name of the first agent, in `agents`, whose hosting cost is 0,
+        for each computation that has such an agent.
+
+    Examples
+    --------
+
+    >>> agents = [AgentDef("a1", default_hosting_cost=1, hosting_costs={"c2": 0}),
+    ...           AgentDef("a2", hosting_costs={"c1": 3})]
+    >>> zero_cost_hosts(["c1", "c2", "c3"], agents)
+    {'c2': 'a1', 'c3': 'a2'}
+    """
+    # Instead of calling hosting_cost for every agent and computation, only look
+    # at agents with an explicit zero cost and at agents with a zero default
+    # cost.
+    explicit_zeros = {}
+    for index, agt in enumerate(agents):
+        for comp, cost in agt.hosting_costs.items():
+            if cost == 0 and comp not in explicit_zeros:
+                explicit_zeros[comp] = index
+    default_zeros = [
+        (index, agt)
+        for index, agt in enumerate(agents)
+        if agt.default_hosting_cost == 0
+    ]
+
+    hosts = {}
+    for comp in computations:
+        host = explicit_zeros.get(comp)
+        for index, agt in default_zeros:
+            if host is not None and index > host:
+                break
+            if comp not in agt.hosting_costs:
+                host = index
+                break
+        if host is not None:
+            hosts[comp] = agents[host].name
+    return hosts
+
+
 def candidate_hosts(
     computation: ComputationNode,
     footprint: float,
-    computations: List[Tuple],
+    neighbours: List[str],
     agents: Iterable[AgentDef],
     communication_load: Callable[[ComputationNode, str], float],
     mapping: Dict[str, str],
-    fixed_mapping: Dict[str, Tuple[str, float]],
-):
+    remaining_capacity: Dict[str, float],
+) -> List[Tuple[float, float, int, AgentDef]]:
     """
     Build a list of candidate agents for a computation.
 
     The list includes agents that have enough capacity to host this computation
-    and is sorted by cost (cheapest cost) where cost is the aggregated
+    and is a heap sorted by cost (cheapest cost first) where cost is the aggregated
     hosting and communication cost incurred by hosting the computation on that agent,
     according to the computation that have been already distributed.
     This means that the first computations are mostly placed depending on their
@@ -221,50 +286,52 @@ def candidate_hosts(
 
     Parameters
     ----------
-    computation
-    footprint
-    computations
-    agents
-    communication_load
-    mapping
+    computation: ComputationNode
+        the computation to place
+    footprint: float
+        the footprint of the computation
+    neighbours: list of str
+        the names of the computations in the links of `computation`
+    agents: iterable of AgentDef
+        the agents
+    communication_load: callable
+        the communication load between two computations
+    mapping: dict
+        the agent of each computation that has already been placed
+    remaining_capacity: dict
+        the capacity left on each agent, with the current mapping
 
     Returns
     -------
-
+    list:
+        a heap of ``(cost, random, index, agent)`` tuples, use `heapq.heappop` to
+        get the cheapest agent.
     """
+    # Communication loads do not depend on the candidate agent
+    placed_neighbours = [
+        (communication_load(computation, n), mapping[n])
+        for n in neighbours
+        if n in mapping
+    ]
+
     candidates = []
     for agt in agents:
-        # Compute remaining capacity for agt, to check if it as enough place
-        # left. Only keep agents that have enough capacity.
-        capa = agt.capacity
-        for c, a in mapping.items():
-            if a == agt.name:
-                c_footprint = next(f for f, comp, _ in computations if comp.name == c)
-                capa -= c_footprint
-        for c, (a, f) in fixed_mapping.items():
-            if a == agt.name:
-                capa -= f
-
-        if capa < footprint:
+        # Only keep agents that have enough capacity left.
+        if remaining_capacity[agt.name] < footprint:
             continue
 
         # compute cost of assigning computation to agt
         hosting_cost = agt.hosting_cost(computation.name)
         comm_cost = 0
-        for l in computation.links:
-            for n in l.nodes:
-                if n in mapping:
-                    comm_cost += communication_load(computation, n) * agt.route(
-                        mapping[n]
-                    )
+        for load, neighbour_agent in placed_neighbours:
+            comm_cost += load * agt.route(neighbour_agent)
         cost = RATIO_HOST_COMM * comm_cost + (1 - RATIO_HOST_COMM) * hosting_cost
         candidates.append((cost, agt))
 
     # Avoid sorting ties by name by adding a random element in the tuple.
     # Otherwise, when agents have the same capacity, agents with names sorted first
     # will always get more computations.
-    candidates = [(c, a, random.random()) for c, a in candidates]
-    candidates.sort(key=lambda o: (o[0], o[2]), reverse=True)
-    candidates = [t[:-1] for t in candidates]
+    candidates = [(c, random.random(), i, a) for i, (c, a) in enumerate(candidates)]
+    heapq.heapify(candidates)
 
     return candidates
@@ -53,10 +53,12 @@ does no use the distribution hints (if some are given, they are just ignored).
 
 
 import logging
+import time
 from typing import Callable, Iterable
 from itertools import combinations
 
-from pulp.constants import LpBinary, LpMinimize, LpStatusOptimal
+from pulp.constants import LpBinary, LpMinimize, LpStatusOptimal, \
+    LpStatusUndefined
 from pulp.pulp import LpVariable, LpProblem, lpSum, value, \
     LpAffineExpression
 from pulp.solvers import GLPK_CMD
@@ -64,6 +66,7 @@ from pulp.solvers import GLPK_CMD
 from pydcop.computations_graph.objects import ComputationGraph, Link, \
     ComputationNode
 from pydcop.dcop.objects import AgentDef
+from pydcop.distribution._decomposition import distribute_by_parts
 from pydcop.distribution.objects import DistributionHints, \
     ImpossibleDistributionException, Distribution
 
@@ -80,10 +83,13 @@ def distribute(computation_graph: ComputationGraph,
                agentsdef: Iterable[AgentDef],
                hints: DistributionHints=None,
                computation_memory=None,
-               communication_load=None) -> Distribution:
+               communication_load=None,
+               timeout=600) -> Distribution:
     """
     Generate a distribution for the given computation graph.
 
+    Large computation graphs are split into sub-problems solved in parallel,
+    see `pydcop.distribution._decomposition`.
 
     :param computation_graph: a ComputationGraph
     :param agentsdef: agents' definitions
@@ -92,8 +98,21 @@ def distribute(computation_graph: ComputationGraph,
     Link node as  arguments and return the memory footprint for this node
     :param communication_load: a function that takes a Link as an argument
       and return the communication cost of this edge
+    :param timeout: timeout for the distribution, in seconds
     """
-
+    return distribute_by_parts(_distribute_part, computation_graph, agentsdef,
+                               hints=hints,
+                               computation_memory=computation_memory,
+                               communication_load=communication_load,
+                               timeout=timeout)
+
+
+def _distribute_part(computation_graph: ComputationGraph,
+                     agentsdef: Iterable[AgentDef],
+                     hints: DistributionHints=None,
+                     computation_memory=None,
+                     communication_load=None,
+                     timeout=600) -> Distribution:
     footprint = footprint_fonc(computation_graph, computation_memory)
     capacity = capacity_fonc(agentsdef)
     route = route_fonc(agentsdef)
@@ -101,7 +120,7 @@ def distribute(computation_graph: ComputationGraph,
     hosting_cost = hosting_cost_func(agentsdef)
 
     mapping = lp_model(computation_graph, agentsdef, footprint, capacity, route,
-                       msg_load, hosting_cost)
+                       msg_load, hosting_cost, timeout=timeout)
     dist = Distribution(mapping)
 
     return dist
@@ -142,7 +161,9 @@ def lp_model(cg: ComputationGraph,
              capacity: Callable[[str], float],
              route: Callable[[str, str], float],
              msg_load: Callable[[str, str], float],
-             hosting_cost: Callable[[str, str], float]):
+             hosting_cost: Callable[[str, str], float],
+             timeout=600):
+    start_t = time.time()
 
     comp_names = [n.name for n in cg.nodes]
     agt_names = [a.name for a in agentsdef]
@@ -191,10 +212,17 @@ def lp_model(cg: ComputationGraph,
         pb += lpSum([xs[c, a] for a in agt_names]) == 1, \
             'Computation {} hosted'.format(c)
 
+    # the timeout for the solver must be minored by the time spent to build
+    # the pb:
+    remaining_time = max(1, round(timeout - (time.time() - start_t)) - 2)
     # solve using GLPK
-    status = pb.solve(solver=GLPK_CMD(keepFiles=1, msg=False,
-                                      options=['--pcost']))
+    status = pb.solve(solver=GLPK_CMD(keepFiles=0, msg=False,
+                                      options=['--pcost',
+                                               '--tmlim', str(remaining_time)]))
 
+    if status == LpStatusUndefined:
+        # Generally means we have reach the timeout.
+        raise TimeoutError('Could not find solution in {}'.format(timeout))
     if status != LpStatusOptimal:
         raise ImpossibleDistributionException("No possible optimal"
                                               " distribution ")
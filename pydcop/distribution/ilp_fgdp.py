@@ -30,15 +30,17 @@
 
 
 import logging
+import time
 from collections import defaultdict
 from itertools import combinations
 from typing import List, Iterable, Dict, Callable
 
 from pulp import LpMinimize, LpVariable, LpProblem, LpBinary, lpSum, \
-    GLPK_CMD, value, LpStatusOptimal
+    GLPK_CMD, value, LpStatusOptimal, LpStatusUndefined
 
 from pydcop.computations_graph.factor_graph import ComputationsFactorGraph
 from pydcop.dcop.objects import AgentDef
+from pydcop.distribution._decomposition import distribute_by_parts
 
 logger = logging.getLogger('distribution.ilpfgdp')
 
@@ -69,10 +71,14 @@ def distribute(computation_graph: ComputationGraph,
                agentsdef: Iterable[AgentDef],
                hints: DistributionHints=None,
                computation_memory=None,
-               communication_load=None):
+               communication_load=None,
+               timeout=600):
     """
     Generate a distribution for the dcop.
 
+    Large computation graphs are split into sub-problems solved in parallel,
+    see `pydcop.distribution._decomposition`.
+
     :param computation_graph: a ComputationGraph
     :param agentsdef: the agents definitions
     :param hints: a DistributionHints
@@ -80,11 +86,25 @@ def distribute(computation_graph: ComputationGraph,
       argument and return the memory footprint for this
     :param link_communication: a function that takes a Link as an argument 
       and return the communication cost of this edge
+    :param timeout: timeout for the distribution, in seconds
     """
     if computation_memory is None or communication_load is None:
         raise ImpossibleDistributionException('LinearProg distribution requires '
                          'computation_memory and link_communication functions')
 
+    return distribute_by_parts(_distribute_part, computation_graph, agentsdef,
+                               hints=hints,
+                               computation_memory=computation_memory,
+                               communication_load=communication_load,
+                               timeout=timeout)
+
+
+def _distribute_part(computation_graph: ComputationGraph,
+                     agentsdef: Iterable[AgentDef],
+                     hints: DistributionHints=None,
+                     computation_memory=None,
+                     communication_load=None,
+                     timeout=600):
     agents = list(agentsdef)
 
     # In order to remove (latter on) distribution hints, we interpret
@@ -97,7 +117,8 @@ def distribute(computation_graph: ComputationGraph,
     logger.debug(f"Must host: {must_host}")
 
     return factor_graph_lp_model(computation_graph, agents, must_host,
-                                 computation_memory, communication_load)
+                                 computation_memory, communication_load,
+                                 timeout=timeout)
 
 
 def distribution_cost(distribution: Distribution,
@@ -162,7 +183,8 @@ def factor_graph_lp_model(cg: ComputationsFactorGraph,
                           agents: List[AgentDef],
                           must_host: Dict[str, List],
                           computation_memory=None,
-                          communication_load=None):
+                          communication_load=None,
+                          timeout=600):
     """
     To distribute we need:
     * com : the communication cost of an edge between a var and a fact
@@ -177,6 +199,7 @@ def factor_graph_lp_model(cg: ComputationsFactorGraph,
 
     :return:
     """
+    start_t = time.time()
     variables = [n for n in cg.nodes if n.type == 'VariableComputation']
     factors = [n for n in cg.nodes if n.type == 'FactorComputation']
 
@@ -276,8 +299,16 @@ def factor_graph_lp_model(cg: ComputationsFactorGraph,
     # status = pb.solve(GLPK_CMD(mip=1))
     # status = pb.solve(GLPK_CMD(mip=0, keepFiles=1,
     #                                options=['--simplex', '--interior']))
-    status = pb.solve(GLPK_CMD(keepFiles=0, msg=False, options=['--pcost']))
-
+    # the timeout for the solver must be minored by the time spent to build
+    # the pb:
+    remaining_time = max(1, round(timeout - (time.time() - start_t)) - 2)
+    status = pb.solve(GLPK_CMD(keepFiles=0, msg=False,
+                               options=['--pcost',
+                                        '--tmlim', str(remaining_time)]))
+
+    if status == LpStatusUndefined:
+        # Generally means we have reach the timeout.
+        raise TimeoutError('Could not find solution in {}'.format(timeout))
     if status != LpStatusOptimal:
         raise ImpossibleDistributionException("No possible optimal"
                                               " distribution ")
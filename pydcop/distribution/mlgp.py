@@ -0,0 +1,528 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+MLGP : MultiLevel Graph Partitioning
+
+Distribution method for large computation graphs, based on multilevel k-way
+graph partitioning: the computation graph is partitioned into one part for each
+agent, minimizing the communication load between parts while respecting agents'
+capacity.
+
+The communication load between computations is used as edge weight and the
+memory footprint of computations as node weights, which must fit in the
+capacity of the agent hosting the part. Route costs and hosting costs are used,
+with the same ratio as ``gh_cgdp``, when selecting the agent of a part.
+
+Algorithm:
+
+* coarsening: the graph is repeatedly contracted, by merging computations
+  connected by heavy edges (heavy-edge matching), until it is small enough
+  compared to the number of agents.
+* initial partition: computations of the coarsest graph are placed by growing
+  parts, starting with the heaviest computation and then always placing the
+  computation that is the most connected to already placed computations on the
+  cheapest agent with enough capacity left.
+* refinement: the partition is projected back on each finer graph and improved
+  by moving computations on the border of parts to the agent of one of their
+  neighbours, when this reduces the cost and the agent has enough capacity.
+
+Computations with an explicit hosting cost of 0 on an agent are fixed on that
+agent (on the first one if there are several, like with ``gh_cgdp``) and never
+merged with computations fixed on another agent. Unlike ``gh_cgdp``, a default
+hosting cost of 0 does not fix computations.
+
+The partition is computed in time roughly linear in the size of the graph,
+which makes this method usable for computation graphs with millions of
+computations, where the greedy and ILP methods do not finish.
+
+"""
+import heapq
+import logging
+import random
+from collections import defaultdict
+from typing import Iterable, Callable, Dict, List, Optional
+
+from pydcop.computations_graph.objects import ComputationNode, ComputationGraph
+from pydcop.dcop.objects import AgentDef
+from pydcop.distribution import oilp_cgdp
+from pydcop.distribution.objects import Distribution, ImpossibleDistributionException
+
+logger = logging.getLogger("distribution.mlgp")
+
+
+# Weight factors when aggregating communication costs and hosting costs in the
+# objective function.
+# the global objective is built as Comm_cost * RATIO + Hosting_cost * (1-RATIO)
+RATIO_HOST_COMM = oilp_cgdp.RATIO_HOST_COMM
+
+# Coarsening stops when the graph has less than COARSEST_SIZE nodes per agent
+# (or less than MIN_COARSEST_SIZE nodes), or when a step merges less than
+# MIN_COARSENING_RATE of the nodes.
+COARSEST_SIZE = 4
+MIN_COARSEST_SIZE = 20
+MIN_COARSENING_RATE = 0.05
+
+# Maximum number of refinement passes on each level
+REFINEMENT_PASSES = 4
+
+
+def distribute(
+    computation_graph: ComputationGraph,
+    agentsdef: Iterable[AgentDef],
+    hints=None,
+    computation_memory: Callable[[ComputationNode], float] = None,
+    communication_load: Callable[[ComputationNode, str], float] = None,
+    timeout=None,  # not used
+) -> Distribution:
+    """
+    mlgp distribution method.
+
+    Multilevel k-way partitioning of the computation graph, minimizing
+    communication and hosting costs while respecting agents' capacities.
+
+    Parameters
+    ----------
+    computation_graph: ComputationGraph
+        the computation graph to distribute
+    agentsdef: iterable of AgentDef
+        the agents, with their capacity, route and hosting costs
+    hints
+        not used
+    computation_memory: callable
+        memory footprint of a computation
+    communication_load: callable
+        communication load between two computations
+
+    Returns
+    -------
+    Distribution:
+        The distribution for the computation graph.
+
+    Raises
+    ------
+    ImpossibleDistributionException
+        if no distribution respecting agents' capacity could be found.
+    """
+    if computation_memory is None or communication_load is None:
+        raise ImpossibleDistributionException(
+            "mlgp distribution requires computation_memory and "
+            "communication_load functions"
+        )
+
+    agents = _Agents(agentsdef)
+    graph = _build_graph(computation_graph, computation_memory, communication_load)
+
+    graph.hosting = _hosting_costs(graph.names, agents)
+    for i, hosting in enumerate(graph.hosting):
+        zeros = [a for a, cost in hosting.items() if cost == 0]
+        if zeros:
+            graph.fixed[i] = min(zeros)
+
+    # Coarsening: levels[0] is the original graph, levels[-1] the coarsest one.
+    levels = [graph]
+    target = max(MIN_COARSEST_SIZE, COARSEST_SIZE * len(agents))
+    while len(levels[-1]) > target:
+        coarse = _coarsen(levels[-1], agents)
+        if len(coarse) > (1 - MIN_COARSENING_RATE) * len(levels[-1]):
+            break
+        levels.append(coarse)
+    logger.info(
+        "Coarsened computation graph in %s levels: %s",
+        len(levels),
+        [len(g) for g in levels],
+    )
+
+    partition = _initial_partition(levels[-1], agents)
+    _refine(levels[-1], agents, partition)
+
+    # Uncoarsening: project the partition on each finer graph and refine it.
+    for finer in reversed(levels[:-1]):
+        partition = [partition[p] for p in finer.parents]
+        _refine(finer, agents, partition)
+
+    loads = _loads(graph, agents, partition)
+    overloaded = [
+        agents.names[a] for a in range(len(agents)) if loads[a] > agents.capacity[a]
+    ]
+    if overloaded:
+        raise ImpossibleDistributionException(
+            f"Impossible Distribution, capacity exceeded on agents {overloaded}"
+        )
+
+    agt_mapping = defaultdict(lambda: [])
+    for i, a in enumerate(partition):
+        agt_mapping[agents.names[a]].append(graph.names[i])
+    return Distribution(agt_mapping)
+
+
+def distribution_cost(
+    distribution: Distribution,
+    computation_graph: ComputationGraph,
+    agentsdef: Iterable[AgentDef],
+    computation_memory: Callable[[ComputationNode], float],
+    communication_load: Callable[[ComputationNode, str], float],
+) -> float:
+    return oilp_cgdp.distribution_cost(
+        distribution,
+        computation_graph,
+        agentsdef,
+        computation_memory,
+        communication_load,
+    )
+
+
+class _Agents(object):
+    """
+    Agents, indexed by position, with a cache for route costs.
+    """
+
+    def __init__(self, agentsdef: Iterable[AgentDef]):
+        self.defs = list(agentsdef)
+        self.names = [a.name for a in self.defs]
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.capacity = [a.capacity for a in self.defs]
+        self.default_hosting = [a.default_hosting_cost for a in self.defs]
+        self.max_capacity = max(self.capacity) if self.capacity else 0
+        self._routes = {}
+
+    def __len__(self):
+        return len(self.defs)
+
+    def route(self, a1: int, a2: int) -> float:
+        if a1 == a2:
+            return 0
+        try:
+            return self._routes[(a1, a2)]
+        except KeyError:
+            cost = self.defs[a1].route(self.names[a2])
+            self._routes[(a1, a2)] = cost
+            return cost
+
+
+class _Graph(object):
+    """
+    Weighted undirected graph used for partitioning.
+
+    Nodes are indexes. For a coarse graph, `parents` is defined on the finer
+    graph and gives, for each node of the finer graph, the index of the node it
+    was merged into.
+    """
+
+    def __init__(self, size: int):
+        self.names = []  # type: List[str]
+        self.weights = [0] * size
+        # Number of computations of the original graph merged in each node
+        self.counts = [1] * size
+        self.adjacency = [dict() for _ in range(size)]  # type: List[Dict[int, float]]
+        self.fixed = [None] * size  # type: List[Optional[int]]
+        # Hosting cost of each node, for agents whose cost is not the default
+        # hosting cost.
+        self.hosting = [dict() for _ in range(size)]  # type: List[Dict[int, float]]
+        self.parents = None  # type: List[int]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def hosting_cost(self, node: int, agent: int, agents: _Agents) -> float:
+        try:
+            return self.hosting[node][agent]
+        except KeyError:
+            return agents.default_hosting[agent] * self.counts[node]
+
+
+def _build_graph(
+    computation_graph: ComputationGraph,
+    computation_memory: Callable[[ComputationNode], float],
+    communication_load: Callable[[ComputationNode, str], float],
+) -> _Graph:
+    nodes = list(computation_graph.nodes)
+    graph = _Graph(len(nodes))
+    graph.names = [n.name for n in nodes]
+    index = {n: i for i, n in enumerate(graph.names)}
+    for i, node in enumerate(nodes):
+        graph.weights[i] = computation_memory(node)
+        # As we support hypergraph, a link may have more than 2 ends.
+        # Loads are added in both directions to get an undirected graph.
+        for link in node.links:
+            for neighbour in link.nodes:
+                if neighbour == node.name:
+                    continue
+                j = index[neighbour]
+                load = communication_load(node, neighbour)
+                graph.adjacency[i][j] = graph.adjacency[i].get(j, 0) + load
+                graph.adjacency[j][i] = graph.adjacency[j].get(i, 0) + load
+    # Each link has been visited from both ends.
+    for adjacency in graph.adjacency:
+        for j in adjacency:
+            adjacency[j] /= 2
+    return graph
+
+
+def _hosting_costs(names: List[str], agents: _Agents) -> List[Dict[int, float]]:
+    # Only look at explicit hosting costs, other costs are the agent's default
+    # hosting cost.
+    index = {n: i for i, n in enumerate(names)}
+    hosting = [dict() for _ in names]
+    for a, agt in enumerate(agents.defs):
+        for comp, cost in agt.hosting_costs.items():
+            if comp in index:
+                hosting[index[comp]][a] = cost
+    return hosting
+
+
+def _coarsen(graph: _Graph, agents: _Agents) -> _Graph:
+    """
+    Build a coarser graph by heavy-edge matching.
+
+    Nodes are visited in random order and each unmatched node is merged with the
+    unmatched neighbour it has the heaviest edge with, unless the merged node
+    would not fit on any agent or the two nodes are fixed on different agents.
+    """
+    order = list(range(len(graph)))
+    random.shuffle(order)
+    parents = [-1] * len(graph)
+    count = 0
+    for i in order:
+        if parents[i] != -1:
+            continue
+        best, best_weight = None, None
+        for j, weight in graph.adjacency[i].items():
+            if parents[j] != -1:
+                continue
+            if graph.weights[i] + graph.weights[j] > agents.max_capacity:
+                continue
+            if (
+                graph.fixed[i] is not None
+                and graph.fixed[j] is not None
+                and graph.fixed[i] != graph.fixed[j]
+            ):
+                continue
+            if best_weight is None or weight > best_weight:
+                best, best_weight = j, weight
+        parents[i] = count
+        if best is not None:
+            parents[best] = count
+        count += 1
+    graph.parents = parents
+
+    coarse = _Graph(count)
+    coarse.counts = [0] * count
+    for i, p in enumerate(parents):
+        coarse.weights[p] += graph.weights[i]
+        coarse.counts[p] += graph.counts[i]
+        if graph.fixed[i] is not None:
+            coarse.fixed[p] = graph.fixed[i]
+        for j, weight in graph.adjacency[i].items():
+            q = parents[j]
+            if q != p:
+                coarse.adjacency[p][q] = coarse.adjacency[p].get(q, 0) + weight
+        for a in graph.hosting[i]:
+            coarse.hosting[p][a] = 0
+
+    # The explicit hosting cost of a merged node is the sum of the hosting
+    # costs of its nodes, some of which may be default hosting costs.
+    for i, p in enumerate(parents):
+        for a in coarse.hosting[p]:
+            coarse.hosting[p][a] += graph.hosting_cost(i, a, agents)
+    return coarse
+
+
+def _initial_partition(graph: _Graph, agents: _Agents) -> List[int]:
+    """
+    Partition the graph by growing parts.
+
+    Fixed nodes are placed first. Then the unplaced node most connected to
+    already placed nodes (the heaviest one when there is no such node) is
+    placed on the cheapest agent with enough capacity left, until all nodes are
+    placed. If no agent has enough capacity left, the node is placed on the agent
+    with the most capacity left and refinement will try to move it elsewhere.
+    """
+    partition = [None] * len(graph)  # type: List[Optional[int]]
+    loads = [0] * len(agents)
+    connectivity = [0] * len(graph)
+    for i, a in enumerate(graph.fixed):
+        if a is not None:
+            partition[i] = a
+            loads[a] += graph.weights[i]
+            for j, weight in graph.adjacency[i].items():
+                connectivity[j] += weight
+
+    # Heap of unplaced nodes, entries whose connectivity is outdated are skipped.
+    # Avoid sorting ties by name by adding a random element in the tuple.
+    heap = [
+        (-connectivity[i], -graph.weights[i], random.random(), i)
+        for i in range(len(graph))
+        if partition[i] is None
+    ]
+    heapq.heapify(heap)
+    # The coarsest graph is small: all agents are candidates.
+    all_agents = range(len(agents))
+    while heap:
+        conn, _, _, i = heapq.heappop(heap)
+        if partition[i] is not None or -conn != connectivity[i]:
+            continue
+        selected = _cheapest_agent(graph, agents, partition, loads, i, all_agents)
+        if selected is None:
+            selected = _most_available(agents, loads)
+            logger.debug(
+                "No agent with enough capacity for %s, overloading %s",
+                i,
+                agents.names[selected],
+            )
+        partition[i] = selected
+        loads[selected] += graph.weights[i]
+        for j, weight in graph.adjacency[i].items():
+            if partition[j] is None:
+                connectivity[j] += weight
+                heapq.heappush(
+                    heap, (-connectivity[j], -graph.weights[j], random.random(), j)
+                )
+    return partition
+
+
+def _refine(graph: _Graph, agents: _Agents, partition: List[int]):
+    """
+    Improve a partition, in place, by moving nodes to other agents.
+
+    Nodes on the border of parts (or with explicit hosting costs) are moved to
+    the cheapest agent of one of their neighbours, if this agent has enough
+    capacity and the move reduces the cost. Nodes on overloaded agents are moved
+    to the cheapest agent with enough capacity, even if the cost increases.
+    """
+    loads = _loads(graph, agents, partition)
+    for _ in range(REFINEMENT_PASSES):
+        order = list(range(len(graph)))
+        random.shuffle(order)
+        moved = 0
+        for i in order:
+            if graph.fixed[i] is not None:
+                continue
+            current = partition[i]
+            overloaded = loads[current] > agents.capacity[current]
+            neighbour_loads = _neighbour_loads(graph, partition, i)
+            candidates = set(neighbour_loads)
+            candidates.update(graph.hosting[i])
+            if overloaded:
+                candidates.add(_most_available(agents, loads))
+            candidates.discard(current)
+            if not candidates:
+                continue
+
+            if overloaded:
+                max_cost = None
+            else:
+                max_cost = _cost(graph, agents, neighbour_loads, i, current)
+            selected = _cheapest_agent(
+                graph, agents, partition, loads, i, candidates, max_cost
+            )
+            if selected is not None:
+                partition[i] = selected
+                loads[current] -= graph.weights[i]
+                loads[selected] += graph.weights[i]
+                moved += 1
+        logger.debug("Refinement pass on %s nodes: %s moves", len(graph), moved)
+        if not moved:
+            break
+
+
+def _loads(graph: _Graph, agents: _Agents, partition: List[int]) -> List[float]:
+    loads = [0] * len(agents)
+    for i, a in enumerate(partition):
+        loads[a] += graph.weights[i]
+    return loads
+
+
+def _neighbour_loads(
+    graph: _Graph, partition: List[Optional[int]], node: int
+) -> Dict[int, float]:
+    """
+    Communication load between `node` and its placed neighbours, for each agent
+    hosting some of these neighbours.
+    """
+    neighbour_loads = defaultdict(float)
+    for j, weight in graph.adjacency[node].items():
+        if partition[j] is not None:
+            neighbour_loads[partition[j]] += weight
+    return neighbour_loads
+
+
+def _most_available(agents: _Agents, loads: List[float]) -> int:
+    # Random tie-break: otherwise agents sorted first would always be selected
+    return max(
+        range(len(agents)),
+        key=lambda a: (agents.capacity[a] - loads[a], random.random()),
+    )
+
+
+def _cost(
+    graph: _Graph,
+    agents: _Agents,
+    neighbour_loads: Dict[int, float],
+    node: int,
+    agent: int,
+) -> float:
+    """
+    Aggregated hosting and communication cost of hosting `node` on `agent`.
+    """
+    comm_cost = 0
+    for neighbour_agent, load in neighbour_loads.items():
+        comm_cost += load * agents.route(agent, neighbour_agent)
+    hosting_cost = graph.hosting_cost(node, agent, agents)
+    return RATIO_HOST_COMM * comm_cost + (1 - RATIO_HOST_COMM) * hosting_cost
+
+
+def _cheapest_agent(
+    graph: _Graph,
+    agents: _Agents,
+    partition: List[Optional[int]],
+    loads: List[float],
+    node: int,
+    candidates: Iterable[int],
+    max_cost: float = None,
+) -> Optional[int]:
+    """
+    The cheapest candidate agent with enough capacity left to host `node`, if
+    its cost is lower than `max_cost`.
+    """
+    neighbour_loads = _neighbour_loads(graph, partition, node)
+    selected, selected_key = None, None
+    for agent in candidates:
+        if loads[agent] + graph.weights[node] > agents.capacity[agent]:
+            continue
+        cost = _cost(graph, agents, neighbour_loads, node, agent)
+        if max_cost is not None and cost >= max_cost:
+            continue
+        # Random tie-break: otherwise agents sorted first would always be
+        # selected.
+        key = (cost, random.random())
+        if selected_key is None or key < selected_key:
+            selected, selected_key = agent, key
+    return selected
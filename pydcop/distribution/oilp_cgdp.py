@@ -65,6 +65,7 @@ from pulp import (
 
 from pydcop.computations_graph.objects import ComputationGraph, ComputationNode, Link
 from pydcop.dcop.objects import AgentDef
+from pydcop.distribution._decomposition import distribute_by_parts
 from pydcop.distribution.objects import (
     DistributionHints,
     Distribution,
@@ -89,6 +90,10 @@ def distribute(
     timeout=600,  # Max 10 min
 ) -> Distribution:
     """
+    oilp_cgdp distribution method.
+
+    Large computation graphs are split into sub-problems solved in parallel,
+    see `pydcop.distribution._decomposition`.
 
     Parameters
     ----------
@@ -97,11 +102,32 @@ def distribute(
     hints
     computation_memory
     communication_load
+    timeout
 
     Returns
     -------
-
+    Distribution:
+        The distribution for the computation graph.
     """
+    return distribute_by_parts(
+        _distribute_part,
+        computation_graph,
+        agentsdef,
+        hints=hints,
+        computation_memory=computation_memory,
+        communication_load=communication_load,
+        timeout=timeout,
+    )
+
+
+def _distribute_part(
+    computation_graph: ComputationGraph,
+    agentsdef: Iterable[AgentDef],
+    hints: DistributionHints = None,
+    computation_memory=None,
+    communication_load=None,
+    timeout=600,
+) -> Distribution:
     footprint_f = footprint_fonc(computation_graph, computation_memory)
     capacity_f = capacity_fonc(agentsdef)
     route_f = route_fonc(agentsdef)
@@ -253,7 +279,7 @@ def ilp_cgdp(
         )
 
     # the timeout for the solver must be minored by the time spent to build the pb:
-    remaining_time = round(timeout - (time.time() - start_t)) -2
+    remaining_time = max(1, round(timeout - (time.time() - start_t)) - 2)
     # solve using GLPK
     try:
         status = pb.solve(solver=GLPK_CMD(keepFiles=0, msg=False, options=["--pcost", "--tmlim", str(remaining_time)]))
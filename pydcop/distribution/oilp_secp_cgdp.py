@@ -59,6 +59,7 @@ from pulp import (
     LpProblem,
     lpSum,
     LpStatusOptimal,
+    LpStatusUndefined,
     GLPK_CMD,
     pulp,
     LpAffineExpression,
@@ -69,6 +70,7 @@ from pydcop.computations_graph.constraints_hypergraph import (
 )
 from pydcop.computations_graph.objects import ComputationNode
 from pydcop.dcop.objects import AgentDef
+from pydcop.distribution._decomposition import distribute_by_parts
 from pydcop.distribution.objects import Distribution, ImpossibleDistributionException
 from pydcop.distribution.oilp_secp_fgdp import (
     secp_dist_objective_function,
@@ -92,6 +94,27 @@ def distribute(
             "computation_memory and link_communication functions"
         )
 
+    # Large graphs are split into sub-problems solved in parallel.
+    return distribute_by_parts(
+        _distribute_part,
+        computation_graph,
+        agentsdef,
+        hints=hints,
+        computation_memory=computation_memory,
+        communication_load=communication_load,
+        timeout=timeout,
+    )
+
+
+def _distribute_part(
+    computation_graph: ComputationConstraintsHyperGraph,
+    agentsdef: Iterable[AgentDef],
+    hints=None,
+    computation_memory: Callable[[ComputationNode], float] = None,
+    communication_load: Callable[[ComputationNode, str], float] = None,
+    timeout=600,
+) -> Distribution:
+    start_t = time.time()
     mapping = defaultdict(lambda: [])
     agents_capa = {a.name: a.capacity for a in agentsdef}
     computations = computation_graph.node_names()
@@ -121,6 +144,7 @@ def distribute(
         Distribution(mapping),
         computation_memory,
         communication_load,
+        timeout=timeout - (time.time() - start_t),
     )
 
 
@@ -277,11 +301,14 @@ def cg_secp_ilp(
 
 
     # the timeout for the solver must be monierd by the time spent to build the pb:
-    remaining_time = round(timeout - (time.time() - start_t)) -2
+    remaining_time = max(1, round(timeout - (time.time() - start_t)) - 2)
 
     # Now solve our LP
     status = pb.solve(GLPK_CMD(keepFiles=0, msg=False, options=["--pcost",  "--tmlim", str(remaining_time)]))
 
+    if status == LpStatusUndefined:
+        # Generally means we have reach the timeout.
+        raise TimeoutError(f"Could not find solution in {timeout}")
     if status != LpStatusOptimal:
         raise ImpossibleDistributionException("No possible optimal" " distribution ")
     else:
@@ -54,6 +54,7 @@ from pulp import (
     LpProblem,
     GLPK_CMD,
     LpStatusOptimal,
+    LpStatusUndefined,
     pulp,
 )
 
@@ -64,6 +65,7 @@ from pydcop.computations_graph.factor_graph import (
 )
 from pydcop.computations_graph.objects import ComputationNode
 from pydcop.dcop.objects import AgentDef
+from pydcop.distribution._decomposition import distribute_by_parts
 from pydcop.distribution.objects import ImpossibleDistributionException, Distribution
 
 logger = logging.getLogger("distribution.oilp_secp_fgdp")
@@ -83,6 +85,27 @@ def distribute(
             "computation_memory and link_communication functions"
         )
 
+    # Large graphs are split into sub-problems solved in parallel.
+    return distribute_by_parts(
+        _distribute_part,
+        computation_graph,
+        agentsdef,
+        hints=hints,
+        computation_memory=computation_memory,
+        communication_load=communication_load,
+        timeout=timeout,
+    )
+
+
+def _distribute_part(
+    computation_graph: ComputationsFactorGraph,
+    agentsdef: Iterable[AgentDef],
+    hints=None,
+    computation_memory: Callable[[ComputationNode], float] = None,
+    communication_load: Callable[[ComputationNode, str], float] = None,
+    timeout=600,
+) -> Distribution:
+    start_t = time.time()
     mapping = defaultdict(lambda: [])
     agents_capa = {a.name: a.capacity for a in agentsdef}
     variable_computations, factor_computations = [], []
@@ -128,6 +151,7 @@ def distribute(
         Distribution(mapping),
         computation_memory,
         communication_load,
+        timeout=timeout - (time.time() - start_t),
     )
 
 
@@ -308,11 +332,14 @@ def fg_secp_ilp(
                     pb += alphas[((i, j), k)] == 0
 
     # the timeout for the solver must be minored by the time spent to build the pb:
-    remaining_time = round(timeout - (time.time() - start_t)) - 2
+    remaining_time = max(1, round(timeout - (time.time() - start_t)) - 2)
 
     # Now solve our LP
     status = pb.solve(GLPK_CMD(keepFiles=0, msg=False, options=["--pcost",  "--tmlim", str(remaining_time)]))
 
+    if status == LpStatusUndefined:
+        # Generally means we have reach the timeout.
+        raise TimeoutError(f"Could not find solution in {timeout}")
     if status != LpStatusOptimal:
         raise ImpossibleDistributionException("No possible optimal" " distribution ")
     else:
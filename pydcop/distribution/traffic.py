@@ -0,0 +1,172 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Traffic profiles.
+
+A traffic profile records the number and the size of the messages actually
+sent on each link between computations during a run of a DCOP algorithm
+(see the ``--dump_traffic`` option of the ``solve`` and ``run`` commands).
+
+It can be used, instead of the estimates given by the algorithm's
+``communication_load`` function, as the communication load between
+computations when distributing them
+(see the ``--traffic_profile`` option of the ``distribute`` command).
+
+"""
+from typing import Any, Callable, Dict, Optional
+
+import yaml
+
+from pydcop.computations_graph.objects import ComputationNode
+
+LinkMetrics = Dict[str, Dict[str, int]]
+
+
+def traffic_profile(agt_metrics: Dict[str, Dict[str, Any]],
+                    inputs: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Build a traffic profile from the metrics of all agents.
+
+    Parameters
+    ----------
+    agt_metrics: dict
+        a map agent name -> agent metrics, as found in the ``agt_metrics``
+        entry of the orchestrator's metrics. Agents' metrics only contain
+        link metrics when they have been enabled (see
+        `Messaging.enable_link_metrics`).
+    inputs: dict
+        optional description of the run the profile was recorded with.
+
+    Returns
+    -------
+    dict
+        the traffic profile, with the number (``count``) and size
+        (``size``) of messages sent on each link, as maps
+        source computation -> destination computation -> value, and the
+        number of cycles (``cycles``) of the run.
+    """
+    count, size, cycles = {}, {}, 0
+    for metrics in agt_metrics.values():
+        _merge(count, metrics.get('count_link_msg', {}))
+        _merge(size, metrics.get('size_link_msg', {}))
+        cycles = max(cycles, max(metrics.get('cycles', {}).values(),
+                                 default=0))
+    profile = {'cycles': cycles, 'count': count, 'size': size}
+    if inputs is not None:
+        profile['inputs'] = inputs
+    return profile
+
+
+def _merge(total: LinkMetrics, link_metrics: LinkMetrics):
+    for src, dests in link_metrics.items():
+        src_total = total.setdefault(src, {})
+        for dest, v in dests.items():
+            src_total[dest] = src_total.get(dest, 0) + v
+
+
+def save_traffic_profile(filename: str, profile: Dict[str, Any]):
+    with open(filename, mode='w', encoding='utf-8') as f:
+        f.write(yaml.dump(profile, default_flow_style=False))
+
+
+def load_traffic_profile(filename: str) -> Dict[str, Any]:
+    with open(filename, mode='r', encoding='utf-8') as f:
+        loaded = yaml.load(f.read(), Loader=yaml.FullLoader)
+    if not isinstance(loaded, dict) or 'size' not in loaded:
+        raise ValueError('Invalid traffic profile file ' + filename)
+    return loaded
+
+
+class ProfileCommunicationLoad(object):
+    """
+    Communication load function based on a traffic profile.
+
+    The load of each link is computed once, when building the function, and
+    stored in a dict. Unlike a closure, instances can be pickled and sent to
+    the processes solving distribution sub-problems (see `_decomposition`).
+
+    Parameters
+    ----------
+    loads: dict
+        the load of each link, as a dict ``{ src: { target: load } }``.
+    default: function
+        optional communication load function, used for computations
+        that are not in `loads`. If not given, the load of their links is 0.
+        It must be picklable when the function is sent to sub-processes.
+    """
+
+    def __init__(
+            self, loads: Dict[str, Dict[str, float]],
+            default: Optional[Callable[[ComputationNode, str], float]] = None):
+        self.loads = loads
+        self.default = default
+
+    def __call__(self, src: ComputationNode, target: str) -> float:
+        try:
+            src_loads = self.loads[src.name]
+        except KeyError:
+            return self.default(src, target) \
+                if self.default is not None else 0
+        return src_loads.get(target, 0)
+
+
+def profile_communication_load(
+        profile: Dict[str, Any],
+        default: Optional[Callable[[ComputationNode, str], float]] = None) \
+        -> Callable[[ComputationNode, str], float]:
+    """
+    Communication load function based on a traffic profile.
+
+    The load of a link is the size of the messages sent on this link during
+    the profiled run, divided by its number of cycles (when there are
+    cycles), to get a load per cycle, comparable to the estimates of
+    algorithms' ``communication_load`` function.
+
+    Parameters
+    ----------
+    profile: dict
+        a traffic profile, see `traffic_profile`.
+    default: function
+        optional communication load function, used for computations
+        that have not sent any message in the profile (e.g. computations
+        that did not exist in the profiled run). If not given, the load
+        of their links is 0.
+
+    Returns
+    -------
+    ProfileCommunicationLoad
+        a function ``communication_load(src: ComputationNode, target: str)``
+        that can be given to distribution methods.
+    """
+    cycles = profile.get('cycles') or 1
+    loads = {src: {target: size / cycles for target, size in targets.items()}
+             for src, targets in profile['size'].items()}
+    return ProfileCommunicationLoad(loads, default)
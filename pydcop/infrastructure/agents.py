@@ -65,7 +65,7 @@ from pydcop.infrastructure.computations import MessagePassingComputation, \
     build_computation
 from pydcop.infrastructure.discovery import Discovery, UnknownComputation, \
     UnknownAgent, _is_technical
-from pydcop.infrastructure.ui import UiServer
+from pydcop.infrastructure.lockstep import LockstepExecutor
 from pydcop.reparation import create_computation_hosted_constraint, \
     create_agent_capacity_constraint, create_agent_hosting_constraint, \
     create_agent_comp_comm_constraint
@@ -108,10 +108,13 @@ class Agent(object):
         runtime.
     daemon: boolean
         indicates if the agent should use a daemon thread (defaults to False)
+    lockstep: LockstepExecutor
+        an optional executor, shared by the agents of the process, that runs
+        the synchronous computations hosted on this agent in lock-step.
 
     See Also
     --------
-    MessagePassingComputation, CommunicationLayer
+    MessagePassingComputation, CommunicationLayer, LockstepExecutor
 
     """
     def __init__(self, name,
@@ -119,7 +122,8 @@ class Agent(object):
                  agent_def: AgentDef=None,
                  ui_port: int=None,
                  delay: float=None,
-                 daemon: bool=False):
+                 daemon: bool=False,
+                 lockstep: LockstepExecutor=None):
         self._name = name
         self.agent_def = agent_def
         self.logger = logging.getLogger('pydcop.agent.' + name)
@@ -139,13 +143,19 @@ class Agent(object):
 
         self.t = Thread(target=self._run, name='thread_'+name)
         self.t.daemon = daemon
+        # Set when running on a CooperativeRuntime instead of our own thread
+        self._runtime = None
+        self._coop_started = False
         self._stopping = threading.Event()
         self._shutdown = threading.Event()
+        # Set once the agent has completely stopped, after unregistration
+        self._terminated = threading.Event()
         self._running = False
         # _idle means that we have finished to handle all incoming messages
         self._idle = False
 
         self._computations = {}  # type: Dict[str, MessagePassingComputation]
+        self._lockstep = lockstep
 
         self.t_active = 0
         # time when run the first non-technical computation is run
@@ -196,17 +206,62 @@ class Agent(object):
         comp_name = computation.name if comp_name is None else comp_name
         self.logger.debug('Add computation %s - %s ',
                           comp_name, self._messaging)
-        computation.message_sender = self._messaging.post_msg
-        computation.periodic_action_handler = self
-        self._computations[comp_name] = computation
+        self._host_computation(computation, comp_name)
         self.discovery.register_computation(comp_name, self.name,self.address,
                                             publish=publish)
 
         # start lookup for agent hosting a neighbor computation
-        if hasattr(computation, 'computation_def') and \
-                computation.computation_def is not None:
-            for n in computation.computation_def.node.neighbors:
-                self.discovery.subscribe_computation(n)
+        for n in _computation_neighbors(computation):
+            self.discovery.subscribe_computation(n)
+
+        event_bus.send("agents.add_computation."+self.name,
+                       (self.name, computation))
+
+    def add_computations(self,
+                         computations: List[MessagePassingComputation],
+                         publish=True):
+        """
+        Add several computations to the agent.
+
+        This is equivalent to calling `add_computation` for each
+        computation, but computations are registered, and their neighbors
+        looked up, with a single discovery message.
+
+        Parameters
+        ----------
+        computations: list of MessagePassingComputation
+            the computations to be added
+        publish: bool
+            True (default) is the computations must be published on the
+            discovery service.
+
+        """
+        self.logger.debug('Add computations %s - %s ',
+                          [c.name for c in computations], self._messaging)
+        for computation in computations:
+            self._host_computation(computation, computation.name)
+        self.discovery.register_computations(
+            [c.name for c in computations], self.name, self.address,
+            publish=publish)
+
+        neighbors = dict.fromkeys(n for c in computations
+                                  for n in _computation_neighbors(c))
+        if neighbors:
+            self.discovery.subscribe_computations(list(neighbors))
+
+        for computation in computations:
+            event_bus.send("agents.add_computation."+self.name,
+                           (self.name, computation))
+
+    def _host_computation(self, computation: MessagePassingComputation,
+                          comp_name: str):
+        if self._lockstep is not None and self._lockstep.accepts(computation):
+            computation.message_sender = self._lockstep.add(
+                computation, self.name, self._messaging)
+        else:
+            computation.message_sender = self._messaging.post_msg
+        computation.periodic_action_handler = self
+        self._computations[comp_name] = computation
 
         if hasattr(computation, '_on_value_selection'):
             computation._on_value_selection = notify_wrap(
@@ -221,9 +276,6 @@ class Agent(object):
             computation.finished,
             partial(self._on_computation_finished, computation.name))
 
-        event_bus.send("agents.add_computation."+self.name,
-                       (self.name, computation))
-
     def remove_computation(self, computation: str) -> None:
         """
         Removes a computation from the agent.
@@ -321,7 +373,7 @@ class Agent(object):
         """
         return self._comm.address
 
-    def start(self):
+    def start(self, runtime=None):
         """
         Starts the agent.
 
@@ -330,16 +382,26 @@ class Agent(object):
 
         Notes
         -----
-        Each agent has it's own thread, this will start the agent's thread,
-        run the _on_start callback and waits for message. Incoming message are
-        added to a queue and handled by calling the _handle_message callback.
+        By default, each agent has it's own thread, this will start the
+        agent's thread, run the _on_start callback and waits for message.
+        Incoming message are added to a queue and handled by calling the
+        _handle_message callback.
+
+        When a `CooperativeRuntime` is given, the agent does not use its own
+        thread but is run on one of the runtime's workers, only when it has
+        messages to handle or periodic actions to run.
 
         The agent (and its thread) will stop  once stop() has been called and
         he has finished handling the current message, if any.
 
+        Parameters
+        ----------
+        runtime: CooperativeRuntime
+            an optional runtime the agent will be run on.
+
         See Also
         --------
-        _on_start(), stop()
+        _on_start(), stop(), CooperativeRuntime
 
         """
         if self.is_running:
@@ -348,7 +410,12 @@ class Agent(object):
         self.logger.info('Starting agent %s ', self.name)
         self._running = True
         self._start_t = perf_counter()
-        self.t.start()
+        if runtime is None:
+            self.t.start()
+        else:
+            self._runtime = runtime
+            self._messaging.on_new_msg = partial(runtime.wake, self)
+            runtime.start_agent(self)
 
     def run(self, computations: Optional[Union[str, List[str]]]=None):
         """
@@ -440,6 +507,8 @@ class Agent(object):
         self.logger.debug('Clean shutdown requested')
         self._shutdown.set()
         self._messaging.shutdown()
+        if self._runtime is not None:
+            self._runtime.wake(self)
 
     def stop(self):
         """
@@ -451,6 +520,8 @@ class Agent(object):
         """
         self.logger.debug('Stop requested on %s', self.name)
         self._stopping.set()
+        if self._runtime is not None:
+            self._runtime.wake(self)
 
     def pause_computations(self, computations: Union[str, Optional[List[str]]]):
         """
@@ -585,7 +656,10 @@ class Agent(object):
         return self._running
 
     def join(self):
-        self.t.join()
+        if self._runtime is None:
+            self.t.join()
+        else:
+            self._terminated.wait()
 
     def _on_start(self):
         """
@@ -610,6 +684,8 @@ class Agent(object):
         self.logger.debug('on_start for {}'.format(self.name))
 
         if self._ui_port:
+            # Only import the ui (and websocket_server) when needed
+            from pydcop.infrastructure.ui import UiServer
             event_bus.enabled = True
             self._ui_server = UiServer(self, self._ui_port)
             self.add_computation(self._ui_server, publish=False)
@@ -672,15 +748,23 @@ class Agent(object):
         if self._ui_server:
             self._ui_server.stop()
 
-        try:
-            # Wait a bit to make sure that the stopped message can reach the
-            # orchestrator before unregistration.
+        # Wait a bit to make sure that the stopped message can reach the
+        # orchestrator before unregistration.
+        if self._runtime is None:
             sleep(0.5)
+            self._unregister_agent()
+        else:
+            # Do not block one of the runtime's workers while waiting.
+            self._runtime.call_later(0.5, self._unregister_agent)
+
+    def _unregister_agent(self):
+        try:
             self.discovery.unregister_agent(self.name)
         except UnreachableAgent:
             # when stopping the agent, the orchestrator / directory might have
             # already left.
             pass
+        self._terminated.set()
 
     def _on_computation_value_changed(self, computation: str, value,
                                       cost, cycle):
@@ -718,7 +802,10 @@ class Agent(object):
             activity_ratio = 0
         else:
             total_t = perf_counter() - self._run_t
-            activity_ratio = self.t_active / (total_t)
+            t_active = self.t_active
+            if self._lockstep is not None:
+                t_active += self._lockstep.active_time(self.name)
+            activity_ratio = t_active / (total_t)
         own_computations = { c.name for c in self.computations(include_technical=True)}
         m = {
             'count_ext_msg': {k: v
@@ -731,6 +818,14 @@ class Agent(object):
             'activity_ratio': activity_ratio,
             'cycles': {c.name: c.cycle_count for c in self.computations()}
         }
+        if self._messaging.count_link_msg is not None:
+            algo_computations = {c.name for c in self.computations()}
+            m['count_link_msg'] = {
+                k: dict(v) for k, v in self._messaging.count_link_msg.items()
+                if k in algo_computations}
+            m['size_link_msg'] = {
+                k: dict(v) for k, v in self._messaging.size_link_msg.items()
+                if k in algo_computations}
         return m
 
     def messages_count(self, computation: str):
@@ -797,42 +892,105 @@ class Agent(object):
                                          "stopping agent thread")
                         break
                 else:
-
-                    current_t = perf_counter()
-                    try:
-                        sender, dest, msg, _ = full_msg
-                        self._idle = False
-                        if not self._stopping.is_set():
-                            self._handle_message(sender, dest, msg, t)
-                    finally:
-                        if self._run_t is not None:
-                            e = perf_counter()
-                            msg_duration = e - current_t
-                            self.t_active += msg_duration
-                            if msg_duration > 1:
-                                self.logger.warning(
-                                    'Long message handling (%s) : %s',
-                                    msg_duration, msg)
+                    self._process_msg(full_msg, t)
 
                 self._process_periodic_action()
 
         except Exception as e:
-            self.logger.error('Thread %s exits With error : %s \n '
-                              'Was handling message %s ',
-                              self.name, e, full_msg)
-            self.logger.error(traceback.format_exc())
-            if hasattr(self, 'on_fatal_error'):
-                self.on_fatal_error(e)
+            self._on_run_error(e, full_msg)
 
         except:  # catch *all* exceptions
             e = sys.exc_info()[0]
             self.logger.error('Thread exits With un-managed error : %s', e)
             self.logger.error(e)
         finally:
-            self._running = False
-            self._comm.shutdown()
-            self._on_stop()
-            self.logger.info('Thread of agent %s stopped', self._name)
+            self._on_run_end()
+
+    def _process_msg(self, full_msg, t):
+        current_t = perf_counter()
+        try:
+            sender, dest, msg, _ = full_msg
+            self._idle = False
+            if not self._stopping.is_set():
+                self._handle_message(sender, dest, msg, t)
+        finally:
+            if self._run_t is not None:
+                e = perf_counter()
+                msg_duration = e - current_t
+                self.t_active += msg_duration
+                if msg_duration > 1:
+                    self.logger.warning(
+                        'Long message handling (%s) : %s',
+                        msg_duration, msg)
+
+    def _on_run_error(self, e: Exception, full_msg):
+        self.logger.error('Thread %s exits With error : %s \n '
+                          'Was handling message %s ',
+                          self.name, e, full_msg)
+        self.logger.error(traceback.format_exc())
+        if hasattr(self, 'on_fatal_error'):
+            self.on_fatal_error(e)
+
+    def _on_run_end(self):
+        self._running = False
+        self._comm.shutdown()
+        self._on_stop()
+        self.logger.info('Thread of agent %s stopped', self._name)
+
+    def _cooperative_step(self, max_msg: int) -> bool:
+        """
+        Run one scheduling step of the agent, when using a CooperativeRuntime.
+
+        This is the equivalent of one or several iterations of the
+        agent's thread loop, except that it never waits for messages:
+        it handles at most `max_msg` messages and runs periodic actions that
+        are due.
+
+        Returns
+        -------
+        bool:
+            False if the agent has stopped, True otherwise.
+        """
+        full_msg, finished = None, False
+        try:
+            if not self._coop_started:
+                self._coop_started = True
+                self.logger.debug('Running agent ' + self._name)
+                self._on_start()
+            for _ in range(max_msg):
+                if self._stopping.is_set():
+                    break
+                full_msg, t = self._messaging.next_msg(0)
+                if full_msg is None:
+                    self._idle = True
+                    if self._shutdown.is_set():
+                        self.logger.info("No message during shutdown, "
+                                         "stopping agent")
+                        finished = True
+                    break
+                self._process_msg(full_msg, t)
+
+            if not finished and not self._stopping.is_set():
+                self._process_periodic_action()
+                return True
+
+        except Exception as e:
+            self._on_run_error(e, full_msg)
+
+        self._on_run_end()
+        return False
+
+    def _has_pending_msg(self) -> bool:
+        return self._messaging.has_pending_msg
+
+    def _next_periodic_deadline(self) -> Optional[float]:
+        """
+        Time (as given by perf_counter) at which the next periodic action
+        must run, None if there is no periodic action.
+        """
+        if self._start_t is None or not self._periodic_cb:
+            return None
+        return min(last_t + p for p, last_t in self._periodic_cb.values())
 
     def _process_periodic_action(self):
         # Process periodic action. Only once the agents runs the
@@ -872,6 +1030,16 @@ def notify_wrap(f, cb):
     return wrapped
 
 
+def _computation_neighbors(computation: MessagePassingComputation) \
+        -> List[str]:
+    # Neighbors of a computation built from a computation definition, whose
+    # hosting agents must be looked up.
+    if hasattr(computation, 'computation_def') and \
+            computation.computation_def is not None:
+        return computation.computation_def.node.neighbors
+    return []
+
+
 class AgentMetrics(object):
     """
     AgentMetrics listen to events from the event_bus to consolidate metrics.
@@ -944,13 +1112,16 @@ class ResilientAgent(Agent):
         only applies to algorithm's messages and is useful when you want to
         observe (for example with the GUI) the behavior of the algorithm at
         runtime.
+    lockstep: LockstepExecutor
+        an optional executor for synchronous computations, see `Agent`.
 
     """
 
     def __init__(self, name: str, comm: CommunicationLayer,
                  agent_def: AgentDef, replication: str, ui_port=None,
-                 delay: float=None):
-        super().__init__(name, comm, agent_def, ui_port=ui_port, delay=delay)
+                 delay: float=None, lockstep: LockstepExecutor=None):
+        super().__init__(name, comm, agent_def, ui_port=ui_port, delay=delay,
+                         lockstep=lockstep)
         self.replication_comp = None
         if replication is not None:
             self.logger.debug('deploying replication computation %s',
@@ -31,17 +31,17 @@
 
 import json
 import logging
+import pickle
 import socket
 from collections import namedtuple, defaultdict
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from json import JSONDecodeError
+from multiprocessing.connection import Listener, Client, Connection
 from queue import Empty, PriorityQueue
-from threading import Thread
+from threading import Thread, Lock
 from time import perf_counter, sleep
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, Optional, Callable
 
-import requests
-from requests.exceptions import ConnectionError
 
 from pydcop.infrastructure.discovery import UnknownComputation, UnknownAgent
 from pydcop.utils.simple_repr import simple_repr, from_repr
@@ -410,6 +410,9 @@ class HttpCommunicationLayer(CommunicationLayer):
                 src_agent, dest_agent, msg, on_error, UnknownAgent
             )
 
+        # requests is slow to import and only needed for http communication.
+        import requests
+
         dest_address = "http://{}:{}/pydcop".format(server, port)
         msg_repr = simple_repr(msg.msg)
         try:
@@ -425,7 +428,7 @@ class HttpCommunicationLayer(CommunicationLayer):
                 json=msg_repr,
                 timeout=0.5,
             )
-        except ConnectionError:
+        except requests.exceptions.ConnectionError:
             # Could not reach the target agent: connection refused or name
             # or service not known
             return self._on_send_error(
@@ -492,6 +495,288 @@ class MPCHttpHandler(BaseHTTPRequestHandler):
         pass
 
 
+class IpcEndpoint(object):
+    """
+    A local pipe endpoint, shared by all the `IpcCommunicationLayer` of a
+    process.
+
+    An `IpcEndpoint` listens on a local pipe (unix domain socket or windows
+    named pipe, depending on the platform) and keeps one persistent
+    connection for each endpoint it sends messages to. Messages are framed
+    using the length-prefixed framing of `multiprocessing.connection`.
+
+    Several agents can share the same endpoint, in which case they all have
+    the same address and incoming messages are dispatched to the right
+    agent using the name of the target agent. Messages between agents
+    sharing an endpoint are delivered in-process, without serialization.
+
+    Parameters
+    ----------
+    address: optional str
+        The address of the pipe this endpoint will be listening on. If not
+        given, a new unique address is generated.
+
+    """
+
+    def __init__(self, address: Optional[str] = None):
+        self.logger = logging.getLogger(
+            "infrastructure.communication.IpcEndpoint"
+        )
+        self._listener = Listener(address)
+        self._address = self._listener.address
+        self._layers = {}  # type: Dict[str, IpcCommunicationLayer]
+        self._connections = {}  # type: Dict[str, Connection]
+        self._send_lock = Lock()
+        self._stopped = False
+
+        self.logger.info("Starting listener for IpcEndpoint on %s",
+                         self._address)
+        t = Thread(name="ipc_thread", target=self._accept_loop, daemon=True)
+        t.start()
+
+    @property
+    def address(self) -> str:
+        return self._address
+
+    def register_layer(self, agent: str, layer: "IpcCommunicationLayer"):
+        self._layers[agent] = layer
+
+    def unregister_layer(self, agent: str):
+        """
+        Un-register the communication layer of an agent.
+
+        Once the last layer has been un-registered, the endpoint stops
+        listening for new messages. Note that it is still possible to send
+        messages, as an agent may need to send messages (e.g.
+        unregistration) after shutting down its communication layer.
+        """
+        self._layers.pop(agent, None)
+        if self._layers or self._stopped:
+            return
+        self.logger.info("Shutting down IpcEndpoint on %s", self._address)
+        self._stopped = True
+        try:
+            # Wake up the accept loop, which is blocked on accept()
+            Client(self._address).close()
+        except OSError:
+            pass
+        self._listener.close()
+
+    def deliver_local(self, dest_agent: str, msg: ComputationMessage):
+        """
+        Deliver a message to an agent sharing this endpoint, without
+        serializing it.
+
+        Raises
+        ------
+        UnknownAgent
+            if the agent is not (anymore) using this endpoint.
+        """
+        try:
+            layer = self._layers[dest_agent]
+        except KeyError:
+            raise UnknownAgent(dest_agent)
+        layer.on_post_message(None, dest_agent, msg)
+
+    def send(self, dest_address: str, data: bytes):
+        """
+        Send a frame to another endpoint.
+
+        Raises
+        ------
+        UnreachableAgent
+            if the target endpoint could not be reached.
+        """
+        with self._send_lock:
+            conn = self._connections.get(dest_address)
+            try:
+                if conn is None:
+                    conn = Client(dest_address)
+                    self._connections[dest_address] = conn
+                conn.send_bytes(data)
+            except (OSError, EOFError):
+                # The pipe does not exist (anymore) or the target endpoint
+                # closed the connection.
+                if conn is not None:
+                    conn.close()
+                self._connections.pop(dest_address, None)
+                raise UnreachableAgent(dest_address)
+
+    def _accept_loop(self):
+        while not self._stopped:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break
+            if self._stopped:
+                conn.close()
+                break
+            t = Thread(name="ipc_reader", target=self._read_loop,
+                       args=[conn], daemon=True)
+            t.start()
+
+    def _read_loop(self, conn: Connection):
+        while True:
+            try:
+                data = conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            sender, dest, src_comp, dest_comp, msg_type, content, \
+                cycle_id = pickle.loads(data)
+            try:
+                layer = self._layers[dest]
+            except KeyError:
+                self.logger.warning(
+                    "Message from %s for agent %s not hosted on %s",
+                    sender, dest, self._address)
+                continue
+            msg = from_repr(content)
+            if cycle_id is not None:
+                # Set on messages of synchronous computations, but not part
+                # of the message's simple_repr.
+                msg.cycle_id = cycle_id
+            comp_msg = ComputationMessage(src_comp, dest_comp, msg, msg_type)
+            try:
+                layer.on_post_message(sender, dest, comp_msg)
+            except UnknownComputation as e:
+                self.logger.warning(
+                    "Message from %s for computation %s not hosted on %s : "
+                    "%s", sender, dest_comp, dest, e
+                )
+        conn.close()
+
+    def __str__(self):
+        return "IpcEndpoint({})".format(self._address)
+
+
+class IpcCommunicationLayer(CommunicationLayer):
+    """
+    Implements communication for several process-based agents on the same
+    host.
+
+    Messages are sent over local pipes, using an `IpcEndpoint`. Unlike
+    `HttpCommunicationLayer`, there is no per-message connection, no JSON
+    encoding and no request / response round-trip.
+
+    Several agents running in the same process can share an `IpcEndpoint`:
+    messages between these agents are then delivered in-process.
+
+    As sending a message does not wait for an answer from the target
+    agent, an `UnknownComputation` error on the receiving side cannot be
+    reported to the sender, it is only logged by the receiver.
+
+    The address of an `IpcCommunicationLayer` is the address of its
+    endpoint's listening pipe, as a string, which can be published through
+    discovery like any other address.
+
+    Parameters
+    ----------
+    address: optional str
+        The address of the pipe this IpcCommunicationLayer will be
+        listening on. If not given, a new unique address is generated.
+        Only used when no `endpoint` is given.
+    on_error: str
+        Indicates how error when sending a message will be
+        handled, possible value are 'ignore', 'retry', 'fail'
+    endpoint: IpcEndpoint
+        An optional endpoint, shared with other agents. If not given,
+        a new endpoint is created for this communication layer.
+
+    """
+
+    def __init__(self, address: Optional[str] = None,
+                 on_error: Optional[str] = "ignore",
+                 endpoint: IpcEndpoint = None):
+        self._endpoint = endpoint if endpoint is not None \
+            else IpcEndpoint(address)
+        self._messaging = None
+        super().__init__(on_error)
+        self.logger = logging.getLogger(
+            "infrastructure.communication.IpcCommunicationLayer"
+        )
+
+    @property
+    def messaging(self):
+        return self._messaging
+
+    @messaging.setter
+    def messaging(self, messaging):
+        # Register on the endpoint as soon as we know the name of our agent,
+        # which is only available once the Messaging is attached.
+        self._messaging = messaging
+        if messaging is not None:
+            self._endpoint.register_layer(messaging.local_agent, self)
+
+    @property
+    def address(self) -> str:
+        """
+        An address that can be used to sent messages to this communication
+        layer.
+
+        :return the address of the listening pipe, as a string.
+        """
+        return self._endpoint.address
+
+    def shutdown(self):
+        if self._messaging is not None:
+            self._endpoint.unregister_layer(self._messaging.local_agent)
+
+    def on_post_message(self, sender, dest, msg: ComputationMessage):
+        self.logger.debug("Ipc message received %s %s", sender, dest)
+        self._messaging.post_msg(msg.src_comp, msg.dest_comp, msg.msg,
+                                 msg.msg_type)
+
+    def send_msg(
+        self, src_agent: str, dest_agent: str, msg: ComputationMessage,
+        on_error=None
+    ):
+        """
+        Send msg from src_agent to dest_agent.
+
+        :param src_agent:
+        :param dest_agent:
+        :param msg: the message to send
+        :param on_error: how to handle failure when sending the message.
+        When used, this parameter overrides the behavior set when building
+        the IpcCommunicationLayer.
+        :return:
+        """
+        on_error = on_error if on_error is not None else self._on_error
+        try:
+            dest_address = self.discovery.agent_address(dest_agent)
+        except UnknownAgent:
+            return self._on_send_error(
+                src_agent, dest_agent, msg, on_error, UnknownAgent
+            )
+
+        if dest_address == self._endpoint.address:
+            # Agent sharing our endpoint, i.e. running in the same process.
+            try:
+                self._endpoint.deliver_local(dest_agent, msg)
+            except UnknownAgent:
+                return self._on_send_error(
+                    src_agent, dest_agent, msg, on_error, UnreachableAgent
+                )
+            return True
+
+        data = pickle.dumps(
+            (src_agent, dest_agent, msg.src_comp, msg.dest_comp,
+             msg.msg_type, simple_repr(msg.msg),
+             getattr(msg.msg, "cycle_id", None)),
+            pickle.HIGHEST_PROTOCOL,
+        )
+        try:
+            self._endpoint.send(dest_address, data)
+        except UnreachableAgent:
+            return self._on_send_error(
+                src_agent, dest_agent, msg, on_error, UnreachableAgent
+            )
+        return True
+
+    def __str__(self):
+        return "IpcCommunicationLayer({})".format(self.address)
+
+
 MSG_MGT = 10
 MSG_VALUE = 15
 MSG_ALGO = 20
@@ -543,6 +828,14 @@ class Messaging(object):
         self.size_ext_msg = defaultdict(lambda: 0)  # type: Dict[str, int]
         self.last_msg_time = 0
         self.msg_queue_count = 0
+        # Optional per-link metrics, for all (local and external) messages,
+        # only kept when enabled with `enable_link_metrics`.
+        self.count_link_msg = None  # type: Dict[str, Dict[str, int]]
+        self.size_link_msg = None  # type: Dict[str, Dict[str, int]]
+
+        # Optional callback, called every time a message is added to the queue.
+        # Used to wake up agents running on a CooperativeRuntime.
+        self.on_new_msg = None  # type: Optional[Callable[[], None]]
 
         self._shutdown = False
 
@@ -576,6 +869,34 @@ class Messaging(object):
         """
         return sum(v for v in self.size_ext_msg.values())
 
+    def enable_link_metrics(self):
+        """
+        Count the number and size of non-management messages sent on each
+        link (pair of source and destination computations).
+
+        Unlike `count_ext_msg` and `size_ext_msg`, these metrics include
+        messages between computations hosted on the same agent, as they are
+        used to profile the traffic of an algorithm independently of the
+        distribution of its computations.
+        """
+        if self.count_link_msg is None:
+            self.count_link_msg = defaultdict(lambda: defaultdict(lambda: 0))
+            self.size_link_msg = defaultdict(lambda: defaultdict(lambda: 0))
+
+    @property
+    def has_pending_msg(self) -> bool:
+        """
+        True if there are messages waiting in the queue.
+        """
+        return not self._queue.empty()
+
+    @property
+    def queue_size(self) -> int:
+        """
+        Number of messages waiting in the queue.
+        """
+        return self._queue.qsize()
+
     def next_msg(self, timeout: float = 0):
         try:
             msg_type, _, t, full_msg = self._queue.get(block=True, timeout=timeout)
@@ -649,6 +970,10 @@ class Messaging(object):
             )
             return
 
+        if self.count_link_msg is not None and msg_type != MSG_MGT:
+            self.count_link_msg[src_computation][dest_computation] += 1
+            self.size_link_msg[src_computation][dest_computation] += msg.size
+
         full_msg = ComputationMessage(src_computation, dest_computation, msg, msg_type)
         if dest_agent == self._local_agent:
             if self.logger.isEnabledFor(logging.DEBUG):
@@ -667,6 +992,8 @@ class Messaging(object):
             # of a message.
             self.msg_queue_count += 1
             self._queue.put((msg_type, self.msg_queue_count, now, full_msg))
+            if self.on_new_msg is not None:
+                self.on_new_msg()
         else:
             if self.logger.isEnabledFor(logging.DEBUG):
                 self.logger.debug(
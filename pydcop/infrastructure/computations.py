@@ -664,6 +664,12 @@ class SynchronousComputationMixin:
     returns a list containing the name of its neighbors (see `DcopComputation` for
     example).
 
+    By default, rounds are synchronized with messages: at the end of a round,
+    a `SynchronizationMsg` is sent to each neighbor that did not receive an
+    algorithm message. The `SimulationEngine` and the `LockstepExecutor`, used
+    by agents in thread and process modes, run synchronous computations hosted
+    in the same process in lock-step instead, without these messages.
+
     """
 
     def __init__(self, name, *args, **kwargs):
@@ -713,7 +719,10 @@ class SynchronousComputationMixin:
             if len(self._cycle_messages) == len(self.neighbors):
                 self._switch_cycle()
             else:
-                self.logger.debug(f"on message from {sender}, cycle {self._current_cycle} not finished {self._cycle_messages} != {self.neighbors}")
+                self.logger.debug(
+                    "on message from %s, cycle %s not finished %s != %s",
+                    sender, self._current_cycle, self._cycle_messages,
+                    self.neighbors)
         elif msg.cycle_id == self._current_cycle + 1:
             self._next_cycle_messages[sender] = (msg, t)
         else:
@@ -731,9 +740,8 @@ class SynchronousComputationMixin:
     def post_msg(self, target: str, msg, prio: int = None, on_error=None):
         # We need to add the current cycle_id to all messages, in order for the neighbor
         # to be able to check that the message is for the current or next cycle.
-        self.logger.debug(
-            f"Sending msg for cycle {self._current_cycle} {self.name} -> {target} : {msg}"
-        )
+        self.logger.debug("Sending msg for cycle %s %s -> %s : %s",
+                          self._current_cycle, self.name, target, msg)
         msg.cycle_id = self._current_cycle
         super(SynchronousComputationMixin, self).post_msg(target, msg, prio, on_error)
         self.cycle_message_sent.append(target)
@@ -744,16 +752,17 @@ class SynchronousComputationMixin:
         # Startup (on_start handler) is considered to be the cycle 0.
         # After this cycle 0, send a synchronization message to all neighbors
         # to which we did not already send a algo-level message.
+        sent = set(self.cycle_message_sent)
         for neighbor in list(self.neighbors):
             # Some messages might also have been sent using post_msg
-            if neighbor not in self.cycle_message_sent:
+            if neighbor not in sent:
                 self.post_msg(neighbor, SynchronizationMsg())
 
         self._cycle_messages = self._next_cycle_messages
         self._next_cycle_messages = {}
 
     def _switch_cycle(self):
-        self.logger.debug(f"Running cycle {self._current_cycle}")
+        self.logger.debug("Running cycle %s", self._current_cycle)
         self._current_cycle += 1
         algo_message = {
             k: (msg, t)
@@ -766,22 +775,19 @@ class SynchronousComputationMixin:
         # For synchronization, we need to send messages to _all_ neighbors, even this
         # implemented algorithms does not require some (or in many cases, most) of these
         # messages.
-        remaining_neighbors = list(self.neighbors)
         if messages is not None:
             for target, message in messages:
                 # message.cycle_id = self._current_cycle
                 self.post_msg(target, message)
-                remaining_neighbors.remove(target)
-        self.logger.debug(f"After cycle {self.current_cycle-1}, need to send sync msg to {remaining_neighbors}")
 
         # Now send a cycle synchronization message to all neighbors to which we did not
-        # already send a algo-level message.
-        for neighbor in remaining_neighbors:
-            # Some messages might also have been sent using post_msg
-            if neighbor not in self.cycle_message_sent:
-                self.logger.debug(
-                    f"After cycle {self.current_cycle - 1}, sync msg to {neighbor}")
-
+        # already send a algo-level message (returned by on_new_cycle or sent using
+        # post_msg).
+        sent = set(self.cycle_message_sent)
+        for neighbor in self.neighbors:
+            if neighbor not in sent:
+                self.logger.debug("After cycle %s, sync msg to %s",
+                                  self.current_cycle - 1, neighbor)
                 self.post_msg(neighbor, SynchronizationMsg())
 
         self._cycle_messages = self._next_cycle_messages
@@ -111,6 +111,16 @@ UnPublishComputationMessage = message_type(
 SubscribeComputationMessage = message_type(
     'subscribe_computation', ['computation', 'subscribe'])  # str, bool
 
+# Bulk registration of computations, used both for publishing computations
+# to the directory and for notifying subscribers.
+PublishComputationsMessage = message_type(
+    'publish_computations',
+    ['computations'])  # List[Tuple[ComputationName, AgentName, Address]]
+
+SubscribeComputationsMessage = message_type(
+    'subscribe_computations',
+    ['computations', 'subscribe'])  # List[ComputationName], bool
+
 PublishReplicaMessage = message_type(
     'publish_replica', ['replica', 'agent', 'publish'])  # str, str, bool
 
@@ -142,6 +152,8 @@ class DirectoryComputation(MessagePassingComputation):
             'publish_computation': self._on_publish_computation,
             'unpublish_computation': self._on_unpublish_computation,
             'subscribe_computation': self._on_subscribe_computation,
+            'publish_computations': self._on_publish_computations,
+            'subscribe_computations': self._on_subscribe_computations,
             'publish_replica': self._on_publish_replica,
             'subscribe_replica': self._on_subscribe_replica
         }
@@ -225,6 +237,39 @@ class DirectoryComputation(MessagePassingComputation):
                              msg.computation, sender)
             self.directory.unsubscribe_from_computation(sender, msg.computation)
 
+    def _on_publish_computations(self, _: DiscoveryName,
+                                 msg: PublishComputationsMessage):
+        self.logger.info('publication of %s computations',
+                         len(msg.computations))
+        self.directory.register_computations(msg.computations)
+
+    def _on_subscribe_computations(self, sender: DiscoveryName,
+                                   msg: SubscribeComputationsMessage):
+        if msg.subscribe:
+            self.logger.info('Subscribe for %s computations from %s',
+                             len(msg.computations), sender)
+            registered = []
+            for computation in msg.computations:
+                self.directory.subscribe_to_computation(sender, computation)
+                try:
+                    agt = self.directory.computation_agent(computation)
+                    registered.append(
+                        (computation, agt, self.directory.agent_address(agt)))
+                except UnknownComputation:
+                    # The subscriber will be notified once registered
+                    pass
+                except UnknownAgent:
+                    self.logger.warning('Unknown agent on lookup for '
+                                        'computation %s', computation)
+            if registered:
+                self.notify_computations_registered(sender, registered)
+        else:
+            self.logger.info('Unsubscribe for %s computations from %s',
+                             len(msg.computations), sender)
+            for computation in msg.computations:
+                self.directory.unsubscribe_from_computation(
+                    sender, computation)
+
     def _on_publish_replica(self, _: DiscoveryName,
                             msg: PublishReplicaMessage):
         if msg.publish:
@@ -272,6 +317,13 @@ class DirectoryComputation(MessagePassingComputation):
                       PublishComputationMessage(computation, agent, address),
                       MSG_DISCOVERY)
 
+    def notify_computations_registered(
+            self, interested: DiscoveryName,
+            computations: List[Tuple[ComputationName, AgentName, Address]]):
+        self.post_msg(interested,
+                      PublishComputationsMessage(computations),
+                      MSG_DISCOVERY)
+
     def notify_computation_unregistered(self, interested: DiscoveryName,
                                         computation: str, agent: AgentName):
         self.post_msg(interested,
@@ -492,11 +544,42 @@ class Directory(object):
         if self.on_register_computation is not None:
             self.on_register_computation(agent, computation)
 
+    def register_computations(
+            self,
+            computations: List[Tuple[ComputationName, AgentName, Address]]):
+        """
+        Register several computations at once.
+
+        Each subscriber is sent a single notification for all the
+        computations it subscribed to.
+
+        Parameters
+        ----------
+        computations: list
+            a list of (computation, agent, address) tuples, the address may
+            be None if the agent is already registered.
+        """
+        notifications = defaultdict(lambda: [])
+        for computation, agent, address in computations:
+            self._computations_data[computation] = agent
+            self.discovery.register_computation(
+                computation, agent, address, publish=False)
+            address = address if address is not None \
+                else self._agents_data[agent]
+            for interested in self._subscription_computations.get(
+                    computation, ()):
+                notifications[interested].append((computation, agent, address))
+            if self.on_register_computation is not None:
+                self.on_register_computation(agent, computation)
+        for interested, registered in notifications.items():
+            self.directory_computation.notify_computations_registered(
+                interested, registered)
+
     def unregister_computation(self, computation: ComputationName,
                                agent: AgentName=None):
         try:
             self._computations_data.pop(computation)
-            self.discovery.unregister_computation(computation)
+            self.discovery.unregister_computation(computation, publish=False)
         except (KeyError, UnknownComputation):
             return
         # notify interested agents
@@ -575,6 +658,7 @@ class DiscoveryComputation(MessagePassingComputation):
             'unpublish_agent': self._on_agent_removed,
             'publish_computation': self._on_computation_added,
             'unpublish_computation': self._on_computation_removed,
+            'publish_computations': self._on_computations_added,
             'publish_replica': self._on_replica_publish,
         }
 
@@ -604,6 +688,12 @@ class DiscoveryComputation(MessagePassingComputation):
         self.discovery.register_computation(msg.computation, msg.agent,
                                             msg.address, publish=False)
 
+    def _on_computations_added(self, _: DiscoveryName,
+                               msg: PublishComputationsMessage):
+        for computation, agent, address in msg.computations:
+            self.discovery.register_computation(computation, agent,
+                                                address, publish=False)
+
     def _on_computation_removed(self, _: DiscoveryName,
                                 msg: UnPublishComputationMessage):
         self.discovery.unregister_computation(
@@ -1148,6 +1238,46 @@ class Discovery(object):
                  for cb, oneshot in self._computation_cbs[computation]
                  if not oneshot]
 
+    def register_computations(self, computations: List[ComputationName],
+                              agent: Optional[AgentName]=None,
+                              address: Optional[Address]=None,
+                              publish: bool=True):
+        """
+        Registers several computations hosted on the same agent.
+
+        This is equivalent to calling `register_computation` for each
+        computation, but the registration is published to the directory in a
+        single message.
+
+        Parameters
+        ----------
+        computations: list of str
+            The names of the computations.
+        agent: Optional[str]
+            The name of the agent hosting these computations, defaults to the
+            agent using this discovery instance.
+        address: Optional[Address]
+            If None, the address must be already known to this discovery
+            instance.
+        publish: bool
+            If True, the computations registration will be published on the
+            directory.
+
+        See Also
+        --------
+        Discovery.register_computation
+        """
+        agent = self.own_agent if agent is None else agent
+        for computation in computations:
+            self.register_computation(computation, agent, address,
+                                      publish=False)
+        if publish and computations:
+            self.logger.info('Publishing %s computations hosted on %s',
+                             len(computations), agent)
+            self.discovery_computation.send_to_directory(
+                PublishComputationsMessage(
+                    [(c, agent, address) for c in computations]))
+
     def unregister_computation(self, computation: ComputationName,
                                agent: AgentName=None, publish: bool=True):
         """
@@ -1264,6 +1394,50 @@ class Discovery(object):
                 SubscribeComputationMessage(computation, True))
         return cb
 
+    def subscribe_computations(self, computations: List[ComputationName],
+                               cb: Optional[DiscoveryCallBack]= None,
+                               one_shot: bool=False)-> DiscoveryCallBack:
+        """
+        Subscribe to several computations on the directory.
+
+        This is equivalent to calling `subscribe_computation` for each
+        computation, but the subscription is sent to the directory in a
+        single message, and the directory notifies already registered
+        computations in a single message.
+
+        Parameters
+        ----------
+        computations: list of str
+            The computations names
+        cb: DiscoveryCallBack
+            An optional callback, called for each computation.
+        one_shot: bool
+            If true, the callback will be discarded after one call for each
+            computation.
+
+        Returns
+        -------
+        Callable
+            the callback, or None if no callback was given.
+
+        See Also
+        --------
+        Discovery.subscribe_computation
+        """
+        self.logger.debug('Subscribe to %s computations : %s, %s',
+                          len(computations), cb, one_shot)
+        subscribe = []
+        for computation in computations:
+            already_subscribed = computation in self._computation_cbs
+            if cb is not None:
+                self._computation_cbs[computation].append((cb, one_shot))
+            if not already_subscribed or cb is None:
+                subscribe.append(computation)
+        if subscribe:
+            self.discovery_computation.send_to_directory(
+                SubscribeComputationsMessage(subscribe, True))
+        return cb
+
     def unsubscribe_computation(self, computation: ComputationName,
                                 cb: Optional[DiscoveryCallBack]=None):
         """
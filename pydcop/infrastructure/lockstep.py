@@ -0,0 +1,319 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Lock-step executor for synchronous computations.
+
+Synchronous computations (see `SynchronousComputationMixin`) operate in
+rounds. When running on agents, rounds are synchronized with messages: at
+the end of each round, every computation sends a `SynchronizationMsg` to
+each neighbor it did not send an algorithm message to, and each message is
+checked against the current round when received.
+
+When several computations are hosted in the same process, a
+`LockstepExecutor` runs them in lock-step instead: at each round, it calls
+`on_new_cycle` on every computation with the messages sent to it during
+the previous round, and routes the messages between these computations in
+bulk, without going through the agents' message queues. No
+synchronization message is needed between computations of the same
+process.
+
+Links to computations hosted in other processes are still synchronized
+with messages: the executor sends the messages, and synchronization
+messages, these computations expect and only runs a new round once it has
+received their messages for the current round. From their point of view,
+the computations run by the executor behave exactly like any other
+synchronous computation.
+
+In thread mode all computations are hosted in the same process and no
+synchronization message is ever sent. In process mode, each worker process
+has its own executor.
+
+Examples
+--------
+
+    lockstep = LockstepExecutor(distribution.computations)
+    for a_name in dcop.agents:
+        agent = Agent(a_name, InProcessCommunicationLayer(),
+                      lockstep=lockstep)
+
+"""
+import logging
+from collections import defaultdict
+from functools import partial
+from threading import Condition, Thread
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Tuple
+
+from pydcop.infrastructure.communication import Messaging
+from pydcop.infrastructure.computations import ComputationException, \
+    MessagePassingComputation, SynchronizationMsg, SynchronousComputationMixin
+
+logger = logging.getLogger("pydcop.lockstep")
+
+
+class LockstepExecutor(object):
+    """
+    Runs the synchronous computations hosted in a process in lock-step.
+
+    Computations are added to the executor by the agents hosting them,
+    when the agents are given the executor (see `Agent`). The executor
+    starts running rounds, in its own thread, once all the computations
+    of the process have been started.
+
+    Notes
+    -----
+    The computations run by an executor must not be migrated to another
+    agent.
+
+    Parameters
+    ----------
+    computations: iterable of str
+        names of all the computations hosted in this process, whatever
+        the agent hosting them. Only synchronous computations from this
+        list are run by the executor.
+
+    """
+
+    def __init__(self, computations: Iterable[str]):
+        self._local = frozenset(computations)
+
+        self._cond = Condition()
+        self._members = {}  # type: Dict[str, MessagePassingComputation]
+        # Name of the agent and messaging hosting each computation
+        self._hosts = {}  # type: Dict[str, Tuple[str, Messaging]]
+        self._started = set()
+        self._thread = None
+
+        # Messages sent between our computations during the current round,
+        # delivered at the next round, as {dest: {src: (msg, t)}}
+        self._outbox = {}  # type: Dict[str, Dict[str, Tuple]]
+        # Messages received from other processes, by round, as
+        # {cycle: {dest: {src: (msg, t)}}}
+        self._remote = {}  # type: Dict[int, Dict[str, Dict[str, Tuple]]]
+        self._remote_counts = defaultdict(int)  # type: Dict[int, int]
+        # Number of links with computations hosted in other processes: we
+        # receive exactly one message on each of them at every round.
+        self._remote_links = 0
+        self._cycle = 0
+
+        self._t_active = defaultdict(float)  # type: Dict[str, float]
+
+    def accepts(self, computation: MessagePassingComputation) -> bool:
+        """
+        Indicates if a computation can be run by this executor.
+        """
+        return isinstance(computation, SynchronousComputationMixin) and \
+            computation.name in self._local
+
+    def add(self, computation: MessagePassingComputation, agent: str,
+            messaging: Messaging) -> Callable:
+        """
+        Add a computation to the executor.
+
+        This is not meant to be called directly, the computation is added
+        by its agent when hosting it.
+
+        Parameters
+        ----------
+        computation: MessagePassingComputation
+            a synchronous computation, hosted in this process.
+        agent: str
+            name of the agent hosting the computation.
+        messaging: Messaging
+            the messaging of this agent, used for messages to computations
+            hosted in other processes.
+
+        Returns
+        -------
+        Callable:
+            the message sender the computation must use.
+        """
+        name = computation.name
+        with self._cond:
+            if self._thread is not None:
+                raise ComputationException(
+                    f"Cannot add computation {name} to a running lock-step "
+                    f"executor")
+            self._members[name] = computation
+            self._hosts[name] = (agent, messaging)
+            self._remote_links += sum(1 for n in computation.neighbors
+                                      if n not in self._local)
+
+        # Rounds are driven by the executor: messages from other processes
+        # are only stored for their round, and the mixin's startup, which
+        # sends synchronization messages to all neighbors, is bypassed.
+        for msg_type in computation._decorated_handlers:
+            computation._decorated_handlers[msg_type] = self._on_remote_msg
+        computation.start = partial(self._start, computation)
+
+        # Metrics entries are created now, so that they are not inserted
+        # from the executor's thread while the agent reads them.
+        messaging.count_ext_msg[name] += 0
+        messaging.size_ext_msg[name] += 0
+        if messaging.count_link_msg is not None:
+            for n in computation.neighbors:
+                messaging.count_link_msg[name][n] += 0
+                messaging.size_link_msg[name][n] += 0
+
+        return partial(self._send, messaging.post_msg)
+
+    def active_time(self, agent: str) -> float:
+        """
+        Time spent by the executor running the computations of an agent.
+        """
+        return self._t_active[agent]
+
+    def _start(self, computation: MessagePassingComputation):
+        # Startup (on_start handler) is the cycle 0.
+        MessagePassingComputation.start(computation)
+        self._sync_remote(computation)
+        with self._cond:
+            self._started.add(computation.name)
+            if self._thread is None and \
+                    len(self._started) == len(self._local):
+                self._thread = Thread(target=self._run, name="lockstep",
+                                      daemon=True)
+                self._thread.start()
+
+    def _send(self, post_msg: Callable, src: str, dest: str, msg,
+              prio: int = None, on_error=None):
+        if src not in self._members or dest not in self._local:
+            # Messages to computations of other processes, or messages
+            # received before startup and re-injected by the computation.
+            post_msg(src, dest, msg, prio, on_error)
+            return
+
+        with self._cond:
+            box = self._outbox.setdefault(dest, {})
+            if src in box:
+                raise ComputationException(
+                    f"Invalid message, {dest} received two messages "
+                    f"from {src} in the same cycle. In a synchronized "
+                    f"computation, a neighbor can only send a single "
+                    f"message in a cycle.")
+            box[src] = (msg, perf_counter())
+
+        src_agent, messaging = self._hosts[src]
+        if self._hosts.get(dest, (None, None))[0] != src_agent:
+            messaging.count_ext_msg[src] += 1
+            messaging.size_ext_msg[src] += msg.size
+        if messaging.count_link_msg is not None:
+            messaging.count_link_msg[src][dest] += 1
+            messaging.size_link_msg[src][dest] += msg.size
+
+    def _sync_remote(self, computation):
+        # Send a synchronization message to all neighbors hosted in other
+        # processes to which we did not already send an algorithm message.
+        sent = set(computation.cycle_message_sent)
+        for neighbor in computation.neighbors:
+            if neighbor not in sent and neighbor not in self._local:
+                computation.post_msg(neighbor, SynchronizationMsg())
+
+    def _on_remote_msg(self, computation, sender: str, msg, t: float):
+        # Handler for all messages received by our computations, which are
+        # always sent by computations hosted in other processes.
+        if sender not in computation.neighbors:
+            raise ComputationException(
+                f"Invalid message: received a message from {sender}, which is "
+                f"not in the neighbors list: {computation.neighbors}"
+            )
+        with self._cond:
+            if msg.cycle_id < self._cycle:
+                raise ComputationException(
+                    f"Invalid message for computation {computation.name}, "
+                    f"current cycle is {self._cycle} "
+                    f"but received message for cycle {msg.cycle_id} "
+                    f"from {sender}"
+                )
+            received = self._remote.setdefault(msg.cycle_id, {})\
+                .setdefault(computation.name, {})
+            if sender in received:
+                raise ComputationException(
+                    f"Invalid message, {computation.name} received two "
+                    f"messages from {sender} for cycle {msg.cycle_id}. "
+                    f"In a synchronized computation, a neighbor can only "
+                    f"send a single message in a cycle."
+                )
+            received[sender] = (msg, t)
+            self._remote_counts[msg.cycle_id] += 1
+            self._cond.notify()
+
+    def _is_ready(self, members) -> bool:
+        # Must be called with the lock held
+        return self._remote_counts[self._cycle] == self._remote_links and \
+            not any(c.is_paused for c in members)
+
+    def _run(self):
+        members = [self._members[n] for n in sorted(self._members)]
+        hosts = self._hosts
+        local = self._local
+        # Computations that ran during the previous cycle. Like with
+        # synchronization messages, a computation only runs a cycle once all
+        # its neighbors have run the previous one: when a computation stops,
+        # its neighbors stop running too.
+        ran = set(self._members)
+        try:
+            while ran:
+                with self._cond:
+                    while not self._is_ready(members):
+                        if not any(c.is_running for c in members):
+                            return
+                        self._cond.wait(0.1)
+                    cycle = self._cycle
+                    inbox, self._outbox = self._outbox, {}
+                    received = self._remote.pop(cycle, {})
+                    self._remote_counts.pop(cycle, None)
+                    self._cycle += 1
+
+                previous, ran = ran, set()
+                for c in members:
+                    if not c.is_running or not all(
+                            n in previous or n not in local
+                            for n in c.neighbors):
+                        continue
+                    start = perf_counter()
+                    messages = inbox.get(c.name, {})
+                    for sender, (msg, t) in received.get(c.name, {}).items():
+                        if not isinstance(msg, SynchronizationMsg):
+                            messages[sender] = (msg, t)
+                    c._current_cycle = cycle + 1
+                    c.cycle_message_sent = []
+                    out = c.on_new_cycle(messages, cycle)
+                    if out:
+                        for target, msg in out:
+                            c.post_msg(target, msg)
+                    self._sync_remote(c)
+                    ran.add(c.name)
+                    self._t_active[hosts[c.name][0]] += perf_counter() - start
+        except Exception:
+            logger.error("Error in lock-step executor, stopping at cycle %s",
+                         self._cycle, exc_info=True)
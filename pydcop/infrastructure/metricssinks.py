@@ -0,0 +1,300 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Sinks for the run-time metrics emitted by the orchestrator.
+
+The orchestrator posts its metrics on an unbounded queue, which never
+blocks it. A `MetricsCollector` thread drains this queue and hands the
+metrics to one or several sinks, which buffer them and only write to disk
+when enough rows have been collected, or periodically:
+
+* `CsvMetricsSink` writes rows in a csv file, kept open during the whole run,
+* `NpzMetricsSink` writes columns in a series of numpy ``.npz`` files, which
+  is much more compact for long runs.
+
+Use `metrics_sink` to select the sink from the file name.
+"""
+import csv
+import logging
+import os
+from queue import Queue, Empty
+from threading import Thread
+from time import perf_counter
+from typing import Dict, List, Iterable
+
+import numpy as np
+
+logger = logging.getLogger("pydcop.metrics")
+
+DEFAULT_FLUSH_ROWS = 1000
+DEFAULT_FLUSH_PERIOD = 1.0
+DEFAULT_CHUNK_ROWS = 100000
+
+
+class MetricsSink(object):
+    """
+    Base class for metrics sinks.
+
+    Sub-classes must implement `_write_rows`, which is called with the
+    buffered rows when flushing.
+
+    Parameters
+    ----------
+    columns: list of str
+        names of the metrics written, in order.
+    flush_rows: int
+        the buffer is flushed when it contains this number of rows.
+    flush_period: float
+        the buffer is flushed, on the next write, when it has not been
+        flushed for this duration, in seconds.
+    """
+
+    def __init__(self, columns: List[str],
+                 flush_rows: int=DEFAULT_FLUSH_ROWS,
+                 flush_period: float=DEFAULT_FLUSH_PERIOD):
+        self.columns = list(columns)
+        self.flush_rows = flush_rows
+        self.flush_period = flush_period
+        self._rows = []
+        self._last_flush = perf_counter()
+
+    def write(self, metrics: Dict):
+        """Add a row of metrics, flushing the buffer if needed."""
+        self._rows.append([metrics[c] for c in self.columns])
+        if len(self._rows) >= self.flush_rows or \
+                perf_counter() - self._last_flush >= self.flush_period:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows."""
+        if self._rows:
+            self._write_rows(self._rows)
+            self._rows = []
+        self._last_flush = perf_counter()
+
+    def close(self):
+        """Flush buffered rows and release the underlying file."""
+        self.flush()
+
+    def _write_rows(self, rows: List[List]):
+        raise NotImplementedError()
+
+
+class CsvMetricsSink(MetricsSink):
+    """
+    Write metrics in a csv file, with a header line.
+
+    The file is created, or truncated if it exists, and kept open until the
+    sink is closed.
+
+    Parameters
+    ----------
+    path: str
+        path of the csv file.
+    """
+
+    def __init__(self, path: str, columns: List[str],
+                 flush_rows: int=DEFAULT_FLUSH_ROWS,
+                 flush_period: float=DEFAULT_FLUSH_PERIOD):
+        super().__init__(columns, flush_rows, flush_period)
+        self.path = path
+        self._file = open(path, mode="w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+        self._file.flush()
+
+    def _write_rows(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        super().close()
+        self._file.close()
+
+
+class NpzMetricsSink(MetricsSink):
+    """
+    Write metrics as columns in numpy ``.npz`` files.
+
+    Rows are written by chunks: for a path ``run.npz``, chunks are written in
+    ``run.0.npz``, ``run.1.npz``, etc. Each chunk contains one array for
+    each column, missing values (e.g. the cost when the assignment is not
+    complete) are written as ``nan``. Use `load_npz_metrics` to read all
+    chunks back.
+
+    Parameters
+    ----------
+    path: str
+        path of the metrics, with the ``.npz`` extension.
+    chunk_rows: int
+        number of rows in each chunk.
+    """
+
+    def __init__(self, path: str, columns: List[str],
+                 chunk_rows: int=DEFAULT_CHUNK_ROWS):
+        super().__init__(columns, chunk_rows, float("inf"))
+        self.path = path
+        self._chunk_count = 0
+        for f in _npz_chunks(path):
+            os.remove(f)
+
+    def _write_rows(self, rows):
+        data = {}
+        for i, c in enumerate(self.columns):
+            values = [r[i] for r in rows]
+            if all(isinstance(v, str) for v in values):
+                data[c] = np.array(values)
+            else:
+                data[c] = np.array(
+                    [np.nan if v is None else v for v in values],
+                    dtype=np.float64)
+        np.savez(_npz_chunk(self.path, self._chunk_count), **data)
+        self._chunk_count += 1
+
+    def flush(self):
+        # Only write full chunks, the last one is written when closing.
+        if len(self._rows) >= self.flush_rows:
+            super().flush()
+
+    def close(self):
+        super().flush()
+
+
+def _npz_chunk(path: str, i: int) -> str:
+    root, _ = os.path.splitext(path)
+    return "{}.{}.npz".format(root, i)
+
+
+def _npz_chunks(path: str) -> List[str]:
+    chunks = []
+    while os.path.exists(_npz_chunk(path, len(chunks))):
+        chunks.append(_npz_chunk(path, len(chunks)))
+    return chunks
+
+
+def load_npz_metrics(path: str) -> Dict[str, np.ndarray]:
+    """
+    Load metrics written by a `NpzMetricsSink`.
+
+    Parameters
+    ----------
+    path: str
+        the path given to the sink.
+
+    Returns
+    -------
+    dict
+        a dict containing an array for each metrics column.
+    """
+    columns = {}
+    for f in _npz_chunks(path):
+        with np.load(f) as chunk:
+            for c in chunk.files:
+                columns.setdefault(c, []).append(chunk[c])
+    return {c: np.concatenate(arrays) for c, arrays in columns.items()}
+
+
+def metrics_sink(path: str, columns: List[str]) -> MetricsSink:
+    """
+    Build a sink for the file `path`: a `NpzMetricsSink` if the file has
+    the ``.npz`` extension, otherwise a `CsvMetricsSink`.
+    """
+    if path.endswith(".npz"):
+        return NpzMetricsSink(path, columns)
+    return CsvMetricsSink(path, columns)
+
+
+class MetricsCollector(Thread):
+    """
+    Thread writing the metrics posted by the orchestrator on a queue to
+    a list of sinks.
+
+    All metrics available on the queue are handed to the sinks at once, and
+    sinks are flushed when no metrics have been received for `flush_period`
+    seconds.
+
+    Parameters
+    ----------
+    queue: Queue
+        queue of (time, metrics) tuples, given as `collector` to the
+        orchestrator.
+    sinks: iterable of MetricsSink
+        sinks the metrics are written to.
+    flush_period: float
+        period, in seconds, for flushing sinks when idle.
+    """
+
+    def __init__(self, queue: Queue, sinks: Iterable[MetricsSink],
+                 flush_period: float=DEFAULT_FLUSH_PERIOD):
+        super().__init__(name="metrics_collector", daemon=True)
+        self.queue = queue
+        self.sinks = list(sinks)
+        self.flush_period = flush_period
+        self._stopped = False
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_period)
+            except Empty:
+                for sink in self.sinks:
+                    sink.flush()
+                continue
+            while item is not None:
+                _, metrics = item
+                for sink in self.sinks:
+                    sink.write(metrics)
+                try:
+                    item = self.queue.get_nowait()
+                except Empty:
+                    break
+            else:
+                break
+        for sink in self.sinks:
+            sink.close()
+
+    def stop(self, last_metrics: Dict=None):
+        """
+        Write all pending metrics, and `last_metrics` if given, then close
+        the sinks and stop the thread.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        if last_metrics is not None:
+            self.queue.put((None, last_metrics))
+        self.queue.put(None)
+        if self.is_alive():
+            self.join()
+        else:
+            self.run()
@@ -0,0 +1,210 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compact storage for the metrics collected by the orchestrator.
+
+The orchestrator receives a value for each computation, and metrics for each
+agent, every time a computation selects a value or finishes a cycle. Instead
+of keeping a dict of values for every cycle, `MetricsStore` keeps:
+
+* the current value and cost of each computation, in arrays indexed by
+  computation,
+* values reported for cycles that are not finished yet,
+* the computations whose value changed since the last metrics were emitted,
+* a fixed-size ring of the most recent `MetricsSummary`,
+* a downsampled history of summaries, covering the whole run with a bounded
+  number of entries.
+
+Its size thus does not depend on the number of cycles.
+"""
+from collections import deque, namedtuple
+from typing import Iterable, List, Tuple, Dict
+
+DEFAULT_RING_SIZE = 1000
+DEFAULT_HISTORY_SIZE = 1000
+
+MetricsSummary = namedtuple(
+    'MetricsSummary',
+    ['time', 'cycle', 'cost', 'violation', 'msg_count', 'msg_size'])
+
+_UNSET = object()
+
+
+class MetricsStore(object):
+    """
+    Current values of computations and bounded history of metrics summaries.
+
+    Parameters
+    ----------
+    computations: iterable of str
+        names of the computations, other computations can be added
+        later when setting their value.
+    ring_size: int
+        number of recent summaries kept.
+    history_size: int
+        maximum number of summaries in the downsampled history. When this
+        size is reached, every other summary is dropped and only one out of
+        two new summaries is kept from then on.
+
+    Examples
+    --------
+    >>> store = MetricsStore(['v1', 'v2'], ring_size=2, history_size=4)
+    >>> store.set_value('v1', 'R', 0)
+    >>> store.set_cycle_value(1, 'v2', 'G', 1)
+    >>> store.assignment()
+    {'v1': 'R'}
+    >>> store.end_cycle(1)
+    [('v2', 'G')]
+    >>> store.changes()
+    {'v1': 'R', 'v2': 'G'}
+    >>> store.changes()
+    {}
+    >>> store.value('v2')
+    ('G', 1)
+    >>> for i in range(10):
+    ...     store.add_summary(MetricsSummary(i, i, 0, 0, 0, 0))
+    >>> [s.cycle for s in store.recent()]
+    [8, 9]
+    >>> [s.cycle for s in store.history()]
+    [0, 4, 8]
+    """
+
+    def __init__(self, computations: Iterable[str],
+                 ring_size: int=DEFAULT_RING_SIZE,
+                 history_size: int=DEFAULT_HISTORY_SIZE):
+        self._index = {}  # type: Dict[str, int]
+        self._names = []  # type: List[str]
+        self._values = []
+        self._costs = []
+        for c in computations:
+            self._slot(c)
+        # cycle -> list of (slot, value, cost), for unfinished cycles
+        self._pending = {}
+        # slots set since the last call to changes()
+        self._changed = set()
+
+        self._recent = deque(maxlen=ring_size)
+        self._history_size = max(2, history_size)
+        self._history = []
+        self._stride = 1
+        self._summary_count = 0
+
+    def _slot(self, computation: str) -> int:
+        try:
+            return self._index[computation]
+        except KeyError:
+            self._index[computation] = len(self._names)
+            self._names.append(computation)
+            self._values.append(_UNSET)
+            self._costs.append(None)
+            return self._index[computation]
+
+    def set_value(self, computation: str, value, cost):
+        """Set the current value of a computation."""
+        i = self._slot(computation)
+        self._values[i] = value
+        self._costs[i] = cost
+        self._changed.add(i)
+
+    def set_cycle_value(self, cycle: int, computation: str, value, cost):
+        """
+        Set the value selected by a computation during `cycle`.
+
+        The value only becomes the current value of the computation once
+        `end_cycle` has been called for this cycle.
+        """
+        self._pending.setdefault(cycle, []).append(
+            (self._slot(computation), value, cost))
+
+    def end_cycle(self, cycle: int) -> List[Tuple[str, object]]:
+        """
+        Apply the values reported for all cycles up to `cycle`.
+
+        Returns
+        -------
+        list
+            a list of (computation, value) for the values set.
+        """
+        changed = []
+        for c in sorted(k for k in self._pending if k <= cycle):
+            for i, value, cost in self._pending.pop(c):
+                self._values[i] = value
+                self._costs[i] = cost
+                self._changed.add(i)
+                changed.append((self._names[i], value))
+        return changed
+
+    def value(self, computation: str) -> Tuple[object, object]:
+        """
+        Current (value, cost) for a computation.
+
+        Raises
+        ------
+        KeyError
+            if no value has been set yet for this computation.
+        """
+        i = self._index[computation]
+        if self._values[i] is _UNSET:
+            raise KeyError(computation)
+        return self._values[i], self._costs[i]
+
+    def assignment(self) -> Dict[str, object]:
+        """Current value of all computations that have one."""
+        return {n: v for n, v in zip(self._names, self._values)
+                if v is not _UNSET}
+
+    def changes(self) -> Dict[str, object]:
+        """
+        Current value of the computations whose value has been set since the
+        previous call to `changes`.
+        """
+        changes = {self._names[i]: self._values[i]
+                   for i in sorted(self._changed)}
+        self._changed = set()
+        return changes
+
+    def add_summary(self, summary: MetricsSummary):
+        """Add a summary to the recent ring and the downsampled history."""
+        self._recent.append(summary)
+        if self._summary_count % self._stride == 0:
+            self._history.append(summary)
+            if len(self._history) > self._history_size:
+                self._history = self._history[::2]
+                self._stride *= 2
+        self._summary_count += 1
+
+    def recent(self) -> List[MetricsSummary]:
+        """The most recent summaries, oldest first."""
+        return list(self._recent)
+
+    def history(self) -> List[MetricsSummary]:
+        """Downsampled summaries, covering the whole run, oldest first."""
+        return list(self._history)
@@ -30,21 +30,25 @@
 
 
 import logging
+from collections import defaultdict
 from time import perf_counter
 from typing import Dict, List, Set
 
 from pydcop.algorithms import ComputationDef
 from pydcop.dcop.objects import AgentDef
 from pydcop.infrastructure.agents import ResilientAgent
-from pydcop.infrastructure.communication import CommunicationLayer, MSG_VALUE, MSG_MGT
+from pydcop.infrastructure.communication import CommunicationLayer, MSG_VALUE, MSG_MGT, \
+    MSG_ALGO
 from pydcop.infrastructure.computations import (
     MessagePassingComputation,
     Message,
     build_computation,
 )
 from pydcop.infrastructure.discovery import Address
+from pydcop.infrastructure.lockstep import LockstepExecutor
 from pydcop.infrastructure.orchestrator import (
     DeployMessage,
+    DeployComputationsMessage,
     RunAgentMessage,
     ReplicateComputationsMessage,
     PauseMessage,
@@ -53,6 +57,7 @@ from pydcop.infrastructure.orchestrator import (
     CycleChangeMessage,
     ComputationFinishedMessage,
     MetricsMessage,
+    MetricsDigestMessage,
     StopAgentMessage,
     RepairReadyMessage,
     SetupRepairMessage,
@@ -62,6 +67,8 @@ from pydcop.infrastructure.orchestrator import (
     ResumeMessage,
     AgentRemovedMessage,
     SetMetricsModeMessage,
+    MigrateComputationsMessage,
+    LoadReportMessage,
 )
 
 ORCHESTRATOR = "orchestrator"
@@ -94,6 +101,17 @@ class OrchestratedAgent(ResilientAgent):
         only applies to algorithm's messages and is useful when you want to
         observe (for example with the GUI) the behavior of the algorithm at
         runtime.
+    digest_period: float
+        If given, value changes, cycle changes and metrics are not sent to
+        the orchestrator for each event but buffered and sent as digests,
+        every `digest_period` seconds and, with the 'cycle_change' mode,
+        once all hosted computations have finished a cycle.
+    link_metrics: bool
+        If True, the number and size of the messages sent on each link
+        between computations are included in the agent's metrics.
+    lockstep: LockstepExecutor
+        An optional executor, shared by the agents of the process, running
+        synchronous computations in lock-step.
 
     See Also
     --------
@@ -111,9 +129,13 @@ class OrchestratedAgent(ResilientAgent):
         replication: str = None,
         ui_port=None,
         delay: float = None,
+        digest_period: float = None,
+        link_metrics: bool = False,
+        lockstep: LockstepExecutor = None,
     ):
         super().__init__(
-            agt_def.name, comm, agt_def, replication, ui_port=ui_port, delay=delay
+            agt_def.name, comm, agt_def, replication, ui_port=ui_port,
+            delay=delay, lockstep=lockstep
         )
 
         # Orchestrator and orchestration computation hosted by it:
@@ -129,6 +151,18 @@ class OrchestratedAgent(ResilientAgent):
         if metrics_on == "period":
             self.set_metrics_period(metrics_period)
 
+        self.digest_period = digest_period
+        if digest_period:
+            self.set_periodic_action(
+                digest_period, self._mgt_computation.send_digest)
+
+        if link_metrics:
+            self._messaging.enable_link_metrics()
+
+        # Computations migrated to another agent: messages received for them
+        # are forwarded to their new host.
+        self._migrated = set()  # type: Set[str]
+
     def set_metrics_period(self, metrics_period):
         self.set_periodic_action(metrics_period, self._mgt_computation.send_metrics)
 
@@ -150,6 +184,45 @@ class OrchestratedAgent(ResilientAgent):
         self._mgt_computation.start()
         return True
 
+    def migrate_computations(self, computations: List[str]):
+        """
+        Remove computations that are migrated to another agent.
+
+        The computations must have been paused. The messages they have
+        buffered while paused are not lost: messages they were about to send
+        are sent before removing them and messages they had received, as
+        well as the messages received later for them, are forwarded to
+        their new host, once it is known.
+
+        Parameters
+        ----------
+        computations: list of str
+            names of the computations to remove.
+        """
+        for name in computations:
+            computation = self.computation(name)
+            received = computation._paused_messages_recv
+            posted = computation._paused_messages_post
+            computation._paused_messages_recv = []
+            computation._paused_messages_post = []
+            for target, msg, prio, on_error in posted:
+                self._messaging.post_msg(name, target, msg, prio, on_error)
+
+            self.remove_computation(name)
+            self._migrated.add(name)
+
+            # The computation is not registered anymore, messages will be
+            # sent once it is registered on its new host.
+            for sender, msg, _ in received:
+                self._messaging.post_msg(sender, name, msg, MSG_ALGO)
+
+    def _handle_message(self, sender_name: str, dest_name: str, msg, t):
+        # Overwritten from Agent, to forward messages for migrated computations
+        if dest_name in self._migrated and dest_name not in self._computations:
+            self._messaging.post_msg(sender_name, dest_name, msg, MSG_ALGO)
+            return
+        super()._handle_message(sender_name, dest_name, msg, t)
+
     def _on_computation_value_changed(self, computation: str, value, cost, cycle):
         # Overwritten from Agent
         self._mgt_computation.on_computation_value_changed(
@@ -194,10 +267,13 @@ class OrchestrationComputation(MessagePassingComputation):
         self._handlers = {
             "metrics_mode": self._on_metrics_mode,
             "deploy": self._on_deploy_computations,
+            "deploy_computations": self._on_deploy_computations_batch,
             "replication": self._on_replication,
             "run_computations": self._on_run_computations,
             "pause_computations": self._on_pause,
             "resume_computations": self._on_resume,
+            "migrate_computations": self._on_migrate,
+            "load_request": self._on_load_request,
             "setup_repair": self._on_setup_repair,
             "repair_run": self._on_repair_run,
             "stop": self._on_stop_request,
@@ -205,6 +281,12 @@ class OrchestrationComputation(MessagePassingComputation):
             "agent_removed": self._on_stop_request,
         }
 
+        # Events buffered for the next digest, when using digests
+        self._digest_values = {}  # computation -> (value, cost, cycle)
+        self._digest_cycles = []  # (computation, cycle)
+        self._cycle_ends = defaultdict(lambda: 0)  # cycle -> computations
+        self._digest_metrics = {}  # metrics sent in the last digest
+
     @property
     def type(self):
         return "mgt"
@@ -242,6 +324,7 @@ class OrchestrationComputation(MessagePassingComputation):
 
     def _on_stop_request(self, sender: str, msg: StopAgentMessage, t: float):
         self.logger.debug("StopAgentMessage from %s : %s", sender, msg)
+        self.send_digest()
         self.send_to_orchestrator(
             AgentStoppedMessage(self.agent.name, self.agent.metrics())
         )
@@ -249,6 +332,7 @@ class OrchestrationComputation(MessagePassingComputation):
 
     def _on_agent_removed(self, sender: str, msg: AgentRemovedMessage, t: float):
         self.logger.debug("AgentRemovedMessage from %s : %s", sender, msg)
+        self.send_digest()
         self.send_to_orchestrator(
             AgentStoppedMessage(self.agent.name, self.agent.metrics())
         )
@@ -262,6 +346,18 @@ class OrchestrationComputation(MessagePassingComputation):
         self.logger.debug("ResumeMessage from %s : %s", sender, msg)
         self.agent.unpause_computations(msg.computations)
 
+    def _on_migrate(self, sender: str, msg: MigrateComputationsMessage, t: float):
+        self.logger.debug("MigrateComputationsMessage from %s : %s", sender, msg)
+        self.agent.migrate_computations(msg.computations)
+
+    def _on_load_request(self, sender: str, msg, t: float):
+        self.post_msg(
+            ORCHESTRATOR_MGT,
+            LoadReportMessage(
+                self.agent.name, self.agent.t_active,
+                self.agent._messaging.queue_size),
+            MSG_MGT)
+
     def _on_deploy_computations(self, sender: str, msg: DeployMessage, t: float):
         """
         Deploys a new computation on this agent.
@@ -289,6 +385,29 @@ class OrchestrationComputation(MessagePassingComputation):
         computation = build_computation(comp_def)
         self.agent.add_computation(computation)
 
+    def _on_deploy_computations_batch(
+        self, sender: str, msg: DeployComputationsMessage, t: float
+    ):
+        """
+        Deploys a batch of computations on this agent.
+
+        Computations are registered in discovery, and their neighbors
+        subscribed to, in bulk.
+
+        Parameters
+        ----------
+
+        comp_defs: list of ComputationDef
+            Definitions of the computations
+        """
+        self.logger.info(
+            "Deploying computations %s  on %s",
+            [comp_def.node.name for comp_def in msg.comp_defs],
+            self.agent.name,
+        )
+        computations = [build_computation(comp_def) for comp_def in msg.comp_defs]
+        self.agent.add_computations(computations)
+
     def _on_setup_repair(self, sender: str, msg: SetupRepairMessage, t: float):
         self.logger.info("SetupRepair msg from %s : %s at %s", sender, msg, t)
         repair_computation = self.agent.setup_repair(msg.repair_info)
@@ -309,6 +428,9 @@ class OrchestrationComputation(MessagePassingComputation):
         'value_change'.
 
         """
+        if self.agent.digest_period:
+            self._digest_values[computation] = (value, cost, cycle)
+            return
         if self.agent.metrics_on == "value_change":
             # Metrics are send with the value message so we do not need to send
             # an extra metrics message, but only when using the 'value_change'
@@ -323,7 +445,14 @@ class OrchestrationComputation(MessagePassingComputation):
 
     def on_computation_new_cycle(self, computation, *args, **kwargs):
         cycle_count, = args
-        if self.agent.metrics_on == "cycle_change":
+        if self.agent.metrics_on == "cycle_change" and self.agent.digest_period:
+            self._digest_cycles.append((computation, cycle_count))
+            # Send a digest once all our computations have finished the cycle
+            self._cycle_ends[cycle_count] += 1
+            if self._cycle_ends[cycle_count] == len(self.agent.computations()):
+                del self._cycle_ends[cycle_count]
+                self.send_digest()
+        elif self.agent.metrics_on == "cycle_change":
             self.send_to_orchestrator(
                 CycleChangeMessage(
                     self.agent.name, computation, cycle_count, self.agent.metrics()
@@ -331,6 +460,8 @@ class OrchestrationComputation(MessagePassingComputation):
             )
 
     def on_computation_finished(self, computation):
+        # Make sure the orchestrator gets the final values and metrics
+        self.send_digest()
         self.send_to_orchestrator(
             ComputationFinishedMessage(self.agent.name, computation)
         )
@@ -377,7 +508,51 @@ class OrchestrationComputation(MessagePassingComputation):
         Send metrics to the orchestrator.
         :return:
         """
-        self.send_to_orchestrator(MetricsMessage(self.agent.name, self.agent.metrics()))
+        if self.agent.digest_period:
+            self.send_digest(periodic=True)
+        else:
+            self.send_to_orchestrator(
+                MetricsMessage(self.agent.name, self.agent.metrics())
+            )
+
+    def send_digest(self, periodic=False):
+        """
+        Send the events buffered since the last digest to the orchestrator.
+
+        Only values that changed and the metrics entries that changed since
+        the previous digest are sent. Nothing is sent if nothing changed,
+        unless `periodic` is True: the digest then replaces the periodic
+        metrics message, when using the 'period' collection mode.
+        """
+        if not self.agent.digest_period:
+            return
+        metrics = self.agent.metrics()
+        delta = {}
+        for k, v in metrics.items():
+            previous = self._digest_metrics.get(k)
+            if isinstance(v, dict):
+                previous = previous if previous is not None else {}
+                changed = {c: cv for c, cv in v.items()
+                           if previous.get(c) != cv}
+                if changed:
+                    delta[k] = changed
+            elif v != previous:
+                delta[k] = v
+        if not (periodic or self._digest_values or self._digest_cycles
+                or set(delta) - {"activity_ratio"}):
+            return
+        self._digest_metrics = metrics
+
+        # Swap the buffers before reading them: with a lock-step executor,
+        # values and cycles are buffered from the executor's thread.
+        digest_values, self._digest_values = self._digest_values, {}
+        digest_cycles, self._digest_cycles = self._digest_cycles, []
+        values = [(c, v, cost, cycle)
+                  for c, (v, cost, cycle) in digest_values.items()]
+        self.send_to_orchestrator(
+            MetricsDigestMessage(
+                self.agent.name, values, digest_cycles, delta, periodic)
+        )
 
     def send_to_orchestrator(self, msg: Message):
         self.post_msg(ORCHESTRATOR_MGT, msg, MSG_MGT)
@@ -27,6 +27,8 @@
 # CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
+import hashlib
+import json
 import threading
 from queue import Queue
 from time import perf_counter
@@ -35,15 +37,15 @@ from typing import List
 from typing import Optional, Any
 
 from collections import defaultdict
+from copy import deepcopy
 
 import time
 import yaml
 
 from pydcop.algorithms import AlgorithmDef, ComputationDef
 from pydcop.commands.distribute import load_algo_module
-from pydcop.dcop.relations import filter_assignment_dict
 from pydcop.computations_graph.objects import ComputationGraph
-from pydcop.dcop.dcop import DCOP
+from pydcop.dcop.dcop import DCOP, IncrementalSolutionCost
 from pydcop.dcop.scenario import Scenario
 from pydcop.distribution import gh_cgdp
 from pydcop.distribution.objects import Distribution
@@ -52,8 +54,12 @@ from pydcop.infrastructure.communication import CommunicationLayer, MSG_MGT
 from pydcop.infrastructure.computations import Message, message_type, \
     MessagePassingComputation
 from pydcop.infrastructure.discovery import Directory, UnknownAgent
+from pydcop.infrastructure.metricsstore import MetricsStore, MetricsSummary, \
+    DEFAULT_RING_SIZE, DEFAULT_HISTORY_SIZE
+from pydcop.infrastructure.rebalancing import LoadRebalancer
 from pydcop.reparation.removal import _removal_candidate_agents, \
     _removal_orphaned_computations, _removal_candidate_agt_info
+from pydcop.utils.simple_repr import simple_repr, from_repr
 
 ORCHESTRATOR = 'orchestrator'
 ORCHESTRATOR_MGT = '_mgt_orchestrator'
@@ -113,6 +119,14 @@ class Orchestrator(object):
         A queue used to collect metrics
     collect_moment: str
         metrics collection mode (e.g. 'value_change')
+    ring_size: int
+        number of recent metrics summaries kept
+    history_size: int
+        maximum number of summaries kept in the downsampled history of the
+        whole run
+    rebalance_period: float
+        if given, every `rebalance_period` seconds, computations are migrated
+        from overloaded agents to underloaded agents (see `LoadRebalancer`).
 
     """
 
@@ -124,7 +138,10 @@ class Orchestrator(object):
                  collector: Queue=None,
                  collect_moment: str='value_change',
                  collect_period: float=None,
-                 ui_port: int = None):
+                 ui_port: int = None,
+                 ring_size: int=DEFAULT_RING_SIZE,
+                 history_size: int=DEFAULT_HISTORY_SIZE,
+                 rebalance_period: float=None):
         self._own_agt = Agent(ORCHESTRATOR, comm, ui_port=ui_port)
         self.directory = Directory(self._own_agt.discovery)
         self._own_agt.add_computation(self.directory.directory_computation)
@@ -148,7 +165,10 @@ class Orchestrator(object):
         self.mgt = AgentsMgt(algo, cg, agent_mapping, dcop,
                              self._own_agt, self, infinity, collector=collector,
                              collect_moment=collect_moment,
-                             collect_period=collect_period)
+                             collect_period=collect_period,
+                             ring_size=ring_size,
+                             history_size=history_size,
+                             rebalance_period=rebalance_period)
 
     @property
     def address(self):
@@ -312,9 +332,24 @@ class Orchestrator(object):
     def end_metrics(self):
         return self.mgt.global_metrics('END', self.mgt.last_agt_stop_time)
 
+    def metrics_history(self):
+        return self.mgt.metrics_history()
+
     def replication_metrics(self):
         return self.mgt._replication_metrics
 
+    def migrations(self):
+        """
+        Computations migrated by the load rebalancer.
+
+        Returns
+        -------
+        list
+            a list of ``(time, computation, source agent, target agent)``
+            tuples, in the order of the migrations.
+        """
+        return list(self.mgt.migrations)
+
     def wait_ready(self):
         """Blocks until the Orchestrator is ready to perform another action.
 
@@ -386,6 +421,98 @@ SetMetricsModeMessage = message_type('metrics_mode', ['mode', 'period'])
 
 DeployMessage = message_type('deploy', ['comp_def'])
 
+
+class DeployComputationsMessage(Message):
+    """
+    Deploys a batch of computations on an agent with a single message.
+
+    Neighbor computations often share the same constraints, which would
+    otherwise be serialized again in each computation definition. When
+    serialized, this message stores each distinct constraint only once, in a
+    table indexed by the hash of its simple representation, and computation
+    definitions refer to constraints by hash.
+
+    Parameters
+    ----------
+    comp_defs: list of ComputationDef
+        the definitions of the computations to deploy.
+    """
+
+    def __init__(self, comp_defs: List[ComputationDef]):
+        super().__init__('deploy_computations', None)
+        self._comp_defs = comp_defs
+
+    @property
+    def comp_defs(self) -> List[ComputationDef]:
+        return self._comp_defs
+
+    def _simple_repr(self):
+        constraints = {}
+        comp_defs = [_dedup_constraints(simple_repr(comp_def), constraints)
+                     for comp_def in self._comp_defs]
+        return {
+            '__module__': self.__module__,
+            '__qualname__': self.__class__.__qualname__,
+            'comp_defs': comp_defs,
+            'constraints': constraints,
+        }
+
+    @classmethod
+    def _from_repr(cls, r):
+        constraints = r['constraints']
+        comp_defs = [from_repr(_resolve_constraints(c, constraints))
+                     for c in r['comp_defs']]
+        return cls(comp_defs)
+
+    def __str__(self):
+        return 'DeployComputationsMessage({})'.format(
+            [comp_def.node.name for comp_def in self._comp_defs])
+
+    def __repr__(self):
+        return str(self)
+
+    def __eq__(self, other):
+        if type(other) != type(self):
+            return False
+        return self._comp_defs == other.comp_defs
+
+
+_CONSTRAINT_REF = '__constraint__'
+
+
+def _dedup_constraints(r, constraints: Dict[str, Any]):
+    """
+    Replace the constraints in the simple repr `r` by references to
+    `constraints`, a table of constraints reprs indexed by their hash.
+    """
+    if isinstance(r, dict):
+        if r.get('__module__') == 'pydcop.dcop.relations':
+            key = hashlib.sha1(json.dumps(r).encode(
+                'utf-8')).hexdigest()
+            constraints.setdefault(key, r)
+            return {_CONSTRAINT_REF: key}
+        return {k: _dedup_constraints(v, constraints) for k, v in r.items()}
+    elif isinstance(r, list):
+        return [_dedup_constraints(v, constraints) for v in r]
+    return r
+
+
+def _resolve_constraints(r, constraints: Dict[str, Any]):
+    """
+    Replace the constraints references in the simple repr `r` by the
+    constraints they refer to.
+
+    Reprs are copied as `from_repr` may modify them.
+    """
+    if isinstance(r, dict):
+        if _CONSTRAINT_REF in r:
+            return deepcopy(constraints[r[_CONSTRAINT_REF]])
+        return {k: _resolve_constraints(v, constraints) for k, v in r.items()}
+    elif isinstance(r, list):
+        return [_resolve_constraints(v, constraints) for v in r]
+    return r
+
+
 RunAgentMessage = message_type('run_computations', ['computations'])
 
 ReplicateComputationsMessage = message_type('replication', ['k'])
@@ -397,6 +524,21 @@ PauseMessage = message_type('pause_computations', ['computations'])
 
 ResumeMessage = message_type('resume_computations', ['computations'])
 
+# MigrateComputationsMessage is sent by the orchestrator to an orchestrated
+# agent to request it to remove computations that are migrated to another
+# agent. The agent forwards the messages it receives for these computations.
+MigrateComputationsMessage = message_type('migrate_computations',
+                                          ['computations'])
+
+# LoadRequestMessage is sent periodically by the orchestrator, when
+# rebalancing computations, to request the current load of an orchestrated
+# agent, which answers with a LoadReportMessage containing its total active
+# time (in seconds) and the number of messages waiting in its queue.
+LoadRequestMessage = message_type('load_request', [])
+
+LoadReportMessage = message_type('load_report',
+                                 ['agent', 'active_time', 'queue_size'])
+
 
 # StopAgentMessage is sent by the orchestrator to orchestrated agents to
 # indicate that they must stop.
@@ -425,6 +567,20 @@ CycleChangeMessage = message_type(
 # orchestrator. It is only sent when using periodic metric collection.
 MetricsMessage = message_type('metrics', ['agent', 'metrics'])
 
+# MetricsDigestMessage is sent by an orchestrated agent, when configured to
+# send digests, instead of ValueChangeMessage, CycleChangeMessage and
+# MetricsMessage. It contains all the events buffered since the previous digest:
+# * values: list of (computation, value, cost, cycle), only the last value
+#   selected by each computation is included
+# * cycles: list of (computation, cycle) cycle changes, only used with the
+#   'cycle_change' collection mode
+# * metrics: only the entries of the agent's metrics that changed since the
+#   previous digest
+# * periodic: True for the digest sent instead of the periodic MetricsMessage,
+#   with the 'period' collection mode.
+MetricsDigestMessage = message_type(
+    'metrics_digest', ['agent', 'values', 'cycles', 'metrics', 'periodic'])
+
 # A ComputationFinishedMessage is sent by an agent to inform the orchestrator
 # that a computation is finished.
 ComputationFinishedMessage = message_type(
@@ -562,9 +718,18 @@ class AgentsMgt(MessagePassingComputation):
     infinity: float
         value used to represent infinity for hard constraints
     collector: Queue
-        metrics will be posted on this queue.
+        metrics will be posted on this queue. Instead of the whole
+        assignment, these metrics contain, in `assignment_changes`, the
+        values that changed since the previous metrics.
     collect_moment:
         metrics collection mode
+    ring_size: int
+        number of recent metrics summaries kept
+    history_size: int
+        maximum number of summaries kept in the downsampled history of the
+        whole run
+    rebalance_period: float
+        if given, period of the load rebalancing, in seconds.
     """
 
     def __init__(self, algo: AlgorithmDef, cg: ComputationGraph,
@@ -574,7 +739,10 @@ class AgentsMgt(MessagePassingComputation):
                  infinity=float('inf'),
                  collector: Queue=None,
                  collect_moment: str='value_change',
-                 collect_period: float=None):
+                 collect_period: float=None,
+                 ring_size: int=DEFAULT_RING_SIZE,
+                 history_size: int=DEFAULT_HISTORY_SIZE,
+                 rebalance_period: float=None):
         super().__init__(ORCHESTRATOR_MGT)
         self._orchestrator_agent = orchestrator_agent
         self._orchestrator = orchestrator
@@ -593,6 +761,8 @@ class AgentsMgt(MessagePassingComputation):
             'value_change': self._on_value_change_msg,
             'cycle_change': self._on_cycle_change_msg,
             'metrics': self._on_metrics_msg,
+            'load_report': self._on_load_report_msg,
+            'metrics_digest': self._on_metrics_digest_msg,
             'end_of_computation': self._on_computation_end_msg,
             'stopped': self._on_agent_stopped_msg,
             'replicated': self._on_computation_replicated_msg,
@@ -606,6 +776,10 @@ class AgentsMgt(MessagePassingComputation):
 
         self._nb_computations = 0
         self.start_time = None
+        # Computations not registered yet, used to detect the end of the
+        # deployment without scanning all computations for each registration
+        self._expected_computations = set(agent_mapping.computations)
+        self._undeployed = set(self._expected_computations)
 
         # last_agt_stop_time is the perf_counter() time from the last
         # received stopped message from an agent.
@@ -626,21 +800,59 @@ class AgentsMgt(MessagePassingComputation):
         self._all_agt_stopped = threading.Event()
 
         # metrics
-        # Storing metrics for agent across several cycles :
-        # Dict cycle->agent->metrics or value
+        # Current values of computations, values for unfinished cycles and
+        # bounded history of metrics summaries.
         self._current_cycle = 0
+        self._store = MetricsStore([n.name for n in self.graph.nodes],
+                                   ring_size=ring_size,
+                                   history_size=history_size)
+        # Last metrics for each agent and, in 'cycle_change' mode, metrics
+        # for unfinished cycles: Dict cycle->agent->metrics
+        self._agt_metrics = {}  # type: Dict[str, Dict]
         self._agt_cycle_metrics = defaultdict(lambda: {})
-        self._agent_cycle_values = defaultdict(lambda: {})
         self._replication_metrics = {}
         # used to detect the end of a cycle
         self._computation_cycle = defaultdict(lambda: set())
 
         self._computation_status = {n.name : '' for n in self.graph.nodes}
 
+        # Metrics may be emitted for every value change, metrics message or
+        # cycle: cost and message totals are maintained incrementally
+        # instead of being recomputed from scratch every time.
+        self._running_cost = IncrementalSolutionCost(dcop, infinity)
+        # agent -> (msg count, msg size)
+        self._agt_totals = {}  # type: Dict[str, Tuple[int, int]]
+        self._msg_count, self._msg_size, self._max_cycle = 0, 0, 0
+        # Last full metrics for agents sending digests
+        self._agt_last_metrics = {}  # type: Dict[str, Dict]
+
         self.dist_count = 0
 
         self.repair_metrics = {}
 
+        # Load-aware migration of computations. Migrated computations are
+        # re-created from their definition, like repaired computations, which
+        # is only safe for algorithms that support it.
+        self._rebalance_period = rebalance_period
+        self._rebalancer = None
+        if rebalance_period:
+            if getattr(self._algo_module, 'MIGRATABLE', False):
+                self._rebalancer = LoadRebalancer(
+                    cg, dcop.agents.values(),
+                    self._algo_module.computation_memory)
+            else:
+                self.logger.warning(
+                    'Computations for %s cannot be migrated, load '
+                    'rebalancing is disabled', algo.algo)
+        # computation -> (source agent, target agent), for the migrations
+        # in progress
+        self._migrations = {}  # type: Dict[str, Tuple[str, str]]
+        self._migrated = set()
+        # Last load reported by each agent: (active_time, queue_size)
+        self._agt_loads = {}  # type: Dict[str, Tuple[float, int]]
+        # (time, computation, source agent, target agent)
+        self.migrations = []  # type: List[Tuple[float, str, str, str]]
+
     @property
     def type(self):
         return 'mgt'
@@ -687,8 +899,7 @@ class AgentsMgt(MessagePassingComputation):
         cost = 0
         for c in self.graph.nodes:
             try:
-                cost += self._agent_cycle_values[self._current_cycle][
-                    c.name][1]
+                cost += self._store.value(c.name)[1]
             except KeyError:
                 complete = False
             except TypeError:
@@ -700,8 +911,7 @@ class AgentsMgt(MessagePassingComputation):
         solution = {}
         for c in self.graph.nodes:
             try:
-                solution[c.name] = self._agent_cycle_values[
-                    self._current_cycle][c.name]
+                solution[c.name] = self._store.value(c.name)
             except KeyError:
                 self.logger.info('Could not find value for computation %s',
                                  c.name)
@@ -747,13 +957,14 @@ class AgentsMgt(MessagePassingComputation):
         # Cb registered to discovery: called for computations events
         self.logger.debug('Receiving computation registration %s: %s on %s',
                           evt, computation, agent)
-        if evt == 'computation_added':
-            deployed = set(self.discovery.computations())
-            expected = set(self.initial_dist.computations)
-            if computation not in expected:
+        if computation in self._migrations:
+            self._on_migration_registration(evt, computation, agent)
+        elif evt == 'computation_added':
+            if computation not in self._expected_computations:
                 return
 
-            missing = expected - deployed
+            self._undeployed.discard(computation)
+            missing = self._undeployed
             if not missing:
                 # once all computations have been deployed, ask agents to run
                 # them
@@ -787,7 +998,6 @@ class AgentsMgt(MessagePassingComputation):
             self.logger.info('Agent %s(%s) has finished replicating its '
                              'computations : %s - waiting for %s',
                              msg.agent, sender, msg, waited)
-            # self._agent_cycle_values[self._current_cycle]
             self._replication_metrics[msg.agent] = msg.metrics
             if not waited:
                 self.logger.info('All computations have been replicated')
@@ -812,22 +1022,24 @@ class AgentsMgt(MessagePassingComputation):
                           msg.computation, msg.value, msg.cost, sender)
 
         if self._collect_moment == 'cycle_change':
-            self._agent_cycle_values[msg.cycle][msg.computation] = \
-                (msg.value, msg.cost)
+            self._store.set_cycle_value(msg.cycle, msg.computation,
+                                        msg.value, msg.cost)
 
         else:
-            self._agent_cycle_values[self._current_cycle][msg.computation] =\
-                (msg.value, msg.cost)
+            self._store_value(msg.computation, msg.value, msg.cost)
             if self._collect_moment == 'value_change':
                 if msg.computation not in self._dcop.variables:
                     # only emit metrics for dcop variable (not reparation
                     # variable)
                     return
 
-                self._agt_cycle_metrics[self._current_cycle][msg.agent] =\
-                    msg.metrics
+                self._set_agent_metrics(msg.agent, msg.metrics)
                 self._emit_metrics(t)
 
+    def _store_value(self, computation: str, value, cost):
+        self._store.set_value(computation, value, cost)
+        self._running_cost.set_value(computation, value)
+
     def _on_cycle_change_msg(self, sender: str, msg: CycleChangeMessage,
                              t: float):
         # Called when receiving a cycle change message from one of the agent.
@@ -854,41 +1066,88 @@ class AgentsMgt(MessagePassingComputation):
                         self._nb_computations:
                     self._current_cycle = cycle_end
 
-                    if cycle_end > 0:
-                        # During a cycle, not all computation select a new
-                        # value, we need to get the unchanged values frm the
-                        #  previous cycle.
-                        vals = self._agent_cycle_values[cycle_end-1].copy()
-                        vals.update(self._agent_cycle_values[cycle_end])
-                        self._agent_cycle_values[cycle_end] = vals
-                        self.logger.debug('Cycle %s is finished : %s',
-                                          cycle_end, vals)
+                    changed = self._apply_cycle_values(cycle_end)
+                    self.logger.debug('Cycle %s is finished : %s',
+                                      cycle_end, changed)
+                    for agt, agt_metrics in \
+                            self._agt_cycle_metrics.pop(cycle_end).items():
+                        self._set_agent_metrics(agt, agt_metrics)
+                    del self._computation_cycle[cycle_end]
 
                     self._emit_metrics(t)
-                    del self._agt_cycle_metrics[cycle_end]
-                    del self._computation_cycle[cycle_end]
                 else:
                     self.logger.debug('Store metrics for cycle %s on '
                                       'computation %s ',
                                       cycle_end, msg.computation)
 
+    def _apply_cycle_values(self, cycle):
+        # During a cycle, not all computation select a new value, unchanged
+        # values are kept from previous cycles.
+        changed = self._store.end_cycle(cycle)
+        for computation, value in changed:
+            self._running_cost.set_value(computation, value)
+        return changed
+
     def _on_metrics_msg(self, sender: str, msg: MetricsMessage, t):
         # Called when receiving a metric message from one of the
         # orchestrated agent. The metric message contains the metrics for
         # all the computations hosted by this agent.
         self.logger.info('Received metrics from %s : %s - %s', msg.agent,
                          dict(msg.metrics), sender)
-        self._agt_cycle_metrics[self._current_cycle][msg.agent] = msg.metrics
+        self._set_agent_metrics(msg.agent, msg.metrics)
 
         self._emit_metrics(t)
 
+    def _on_load_report_msg(self, sender: str, msg: LoadReportMessage, t):
+        self._agt_loads[msg.agent] = (msg.active_time, msg.queue_size)
+
+    def _on_metrics_digest_msg(self, sender: str, msg: MetricsDigestMessage,
+                               t: float):
+        # Called when receiving a digest from an orchestrated agent, which
+        # replaces the value_change, cycle_change and metrics messages.
+        self.logger.debug('Received digest from %s : %s values, %s cycles',
+                          msg.agent, len(msg.values), len(msg.cycles))
+        previous = self._agt_last_metrics.get(msg.agent, {})
+        metrics = dict(previous)
+        for k, v in msg.metrics.items():
+            if isinstance(v, dict):
+                metrics[k] = dict(previous.get(k, {}), **v)
+            else:
+                metrics[k] = v
+        self._agt_last_metrics[msg.agent] = metrics
+
+        if self._collect_moment == 'cycle_change':
+            for computation, value, cost, cycle in msg.values:
+                self._store.set_cycle_value(cycle, computation, value, cost)
+            for computation, cycle in msg.cycles:
+                self._on_cycle_change_msg(
+                    sender,
+                    CycleChangeMessage(msg.agent, computation, cycle, metrics),
+                    t)
+            return
+
+        changed = False
+        for computation, value, cost, _ in msg.values:
+            self._store_value(computation, value, cost)
+            changed |= computation in self._dcop.variables
+        self._set_agent_metrics(msg.agent, metrics)
+        if self._collect_moment == 'period':
+            # Like MetricsMessage, only the periodic digests emit metrics, so
+            # that the number of metrics does not depend on the digest period.
+            if msg.periodic:
+                self._emit_metrics(t)
+        elif changed:
+            self._emit_metrics(t)
+
     def _on_agent_stopped_msg(self, sender: str, msg: AgentStoppedMessage,
                               reception_time: float):
         self.logger.debug('Received stopped from %s : %s - %s', msg.agent,
                           dict(msg.metrics), sender)
+        # Values for cycles that will never be finished are the last values
+        # selected by the computations.
+        self._apply_cycle_values(float('inf'))
         try:
-            self._agt_cycle_metrics[self._current_cycle][msg.agent] \
-                = msg.metrics
+            self._set_agent_metrics(msg.agent, msg.metrics)
         except ValueError:
             self.logger.warning('Stopped message for an unexpected agent: %s ',
                                 msg.agent)
@@ -941,6 +1200,9 @@ class AgentsMgt(MessagePassingComputation):
             if not self._orchestrator.repair_only:
                 self._send_mgt_msg(agt, RunAgentMessage(computations))
             self._agts_state[agt] = 'running'
+        if self._rebalancer is not None \
+                and not self._orchestrator.repair_only:
+            self.add_periodic_action(self._rebalance_period, self._rebalance)
 
     def _orchestrator_start_replication(self, msg, *_):
         """
@@ -1024,6 +1286,87 @@ class AgentsMgt(MessagePassingComputation):
             self._send_mgt_msg(candidate, msg)
             self._agts_state[candidate] = 'repair_setup'
 
+    def _rebalance(self):
+        """
+        Periodic action: migrate computations from overloaded agents to
+        underloaded agents.
+
+        Migrations use the same steps as the repair process: all
+        computations are paused, migrated computations are removed from their
+        source agent, deployed on their target agent once their removal has
+        been registered and, once all of them have been registered again,
+        started and all other computations are resumed.
+        """
+        agents = self.discovery.agents()
+        if self._migrations or \
+                any(self._agts_state.get(a) != 'running' for a in agents):
+            # Do not interfere with a migration or repair in progress.
+            return
+        hosted = {
+            a: [c for c in self.discovery.agent_computations(a)
+                if self._computation_status.get(c, 'finished') != 'finished']
+            for a in agents}
+        moves = []
+        if all(a in self._agt_loads for a in agents):
+            moves = self._rebalancer.plan(
+                hosted,
+                {a: self._agt_loads[a][0] for a in agents},
+                {a: self._agt_loads[a][1] for a in agents},
+                perf_counter())
+        self._agt_loads.clear()
+        if not moves:
+            # Loads are measured between two rounds without migration.
+            for agent in agents:
+                self._send_mgt_msg(agent, LoadRequestMessage())
+            return
+
+        self.logger.info('Migrating computations %s', moves)
+        self._rebalancer.reset()
+        self._request_pause()
+        by_source = defaultdict(list)
+        for computation, src, dest in moves:
+            self._migrations[computation] = (src, dest)
+            self._agts_state[src] = self._agts_state[dest] = 'migrating'
+            by_source[src].append(computation)
+        for src, computations in by_source.items():
+            self._send_mgt_msg(src, MigrateComputationsMessage(computations))
+
+    def _on_migration_registration(self, evt: str, computation: str,
+                                   agent: str):
+        src, dest = self._migrations[computation]
+        if evt == 'computation_removed':
+            # Only deploy the computation once it has been removed from the
+            # directory, otherwise the removal would also remove the new host.
+            # Note: removal notifications do not always include the agent.
+            self.logger.debug('Computation %s removed from %s, deploying it '
+                              'on %s', computation, src, dest)
+            self._send_mgt_msg(dest, DeployComputationsMessage(
+                [ComputationDef(self.graph.computation(computation),
+                                self._algo)]))
+        elif evt == 'computation_added' and agent == dest:
+            self.logger.info('Computation %s migrated from %s to %s',
+                             computation, src, dest)
+            self._migrated.add(computation)
+            self.migrations.append(
+                (perf_counter() - self.start_time, computation, src, dest))
+            if len(self._migrated) == len(self._migrations):
+                self._end_migrations()
+
+    def _end_migrations(self):
+        # Start the migrated computations and resume all others
+        migrated = defaultdict(list)
+        for computation, (_, dest) in self._migrations.items():
+            migrated[dest].append(computation)
+        self._migrations.clear()
+        self._migrated.clear()
+        for agent in self.discovery.agents():
+            self._send_mgt_msg(agent, ResumeMessage(
+                [c for c in self.discovery.agent_computations(agent)
+                 if c not in migrated[agent]]))
+            self._agts_state[agent] = 'running'
+        for agent, computations in migrated.items():
+            self._send_mgt_msg(agent, RunAgentMessage(computations))
+
     def _agents_arrival(self, arrived_agents: List[str]):
         # TODO
         # For arrival,
@@ -1188,16 +1531,19 @@ class AgentsMgt(MessagePassingComputation):
 
     def _deploy_computation(self, agent_id: str):
         """Deploy computations hosted on agent `agent_id` """
-        for c in self.initial_dist.computations_hosted(agent_id):
-            self._nb_computations += 1
-            self.logger.info('Deploying computation %s on %s', c, agent_id)
-            comp_def = ComputationDef(self.graph.computation(c),
-                                      self._algo)
-            self._send_mgt_msg(agent_id, DeployMessage(comp_def))
-            self.discovery.subscribe_computation(
-                comp_def.node.name, self._cb_computation_registration)
-            self.discovery.subscribe_replica(
-                comp_def.node.name, self._cb_replica_registration)
+        computations = self.initial_dist.computations_hosted(agent_id)
+        if not computations:
+            return
+        self.logger.info('Deploying computations %s on %s',
+                         computations, agent_id)
+        comp_defs = [ComputationDef(self.graph.computation(c), self._algo)
+                     for c in computations]
+        self._nb_computations += len(comp_defs)
+        self._send_mgt_msg(agent_id, DeployComputationsMessage(comp_defs))
+        for c in computations:
+            self.discovery.subscribe_replica(c, self._cb_replica_registration)
+        self.discovery.subscribe_computations(
+            computations, self._cb_computation_registration)
 
     def wait_stop_agents(self, timeout=None):
         # wait until all agents have indicated they have stopped
@@ -1206,68 +1552,88 @@ class AgentsMgt(MessagePassingComputation):
 
     def global_metrics(self, current_status, t):
 
+        global_metrics = self._metrics(current_status, t)
+        global_metrics['assignment'] = self._store.assignment()
+        return global_metrics
+
+    def _metrics(self, current_status, t):
+        # All metrics, except the assignment.
         if t is None:
             t = perf_counter()
 
-        # Current global cost
-        agent_values = self._agent_cycle_values[self._current_cycle]
+        summary = self._summary(t)
+        global_metrics = {
+            'status': current_status,
+            'cost':  summary.cost,
+            'violation':  summary.violation,
+            'time': summary.time,
+            'msg_count': summary.msg_count,
+            'msg_size': summary.msg_size,
+            'cycle': summary.cycle,
+            'agt_metrics': dict(self._agt_metrics)
+        }
+        if self._rebalancer is not None:
+            global_metrics['migrations'] = len(self.migrations)
 
-        assignment = {k: agent_values[k][0] for k in agent_values
-                      if agent_values[k]}
-        # only keep dcop variable to compute the solution cost
-        # it might other contain variables used for reparation
-        dcop_assignment = filter_assignment_dict(
-            assignment, self._dcop.variables.values())
-        try:
-            violation, cost = self._dcop.solution_cost(dcop_assignment,
-                                                       self.infinity)
-        except ValueError as ve:
-            var_names = set(self._dcop.variables)
-            ass_names = set(assignment)
-            self.logger.debug(
-                'Cannot compute cost for cycle %s, incomplete assignment: '
-                'missing var %s in  %s', self._current_cycle,
-                (var_names - ass_names), assignment)
-            self.logger.debug(ve)
-            cost, violation = None, None
+        return global_metrics
 
-        # msg stats and activity ratio
-        msg_count, msg_size = 0, 0
-        agt_cycles = []
-        for agt in self._agt_cycle_metrics[self._current_cycle]:
-            agt_metrics = self._agt_cycle_metrics[self._current_cycle][agt]
-            try:
-                msg_count += sum( agt_metrics['count_ext_msg'][v]
-                                  for v in agt_metrics['count_ext_msg'])
-                msg_size += sum(agt_metrics['size_ext_msg'][v]
-                                for v in agt_metrics['size_ext_msg'])
-                agt_cycles += [agt_metrics['cycles'][v]
-                                    for v in agt_metrics['cycles']]
-            except KeyError:
-                self.logger.warning(
-                    'Incomplete metrics for computation %s : %s ',
-                    agt, agt_metrics)
-        max_cycle = max(agt_cycles, default=0)
+    def metrics_history(self):
+        """
+        Summaries of the metrics emitted during the run.
+
+        Returns
+        -------
+        tuple
+            a tuple of two lists of `MetricsSummary`: the most recent
+            summaries and a downsampled history of the whole run.
+        """
+        return self._store.recent(), self._store.history()
 
+    def _summary(self, t):
+        try:
+            violation, cost = self._running_cost.solution_cost()
+        except ValueError:
+            cost, violation = None, None
         total_time = t - self.start_time if self.start_time is not None else 0
+        return MetricsSummary(total_time, self._max_cycle, cost, violation,
+                              self._msg_count, self._msg_size)
 
-        global_metrics = {
-            'status': current_status,
-            'assignment': assignment,
-            'cost':  cost,
-            'violation':  violation,
-            'time': total_time,
-            'msg_count': msg_count,
-            'msg_size': msg_size,
-            'cycle': max_cycle,
-            'agt_metrics': self._agt_cycle_metrics[self._current_cycle]
-        }
+    def _agent_totals(self, agt, agt_metrics):
+        try:
+            return (sum(agt_metrics['count_ext_msg'].values()),
+                    sum(agt_metrics['size_ext_msg'].values()),
+                    max(agt_metrics['cycles'].values(), default=0))
+        except KeyError:
+            self.logger.warning(
+                'Incomplete metrics for computation %s : %s ',
+                agt, agt_metrics)
+            return 0, 0, 0
 
-        return global_metrics
+    def _set_agent_metrics(self, agt, agt_metrics):
+        """
+        Store the last metrics received from an agent, and update the running
+        message totals with the difference from its previous metrics.
+        """
+        self._agt_metrics[agt] = agt_metrics
+        count, size, cycle = self._agent_totals(agt, agt_metrics)
+        prev_count, prev_size = self._agt_totals.get(agt, (0, 0))
+        self._msg_count += count - prev_count
+        self._msg_size += size - prev_size
+        self._agt_totals[agt] = count, size
+        # cycles only increase, no need to look at other agents
+        self._max_cycle = max(self._max_cycle, cycle)
 
     def _emit_metrics(self, t):
+        if t is None:
+            t = perf_counter()
+        self._store.add_summary(self._summary(t))
         if self._collector is not None:
-            self._collector.put((t, self.global_metrics('RUNNING', t)))
+            # Building the whole assignment for every event would cost O(n):
+            # running metrics only contain the values changed since the
+            # previous ones.
+            metrics = self._metrics('RUNNING', t)
+            metrics['assignment_changes'] = self._store.changes()
+            self._collector.put((t, metrics))
 
     def _send_mgt_msg(self, agt, msg):
         self.post_msg('_mgt_' + agt, msg, MSG_MGT)
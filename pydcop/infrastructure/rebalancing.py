@@ -0,0 +1,237 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Load-aware migration of computations at run time.
+
+Once deployed, computations stay on the agent they were initially
+distributed to. When some agents are much busier than others (the
+distribution was based on inaccurate estimates, or the load of the
+algorithm changes over time), a `LoadRebalancer` can be used by the
+orchestrator to select computations that should be migrated from
+overloaded agents to underloaded agents.
+
+The load of an agent is the fraction of time it spent handling messages
+since the previous rebalancing round, computed from the total active time
+reported by agents, and the number of messages waiting in their queue is
+used to detect agents whose message queue is backing up.
+
+The rebalancer only selects migrations, they are performed by the
+orchestrator (see `AgentsMgt`).
+"""
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from pydcop.computations_graph.objects import ComputationGraph
+from pydcop.dcop.objects import AgentDef
+
+# An agent is overloaded when its load is greater than the average load
+# multiplied by this factor.
+OVERLOAD_FACTOR = 1.5
+# Agents whose load is below this value are never considered overloaded.
+MIN_LOAD = 0.2
+# An agent is also overloaded when it has more messages than this waiting
+# in its queue (and a load greater than the average load).
+MAX_QUEUE_SIZE = 100
+
+Migration = Tuple[str, str, str]
+
+
+class LoadRebalancer(object):
+    """
+    Selects computations to migrate, based on the load of agents.
+
+    At each call to `plan`, the load of each agent since the previous call
+    is computed from its total active time. Computations are then moved
+    from overloaded agents to the least loaded agents, at most one
+    computation per agent and per round, and only if the move does not
+    make the target agent busier than the source agent was. As there is
+    no metric for the load of each computation, the load of an agent is
+    assumed to be evenly shared by its computations.
+
+    Among the computations of an overloaded agent, the one with the largest
+    number of neighbours already hosted on the target agent is migrated,
+    to avoid increasing the communication load.
+
+    Parameters
+    ----------
+    cg: ComputationGraph
+        the computation graph of the running dcop.
+    agents: iterable of AgentDef
+        definition of the agents, for their capacity.
+    computation_memory: function
+        a function giving the footprint of a computation (from the algorithm
+        module). When None, the capacity of agents is not checked.
+    overload_factor: float
+        see `OVERLOAD_FACTOR`
+    min_load: float
+        see `MIN_LOAD`
+    max_queue_size: int
+        see `MAX_QUEUE_SIZE`
+    """
+
+    def __init__(self, cg: ComputationGraph, agents: Iterable[AgentDef],
+                 computation_memory: Callable = None,
+                 overload_factor: float = OVERLOAD_FACTOR,
+                 min_load: float = MIN_LOAD,
+                 max_queue_size: int = MAX_QUEUE_SIZE):
+        self.graph = cg
+        self.agents = {a.name: a for a in agents}
+        self.computation_memory = computation_memory
+        self.overload_factor = overload_factor
+        self.min_load = min_load
+        self.max_queue_size = max_queue_size
+
+        self._last_t = None
+        self._last_active = {}  # type: Dict[str, float]
+
+    def loads(self, active_times: Dict[str, float], t: float) \
+            -> Dict[str, float]:
+        """
+        Load of agents since the previous call.
+
+        Parameters
+        ----------
+        active_times: dict
+            total active time of each agent, in seconds.
+        t: float
+            current time, in seconds.
+
+        Returns
+        -------
+        dict
+            the fraction of time each agent has been active since the
+            previous call. Empty on the first call, agents that were not
+            given in the previous call are not included.
+        """
+        loads = {}
+        if self._last_t is not None and t > self._last_t:
+            duration = t - self._last_t
+            for agent, active in active_times.items():
+                if agent in self._last_active:
+                    loads[agent] = max(0, active - self._last_active[agent]) \
+                        / duration
+        self._last_t = t
+        self._last_active = dict(active_times)
+        return loads
+
+    def reset(self):
+        """
+        Forget the active times given in the previous call, for example
+        when the distribution has changed: the next call to `plan` will
+        only be used as a new starting point.
+        """
+        self._last_t = None
+        self._last_active = {}
+
+    def plan(self, hosted: Dict[str, List[str]],
+             active_times: Dict[str, float],
+             queue_sizes: Dict[str, int], t: float) -> List[Migration]:
+        """
+        Select the computations to migrate.
+
+        Parameters
+        ----------
+        hosted: dict
+            current distribution, as a map agent -> names of the
+            computations hosted on this agent.
+        active_times: dict
+            total active time of each agent, in seconds.
+        queue_sizes: dict
+            number of messages waiting in the queue of each agent.
+        t: float
+            current time, in seconds.
+
+        Returns
+        -------
+        list
+            a list of migrations ``(computation, source agent, target
+            agent)``, empty if the load is balanced enough.
+        """
+        loads = self.loads(active_times, t)
+        agents = [a for a in hosted if a in self.agents]
+        if not loads or len(agents) < 2:
+            return []
+        loads = {a: loads.get(a, 0) for a in agents}
+        mean = sum(loads.values()) / len(agents)
+
+        overloaded = [
+            a for a in agents
+            if len(hosted[a]) > 0 and loads[a] >= self.min_load
+            and (loads[a] > mean * self.overload_factor
+                 or (loads[a] > mean
+                     and queue_sizes.get(a, 0) > self.max_queue_size))]
+        overloaded.sort(key=lambda a: (-loads[a], a))
+
+        migrations = []
+        busy = set()
+        for src in overloaded:
+            comp_load = loads[src] / len(hosted[src])
+            candidates = sorted(
+                (a for a in agents if a != src and a not in busy
+                 and loads[a] + comp_load < loads[src]),
+                key=lambda a: (loads[a], a))
+            for dest in candidates:
+                computation = self._select_computation(
+                    hosted[src], hosted[dest], dest)
+                if computation is not None:
+                    migrations.append((computation, src, dest))
+                    busy.update((src, dest))
+                    loads[src] -= comp_load
+                    loads[dest] += comp_load
+                    break
+        return migrations
+
+    def _select_computation(self, src_computations: List[str],
+                            dest_computations: List[str], dest: str):
+        remaining = self._remaining_capacity(dest, dest_computations)
+        dest_computations = set(dest_computations)
+        best, best_score = None, None
+        for computation in sorted(src_computations):
+            node = self.graph.computation(computation)
+            if self._footprint(node) > remaining:
+                continue
+            score = sum(1 for n in self.graph.neighbors(computation)
+                        if n in dest_computations)
+            if best_score is None or score > best_score:
+                best, best_score = computation, score
+        return best
+
+    def _remaining_capacity(self, agent: str, computations: List[str]):
+        capacity = getattr(self.agents[agent], 'capacity', None)
+        if capacity is None or self.computation_memory is None:
+            return float('inf')
+        return capacity - sum(self._footprint(self.graph.computation(c))
+                              for c in computations)
+
+    def _footprint(self, node):
+        if self.computation_memory is None:
+            return 0
+        return self.computation_memory(node)
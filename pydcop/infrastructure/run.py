@@ -28,10 +28,11 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 import logging
+import os
 from importlib import import_module
 from multiprocessing import Process
 from queue import Queue
-from typing import Union
+from typing import List, Union
 
 from pydcop.algorithms import AlgorithmDef, load_algorithm_module
 from pydcop.computations_graph.objects import ComputationGraph
@@ -39,9 +40,12 @@ from pydcop.dcop.dcop import DCOP
 from pydcop.dcop.objects import AgentDef
 from pydcop.distribution.objects import Distribution
 from pydcop.infrastructure.communication import InProcessCommunicationLayer, \
-    HttpCommunicationLayer
+    IpcCommunicationLayer, IpcEndpoint
+from pydcop.infrastructure.lockstep import LockstepExecutor
 from pydcop.infrastructure.orchestratedagents import OrchestratedAgent
 from pydcop.infrastructure.orchestrator import Orchestrator
+from pydcop.infrastructure.runtime import CooperativeRuntime
+from pydcop.infrastructure.simulation import SimulationEngine
 
 
 
@@ -152,10 +156,17 @@ def run_local_thread_dcop(algo: AlgorithmDef,
                           period=None,
                           replication=None,
                           delay=None,
-                          uiport=None) -> Orchestrator:
+                          uiport=None,
+                          nb_workers: int=None,
+                          digest_period: float=None,
+                          link_metrics: bool=False,
+                          rebalance_period: float=None,
+                          lockstep: bool=True) -> Orchestrator:
     """Build orchestrator and agents for running a dcop in threads.
 
-    The DCOP will be run in a single process, using one thread for each agent.
+    The DCOP will be run in a single process, using one thread for each agent,
+    or, when `nb_workers` is given, using a `CooperativeRuntime` where all
+    agents share a small pool of worker threads.
 
     Parameters
     ----------
@@ -178,6 +189,24 @@ def run_local_thread_dcop(algo: AlgorithmDef,
         period for collecting metrics, only used we 'period' metric collection
     replication
         replication algorithm,  for resilent DCOP.
+    nb_workers: int
+        if given, agents are run on a CooperativeRuntime with this number
+        of worker threads, instead of using one thread for each agent.
+    digest_period: float
+        if given, agents coalesce value changes and metrics and send them
+        to the orchestrator as digests, at most every `digest_period`
+        seconds (and at the end of each cycle with 'cycle_change').
+    link_metrics: bool
+        if True, agents count the messages sent on each link between
+        computations, and include them in their metrics.
+    rebalance_period: float
+        if given, the orchestrator migrates computations from overloaded
+        agents to underloaded agents every `rebalance_period` seconds.
+    lockstep: bool
+        if True (default), synchronous computations are run in lock-step
+        by a `LockstepExecutor`, without synchronization messages. Not
+        used with `replication`, `delay` or `rebalance_period`, which
+        require computations to run on their agent's thread.
 
     Returns
     -------
@@ -187,8 +216,8 @@ def run_local_thread_dcop(algo: AlgorithmDef,
 
     See Also
     --------
-    Orchestrator, OrchestratedAgent
-    run_local_process_dcopb
+    Orchestrator, OrchestratedAgent, LockstepExecutor
+    run_local_process_dcop
 
 
     """
@@ -198,9 +227,15 @@ def run_local_thread_dcop(algo: AlgorithmDef,
                                 collector=collector,
                                 collect_moment=collect_moment,
                                 collect_period=period,
-                                ui_port=uiport)
+                                ui_port=uiport,
+                                rebalance_period=rebalance_period)
     orchestrator.start()
 
+    runtime = CooperativeRuntime(nb_workers) if nb_workers else None
+    # All computations are hosted in this process.
+    executor = LockstepExecutor(distribution.computations) \
+        if _use_lockstep(lockstep, replication, delay, rebalance_period) \
+        else None
 
     # Create and start all agents.
     # Each agent will register it-self on the orchestrator
@@ -214,14 +249,80 @@ def run_local_thread_dcop(algo: AlgorithmDef,
                                   metrics_period=period,
                                   replication=replication,
                                   delay=delay,
-                                  ui_port=uiport)
-        agent.start()
+                                  ui_port=uiport,
+                                  digest_period=digest_period,
+                                  link_metrics=link_metrics,
+                                  lockstep=executor)
+        agent.start(runtime)
 
     # once all agents have started and registered to the orchestrator,
     # computation will be deployed on them and then run.
     return orchestrator
 
 
+def run_simulated_dcop(algo: AlgorithmDef,
+                       cg: ComputationGraph,
+                       distribution: Distribution,
+                       dcop: DCOP,
+                       infinity: float=float('inf'),
+                       collector: Queue=None,
+                       collect_moment: str='value_change',
+                       period=None,
+                       seed: int=None,
+                       link_metrics: bool=False) -> SimulationEngine:
+    """Build a simulation engine for running a dcop in a single thread.
+
+    No agent is created: the computations are built directly and exchange
+    their messages through the engine's event queue, in logical time.
+    The returned engine can be used like an orchestrator.
+
+    Parameters
+    ----------
+    algo: AlgorithmDef
+        Definition of DCOP algorithm, with associated parameters
+    cg: ComputationGraph
+        The computation graph used to solve the DCOP with the given algorithm
+    distribution: Distribution
+        Distribution of the computation on the agents, used for metrics.
+    dcop: DCOP
+        The DCOP instance to solve
+    infinity: float
+        cost representing infinity for hard constraints, e.g. the value of
+        the `--infinity` cli option. Constraints with this cost are counted
+        as violations, and not in the cost of the solution.
+    collector: queue
+        optionnal queue, used to collect metrics
+    collect_moment: str
+        metric collection configuration : 'cycle_change', 'value_change' or
+        'period'
+    period: float
+        period for collecting metrics, in simulated time, only used we
+        'period' metric collection
+    seed: int
+        seed for random number generators, for reproducible runs.
+    link_metrics: bool
+        if True, the messages sent on each link between computations are
+        counted and included in agents' metrics.
+
+    Returns
+    -------
+    SimulationEngine
+        the simulation engine
+
+    See Also
+    --------
+    SimulationEngine
+    run_local_thread_dcop
+
+    """
+    return SimulationEngine(algo, cg, distribution, dcop, infinity,
+                            collector=collector,
+                            collect_moment=collect_moment,
+                            collect_period=period,
+                            seed=seed,
+                            link_metrics=link_metrics)
+
+
 def run_local_process_dcop(algo: AlgorithmDef, cg: ComputationGraph,
                            distribution: Distribution, dcop: DCOP,
                            infinity,  # FIXME : this has nothing to to here, #41
@@ -230,32 +331,92 @@ def run_local_process_dcop(algo: AlgorithmDef, cg: ComputationGraph,
                            period=None,
                            replication=None,
                            delay=None,
-                           uiport=None
+                           uiport=None,
+                           nb_process: int=None,
+                           nb_workers: int=None,
+                           digest_period: float=None,
+                           link_metrics: bool=False,
+                           rebalance_period: float=None,
+                           lockstep: bool=True
                            ):
+    """Build orchestrator and agents for running a dcop in processes.
+
+    The DCOP will be run on the local machine, with agents sharded over a
+    fixed pool of worker processes. Each worker process hosts several
+    agents, each running in its own thread. Agents and orchestrator
+    communicate through local pipes, using an `IpcCommunicationLayer`, and
+    agents hosted in the same worker process exchange their messages
+    in-process.
 
+    Parameters are the same as for `run_local_thread_dcop`, with an
+    additional `nb_process` parameter.
+
+    Parameters
+    ----------
+    nb_process: int
+        number of worker processes, defaults to the number of cpu cores.
+        Use a number greater or equal to the number of agents to get one
+        process for each agent.
+    nb_workers: int
+        if given, agents in each worker process are run on a
+        CooperativeRuntime with this number of worker threads, instead of
+        using one thread for each agent.
+    lockstep: bool
+        if True (default), each worker process runs the synchronous
+        computations it hosts in lock-step, using a `LockstepExecutor`.
+        Rounds are only synchronized with messages on the links between
+        computations hosted in different processes.
+
+    Returns
+    -------
+    orchestator
+        An orchestrator agent that bootstrap dcop agents, monitor them and
+        collects metrics.
+
+    See Also
+    --------
+    run_local_thread_dcop, IpcCommunicationLayer
+
+    """
     agents = dcop.agents
-    port = 9000
-    comm = HttpCommunicationLayer(('127.0.0.1', port))
+    comm = IpcCommunicationLayer()
     orchestrator = Orchestrator(algo, cg, distribution, comm, dcop, infinity,
                                 collector=collector,
                                 collect_moment=collect_moment,
                                 collect_period=period,
-                                ui_port=uiport)
+                                ui_port=uiport,
+                                rebalance_period=rebalance_period)
     orchestrator.start()
 
-    # Create and start all agents.
+    if nb_process is None:
+        nb_process = os.cpu_count() or 1
+
+    # Create and start all worker processes and their agents.
     # Each agent will register it-self on the orchestrator
-    for a_name in dcop.agents:
-        port += 1
-        if uiport:
-            uiport += 1
-        p = Process(target=_build_process_agent, name='p_'+a_name,
-                    args=[agents[a_name], port, orchestrator.address],
+    use_lockstep = \
+        _use_lockstep(lockstep, replication, delay, rebalance_period)
+    for i, shard in enumerate(shard_agents(list(agents), nb_process)):
+        agt_defs, uiports = [], []
+        # Computations hosted in this worker process, for its executor
+        lockstep_computations = \
+            [c for a in shard for c in distribution.computations_hosted(a)] \
+            if use_lockstep else None
+        for a_name in shard:
+            if uiport:
+                uiport += 1
+            agt_defs.append(agents[a_name])
+            uiports.append(uiport)
+        p = Process(target=_build_process_agents, name='p_{}'.format(i),
+                    args=[agt_defs, orchestrator.address],
                     kwargs={'metrics_on': collect_moment,
                             'metrics_period': period,
                             'replication': replication,
                             'delay': delay,
-                            'uiport': uiport},
+                            'uiports': uiports,
+                            'nb_workers': nb_workers,
+                            'digest_period': digest_period,
+                            'link_metrics': link_metrics,
+                            'lockstep_computations': lockstep_computations},
                     daemon=True)
         p.start()
 
@@ -264,17 +425,59 @@ def run_local_process_dcop(algo: AlgorithmDef, cg: ComputationGraph,
     return orchestrator
 
 
+def _use_lockstep(lockstep, replication, delay, rebalance_period) -> bool:
+    # Replication and rebalancing move computations between agents, and
+    # the delay is applied to messages in the agents' queues: these
+    # require computations to be run by their agents.
+    return lockstep and not (replication or delay or rebalance_period)
+
+
+def shard_agents(agents: List[str], nb_shards: int) -> List[List[str]]:
+    """
+    Split a list of agents into at most `nb_shards` shards of balanced sizes.
+
+    Agents are kept in their original order, each shard containing
+    contiguous agents.
 
-def _build_process_agent(agt_def: AgentDef, port, orchestrator_address,
-                         metrics_on, metrics_period, replication,
-                         delay, uiport):
-    comm = HttpCommunicationLayer(('127.0.0.1', port))
-    agent = OrchestratedAgent(agt_def, comm, orchestrator_address,
-                              metrics_on=metrics_on,
-                              metrics_period=metrics_period,
-                              replication=replication,
-                              delay=delay,
-                              ui_port=uiport)
+    Examples
+    --------
+    >>> shard_agents(['a1', 'a2', 'a3', 'a4', 'a5'], 2)
+    [['a1', 'a2', 'a3'], ['a4', 'a5']]
+    >>> shard_agents(['a1', 'a2'], 4)
+    [['a1'], ['a2']]
+    """
+    nb_shards = max(1, min(nb_shards, len(agents)))
+    size, extra = divmod(len(agents), nb_shards)
+    shards, start = [], 0
+    for i in range(nb_shards):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(agents[start:end])
+        start = end
+    return shards
+
+
+def _build_process_agents(agt_defs: List[AgentDef], orchestrator_address,
+                          metrics_on, metrics_period, replication,
+                          delay, uiports, nb_workers=None,
+                          digest_period=None, link_metrics=False,
+                          lockstep_computations=None):
+    # All agents in this process share the same pipe endpoint.
+    endpoint = IpcEndpoint()
+    executor = LockstepExecutor(lockstep_computations) \
+        if lockstep_computations is not None else None
+    process_agents = []
+    for agt_def, uiport in zip(agt_defs, uiports):
+        comm = IpcCommunicationLayer(endpoint=endpoint)
+        agent = OrchestratedAgent(agt_def, comm, orchestrator_address,
+                                  metrics_on=metrics_on,
+                                  metrics_period=metrics_period,
+                                  replication=replication,
+                                  delay=delay,
+                                  ui_port=uiport,
+                                  digest_period=digest_period,
+                                  link_metrics=link_metrics,
+                                  lockstep=executor)
+        process_agents.append(agent)
 
     # Disable all non-error logging for agent's processes, we don't want
     # all agents trying to log in the same console
@@ -284,4 +487,11 @@ def _build_process_agent(agt_def: AgentDef, port, orchestrator_address,
     root_logger.setLevel(logging.ERROR)
     root_logger.addHandler(console_handler)
 
-    agent.start()
+    runtime = CooperativeRuntime(nb_workers) if nb_workers else None
+    for agent in process_agents:
+        agent.start(runtime)
+    # Keep the process's main thread alive as long as the agents are running:
+    # exit handlers, run when returning from this function, would otherwise
+    # remove the pipe the agents are listening on.
+    for agent in process_agents:
+        agent.join()
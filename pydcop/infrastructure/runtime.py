@@ -0,0 +1,261 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Cooperative runtime for agents.
+
+By default, each `Agent` runs on its own thread, which polls the agent's
+message queue. When running thousands of agents in the same process, this
+thread-per-agent model is dominated by polling and GIL contention.
+
+A `CooperativeRuntime` runs many agents on a small, fixed pool of worker
+threads. An agent is only scheduled on a worker when a message is posted in
+its queue or when one of its periodic actions is due. An agent is never
+run on more than one worker at the same time, which means that, from the
+agent's and computations' point of view, the semantics are exactly the
+same as when using a dedicated thread.
+
+Examples
+--------
+
+    runtime = CooperativeRuntime(4)
+    for agt in agents:
+        agt.start(runtime)
+
+"""
+import heapq
+import logging
+import os
+from collections import deque
+from itertools import count
+from threading import Condition, Thread
+from time import perf_counter
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("pydcop.runtime")
+
+# Scheduling states of an agent in the runtime
+IDLE = "idle"
+QUEUED = "queued"
+RUNNING = "running"
+
+
+class _AgentSlot(object):
+    """Scheduling state of an agent hosted by a CooperativeRuntime."""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.state = IDLE
+        # True if the agent must be re-scheduled once its current step is
+        # finished (e.g. a message was posted while it was running).
+        self.pending = False
+        # Deadline of the next periodic action timer, if any.
+        self.timer = None  # type: Optional[float]
+
+
+class CooperativeRuntime(object):
+    """
+    Runs many agents on a small pool of worker threads.
+
+    Parameters
+    ----------
+    nb_workers: int
+        number of worker threads, defaults to the number of cpu cores.
+    batch_size: int
+        maximum number of messages an agent handles each time it is
+        scheduled, before giving back its worker to other agents.
+
+    """
+
+    def __init__(self, nb_workers: int = None, batch_size: int = 20):
+        self.nb_workers = nb_workers if nb_workers else (os.cpu_count() or 1)
+        self.batch_size = batch_size
+
+        self._cond = Condition()
+        self._ready = deque()
+        self._slots = {}  # type: Dict[str, _AgentSlot]
+        # Heap of (deadline, seq, callable)
+        self._timers = []
+        self._seq = count()
+        self._stopped = False
+
+        self._workers = []
+        for i in range(self.nb_workers):
+            t = Thread(target=self._work, name="runtime_worker_{}".format(i),
+                       daemon=True)
+            self._workers.append(t)
+            t.start()
+
+    @property
+    def agents_count(self) -> int:
+        """Number of agents currently hosted on this runtime."""
+        return len(self._slots)
+
+    def start_agent(self, agent):
+        """
+        Start running an agent on this runtime.
+
+        This is not meant to be called directly, use `agent.start(runtime)`.
+        """
+        with self._cond:
+            if agent.name in self._slots:
+                raise ValueError(
+                    "Agent {} already hosted on the runtime".format(agent.name))
+            slot = _AgentSlot(agent)
+            self._slots[agent.name] = slot
+            self._enqueue(slot)
+
+    def wake(self, agent):
+        """
+        Schedule an agent, e.g. when a message has been posted in its queue.
+
+        Waking an agent that is already scheduled is harmless.
+        """
+        with self._cond:
+            try:
+                slot = self._slots[agent.name]
+            except KeyError:
+                # Agent not started yet or already finished
+                return
+            if slot.state == IDLE:
+                self._enqueue(slot)
+            elif slot.state == RUNNING:
+                slot.pending = True
+
+    def call_later(self, delay: float, cb: Callable):
+        """
+        Run `cb` on one of the workers, once `delay` seconds have elapsed.
+        """
+        with self._cond:
+            heapq.heappush(self._timers,
+                           (perf_counter() + delay, next(self._seq), cb))
+            self._cond.notify()
+
+    def stop(self):
+        """
+        Stop all workers.
+
+        Agents still hosted on the runtime will not be run anymore,
+        they should be stopped before stopping the runtime.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _enqueue(self, slot: _AgentSlot):
+        # Must be called with the lock held
+        slot.state = QUEUED
+        self._ready.append(slot)
+        self._cond.notify()
+
+    def _on_timer(self, slot: _AgentSlot, deadline: float):
+        # Timers for periodic actions. Only the most recent timer set for
+        # an agent is considered, older ones are stale.
+        with self._cond:
+            if slot.timer != deadline:
+                return
+            slot.timer = None
+            if slot.state == IDLE:
+                self._enqueue(slot)
+            elif slot.state == RUNNING:
+                slot.pending = True
+
+    def _next_task(self):
+        # Must be called with the lock held.
+        # Returns either a slot to run or a timer callback, or None if the
+        # runtime has been stopped.
+        while not self._stopped:
+            now = perf_counter()
+            if self._timers and self._timers[0][0] <= now:
+                _, _, cb = heapq.heappop(self._timers)
+                return cb
+            if self._ready:
+                return self._ready.popleft()
+            timeout = self._timers[0][0] - now if self._timers else None
+            self._cond.wait(timeout)
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                if task is None:
+                    return
+                if isinstance(task, _AgentSlot):
+                    task.state = RUNNING
+                    task.pending = False
+
+            if not isinstance(task, _AgentSlot):
+                try:
+                    task()
+                except Exception:
+                    logger.error("Error in runtime timer callback %s", task,
+                                 exc_info=True)
+                continue
+
+            slot = task
+            alive = slot.agent._cooperative_step(self.batch_size)
+            deadline = slot.agent._next_periodic_deadline() if alive else None
+
+            with self._cond:
+                if not alive:
+                    self._slots.pop(slot.agent.name, None)
+                    slot.state = IDLE
+                    continue
+                if deadline is not None and \
+                        (slot.timer is None or deadline < slot.timer):
+                    slot.timer = deadline
+                    heapq.heappush(
+                        self._timers,
+                        (deadline, next(self._seq),
+                         _TimerCallback(self, slot, deadline)))
+                    self._cond.notify()
+                if slot.pending or slot.agent._has_pending_msg():
+                    self._enqueue(slot)
+                else:
+                    slot.state = IDLE
+
+
+class _TimerCallback(object):
+    # Callable for periodic action timers (avoids closures in the heap,
+    # which would make them harder to identify when debugging)
+
+    def __init__(self, runtime: CooperativeRuntime, slot: _AgentSlot,
+                 deadline: float):
+        self.runtime = runtime
+        self.slot = slot
+        self.deadline = deadline
+
+    def __call__(self):
+        self.runtime._on_timer(self.slot, self.deadline)
+
+    def __repr__(self):
+        return "_TimerCallback({}, {})".format(self.slot.agent.name,
+                                               self.deadline)
@@ -0,0 +1,583 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Deterministic, single-threaded, simulation of a DCOP algorithm.
+
+When running experiments, we often do not need real agents, only the
+semantics of the DCOP algorithm. A `SimulationEngine` builds the
+`MessagePassingComputation` objects for all computations of the
+computation graph and delivers their messages through a single in-memory
+event queue, using a logical clock. It bypasses agents, messaging,
+discovery and all management messages, which makes it orders of magnitude
+faster than running agents in threads.
+
+All messages take the same (logical) time to be delivered and messages
+sent at the same time are delivered in the order they were sent: given a
+seed for the random number generators, a run is exactly reproducible.
+
+When all computations are synchronous (i.e. use the
+`SynchronousComputationMixin`, like maxsum), they are run in lock-step:
+at each cycle, `on_new_cycle` is called for every computation with the
+messages sent to it during the previous cycle. This avoids the per-message
+bookkeeping of the mixin and its synchronization messages, which are not
+sent (nor counted in the metrics) in this mode.
+
+The engine mimics the orchestrator's interface (`deploy_computations`,
+`run`, `end_metrics`, etc.) and produces the same metrics: messages are
+counted as external when the source and target computations are hosted on
+different agents in the given distribution. Note that the `time` metric is
+the simulated time, not the wall-clock time.
+
+Like the orchestrator, the engine maintains the metrics posted on the
+collector incrementally: these metrics only contain the values that changed
+since the previous ones (`assignment_changes`), and the cost and message
+totals are updated for each event instead of being recomputed. Per-agent
+metrics (`agt_metrics`) are only computed for the end metrics.
+
+Examples
+--------
+
+    engine = SimulationEngine(algo, cg, distribution, dcop, seed=42)
+    engine.deploy_computations()
+    engine.run(timeout=10)
+    metrics = engine.end_metrics()
+
+"""
+import heapq
+import logging
+import random
+from collections import defaultdict
+from functools import partial
+from itertools import count
+from queue import Queue
+from time import perf_counter
+from typing import Callable, Dict, Optional
+
+import numpy
+
+from pydcop.algorithms import AlgorithmDef, ComputationDef
+from pydcop.computations_graph.objects import ComputationGraph
+from pydcop.dcop.dcop import DCOP, IncrementalSolutionCost
+from pydcop.dcop.relations import filter_assignment_dict
+from pydcop.distribution.objects import Distribution
+from pydcop.infrastructure.agents import notify_wrap
+from pydcop.infrastructure.communication import MSG_ALGO, MSG_MGT
+from pydcop.infrastructure.computations import MessagePassingComputation, \
+    SynchronousComputationMixin, ComputationException, build_computation
+from pydcop.infrastructure.metricsstore import MetricsStore
+
+logger = logging.getLogger("pydcop.simulation")
+
+# Logical time, in seconds, needed to deliver a message.
+DEFAULT_LATENCY = 0.001
+
+# The wall-clock timeout is only checked every CHECK_INTERVAL events.
+CHECK_INTERVAL = 1000
+
+
+class SimulationEngine(object):
+    """
+    Runs all computations of a DCOP in a single thread, in logical time.
+
+    Parameters
+    ----------
+    algo: AlgorithmDef
+        Definition of DCOP algorithm, with associated parameters
+    cg: ComputationGraph
+        The computation graph used to solve the DCOP with the given algorithm
+    distribution: Distribution
+        Distribution of the computation on the agents. It is only used to
+        count messages between computations hosted on different agents.
+    dcop: DCOP
+        The DCOP instance to solve
+    infinity: float
+        value used to represent infinity for hard constraints
+    collector: Queue
+        optional queue, used to collect metrics
+    collect_moment: str
+        metric collection configuration : 'cycle_change', 'value_change' or
+        'period'
+    collect_period: float
+        period, in simulated seconds, for collecting metrics, only used with
+        'period' metric collection
+    latency: float
+        logical time, in seconds, needed to deliver a message.
+    seed: int
+        if given, used to seed python's and numpy's random number
+        generators before building the computations.
+    lockstep: bool
+        if True (the default) and all computations are synchronous
+        computations (using `SynchronousComputationMixin`), they are run in
+        lock-step, without any synchronization message.
+    link_metrics: bool
+        if True, the number and size of the messages sent on each link
+        between computations are counted and included in agents' metrics.
+    """
+
+    def __init__(self, algo: AlgorithmDef, cg: ComputationGraph,
+                 distribution: Distribution, dcop: DCOP,
+                 infinity=float('inf'),
+                 collector: Queue = None,
+                 collect_moment: str = 'value_change',
+                 collect_period: float = None,
+                 latency: float = DEFAULT_LATENCY,
+                 seed: int = None,
+                 lockstep: bool = True,
+                 link_metrics: bool = False):
+        self._algo = algo
+        self.graph = cg
+        self.distribution = distribution
+        self.dcop = dcop
+        self.infinity = infinity
+        self._collector = collector
+        self._collect_moment = collect_moment
+        self._collect_period = collect_period
+        self.latency = latency
+        self.seed = seed
+        self.lockstep = lockstep
+
+        self.status = 'OK'
+        self.logger = logger
+
+        # Events: (time, priority, seq, target, payload). target is the name
+        # of the destination computation for messages and None for timers.
+        self._events = []
+        self._seq = count()
+        self.now = 0
+        self._stopping = False
+
+        self._computations = {}  # type: Dict[str, MessagePassingComputation]
+        self._agent_for = {}  # type: Dict[str, str]
+        self._finished = set()
+        # Messages for the next cycle, only used in lock-step mode
+        self._outbox = None  # type: Optional[Dict[str, Dict]]
+
+        # metrics
+        self._values = {}  # computation -> (value, cost)
+        self._cycle_done = defaultdict(lambda: 0)
+        self._last_cycle = -1
+        self._msg_count, self._msg_size, self._max_cycle = 0, 0, 0
+        # Values reported for unfinished cycles, values changed since the
+        # last metrics and cost of the assignment: only needed when
+        # collecting run-time metrics.
+        self._store = self._running_cost = None
+        if collector is not None:
+            self._store = MetricsStore(n.name for n in cg.nodes)
+            self._running_cost = IncrementalSolutionCost(dcop, infinity)
+        self.count_ext_msg = defaultdict(lambda: 0)  # type: Dict[str, int]
+        self.size_ext_msg = defaultdict(lambda: 0)  # type: Dict[str, int]
+        self._t_active = defaultdict(lambda: 0)  # type: Dict[str, float]
+        self.count_link_msg = self.size_link_msg = None
+        if link_metrics:
+            self.count_link_msg = defaultdict(lambda: defaultdict(lambda: 0))
+            self.size_link_msg = defaultdict(lambda: defaultdict(lambda: 0))
+        self._start_wall = None
+        self._end_wall = None
+
+    @property
+    def computations(self) -> Dict[str, MessagePassingComputation]:
+        return self._computations
+
+    def deploy_computations(self):
+        """
+        Build the computations for all nodes of the computation graph.
+        """
+        if self.seed is not None:
+            random.seed(self.seed)
+            numpy.random.seed(self.seed)
+
+        for agent in sorted(self.distribution.agents):
+            for c in sorted(self.distribution.computations_hosted(agent)):
+                self._agent_for[c] = agent
+
+        for node in sorted(self.graph.nodes, key=lambda n: n.name):
+            comp_def = ComputationDef(node, self._algo)
+            computation = build_computation(comp_def)
+            self._add_computation(computation)
+        self.logger.info('%s computations deployed', len(self._computations))
+
+    def run(self, timeout: Optional[float] = None,
+            max_time: Optional[float] = None):
+        """
+        Run the simulation.
+
+        The simulation stops when all computations have finished, when there
+        is no more event to process, or when `stop_agents` has been called.
+
+        Parameters
+        ----------
+        timeout: float
+            wall-clock time, in seconds, after which the simulation is stopped.
+        max_time: float
+            simulated time after which the simulation is stopped.
+        """
+        self._start_wall = perf_counter()
+        deadline = self._start_wall + timeout if timeout else None
+
+        if self._collect_moment == 'period' and self._collector is not None:
+            self.set_periodic_action(self._collect_period or 1,
+                                     self._emit_metrics)
+
+        if self.lockstep and self._computations and \
+                all(isinstance(c, SynchronousComputationMixin)
+                    for c in self._computations.values()):
+            nb_events = self._run_lockstep(deadline, max_time)
+        else:
+            nb_events = self._run_events(deadline, max_time)
+
+        self._end_wall = perf_counter()
+        for c in self._computations.values():
+            if c.is_running:
+                c.stop()
+        self.logger.info('Simulation ended at %s (%s events), status %s',
+                         self.now, nb_events, self.status)
+
+    def _run_events(self, deadline, max_time) -> int:
+        for name in sorted(self._computations):
+            self._computations[name].start()
+
+        events = self._events
+        computations = self._computations
+        agent_for = self._agent_for
+        t_active = self._t_active
+        nb_events = 0
+        while events and not self._stopping:
+            t, _, _, target, payload = heapq.heappop(events)
+            if max_time is not None and t > max_time:
+                self.status = 'TIMEOUT'
+                break
+            self.now = t
+            start = perf_counter()
+            if target is None:
+                payload()
+            else:
+                sender, msg = payload
+                computations[target].on_message(sender, msg, t)
+            t_active[agent_for.get(target)] += perf_counter() - start
+
+            nb_events += 1
+            if deadline is not None and nb_events % CHECK_INTERVAL == 0 \
+                    and perf_counter() > deadline:
+                self.status = 'TIMEOUT'
+                break
+        return nb_events
+
+    def _run_lockstep(self, deadline, max_time) -> int:
+        # All computations are synchronous: run them in lock-step, calling
+        # `on_new_cycle` on every computation with the messages sent to it
+        # during the previous cycle. As every computation is known to run
+        # each cycle, no synchronization message is needed.
+        computations = [self._computations[n]
+                        for n in sorted(self._computations)]
+        agent_for = self._agent_for
+        t_active = self._t_active
+        self._outbox = {}
+
+        # Startup is cycle 0 ; bypass the mixin's start(), which would send
+        # synchronization messages.
+        for c in computations:
+            MessagePassingComputation.start(c)
+
+        cycle = 0
+        while not self._stopping:
+            if max_time is not None and self.now + self.latency > max_time:
+                self.status = 'TIMEOUT'
+                break
+            inbox, self._outbox = self._outbox, {}
+            self.now += self.latency
+            self._fire_due_timers()
+
+            for c in computations:
+                if not c.is_running or self._stopping:
+                    continue
+                start = perf_counter()
+                c._current_cycle = self._max_cycle = cycle + 1
+                c.cycle_message_sent = []
+                messages = c.on_new_cycle(inbox.get(c.name, {}), cycle)
+                if messages:
+                    for target, msg in messages:
+                        c.post_msg(target, msg)
+                t_active[agent_for.get(c.name)] += perf_counter() - start
+            cycle += 1
+
+            if self._collect_moment == 'cycle_change':
+                self._emit_metrics()
+            if not any(c.is_running for c in computations):
+                break
+            if deadline is not None and perf_counter() > deadline:
+                self.status = 'TIMEOUT'
+                break
+        self._outbox = None
+        return cycle
+
+    def _fire_due_timers(self):
+        # In lock-step mode the event queue only contains timers.
+        events = self._events
+        while events and events[0][0] <= self.now:
+            _, _, _, _, payload = heapq.heappop(events)
+            payload()
+
+    def stop_agents(self, timeout: float = None):
+        """
+        Request the simulation to stop.
+
+        This can safely be called from another thread, the simulation stops
+        after handling the current event. The `timeout` argument is only
+        there for compatibility with the Orchestrator interface.
+        """
+        self._stopping = True
+
+    def stop(self):
+        self._stopping = True
+
+    def wait_ready(self):
+        return False
+
+    def current_solution(self):
+        solution = {c: self._values[c][0] if c in self._values else None
+                    for c in self._computations}
+        return solution, len(self._values) == len(self._computations)
+
+    def end_metrics(self):
+        return self.global_metrics('END')
+
+    def global_metrics(self, current_status: str):
+        assignment = {k: v[0] for k, v in self._values.items()}
+        dcop_assignment = filter_assignment_dict(
+            assignment, self.dcop.variables.values())
+        try:
+            violation, cost = self.dcop.solution_cost(dcop_assignment,
+                                                      self.infinity)
+        except ValueError:
+            cost, violation = None, None
+
+        agt_metrics = self.agents_metrics()
+        msg_count, msg_size = 0, 0
+        max_cycle = 0
+        for m in agt_metrics.values():
+            msg_count += sum(m['count_ext_msg'].values())
+            msg_size += sum(m['size_ext_msg'].values())
+            max_cycle = max(max_cycle, max(m['cycles'].values(), default=0))
+
+        return {
+            'status': current_status,
+            'assignment': assignment,
+            'cost': cost,
+            'violation': violation,
+            'time': self.now,
+            'msg_count': msg_count,
+            'msg_size': msg_size,
+            'cycle': max_cycle,
+            'agt_metrics': agt_metrics,
+        }
+
+    def agents_metrics(self):
+        """
+        Metrics for each agent, in the same format as `Agent.metrics()`.
+        """
+        end = self._end_wall if self._end_wall is not None else perf_counter()
+        total_t = end - self._start_wall if self._start_wall else 0
+        metrics = {}
+        for agent in self.distribution.agents:
+            hosted = self.distribution.computations_hosted(agent)
+            metrics[agent] = {
+                'count_ext_msg': {c: self.count_ext_msg[c] for c in hosted
+                                  if c in self.count_ext_msg},
+                'size_ext_msg': {c: self.size_ext_msg[c] for c in hosted
+                                 if c in self.size_ext_msg},
+                'activity_ratio':
+                    self._t_active[agent] / total_t if total_t else 0,
+                'cycles': {c: getattr(self._computations[c], 'cycle_count', 0)
+                           for c in hosted if c in self._computations},
+            }
+            if self.count_link_msg is not None:
+                metrics[agent]['count_link_msg'] = {
+                    c: dict(self.count_link_msg[c]) for c in hosted
+                    if c in self.count_link_msg}
+                metrics[agent]['size_link_msg'] = {
+                    c: dict(self.size_link_msg[c]) for c in hosted
+                    if c in self.size_link_msg}
+        return metrics
+
+    def set_periodic_action(self, period: float, cb: Callable):
+        """
+        Call `cb` every `period` simulated seconds.
+
+        The engine is the periodic action handler for all computations,
+        which allows using `add_periodic_action` in computations.
+        """
+        timer = _PeriodicTimer(period, cb)
+        self._schedule_timer(timer)
+        return timer
+
+    def remove_periodic_action(self, handle: '_PeriodicTimer'):
+        handle.cancelled = True
+
+    def _add_computation(self, computation: MessagePassingComputation):
+        computation.message_sender = self._post_msg
+        computation.periodic_action_handler = self
+        self._computations[computation.name] = computation
+
+        if hasattr(computation, '_on_value_selection'):
+            computation._on_value_selection = notify_wrap(
+                computation._on_value_selection,
+                self._wrap_cb(self._on_value_change, computation.name))
+        if hasattr(computation, '_on_new_cycle'):
+            computation._on_new_cycle = notify_wrap(
+                computation._on_new_cycle,
+                self._wrap_cb(self._on_new_cycle, computation.name))
+        if isinstance(computation, SynchronousComputationMixin):
+            # Synchronous computations do not call `new_cycle` when not run
+            # in lock-step.
+            computation._switch_cycle = notify_wrap(
+                computation._switch_cycle,
+                partial(self._on_switch_cycle, computation))
+        computation.finished = notify_wrap(
+            computation.finished,
+            self._wrap_cb(self._on_finished, computation.name))
+
+    @staticmethod
+    def _wrap_cb(cb, name):
+        def wrapped(*args):
+            cb(name, *args)
+        return wrapped
+
+    def _post_msg(self, src: str, dest: str, msg, prio: int = None,
+                  on_error=None):
+        if dest not in self._computations:
+            self.logger.warning('Dropping message %s from %s to unknown '
+                                'computation %s', msg, src, dest)
+            return
+        prio = MSG_ALGO if prio is None else prio
+        if prio != MSG_MGT and self._agent_for.get(src) != \
+                self._agent_for.get(dest):
+            self.count_ext_msg[src] += 1
+            self.size_ext_msg[src] += msg.size
+            self._msg_count += 1
+            self._msg_size += msg.size
+        if self.count_link_msg is not None and prio != MSG_MGT:
+            self.count_link_msg[src][dest] += 1
+            self.size_link_msg[src][dest] += msg.size
+
+        if self._outbox is None:
+            heapq.heappush(self._events, (self.now + self.latency, prio,
+                                          next(self._seq), dest, (src, msg)))
+        else:
+            # Lock-step mode: messages are delivered at the next cycle.
+            box = self._outbox.setdefault(dest, {})
+            if src in box:
+                raise ComputationException(
+                    f"Invalid message, {dest} received two messages "
+                    f"from {src} in the same cycle. In a synchronized "
+                    f"computation, a neighbor can only send a single "
+                    f"message in a cycle.")
+            box[src] = (msg, self.now + self.latency)
+
+    def _schedule_timer(self, timer: '_PeriodicTimer'):
+        heapq.heappush(self._events,
+                       (self.now + timer.period, MSG_MGT, next(self._seq),
+                        None, partial(self._fire_timer, timer)))
+
+    def _fire_timer(self, timer: '_PeriodicTimer'):
+        if not timer.cancelled:
+            timer.cb()
+            self._schedule_timer(timer)
+
+    def _on_value_change(self, computation: str, value, cost, cycle):
+        self._values[computation] = (value, cost)
+        if self._collector is None:
+            return
+        if self._collect_moment == 'cycle_change' and self._outbox is None:
+            # The value is only used in metrics once all computations have
+            # finished this cycle.
+            self._store.set_cycle_value(cycle, computation, value, cost)
+            return
+        self._store.set_value(computation, value, cost)
+        self._running_cost.set_value(computation, value)
+        if self._collect_moment == 'value_change' \
+                and computation in self.dcop.variables:
+            self._emit_metrics()
+
+    def _on_switch_cycle(self, computation: SynchronousComputationMixin):
+        self._max_cycle = max(self._max_cycle, computation.cycle_count)
+
+    def _on_new_cycle(self, computation: str, cycle: int):
+        self._max_cycle = max(self._max_cycle, cycle)
+        if self._collector is None or self._collect_moment != 'cycle_change':
+            return
+        # cycle - 1 is finished for this computation. Once all computations
+        # have finished a cycle, emit the metrics for this cycle.
+        self._cycle_done[cycle - 1] += 1
+        nb_computations = len(self._computations)
+        while self._cycle_done.get(self._last_cycle + 1) == nb_computations:
+            self._last_cycle += 1
+            del self._cycle_done[self._last_cycle]
+            # Not all computations select a new value during a cycle, values
+            # from the previous cycles are kept for those that did not.
+            for c, value in self._store.end_cycle(self._last_cycle):
+                self._running_cost.set_value(c, value)
+            self._emit_metrics()
+
+    def _on_finished(self, computation: str):
+        self._finished.add(computation)
+        if len(self._finished) == len(self._computations):
+            self.logger.info('All computations have finished')
+            self.status = 'FINISHED'
+            self._stopping = True
+
+    def _emit_metrics(self):
+        # Same metrics as `AgentsMgt._emit_metrics`, without `agt_metrics`.
+        if self._collector is None:
+            return
+        try:
+            violation, cost = self._running_cost.solution_cost()
+        except ValueError:
+            cost, violation = None, None
+        self._collector.put((self.now, {
+            'status': 'RUNNING',
+            'cost': cost,
+            'violation': violation,
+            'time': self.now,
+            'msg_count': self._msg_count,
+            'msg_size': self._msg_size,
+            'cycle': self._max_cycle,
+            'assignment_changes': self._store.changes(),
+        }))
+
+
+class _PeriodicTimer(object):
+    """Handle for a periodic action in a SimulationEngine."""
+
+    def __init__(self, period: float, cb: Callable):
+        self.period = period
+        self.cb = cb
+        self.cancelled = False
+
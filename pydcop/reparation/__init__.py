@@ -29,11 +29,282 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import Callable, Tuple, Dict, List
+from typing import Callable, Tuple, Dict, List, Iterable, Union
 
-from pydcop.dcop.objects import BinaryVariable
-from pydcop.dcop.relations import NAryFunctionRelation, RelationProtocol, \
-    Constraint
+from pydcop.dcop.objects import BinaryVariable, Variable
+from pydcop.dcop.relations import RelationProtocol, Constraint, \
+    AbstractBaseRelation, NeutralRelation
+from pydcop.utils.simple_repr import SimpleRepr, simple_repr
+
+# Value of the hard constraints of the reparation dcop when they are not
+# satisfied.
+INFEASIBLE_COST = 10000
+
+
+class LinearRelation(AbstractBaseRelation, SimpleRepr):
+    """
+    A relation whose value is a weighted sum of its (binary) variables.
+
+    The weights are computed once, when building the relation, and
+    evaluating the relation for an assignment is a single weighted sum. When
+    slicing the relation, the weighted values of the sliced variables are
+    added to the offset.
+
+    Parameters
+    ----------
+    name: str
+        name of the relation
+    variables: iterable of Variable
+        the variables of the relation
+    weights: list of numbers
+        one weight for each variable, in the same order
+    offset: number
+        a constant added to the weighted sum.
+    """
+
+    def __init__(self, name: str, variables: Iterable[Variable],
+                 weights: List[float], offset: float = 0) -> None:
+        super().__init__(name)
+        self._variables = list(variables)
+        self._weights = list(weights)
+        self._offset = offset
+        if len(self._weights) != len(self._variables):
+            raise ValueError('Relation {} needs one weight for each '
+                             'variable : {} for {}'
+                             .format(name, self._weights, self._variables))
+        self._weighted_vars = list(zip(self._variables, self._weights))
+        self._terms = [(v.name, w) for v, w in self._weighted_vars]
+
+    @property
+    def weights(self) -> List[float]:
+        return self._weights
+
+    @property
+    def offset(self) -> float:
+        return self._offset
+
+    def _weighted_sum(self, assignment: Union[Dict, List]) -> float:
+        if type(assignment) is dict:
+            return self._offset + sum([w * assignment[v_name]
+                                       for v_name, w in self._terms])
+        elif isinstance(assignment, list):
+            return self._offset + sum([w * val for w, val
+                                       in zip(self._weights, assignment)])
+        raise ValueError('Assignment must be list or dict')
+
+    def _sliced_terms(self, partial_assignment: Dict[str, object]):
+        # Returns the remaining variables and weights and the weighted sum
+        # for the sliced variables.
+        var_names = {v.name for v in self._variables}
+        for v_name in partial_assignment:
+            if v_name not in var_names:
+                raise ValueError('Unknown variable "{}" when slicing relation '
+                                 '{}'.format(v_name, self._name))
+        remaining, weights, fixed = [], [], 0
+        for v, w in self._weighted_vars:
+            if v.name in partial_assignment:
+                fixed += w * partial_assignment[v.name]
+            else:
+                remaining.append(v)
+                weights.append(w)
+        return remaining, weights, fixed
+
+    def _value(self, weighted_sum: float) -> float:
+        return weighted_sum
+
+    def get_value_for_assignment(self, assignment):
+        return self._value(self._weighted_sum(assignment))
+
+    def slice(self, partial_assignment: Dict[str, object]) -> RelationProtocol:
+        if not partial_assignment:
+            return self
+        remaining, weights, fixed = self._sliced_terms(partial_assignment)
+        return LinearRelation(self._name, remaining, weights,
+                              self._offset + fixed)
+
+    def set_value_for_assignment(self, assignment, relation_value):
+        raise NotImplementedError('set_value_for_assignment is not '
+                                  'implemented for {}'
+                                  .format(type(self).__name__))
+
+    def __call__(self, *args, **kwargs):
+        if kwargs:
+            return self.get_value_for_assignment(kwargs)
+        if len(args) == 1 and type(args[0]) is dict:
+            return self.get_value_for_assignment(args[0])
+        return self.get_value_for_assignment(list(args))
+
+    def _params(self):
+        return self._weights, self._offset
+
+    def __eq__(self, other):
+        if type(other) != type(self):
+            return False
+        return self.name == other.name and \
+            self.dimensions == other.dimensions and \
+            self._params() == other._params()
+
+    def __hash__(self):
+        return hash((self._name, tuple(self._variables),
+                     tuple(self._weights), self._offset))
+
+    def __str__(self):
+        return '{}({})'.format(type(self).__name__, self._name)
+
+    def __repr__(self):
+        return '{}({}, {}, {})'.format(
+            type(self).__name__, self._name,
+            [v.name for v in self._variables], self._params())
+
+
+class CardinalityRelation(LinearRelation):
+    """
+    A hard constraint ensuring that exactly `count` binary variables are
+    set to 1.
+
+    Parameters
+    ----------
+    name: str
+        name of the relation
+    variables: iterable of Variable
+        the binary variables of the relation
+    count: int
+        the number of variables that must be set to 1.
+    penalty: number
+        the value of the relation when the constraint is not satisfied
+    """
+
+    def __init__(self, name: str, variables: Iterable[Variable],
+                 count: int = 1, penalty: float = INFEASIBLE_COST) -> None:
+        variables = list(variables)
+        super().__init__(name, variables, [1] * len(variables))
+        self._count = count
+        self._penalty = penalty
+
+    def _value(self, weighted_sum: float) -> float:
+        return 0 if weighted_sum == self._count else self._penalty
+
+    def slice(self, partial_assignment: Dict[str, object]) -> RelationProtocol:
+        if not partial_assignment:
+            return self
+        remaining, _, fixed = self._sliced_terms(partial_assignment)
+        return CardinalityRelation(self._name, remaining,
+                                   self._count - fixed, self._penalty)
+
+    def _params(self):
+        return self._count, self._penalty
+
+    def __hash__(self):
+        return hash((self._name, tuple(self._variables),
+                     self._count, self._penalty))
+
+
+class CapacityRelation(LinearRelation):
+    """
+    A hard constraint ensuring that the footprints of the binary variables
+    set to 1 do not exceed a capacity.
+
+    Parameters
+    ----------
+    name: str
+        name of the relation
+    variables: iterable of Variable
+        the binary variables of the relation
+    footprints: list of numbers
+        the footprint of each variable, in the same order
+    capacity: number
+        the capacity that must not be exceeded
+    penalty: number
+        the value of the relation when the constraint is not satisfied
+    """
+
+    def __init__(self, name: str, variables: Iterable[Variable],
+                 footprints: List[float], capacity: float,
+                 penalty: float = INFEASIBLE_COST) -> None:
+        super().__init__(name, variables, footprints)
+        self._footprints = self._weights
+        self._capacity = capacity
+        self._penalty = penalty
+
+    def _value(self, weighted_sum: float) -> float:
+        return 0 if weighted_sum <= self._capacity else self._penalty
+
+    def slice(self, partial_assignment: Dict[str, object]) -> RelationProtocol:
+        if not partial_assignment:
+            return self
+        remaining, footprints, fixed = self._sliced_terms(partial_assignment)
+        return CapacityRelation(self._name, remaining, footprints,
+                                self._capacity - fixed, self._penalty)
+
+    def _params(self):
+        return self._footprints, self._capacity, self._penalty
+
+    def __hash__(self):
+        return hash((self._name, tuple(self._variables),
+                     tuple(self._footprints), self._capacity, self._penalty))
+
+
+class ConditionalLinearRelation(LinearRelation):
+    """
+    A relation whose value is a weighted sum of its variables when a binary
+    `condition` variable is set to 1, and 0 otherwise.
+
+    The condition variable is the first dimension of the relation.
+
+    Parameters
+    ----------
+    name: str
+        name of the relation
+    condition: Variable
+        the binary variable the relation is conditioned on
+    variables: iterable of Variable
+        the variables of the weighted sum
+    weights: list of numbers
+        one weight for each variable, in the same order
+    offset: number
+        a constant added to the weighted sum.
+    """
+
+    def __init__(self, name: str, condition: Variable,
+                 variables: Iterable[Variable], weights: List[float],
+                 offset: float = 0) -> None:
+        super().__init__(name, variables, weights, offset)
+        self._condition = condition
+        self._variables = [condition] + self._variables
+
+    def get_value_for_assignment(self, assignment):
+        if type(assignment) is dict:
+            if not assignment[self._condition.name]:
+                return 0
+            return self._weighted_sum(assignment)
+        elif isinstance(assignment, list):
+            if not assignment[0]:
+                return 0
+            return self._weighted_sum(assignment[1:])
+        raise ValueError('Assignment must be list or dict')
+
+    def slice(self, partial_assignment: Dict[str, object]) -> RelationProtocol:
+        if not partial_assignment:
+            return self
+        remaining, weights, fixed = self._sliced_terms(partial_assignment)
+        if self._condition.name not in partial_assignment:
+            return ConditionalLinearRelation(
+                self._name, self._condition, remaining, weights,
+                self._offset + fixed)
+        if partial_assignment[self._condition.name]:
+            return LinearRelation(self._name, remaining, weights,
+                                  self._offset + fixed)
+        return NeutralRelation(remaining, self._name)
+
+    def _params(self):
+        return self._condition, self._weights, self._offset
+
+    def _simple_repr(self):
+        # The condition is given separately from the variables of the
+        # weighted sum.
+        r = super()._simple_repr()
+        r['variables'] = simple_repr(self._variables[1:])
+        return r
 
 
 def create_computation_hosted_constraint(computation_name: str,
@@ -50,20 +321,11 @@ def create_computation_hosted_constraint(computation_name: str,
      containing the n binary variables x_i^m, one for each of the n
     candidate agents a_m the computation x_i could be hosted on
 
-    :return: a constraint object
+    :return: a `CardinalityRelation` constraint object
     """
 
-    def hosted(**kwargs):
-        # kwargs will be a map {bin_var_name -> value} giving the binary
-        # value for each of the n candidate agent the computation could be
-        # hosted on
-        s = sum([v for v in kwargs.values()])
-        return 0 if s == 1 else 10000
-
-    constraint = NAryFunctionRelation(
-        hosted, list(bin_vars.values()),
-        name='{}_hosted'.format(computation_name))
-
+    constraint = CardinalityRelation('{}_hosted'.format(computation_name),
+                                     bin_vars.values(), 1)
     return constraint
 
 
@@ -93,24 +355,11 @@ def create_agent_capacity_constraint(agt_name: str, remaining_capacity,
 
     Returns
     -------
-    a Constraint object
+    a `CapacityRelation` Constraint object
     """
-    # Reversed lookup table: which (agt, computation) a variable is about:
-    var_lookup = {v.name: k for k, v in bin_vars.items()}
-
-    def capacity(**kwargs):
-        # kwargs will be a name {v_name : value}
-        # where v_name is x_{}_{}
-        orphaned_footprint = 0
-        for v_name in kwargs:
-            comp, _ = var_lookup[v_name]
-            orphaned_footprint += kwargs[v_name] * footprint_func(comp)
-
-        repair_capa = remaining_capacity - orphaned_footprint
-        return 0 if repair_capa >= 0 else 10000
-
-    constraint = NAryFunctionRelation(capacity, list(bin_vars.values()),
-                                      name=agt_name + '_capacity')
+    footprints = [footprint_func(comp) for comp, _ in bin_vars]
+    constraint = CapacityRelation(agt_name + '_capacity', bin_vars.values(),
+                                  footprints, remaining_capacity)
     return constraint
 
 
@@ -137,21 +386,11 @@ def create_agent_hosting_constraint(agt_name: str,
 
     Returns
     -------
-    a Constraint object
+    a `LinearRelation` Constraint object
     """
-
-    # Reversed lookup table: which (agt, computation) a variable is about:
-    var_lookup = {v.name: k for k, v in bin_vars.items()}
-
-    def hosting_cost(**kwargs):
-        cost = 0
-        for v_name in kwargs:
-            comp, _ = var_lookup[v_name]
-            cost += kwargs[v_name] * hosting_func(comp)
-        return cost
-
-    constraint = NAryFunctionRelation(hosting_cost, list(bin_vars.values()),
-                                      name=agt_name + '_hosting')
+    costs = [hosting_func(comp) for comp, _ in bin_vars]
+    constraint = LinearRelation(agt_name + '_hosting', bin_vars.values(),
+                                costs)
     return constraint
 
 
@@ -187,43 +426,24 @@ def create_agent_comp_comm_constraint(
 
     Returns
     -------
-    A Constraint object
+    A `ConditionalLinearRelation` Constraint object
     """
     agts, fixed_neighbors, candidate_neighbors = candidate_info
 
-    def host_cost(**kwargs):
-        """
-
-        Parameters
-        ----------
-        kwargs : dict
-            assignment for the variables the comm constraints depends on,
-            given as a dict { variable name -> variable value}
-
-        Returns
-        -------
-
-        """
-        candidate_cost = 0.0
-        locally_hosted = bin_vars[(candidate_name, agt_name)].name
-        for v in fixed_neighbors:
-            v_agt = fixed_neighbors[v]
-            candidate_cost += kwargs[locally_hosted] * \
-                                comm(candidate_name, v, v_agt)
-        for v in candidate_neighbors:
-            cost_v = 0.0
-            for v_agt in candidate_neighbors[v]:
-                arg_name = bin_vars[(v, v_agt)].name
-                cost_v += kwargs[arg_name] * comm(candidate_name, v, v_agt)
-            candidate_cost += kwargs[locally_hosted] * cost_v
-
-        return candidate_cost
-
-    scope = [bin_vars[(candidate_name, agt_name)]]
+    # The communication costs with fixed neighbors only depend on the
+    # variable for the candidate computation on this agent, the costs with
+    # candidate neighbors also depend on the variables for these neighbors.
+    fixed_cost = 0.0
+    for v, v_agt in fixed_neighbors.items():
+        fixed_cost += comm(candidate_name, v, v_agt)
+
+    variables, costs = [], []
     for v in candidate_neighbors:
         for v_agt in candidate_neighbors[v]:
-            scope.append(bin_vars[(v, v_agt)])
+            variables.append(bin_vars[(v, v_agt)])
+            costs.append(comm(candidate_name, v, v_agt))
 
-    constraint = NAryFunctionRelation(
-        host_cost, scope, name= 'comm_' + agt_name + '_' + candidate_name)
+    constraint = ConditionalLinearRelation(
+        'comm_' + agt_name + '_' + candidate_name,
+        bin_vars[(candidate_name, agt_name)], variables, costs, fixed_cost)
     return constraint
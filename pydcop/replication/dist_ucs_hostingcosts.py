@@ -36,6 +36,7 @@ Uniform Cost Search distribution
 import itertools
 import logging
 from collections import defaultdict
+from contextlib import contextmanager
 from copy import deepcopy
 from typing import List, Dict, Tuple, Set, Iterable, Union
 
@@ -191,7 +192,6 @@ class UCSReplicateMessage(Message):
 
     @property
     def size(self):
-        table_size = sum(len(p) for _, p in self._paths)
         return len(self.hosts) + len(self._visited) + len(self._rq_path)
 
     def __str__(self):
@@ -224,6 +224,34 @@ class UCSReplicateMessage(Message):
         return False
 
 
+class UCSReplicateBatchMessage(Message):
+    """
+    Several UCSReplicateMessage, for different computations, sent at once to
+    the same agent.
+
+    The receiver handles them in the same order as if they had been sent as
+    separate messages.
+    """
+
+    def __init__(self, messages: List[UCSReplicateMessage]):
+        super().__init__("ucs_replicate_batch", None)
+        self._messages = messages
+
+    @property
+    def messages(self) -> List[UCSReplicateMessage]:
+        return self._messages
+
+    @property
+    def size(self):
+        return sum(m.size for m in self._messages)
+
+    def __str__(self):
+        return "UCSReplicateBatchMessage({})".format(self._messages)
+
+    def __repr__(self):
+        return "UCSReplicateBatchMessage({})".format(self._messages)
+
+
 def replication_computation_name(agt_name: AgentName) -> str:
     return "_replication_" + agt_name
 
@@ -275,6 +303,13 @@ class UCSReplication(MessagePassingComputation):
       * self._hosted_replicas contains the list of replicas the current agent
         has accepted to host a replica of.
 
+    The replication of all the computations of the agent is started at once
+    and their explorations run concurrently. The messages sent for several
+    computations to the same agent while handling a message (or starting the
+    replication) are grouped in a single `UCSReplicateBatchMessage`: the
+    explorations of computations coming from the same agent travel together
+    as long as they follow the same paths.
+
     Parameters
     ----------
     agent: Agent
@@ -322,6 +357,10 @@ class UCSReplication(MessagePassingComputation):
         self._pending_requests = {}
         self._removed_agents = set()
 
+        # Messages waiting to be sent at the end of the current handler,
+        # grouped by target replication computation.
+        self._outbox = None  # type: Dict[str, List[UCSReplicateMessage]]
+
         self.logger = (
             logger
             if logger is not None
@@ -474,24 +513,24 @@ class UCSReplication(MessagePassingComputation):
             f"Starting replications of computations {computations} on neighbors {neighbors} - {k_target}"
         )
 
-        for c in computations:
-            # initialize paths with our neighbors and their costs
-            paths = [(c, (self.agt_name, n)) for n, c in neighbors]
-            paths.sort()
-            budget = min(c for c, _ in paths)
-            visited = [self.agt_name]
-            comp_def, footprint = self.computations[c]
-            self.on_replicate_request(
-                budget,
-                0,
-                (self.agt_name,),
-                paths,
-                visited,
-                comp_def,
-                footprint,
-                replica_count=k_target,
-                hosts=[],
-            )
+        # initialize paths with our neighbors and their costs, these initial
+        # paths are the same for all computations.
+        initial_paths = [(r, (self.agt_name, n)) for n, r in neighbors]
+        budget = min(r for r, _ in initial_paths)
+        with self._batch():
+            for c in computations:
+                comp_def, footprint = self.computations[c]
+                self.on_replicate_request(
+                    budget,
+                    0,
+                    (self.agt_name,),
+                    PathsTable(initial_paths),
+                    [self.agt_name],
+                    comp_def,
+                    footprint,
+                    replica_count=k_target,
+                    hosts=[],
+                )
 
     def on_start(self):
         # Register to all agents event, in order to use them for distribution
@@ -524,6 +563,18 @@ class UCSReplication(MessagePassingComputation):
             reception time, not used
 
         """
+        with self._batch():
+            self._handle_replicate_msg(sender_name, msg)
+
+    @register("ucs_replicate_batch")
+    def _on_replicate_batch_msg(
+        self, sender_name: str, msg: UCSReplicateBatchMessage, _: float
+    ):
+        with self._batch():
+            for replicate_msg in msg.messages:
+                self._handle_replicate_msg(sender_name, replicate_msg)
+
+    def _handle_replicate_msg(self, sender_name: str, msg: UCSReplicateMessage):
         if msg.rep_msg_type == "replicate_request":
             if self.logger.isEnabledFor(logging.DEBUG):
                 self.logger.debug(
@@ -646,8 +697,7 @@ class UCSReplication(MessagePassingComputation):
             cheapest, cheapest_path = cheapest_path_to(n, paths)
             if cheapest > spent + r:
                 remove_path(paths, cheapest_path)
-                paths.append((spent + r, p))
-                paths.sort()
+                paths.add(spent + r, p)
             else:
                 # self.logger.debug('Cheaper path known to %s : %s (%s)', p,
                 #                   cheapest_path, cheapest)
@@ -753,7 +803,8 @@ class UCSReplication(MessagePassingComputation):
 
         # no reachable candidate path and no ancestor to go back,
         # we are back at the start node: increase the budget
-        if not paths:
+        budget, _ = paths.cheapest(exclude=rq_path)
+        if budget == float("inf"):
             # Cannot increase budget, replica distribution is finished for
             # this computation, even if we have not reached target resiliency
             # level. Report the final replica distribution to the orchestrator.
@@ -763,7 +814,6 @@ class UCSReplication(MessagePassingComputation):
             )
             self.computation_replicated(comp_name, hosts)
         else:
-            budget = min(c for c, p in paths if p != rq_path)
             if self.logger.isEnabledFor(logging.INFO):
                 self.logger.info(
                     f"Increase budget for computation {comp_name} : {budget}"
@@ -802,7 +852,7 @@ class UCSReplication(MessagePassingComputation):
                 f"sending replica request from {self.name} to {target_agt} "
                 f"for {rq_path} - {comp_def.name} (b:{budget_to_next}, c: {cost_to_next})"
             )
-        self.post_msg(
+        self._post_replication_msg(
             replication_computation_name(target_agt),
             UCSReplicateMessage(
                 "replicate_request",
@@ -816,16 +866,16 @@ class UCSReplication(MessagePassingComputation):
                 replica_count,
                 hosts,
             ),
-            MSG_REPLICATION,
         )
 
         # All request must be answered, otherwise the replication is stuck.
-        # Keep track of all request sent.
+        # Keep track of all request sent. The paths table is only needed if
+        # the request is lost, only keep its content.
         self._pending_requests[(target_agt, comp_def.name)] = (
             budget,
             spent,
             rq_path,
-            paths.copy(),
+            paths.items(),
             visited[:],
             comp_def,
             footprint,
@@ -856,7 +906,7 @@ class UCSReplication(MessagePassingComputation):
                 f"for {comp_def.name} rq {rq_path} ({budget}, {spent}, {cost_to_target}) "
                 f"paths : {paths}"
             )
-        self.post_msg(
+        self._post_replication_msg(
             replication_computation_name(target_agt),
             UCSReplicateMessage(
                 "replicate_answer",
@@ -870,9 +920,37 @@ class UCSReplication(MessagePassingComputation):
                 replica_count,
                 hosts,
             ),
-            MSG_REPLICATION,
         )
 
+    def _post_replication_msg(self, target: str, msg: UCSReplicateMessage):
+        if self._outbox is not None:
+            self._outbox[target].append(msg)
+        else:
+            self.post_msg(target, msg, MSG_REPLICATION)
+
+    @contextmanager
+    def _batch(self):
+        """
+        Group the messages sent to the same replication computation, until
+        the end of the `with` block, into a single batch message.
+        """
+        if self._outbox is not None:
+            # Already batching, messages are sent by the outermost block.
+            yield
+            return
+        self._outbox = defaultdict(list)
+        try:
+            yield
+        finally:
+            outbox, self._outbox = self._outbox, None
+            for target, messages in outbox.items():
+                if len(messages) == 1:
+                    self.post_msg(target, messages[0], MSG_REPLICATION)
+                else:
+                    self.post_msg(
+                        target, UCSReplicateBatchMessage(messages), MSG_REPLICATION
+                    )
+
     def route(self, target: AgentName) -> float:
         return self.agent_def.route(target)
 
@@ -916,13 +994,14 @@ class UCSReplication(MessagePassingComputation):
                 self._replication_computations_cache = without
                 self._removed_agents.add(agent)
 
-                # if we had pending request to this agent, we will never get an
-                # answer
-                self._answer_lost_requests(agent)
+                with self._batch():
+                    # if we had pending request to this agent, we will never
+                    # get an answer
+                    self._answer_lost_requests(agent)
 
-                # Re-launch replication for the computation(s) that have lost a
-                # replica.
-                self._replicate_on_agent_lost(agent)
+                    # Re-launch replication for the computation(s) that have
+                    # lost a replica.
+                    self._replicate_on_agent_lost(agent)
 
         elif event == "agent_added":
             if agent != self.agt_name:
@@ -975,8 +1054,7 @@ class UCSReplication(MessagePassingComputation):
                     hosting_path,
                     hosting_cost,
                 )
-            paths.append((hosting_cost, hosting_path))
-            paths.sort()
+            paths.add(hosting_cost, hosting_path)
 
     def _visit_path(
         self,
@@ -1140,7 +1218,7 @@ class UCSReplication(MessagePassingComputation):
                 budget,
                 spent,
                 rq_path,
-                paths,
+                PathsTable(paths),
                 visited,
                 comp_def,
                 footprint,
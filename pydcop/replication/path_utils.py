@@ -29,7 +29,11 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import Iterable, Optional, Tuple, List, Set
+import heapq
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple, List, Set, Dict, Iterator
+
+from pydcop.utils.simple_repr import simple_repr, from_repr
 
 Node = str
 Path = Tuple[Node, ...]
@@ -74,7 +78,217 @@ def before_last(path):
     return path[-2]
 
 
-PathsTable = List[Tuple[float, Path]]
+class PathsTable(object):
+    """
+    A table of paths with their costs.
+
+    The table is iterated in increasing (cost, path) order, as a sorted list
+    of ``(cost, path)`` tuples, but it is indexed to avoid scanning all paths
+    in the operations used by UCS replication:
+
+    * a heap of costs gives the cheapest path,
+    * an index on the last node of paths gives the cheapest path to a node,
+    * an index on prefixes (a flattened prefix tree) gives the paths starting
+      with a given prefix.
+
+    A path can only be in the table once, adding a path that is already in
+    the table replaces its cost.
+
+    Parameters
+    ----------
+    paths: iterable of (cost, path) tuples
+        initial content of the table.
+    """
+
+    def __init__(self, paths: Iterable[Tuple[float, Path]] = None):
+        self._costs = {}  # type: Dict[Path, float]
+        # Entries are not removed from the heap when removing a path, they
+        # are discarded when they reach the top of the heap.
+        self._heap = []  # type: List[Tuple[float, Path, int]]
+        self._entry = {}  # type: Dict[Path, int]
+        self._count = 0
+        self._by_last = defaultdict(set)  # type: Dict[Node, Set[Path]]
+        self._prefixes = defaultdict(set)  # type: Dict[Path, Set[Path]]
+        if paths is not None:
+            for cost, path in paths:
+                self.add(cost, path)
+
+    def add(self, cost: float, path: Path):
+        """
+        Add a path to the table.
+
+        Parameters
+        ----------
+        cost: float
+            the cost of the path
+        path: Path
+            the path
+        """
+        path = tuple(path)
+        if path in self._costs:
+            self.remove(path)
+        self._costs[path] = cost
+        self._count += 1
+        self._entry[path] = self._count
+        heapq.heappush(self._heap, (cost, path, self._count))
+        self._by_last[path[-1]].add(path)
+        for i in range(1, len(path) + 1):
+            self._prefixes[path[:i]].add(path)
+
+    def remove(self, path: Path) -> bool:
+        """
+        Remove a path from the table.
+
+        Parameters
+        ----------
+        path: Path
+            the path to remove.
+
+        Returns
+        -------
+        bool
+            True if the path was in the table.
+        """
+        path = tuple(path)
+        if path not in self._costs:
+            return False
+        del self._costs[path]
+        del self._entry[path]
+        self._discard(self._by_last, path[-1], path)
+        for i in range(1, len(path) + 1):
+            self._discard(self._prefixes, path[:i], path)
+
+        if len(self._heap) > 2 * len(self._costs) + 16:
+            self._heap = [e for e in self._heap if self._entry.get(e[1]) == e[2]]
+            heapq.heapify(self._heap)
+        return True
+
+    def cost(self, path: Path) -> float:
+        """
+        The cost of a path, infinite if the path is not in the table.
+        """
+        return self._costs.get(tuple(path), float("inf"))
+
+    def cheapest(self, exclude: Path = None) -> Tuple[float, Path]:
+        """
+        The cheapest path in the table.
+
+        Parameters
+        ----------
+        exclude: Path
+            an optional path that must not be returned.
+
+        Returns
+        -------
+        Tuple[float, Path]
+            The cheapest cost and the corresponding path, or an infinite cost
+            with an empty path if the table contains no (other) path.
+        """
+        heap = self._heap
+        while heap and self._entry.get(heap[0][1]) != heap[0][2]:
+            heapq.heappop(heap)
+        if not heap:
+            return float("inf"), ()
+        cost, path, _ = heap[0]
+        if path != exclude:
+            return cost, path
+        top = heapq.heappop(heap)
+        try:
+            return self.cheapest()
+        finally:
+            heapq.heappush(heap, top)
+
+    def cheapest_to(self, target: Node) -> Tuple[float, Path]:
+        """
+        The cheapest path ending at `target`.
+
+        Returns
+        -------
+        Tuple[float, Path]
+            The cheapest cost and the corresponding path, or an infinite cost
+            with an empty path if no path ends at target.
+        """
+        paths = self._by_last.get(target)
+        if not paths:
+            return float("inf"), ()
+        return min((self._costs[p], p) for p in paths)
+
+    def starting_with(self, prefix: Path,
+                      max_cost: float = None) -> List[Tuple[float, Path]]:
+        """
+        The paths starting with `prefix`, prefix included.
+
+        Parameters
+        ----------
+        prefix: Path
+            the prefix
+        max_cost: float
+            if given, only paths with a cost lower than (or very close to)
+            `max_cost` are returned.
+
+        Returns
+        -------
+        list
+            a list of (cost, path), in increasing (cost, path) order.
+        """
+        paths = self._prefixes.get(tuple(prefix))
+        if not paths:
+            return []
+        costs = self._costs
+        if max_cost is None:
+            found = [(costs[p], p) for p in paths]
+        else:
+            found = [(costs[p], p) for p in paths
+                     if costs[p] - max_cost <= 0.0001]
+        found.sort()
+        return found
+
+    def items(self) -> List[Tuple[float, Path]]:
+        """
+        The content of the table, as a list of (cost, path) in no particular
+        order.
+        """
+        return list(zip(self._costs.values(), self._costs.keys()))
+
+    def copy(self) -> "PathsTable":
+        return PathsTable(self.items())
+
+    @staticmethod
+    def _discard(index, key, path):
+        paths = index[key]
+        paths.discard(path)
+        if not paths:
+            del index[key]
+
+    def __iter__(self) -> Iterator[Tuple[float, Path]]:
+        return iter(sorted(self.items()))
+
+    def __len__(self):
+        return len(self._costs)
+
+    def __contains__(self, path):
+        return tuple(path) in self._costs
+
+    def __eq__(self, other):
+        if isinstance(other, PathsTable):
+            return self._costs == other._costs
+        if isinstance(other, list):
+            return sorted(self.items()) == sorted(other)
+        return False
+
+    def __repr__(self):
+        return "PathsTable({})".format(list(self))
+
+    def _simple_repr(self):
+        return {
+            "__module__": self.__module__,
+            "__qualname__": self.__class__.__qualname__,
+            "paths": [[c, simple_repr(p)] for c, p in self],
+        }
+
+    @classmethod
+    def _from_repr(cls, r):
+        return cls((c, from_repr(p)) for c, p in r["paths"])
 
 
 def remove_path(paths: PathsTable, path: Path) -> PathsTable:
@@ -83,13 +297,16 @@ def remove_path(paths: PathsTable, path: Path) -> PathsTable:
 
     Parameters
     ----------
-    paths
-    path
+    paths: PathsTable or list of (cost, path)
+    path: Path
 
     Returns
     -------
-
+    The paths, which have been modified in place.
     """
+    if isinstance(paths, PathsTable):
+        paths.remove(path)
+        return paths
     to_remove = [(c, p) for c, p in paths if p == path]
     for item in to_remove:
         paths.remove(item)
@@ -104,8 +321,8 @@ def cheapest_path_to(target: Node, paths: PathsTable) -> Tuple[float, Path]:
     ----------
     target: Node
         The end node to look for
-    paths: dict of path, float
-        A dict of known paths with their costs
+    paths: PathsTable or sorted list of (cost, path)
+        known paths with their costs
 
     Returns
     -------
@@ -116,6 +333,8 @@ def cheapest_path_to(target: Node, paths: PathsTable) -> Tuple[float, Path]:
 
     :return:
     """
+    if isinstance(paths, PathsTable):
+        return paths.cheapest_to(target)
     for cost, p in paths:
         if p[-1] == target:
             return cost, p
@@ -123,13 +342,31 @@ def cheapest_path_to(target: Node, paths: PathsTable) -> Tuple[float, Path]:
 
 
 def affordable_path_from(prefix: Path, max_path_cost: float, paths: PathsTable):
-    # filtered = []
+    """
+    Paths starting with `prefix` and with a cost lower than `max_path_cost`.
+
+    Parameters
+    ----------
+    prefix: Path
+    max_path_cost: float
+    paths: PathsTable or sorted list of (cost, path)
+        known paths with their costs
+
+    Returns
+    -------
+    An iterable of paths, in increasing cost order, where the prefix has been
+    removed. With a `PathsTable`, these paths are selected when calling this
+    function: the table can be modified while iterating.
+    """
     plen = len(prefix)
-    for cost, path in paths:
-        if path[:plen] == prefix and (cost - max_path_cost) <= 0.0001:
-            yield path[plen:]
-            # filtered.append((cost, path[plen:]))
-    # return filtered
+    if isinstance(paths, PathsTable):
+        return [path[plen:]
+                for _, path in paths.starting_with(prefix, max_path_cost)]
+    return (
+        path[plen:]
+        for cost, path in paths
+        if path[:plen] == prefix and (cost - max_path_cost) <= 0.0001
+    )
 
 
 def filter_missing_agents_paths(
@@ -161,4 +398,6 @@ def filter_missing_agents_paths(
         if missing:
             continue
         filtered.append((cost, path))
+    if isinstance(paths, PathsTable):
+        return PathsTable(filtered)
     return filtered
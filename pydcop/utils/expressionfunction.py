@@ -29,6 +29,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
+import marshal
 from typing import List
 from collections.abc import Callable
 from pydcop.utils.simple_repr import SimpleRepr, simple_repr, from_repr
@@ -140,6 +141,17 @@ class ExpressionFunction(Callable, SimpleRepr):
     def __hash__(self):
         return hash((self._expression, tuple(self._fixed_vars.items())))
 
+    def __getstate__(self):
+        # Code objects cannot be pickled, but can be marshaled, which avoids
+        # compiling the expression again when un-pickling.
+        state = self.__dict__.copy()
+        state['_c'] = marshal.dumps(self._c)
+        return state
+
+    def __setstate__(self, state):
+        state['_c'] = marshal.loads(state['_c'])
+        self.__dict__.update(state)
+
     def _simple_repr(self):
         r = super()._simple_repr()
         r['fixed_vars'] = simple_repr(self._fixed_vars)
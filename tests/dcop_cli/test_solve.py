@@ -30,8 +30,11 @@
 
 
 import json
+import sys
 import unittest
+from os import path
 from subprocess import STDOUT, check_output, CalledProcessError
+from tempfile import TemporaryDirectory
 
 from tests.dcop_cli.utils import instance_path
 
@@ -242,6 +245,44 @@ class GraphColoringCsp(unittest.TestCase):
         self.check_results(result)
 
 
+class SimulationMode(unittest.TestCase):
+
+    def run_simulation(self, seed, tmp_dir):
+        run_metrics = path.join(tmp_dir, 'run_{}.csv'.format(seed))
+        cmd = [sys.executable, '-m', 'pydcop.dcop_cli', '-v', '0',
+               'solve', '-a', 'dsa', '-m', 'simulation',
+               '--seed', str(seed), '--sim_timeout', '2',
+               '-c', 'period', '--period', '0.5',
+               '--run_metrics', run_metrics,
+               instance_path('graph_coloring_10_4_15_0.1.yml')]
+        output = check_output(cmd, stderr=STDOUT, timeout=60,
+                              cwd=path.join(path.dirname(__file__), '..', '..'))
+        results = json.loads(output.decode(encoding='utf-8'))
+        # The activity ratio is the only wall-clock metric
+        for agt_metrics in results['agt_metrics'].values():
+            del agt_metrics['activity_ratio']
+        with open(run_metrics, encoding='utf-8') as f:
+            return results, f.read()
+
+    def test_same_seed_same_metrics(self):
+        with TemporaryDirectory() as tmp_dir:
+            results, run_metrics = self.run_simulation(1, tmp_dir)
+            self.assertEqual(results['status'], 'TIMEOUT')
+            self.assertEqual(results['time'], 2)
+            # header, one line every 0.5 simulated second and end metrics
+            self.assertEqual(len(run_metrics.splitlines()), 6)
+
+            self.assertEqual((results, run_metrics),
+                             self.run_simulation(1, tmp_dir))
+
+    def test_sim_timeout_requires_simulation_mode(self):
+        cmd = [sys.executable, '-m', 'pydcop.dcop_cli', 'solve', '-a', 'dsa',
+               '--sim_timeout', '2', instance_path('graph_coloring1.yaml')]
+        self.assertRaises(CalledProcessError, check_output, cmd,
+                          stderr=STDOUT, timeout=60,
+                          cwd=path.join(path.dirname(__file__), '..', '..'))
+
+
 def run_solve(algo, distribution, filename, timeout: int, mode='thread',
               algo_params=''):
     filename = instance_path(filename)
@@ -1,9 +1,16 @@
+import os
+import random
+import subprocess
 import tempfile
+import threading
+import time
 from unittest.mock import call, patch
 from unittest import mock
 
+import pytest
 import yaml
 import pydcop.commands.batch as batch_module
+from pydcop.commands._warm_worker import WarmWorker, warm_argv
 
 from pydcop.commands.batch import (
     parameters_configuration,
@@ -14,6 +21,7 @@ from pydcop.commands.batch import (
     build_final_command,
     input_files_glob,
     input_files_re,
+    check_output_group_kill,
 )
 
 
@@ -523,3 +531,150 @@ batches:
         ],
         any_order=True,
     )
+
+
+PARALLEL_DEFINITION = """
+sets:
+ set1:
+   iterations: 12
+
+batches:
+  batch1:
+    command: generate ising
+    command_options:
+      row_count: 3
+    global_options:
+      output: ising_{iteration}.yaml
+"""
+
+
+def test_run_batches_parallel(tmpdir):
+    running, max_running = set(), []
+    lock = threading.Lock()
+
+    def run_command(cli_command, command_dir, timeout):
+        with lock:
+            running.add(cli_command)
+            max_running.append(len(running))
+        time.sleep(random.uniform(0.01, 0.05))
+        with lock:
+            running.remove(cli_command)
+
+    progress_file = str(tmpdir.join("progress"))
+    batches_def = yaml.load(PARALLEL_DEFINITION, Loader=yaml.FullLoader)
+    with patch("pydcop.commands.batch.run_cli_command", side_effect=run_command), \
+            patch("pydcop.commands.batch.progress_file", progress_file):
+        batch_module.run_batches(batches_def, simulate=False, parallel=4)
+
+    assert 1 < max(max_running) <= 4
+    with open(progress_file) as f:
+        jids = [line[5:-2] for line in f if line.startswith("JID: ")]
+    assert sorted(jids) == sorted(f"set1__{i}_{{'row_count': '3'}}" for i in range(12))
+
+
+def test_run_batches_parallel_resume(tmpdir):
+    batches_def = yaml.load(PARALLEL_DEFINITION, Loader=yaml.FullLoader)
+    done = {f"set1__{i}_{{'row_count': '3'}}" for i in range(0, 12, 2)}
+
+    with patch("pydcop.commands.batch.run_cli_command") as run_mock:
+        batch_module.run_batches(batches_def, False, set(done), parallel=3)
+
+    assert run_mock.call_count == 6
+    commands = {c[0][0] for c in run_mock.call_args_list}
+    assert "pydcop --output ising_1.yaml generate ising --row_count 3" in commands
+    assert "pydcop --output ising_2.yaml generate ising --row_count 3" not in commands
+
+
+def test_run_batches_parallel_failure():
+    batches_def = yaml.load(PARALLEL_DEFINITION, Loader=yaml.FullLoader)
+
+    def run_command(cli_command, command_dir, timeout):
+        if "ising_3" in cli_command:
+            raise subprocess.CalledProcessError(1, cli_command)
+
+    with patch("pydcop.commands.batch.run_cli_command", side_effect=run_command):
+        with pytest.raises(subprocess.CalledProcessError):
+            batch_module.run_batches(batches_def, simulate=False, parallel=2)
+
+
+def test_check_output_group_kill_timeout():
+    start = time.time()
+    with pytest.raises(subprocess.TimeoutExpired):
+        check_output_group_kill("sleep 10 & sleep 10", shell=True, timeout=0.5)
+    assert time.time() - start < 5
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "sched_getaffinity"), reason="CPU pinning only on linux"
+)
+def test_check_output_group_kill_pin_cpus():
+    cpu = min(os.sched_getaffinity(0))
+    result = check_output_group_kill(
+        "python -c 'import os; print(os.sched_getaffinity(0))'",
+        shell=True,
+        universal_newlines=True,
+        cpus={cpu},
+    )
+    assert result.stdout.strip() == str({cpu})
+
+
+INSTANCE = os.path.join(
+    os.path.dirname(__file__), "..", "instances", "graph_coloring_10_4_15_0.1.yml"
+)
+
+
+def test_warm_argv():
+    assert warm_argv(f"pydcop -t 5 distribute -d oneagent {INSTANCE}") == [
+        "-t", "5", "distribute", "-d", "oneagent", INSTANCE
+    ]
+    assert warm_argv("pydcop generate ising --row_count 3") is None
+    assert warm_argv("pydcop solve --algo dsa $HOME/dcop.yaml") is None
+    assert warm_argv("pydcop solve --algo dsa dcop.yaml | tee out") is None
+    assert warm_argv("python -m pydcop solve --algo dsa dcop.yaml") is None
+
+
+def test_warm_worker_runs_jobs(tmpdir):
+    worker = WarmWorker()
+    try:
+        for i in range(2):
+            worker.run(
+                f"pydcop --output out_{i}.json solve --algo dsa "
+                f"--algo_params stop_cycle:10 {INSTANCE}",
+                str(tmpdir),
+                30,
+            )
+            assert tmpdir.join(f"out_{i}.json").check()
+    finally:
+        worker.close()
+
+
+def test_warm_worker_isolates_failures_and_timeouts(tmpdir):
+    worker = WarmWorker()
+    try:
+        with pytest.raises(subprocess.CalledProcessError) as cpe:
+            worker.run(f"pydcop solve --algo no_such_algo {INSTANCE}", str(tmpdir))
+        assert "no_such_algo" in cpe.value.output
+
+        start = time.time()
+        with pytest.raises(subprocess.TimeoutExpired):
+            worker.run(f"pydcop solve --algo dsa {INSTANCE}", str(tmpdir), 1)
+        assert time.time() - start < 10
+
+        worker.run(
+            f"pydcop --output out.json solve --algo dsa "
+            f"--algo_params stop_cycle:10 {INSTANCE}",
+            str(tmpdir),
+            30,
+        )
+        assert tmpdir.join("out.json").check()
+    finally:
+        worker.close()
+
+
+def test_run_batches_warm_falls_back_to_sub_process():
+    batches_def = yaml.load(PARALLEL_DEFINITION, Loader=yaml.FullLoader)
+
+    with patch("pydcop.commands.batch.run_cli_command") as run_mock:
+        batch_module.run_batches(batches_def, simulate=False, warm=True)
+
+    assert run_mock.call_count == 12
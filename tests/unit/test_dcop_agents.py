@@ -29,6 +29,8 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
+import pickle
+
 from pydcop.dcop.objects import AgentDef, create_agents
 from pydcop.utils.simple_repr import from_repr, simple_repr
 
@@ -100,6 +102,17 @@ def test_with_routes():
     assert a.route("ahahah") == 1
 
 
+def test_pickle_keeps_routes():
+
+    a = AgentDef("a1", default_route=3, routes={"psycho": 5}, capacity=10)
+
+    a2 = pickle.loads(pickle.dumps(a))
+
+    assert a2.route("psycho") == 5
+    assert a2.route("ahahah") == 3
+    assert a2.capacity == 10
+
+
 def test_create_agents_from_range():
     agts = create_agents("a", range(20), default_route=2, default_hosting_costs=7)
     assert isinstance(agts["a08"], AgentDef)
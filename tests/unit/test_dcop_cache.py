@@ -0,0 +1,216 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+
+import numpy as np
+import pytest
+
+from pydcop.dcop import dcopcache, yamldcop
+from pydcop.dcop.relations import generate_assignment_as_dict
+from pydcop.dcop.yamldcop import load_dcop_from_file
+
+DCOP_STR = """
+name: cache test
+objective: min
+
+domains:
+  colors:
+    values: [R, G, B]
+
+variables:
+  v1:
+    domain: colors
+  v2:
+    domain: colors
+  v3:
+    domain: colors
+
+constraints:
+  c1:
+    type: intention
+    function: 10 if v1 == v2 else 0
+  c2:
+    type: extensional
+    variables: [v2, v3]
+    default: 0
+    values:
+      10: R R | G G | B B
+
+agents: [a1, a2, a3]
+"""
+
+
+@pytest.fixture
+def dcop_file(tmpdir):
+    path = tmpdir.join("dcop.yaml")
+    path.write(DCOP_STR)
+    return str(path)
+
+
+def assert_same_dcop(dcop1, dcop2):
+    assert dcop1.name == dcop2.name
+    assert dcop1.objective == dcop2.objective
+    assert set(dcop1.variables) == set(dcop2.variables)
+    assert set(dcop1.agents) == set(dcop2.agents)
+    assert set(dcop1.constraints) == set(dcop2.constraints)
+    for name, c1 in dcop1.constraints.items():
+        c2 = dcop2.constraint(name)
+        for assignment in generate_assignment_as_dict(c1.dimensions):
+            assert c1(**assignment) == c2(**assignment)
+
+
+def test_load_without_cache_dir_does_not_use_cache(dcop_file, tmpdir):
+    load_dcop_from_file(dcop_file)
+
+    assert not tmpdir.join("cache").exists()
+
+
+def test_load_stores_dcop_in_cache(dcop_file, tmpdir):
+    cache_dir = str(tmpdir.join("cache"))
+    dcop = load_dcop_from_file(dcop_file, cache_dir=cache_dir)
+
+    entries = os.listdir(cache_dir)
+    assert len(entries) == 1
+    assert os.path.exists(
+        os.path.join(cache_dir, entries[0], dcopcache.DCOP_FILE))
+    assert_same_dcop(dcop, load_dcop_from_file(dcop_file))
+
+
+def test_load_from_cache_does_not_parse(dcop_file, tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join("cache"))
+    dcop = load_dcop_from_file(dcop_file, cache_dir=cache_dir)
+
+    def fail_parse(_):
+        raise AssertionError("dcop should be loaded from cache")
+    monkeypatch.setattr(yamldcop, "load_dcop", fail_parse)
+    cached = load_dcop_from_file([dcop_file], cache_dir=cache_dir)
+
+    assert_same_dcop(dcop, cached)
+
+
+def test_cache_keyed_by_content(dcop_file, tmpdir):
+    cache_dir = str(tmpdir.join("cache"))
+    load_dcop_from_file(dcop_file, cache_dir=cache_dir)
+
+    other_file = tmpdir.join("other.yaml")
+    other_file.write(DCOP_STR.replace("10 if", "5 if"))
+    other = load_dcop_from_file(str(other_file), cache_dir=cache_dir)
+
+    assert len(os.listdir(cache_dir)) == 2
+    assert other.constraint("c1")(v1="R", v2="R") == 5
+
+
+def test_large_tables_stored_as_npy(dcop_file, tmpdir, monkeypatch):
+    monkeypatch.setattr(dcopcache, "TABLE_MIN_SIZE", 1)
+    cache_dir = str(tmpdir.join("cache"))
+    dcop = load_dcop_from_file(dcop_file, cache_dir=cache_dir)
+
+    entry = os.listdir(cache_dir)[0]
+    tables = [f for f in os.listdir(os.path.join(cache_dir, entry))
+              if f.endswith(".npy")]
+    assert len(tables) == 1
+
+    cached = load_dcop_from_file(dcop_file, cache_dir=cache_dir)
+    assert_same_dcop(dcop, cached)
+
+
+def test_invalid_cache_entry_is_ignored(dcop_file, tmpdir):
+    cache_dir = str(tmpdir.join("cache"))
+    dcop = load_dcop_from_file(dcop_file, cache_dir=cache_dir)
+    entry = os.listdir(cache_dir)[0]
+    with open(os.path.join(cache_dir, entry, dcopcache.DCOP_FILE), "wb") as f:
+        f.write(b"not a pickle")
+
+    cached = load_dcop_from_file(dcop_file, cache_dir=cache_dir)
+
+    assert_same_dcop(dcop, cached)
+
+
+def test_cache_entry_discarded_when_table_modified(tmpdir):
+    table_file = str(tmpdir.join("table.npy"))
+    np.save(table_file, np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]]))
+    dcop_file = tmpdir.join("dcop.yaml")
+    dcop_file.write(DCOP_STR.replace(
+        "default: 0\n    values:\n      10: R R | G G | B B",
+        "table: table.npy"))
+    cache_dir = str(tmpdir.join("cache"))
+    dcop = load_dcop_from_file(str(dcop_file), cache_dir=cache_dir)
+    assert dcop.constraint("c2")(v2="R", v3="G") == 2
+
+    np.save(table_file, np.array([[1, 20, 3], [4, 5, 6], [7, 8, 9]]))
+    stat = os.stat(table_file)
+    os.utime(table_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    dcop = load_dcop_from_file(str(dcop_file), cache_dir=cache_dir)
+
+    assert dcop.constraint("c2")(v2="R", v3="G") == 20
+
+
+@pytest.fixture
+def dcops_in_memory():
+    yamldcop.keep_dcops_in_memory(2)
+    yield
+    yamldcop.keep_dcops_in_memory(0)
+
+
+def test_memory_cache_returns_same_dcop(dcop_file, dcops_in_memory):
+    dcop = load_dcop_from_file(dcop_file)
+
+    assert load_dcop_from_file([dcop_file]) is dcop
+
+
+def test_memory_cache_disabled_by_default(dcop_file):
+    dcop = load_dcop_from_file(dcop_file)
+
+    assert load_dcop_from_file(dcop_file) is not dcop
+
+
+def test_memory_cache_reloads_modified_file(dcop_file, dcops_in_memory):
+    dcop = load_dcop_from_file(dcop_file)
+    with open(dcop_file, "a") as f:
+        f.write("\n")
+
+    reloaded = load_dcop_from_file(dcop_file)
+
+    assert reloaded is not dcop
+    assert_same_dcop(dcop, reloaded)
+
+
+def test_memory_cache_is_bounded(tmpdir, dcops_in_memory):
+    files = []
+    for i in range(3):
+        path = tmpdir.join(f"dcop{i}.yaml")
+        path.write(DCOP_STR)
+        files.append(str(path))
+    dcops = [load_dcop_from_file(f) for f in files]
+
+    assert load_dcop_from_file(files[2]) is dcops[2]
+    assert load_dcop_from_file(files[0]) is not dcops[0]
@@ -0,0 +1,113 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import subprocess
+import sys
+from os import path
+
+import pytest
+
+from pydcop.dcop_cli import selected_command, command_help, COMMANDS
+
+ROOT_DIR = path.join(path.dirname(__file__), '..', '..')
+
+# Heavy modules that must not be imported when starting the cli, as pydcop is
+# often used to run many short commands.
+HEAVY_MODULES = ['numpy', 'networkx', 'pulp', 'requests', 'yaml',
+                 'websocket_server', 'pydcop.algorithms',
+                 'pydcop.distribution', 'pydcop.infrastructure']
+
+
+def imported_modules(statement):
+    """
+    Modules newly imported when executing `statement` in a fresh interpreter.
+    """
+    script = 'import sys\n' \
+             'before = set(sys.modules)\n' \
+             '{}\n' \
+             'print("\\n".join(set(sys.modules) - before))'.format(statement)
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     cwd=ROOT_DIR)
+    return output.decode('utf-8').split()
+
+
+def test_selected_command():
+    assert selected_command(['solve', '-a', 'dsa', 'dcop.yaml']) == 'solve'
+    assert selected_command(['-t', '5', '--output', 'o.yaml', 'run', '-a',
+                             'dsa']) == 'run'
+    assert selected_command(['-v', '2', 'agent', '-n', 'a1']) == 'agent'
+    assert selected_command(['--timeout=5', 'batch', 'bench.yaml']) == 'batch'
+
+
+def test_selected_command_with_abbreviated_options():
+    assert selected_command(['--time', '5', 'solve', 'dcop.yaml']) == 'solve'
+    assert selected_command(['--out', 'o.yaml', '--verb', '2', 'run']) == 'run'
+    assert selected_command(['--out', 'solve']) is None
+
+
+def test_selected_command_not_found():
+    assert selected_command([]) is None
+    assert selected_command(['--help']) is None
+    assert selected_command(['--output', 'solve']) is None
+    assert selected_command(['foo', 'solve']) is None
+    assert selected_command(['-h', 'solve']) is None
+
+
+def test_commands_help_from_commands_modules():
+    assert command_help('solve') == 'solve static dcop'
+    assert command_help('graph').startswith('Graph metrics for dcop graphs.')
+    for command in COMMANDS:
+        assert command_help(command)
+
+
+def test_cli_help_does_not_import_commands():
+    modules = imported_modules('from pydcop.dcop_cli import build_parser\n'
+                               'build_parser().format_help()')
+
+    for command in COMMANDS:
+        assert 'pydcop.commands.' + command not in modules
+
+
+def test_cli_import_does_not_import_commands():
+    modules = imported_modules('import pydcop.dcop_cli')
+
+    for module in modules:
+        for heavy in HEAVY_MODULES:
+            assert module != heavy and not module.startswith(heavy + '.')
+        for command in COMMANDS:
+            assert module != 'pydcop.commands.' + command
+
+
+@pytest.mark.parametrize('module', ['requests', 'websocket_server'])
+def test_agent_import_does_not_import_optional_dependencies(module):
+    modules = imported_modules('import pydcop.infrastructure.agents')
+
+    assert module not in modules
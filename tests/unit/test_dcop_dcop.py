@@ -29,9 +29,13 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
-from pydcop.dcop.dcop import DCOP, filter_dcop
+import random
+
+import pytest
+
+from pydcop.dcop.dcop import DCOP, filter_dcop, IncrementalSolutionCost
 from pydcop.dcop.objects import Variable, VariableDomain, AgentDef, \
-    create_agents
+    create_agents, VariableWithCostDict
 from pydcop.dcop.relations import constraint_from_str
 
 
@@ -145,3 +149,66 @@ def test_filter_dcop_unary_constraint_accepted():
     assert "v3" in filtered.variables
     assert "c2" in filtered.constraints
     assert "v4"  not in filtered.variables
+
+
+def test_incremental_cost_incomplete_assignment():
+    dcop = DCOP()
+    d = VariableDomain('test', 'test', values=range(3))
+    v1, v2 = Variable('v1', d), Variable('v2', d)
+    dcop += 'c1', '0 if v1 != v2 else 10', [v1, v2]
+    running = IncrementalSolutionCost(dcop, float('inf'))
+
+    running.set_value('v1', 0)
+    assert not running.is_complete
+    with pytest.raises(ValueError):
+        running.solution_cost()
+
+    running.set_value('v2', 0)
+    assert running.is_complete
+    assert running.solution_cost() == (0, 10)
+
+    running.set_value('v2', None)
+    assert not running.is_complete
+
+
+def test_incremental_cost_same_as_solution_cost():
+    dcop = DCOP()
+    d = VariableDomain('test', 'test', values=range(4))
+    variables = [VariableWithCostDict('v{}'.format(i), d,
+                                      {0: 1, 1: 2, 2: 0, 3: 5})
+                 for i in range(10)]
+    for i in range(10):
+        v1, v2 = variables[i], variables[(i + 3) % 10]
+        dcop += 'c{}'.format(i), \
+            '{} * abs({} - {}) if {} != 3 else 1000'.format(
+                i, v1.name, v2.name, v1.name), [v1, v2]
+    dcop += 'c_hard', '0 if v0 != v1 else float("inf")', variables
+
+    running = IncrementalSolutionCost(dcop, float('inf'))
+    assignment = {}
+    rnd = random.Random(0)
+    for v in variables:
+        assignment[v.name] = rnd.choice(d.values)
+        running.set_value(v.name, assignment[v.name])
+    for _ in range(200):
+        name = rnd.choice(variables).name
+        assignment[name] = rnd.choice(d.values)
+        running.set_value(name, assignment[name])
+
+        assert running.solution_cost() == \
+            dcop.solution_cost(assignment, float('inf'))
+        assert running.assignment == assignment
+
+
+def test_incremental_cost_ignores_unknown_variable():
+    dcop = DCOP()
+    d = VariableDomain('test', 'test', values=range(3))
+    v1 = Variable('v1', d)
+    dcop += 'c1', 'v1 * 2', [v1]
+    running = IncrementalSolutionCost(dcop, float('inf'))
+
+    running.set_value('foo', 2)
+    running.set_value('v1', 2)
+
+    assert running.solution_cost() == (0, 4)
+    assert running.assignment == {'v1': 2}
@@ -30,13 +30,17 @@
 
 
 import unittest
+from os import path
 
+import numpy as np
 import pytest
 
 from pydcop.dcop.objects import VariableWithCostDict
 from pydcop.dcop.scenario import EventAction, Scenario, DcopEvent
 from pydcop.dcop.yamldcop import (
     load_dcop,
+    load_dcop_from_file,
+    dcop_yaml,
     DcopInvalidFormatError,
     load_scenario,
     yaml_scenario,
@@ -1033,3 +1037,106 @@ def test_yaml_scenario_two_events():
     assert len(obtained.events) == 2
     assert obtained.events[1].is_delay
     assert not obtained.events[0].is_delay
+
+
+TABLE_DCOP_STR = """
+name: dcop name
+objective: min
+
+domains:
+  d1:
+    values: [0 .. 2]
+  d2:
+    values: [A, B]
+
+variables:
+  v1:
+    domain : d1
+  v2:
+    domain : d2
+
+constraints:
+  ext_table:
+    type: extensional
+    variables: [v1, v2]
+    table: {}
+"""
+
+
+def test_extensional_constraint_npy_table(tmpdir):
+    np.save(str(tmpdir.join("table.npy")), np.array([[1, 2], [3, 4], [5, 6]]))
+    dcop_file = tmpdir.join("dcop.yaml")
+    dcop_file.write(TABLE_DCOP_STR.format("table.npy"))
+
+    # table path is relative to the dcop file
+    dcop = load_dcop_from_file(str(dcop_file))
+
+    c = dcop.constraint("ext_table")
+    assert [v.name for v in c.dimensions] == ["v1", "v2"]
+    assert c(v1=0, v2="A") == 1
+    assert c(v1=1, v2="B") == 4
+    assert c(v1=2, v2="A") == 5
+
+
+def test_extensional_constraint_csv_table(tmpdir):
+    tmpdir.join("table.csv").write("1, 2\n3, 4\n5, 6\n")
+
+    dcop = load_dcop(TABLE_DCOP_STR.format("table.csv"), str(tmpdir))
+
+    c = dcop.constraint("ext_table")
+    assert c(v1=0, v2="B") == 2
+    assert c(v1=2, v2="B") == 6
+
+
+def test_extensional_constraint_stacked_table(tmpdir):
+    tables = np.arange(18).reshape((3, 3, 2))
+    np.save(str(tmpdir.join("tables.npy")), tables)
+
+    dcop = load_dcop(
+        TABLE_DCOP_STR.format("tables.npy") + "    table_index: 1\n", str(tmpdir)
+    )
+
+    c = dcop.constraint("ext_table")
+    assert c(v1=0, v2="A") == 6
+    assert c(v1=2, v2="B") == 11
+
+
+def test_extensional_constraint_stacked_table_invalid_index(tmpdir):
+    np.save(str(tmpdir.join("tables.npy")), np.zeros((2, 3, 2)))
+
+    with pytest.raises(DcopInvalidFormatError):
+        load_dcop(
+            TABLE_DCOP_STR.format("tables.npy") + "    table_index: 2\n",
+            str(tmpdir),
+        )
+
+
+def test_extensional_constraint_table_invalid_shape(tmpdir):
+    np.save(str(tmpdir.join("table.npy")), np.array([[1, 2, 3], [4, 5, 6]]))
+
+    with pytest.raises(DcopInvalidFormatError):
+        load_dcop(TABLE_DCOP_STR.format("table.npy"), str(tmpdir))
+
+
+def test_dcop_yaml_external_tables(tmpdir):
+    dcop = load_dcop(
+        TABLE_DCOP_STR.replace(
+            "table: {}", "default: 0\n    values:\n      3: 1 A | 2 B")
+    )
+    yaml_dir = str(tmpdir)
+
+    dcop_str = dcop_yaml(
+        dcop,
+        tables_dir=path.join(yaml_dir, "tables"),
+        yaml_dir=yaml_dir,
+        table_min_size=6,
+    )
+    dcop_file = tmpdir.join("dcop.yaml")
+    dcop_file.write(dcop_str)
+
+    assert "table: tables/ext_table.npy" in dcop_str
+    loaded = load_dcop_from_file(str(dcop_file))
+    c = loaded.constraint("ext_table")
+    assert c(v1=1, v2="A") == 3
+    assert c(v1=2, v2="B") == 3
+    assert c(v1=0, v2="A") == 0
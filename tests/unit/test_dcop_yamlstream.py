@@ -0,0 +1,174 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import io
+
+import numpy as np
+import pytest
+import yaml
+
+from pydcop.dcop.yamldcop import load_dcop, load_dcop_from_file
+from pydcop.dcop.yamlstream import (
+    DcopYamlWriter,
+    TableStack,
+    write_distribution_yaml,
+    yaml_scalar,
+)
+from pydcop.distribution.yamlformat import load_dist
+
+
+def test_write_variables_and_intention_constraint():
+    out = io.StringIO()
+    with DcopYamlWriter(out, "test dcop", objective="max") as writer:
+        writer.domain("colors", ["R", "G"], "color")
+        writer.variable("v1", "colors")
+        writer.variable("v2", "colors", initial_value="G")
+        writer.intention_constraint("c1", "10 if v1 == v2 else 0")
+
+    dcop = load_dcop(out.getvalue())
+
+    assert dcop.name == "test dcop"
+    assert dcop.objective == "max"
+    assert list(dcop.domain("colors").values) == ["R", "G"]
+    assert dcop.variable("v2").initial_value == "G"
+    assert dcop.constraint("c1")(v1="R", v2="R") == 10
+    assert dcop.constraint("c1")(v1="R", v2="G") == 0
+
+
+def test_write_extensional_constraints():
+    out = io.StringIO()
+    with DcopYamlWriter(out, "test") as writer:
+        writer.domain("d1", [0, 1, 2])
+        writer.domain("d2", ["A", "B"])
+        writer.variable("v1", "d1")
+        writer.variable("v2", "d2")
+        domains = [[0, 1, 2], ["A", "B"]]
+        writer.extensional_constraint(
+            "c1", ["v1", "v2"], domains, [[1, 2], [3, 4], [5, 6.5]]
+        )
+        writer.extensional_constraint(
+            "c2", ["v1", "v2"], domains, [[0, 0], [3, 0], [0, 0]], default=0
+        )
+        writer.extensional_constraint("c3", ["v1"], [[0, 1, 2]], [-1e-5, 0, 2])
+
+    dcop = load_dcop(out.getvalue())
+
+    c1 = dcop.constraint("c1")
+    assert c1(v1=0, v2="A") == 1
+    assert c1(v1=2, v2="B") == 6.5
+    c2 = dcop.constraint("c2")
+    assert c2(v1=1, v2="A") == 3
+    assert c2(v1=1, v2="B") == 0
+    assert dcop.constraint("c3")(v1=0) == -1e-5
+
+
+def test_write_agents():
+    out = io.StringIO()
+    with DcopYamlWriter(out, "test") as writer:
+        writer.domain("d", [0, 1])
+        writer.variable("v1", "d")
+        writer.agent("a1", capacity=100)
+        writer.agent("a2")
+        writer.default_route(5)
+        writer.hosting_costs("a1", 3, {"v1": 0})
+
+    dcop = load_dcop(out.getvalue())
+
+    assert dcop.agent("a1").capacity == 100
+    assert dcop.agent("a1").hosting_cost("v1") == 0
+    assert dcop.agent("a1").hosting_cost("c1") == 3
+    assert dcop.agent("a2").route("a1") == 5
+
+
+def test_sections_must_be_written_in_order():
+    writer = DcopYamlWriter(io.StringIO(), "test")
+    writer.domain("d", [0, 1])
+    writer.variable("v1", "d")
+
+    with pytest.raises(ValueError):
+        writer.domain("d2", [0, 1])
+
+
+def test_write_stacked_tables(tmpdir):
+    dcop_file = str(tmpdir.join("dcop.yaml"))
+    with open(dcop_file, "w") as fo:
+        with DcopYamlWriter(
+            fo, "test", tables_prefix=str(tmpdir.join("dcop")), yaml_dir=str(tmpdir)
+        ) as writer:
+            writer.domain("d", [0, 1])
+            for i in range(3):
+                writer.variable(f"v{i}", "d")
+            for i in range(3):
+                writer.extensional_constraint(
+                    f"c{i}", [f"v{i}"], [[0, 1]], np.array([i, 10 * i])
+                )
+            writer.extensional_constraint(
+                "c01", ["v0", "v1"], [[0, 1], [0, 1]], np.array([[1, 2], [3, 4]])
+            )
+    assert len(writer.table_files) == 2
+
+    dcop = load_dcop_from_file(dcop_file)
+
+    assert dcop.constraint("c2")(v2=1) == 20
+    assert dcop.constraint("c1")(v1=0) == 1
+    assert dcop.constraint("c01")(v0=1, v1=0) == 3
+
+
+def test_table_stack(tmpdir):
+    filename = str(tmpdir.join("tables.npy"))
+    stack = TableStack(filename, (2, 3), np.float64)
+    assert stack.append(np.ones((2, 3))) == 0
+    assert list(stack.extend(np.zeros((2, 2, 3)))) == [1, 2]
+    with pytest.raises(ValueError):
+        stack.append(np.ones((3, 2)))
+    stack.close()
+
+    tables = np.load(filename)
+    assert tables.shape == (3, 2, 3)
+    assert tables[0].sum() == 6
+    assert tables[1:].sum() == 0
+
+
+def test_write_distribution():
+    out = io.StringIO()
+    write_distribution_yaml(
+        out, iter([("a1", ["v1", "c1"]), ("a2", ["v2"])]), {"dist_algo": "NA"}
+    )
+
+    dist = load_dist(out.getvalue())
+
+    assert dist.mapping() == {"a1": ["v1", "c1"], "a2": ["v2"]}
+
+
+@pytest.mark.parametrize(
+    "value", ["a_1", "1", "yes", "a: b", "", 3, -1.5, 1e-5, 1e20, None, True]
+)
+def test_yaml_scalar(value):
+    assert yaml.safe_load(yaml_scalar(value)) == value
@@ -0,0 +1,236 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import pulp
+import pytest
+
+from pydcop.computations_graph import constraints_hypergraph
+from pydcop.dcop.dcop import DCOP
+from pydcop.dcop.objects import Variable, Domain, AgentDef
+from pydcop.dcop.relations import constraint_from_str
+from pydcop.distribution import _decomposition, oilp_cgdp
+from pydcop.distribution._decomposition import (
+    agent_groups,
+    distribute_by_parts,
+    SubComputationGraph,
+)
+from pydcop.distribution.objects import Distribution
+
+
+def memory(computation):
+    return 1
+
+
+def load(computation, target):
+    return 1
+
+
+def chain_graph(count, prefix="v"):
+    d = Domain("d", "", [0, 1, 2])
+    variables = [Variable(f"{prefix}{i}", d) for i in range(count)]
+    dcop = DCOP("chain")
+    for i in range(count - 1):
+        v1, v2 = variables[i], variables[i + 1]
+        dcop.add_constraint(
+            constraint_from_str(
+                f"c_{v1.name}_{v2.name}", f"1 if {v1.name} == {v2.name} else 0", [v1, v2]
+            )
+        )
+    return constraints_hypergraph.build_computation_graph(dcop)
+
+
+def timeout_part(computation_graph, agentsdef, **kwargs):
+    raise TimeoutError()
+
+
+def one_agent_part(computation_graph, agentsdef, **kwargs):
+    agents = list(agentsdef)
+    return Distribution({agents[0].name: computation_graph.node_names()})
+
+
+def test_sub_graph_only_keeps_inner_links():
+    cg = chain_graph(4)
+
+    sub = SubComputationGraph(cg, ["v1", "v2"])
+
+    assert sorted(sub.node_names()) == ["v1", "v2"]
+    assert len(sub.links) == 1
+    assert sub.neighbors("v1") == ["v2"]
+    assert sub.computation("v2") is cg.computation("v2")
+    with pytest.raises(KeyError):
+        sub.computation("v0")
+
+
+def test_agent_groups_merge_agents_exchanging_messages():
+    # Two independent chains, each one on two agents
+    cg = chain_graph(4, "v")
+    cg.nodes.extend(chain_graph(4, "w").nodes)
+    agents = [AgentDef(f"a{i}", capacity=10) for i in range(5)]
+    dist = Distribution(
+        {"a0": ["v0", "v1"], "a1": ["w0", "w1"], "a2": ["v2", "v3"], "a3": ["w2", "w3"]}
+    )
+
+    groups = agent_groups(cg, agents, dist, load, max_size=4)
+
+    groups = sorted(sorted(g) for g in groups)
+    assert groups in (
+        [["a0", "a2", "a4"], ["a1", "a3"]],
+        [["a0", "a2"], ["a1", "a3", "a4"]],
+    )
+
+
+def test_agent_groups_pack_independent_agents():
+    cg = chain_graph(6)
+    agents = [AgentDef(f"a{i}", capacity=10) for i in range(3)]
+    dist = Distribution({"a0": ["v0", "v1"], "a1": ["v2", "v3"], "a2": ["v4", "v5"]})
+
+    # a1 exchanges messages with a0 and a2 but the group would be too big
+    groups = agent_groups(cg, agents, dist, load, max_size=4)
+
+    assert len(groups) == 2
+    assert sum(len(g) for g in groups) == 3
+
+
+def test_small_graph_timeout_uses_greedy_distribution():
+    cg = chain_graph(6)
+    agents = [AgentDef(f"a{i}", capacity=3, default_hosting_cost=1) for i in range(2)]
+
+    dist = distribute_by_parts(
+        timeout_part, cg, agents, computation_memory=memory, communication_load=load
+    )
+
+    assert sorted(dist.computations) == sorted(cg.node_names())
+    for agent in dist.agents:
+        assert len(dist.computations_hosted(agent)) <= 3
+
+
+def test_large_graph_solved_by_parts(monkeypatch):
+    monkeypatch.setattr(_decomposition, "MAX_PART_SIZE", 4)
+    monkeypatch.setattr(_decomposition, "MAX_PROCESSES", 2)
+    cg = chain_graph(12)
+    agents = [AgentDef(f"a{i}", capacity=4, default_hosting_cost=1) for i in range(6)]
+
+    dist = distribute_by_parts(
+        one_agent_part, cg, agents, computation_memory=memory, communication_load=load
+    )
+
+    assert sorted(dist.computations) == sorted(cg.node_names())
+
+
+def test_large_graph_timeout_keeps_greedy_placement(monkeypatch):
+    monkeypatch.setattr(_decomposition, "MAX_PART_SIZE", 4)
+    cg = chain_graph(12)
+    agents = [AgentDef(f"a{i}", capacity=4, default_hosting_cost=1) for i in range(6)]
+
+    dist = distribute_by_parts(
+        timeout_part, cg, agents, computation_memory=memory, communication_load=load
+    )
+
+    assert sorted(dist.computations) == sorted(cg.node_names())
+    for agent in dist.agents:
+        assert len(dist.computations_hosted(agent)) <= 4
+
+
+def last_agent_ilp(cg, agentsdef, *args, **kwargs):
+    # Stands for the ILP solver: hosts the whole sub-problem on its last agent
+    names = sorted(a.name for a in agentsdef)
+    return {n: cg.node_names() if n == names[-1] else [] for n in names}
+
+
+def test_oilp_parts_are_merged(monkeypatch):
+    # The sub-problems are solved in forked processes, which inherit the
+    # patched solver.
+    monkeypatch.setattr(_decomposition, "MAX_PART_SIZE", 4)
+    monkeypatch.setattr(oilp_cgdp, "ilp_cgdp", last_agent_ilp)
+    split = []
+
+    def recording_agent_groups(cg, agents, distribution, *args, **kwargs):
+        groups = agent_groups(cg, agents, distribution, *args, **kwargs)
+        split.append((distribution, groups))
+        return groups
+
+    monkeypatch.setattr(_decomposition, "agent_groups", recording_agent_groups)
+    cg = chain_graph(12)
+    agents = [AgentDef(f"a{i}", capacity=4, default_hosting_cost=1) for i in range(6)]
+
+    dist = oilp_cgdp.distribute(
+        cg, agents, computation_memory=memory, communication_load=load
+    )
+
+    (initial, groups), = split
+    solved = 0
+    for group in groups:
+        computations = [c for a in group for c in initial.computations_hosted(a)]
+        if len(group) == 1 or not computations:
+            # no sub-problem, initial placement
+            for a in group:
+                assert dist.computations_hosted(a) == initial.computations_hosted(a)
+        else:
+            solved += 1
+            last = sorted(group)[-1]
+            assert sorted(dist.computations_hosted(last)) == sorted(computations)
+            assert all(not dist.computations_hosted(a) for a in group if a != last)
+    assert solved > 1
+    hosted = [c for a in dist.agents for c in dist.computations_hosted(a)]
+    assert sorted(hosted) == sorted(cg.node_names())
+
+
+def cbc_solver(keepFiles=0, msg=False, options=None):
+    return pulp.PULP_CBC_CMD(msg=False)
+
+
+@pytest.mark.skipif(
+    "PULP_CBC_CMD" not in pulp.listSolvers(onlyAvailable=True),
+    reason="no ILP solver",
+)
+def test_oilp_solved_by_parts(monkeypatch):
+    monkeypatch.setattr(_decomposition, "MAX_PART_SIZE", 4)
+    monkeypatch.setattr(oilp_cgdp, "GLPK_CMD", cbc_solver)
+    cg = chain_graph(12)
+    # Each computation is cheaper on one agent
+    agents = [
+        AgentDef(
+            f"a{i}",
+            capacity=4,
+            default_hosting_cost=10,
+            hosting_costs={f"v{j}": 1 for j in range(12) if j % 6 == i},
+        )
+        for i in range(6)
+    ]
+
+    dist = oilp_cgdp.distribute(
+        cg, agents, computation_memory=memory, communication_load=load
+    )
+
+    hosted = [c for a in dist.agents for c in dist.computations_hosted(a)]
+    assert sorted(hosted) == sorted(cg.node_names())
+    for agent in dist.agents:
+        assert len(dist.computations_hosted(agent)) <= 4
@@ -0,0 +1,130 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import random
+
+import pytest
+
+from pydcop.computations_graph import constraints_hypergraph
+from pydcop.dcop.dcop import DCOP
+from pydcop.dcop.objects import Variable, Domain, AgentDef
+from pydcop.dcop.relations import constraint_from_str
+from pydcop.distribution import gh_cgdp
+from pydcop.distribution.objects import ImpossibleDistributionException
+
+
+def memory(computation):
+    return 1
+
+
+def load(computation, target):
+    return 1
+
+
+def ring_graph(count):
+    d = Domain("d", "", [0, 1, 2])
+    variables = [Variable(f"v{i}", d) for i in range(count)]
+    dcop = DCOP("ring")
+    for i in range(count):
+        v1, v2 = variables[i], variables[(i + 1) % count]
+        dcop.add_constraint(
+            constraint_from_str(
+                f"c{i}", f"1 if {v1.name} == {v2.name} else 0", [v1, v2]
+            )
+        )
+    return constraints_hypergraph.build_computation_graph(dcop)
+
+
+def test_respects_capacity():
+    cg = ring_graph(12)
+    agents = [AgentDef(f"a{i}", capacity=3, default_hosting_cost=1) for i in range(4)]
+
+    dist = gh_cgdp.distribute(
+        cg, agents, computation_memory=memory, communication_load=load
+    )
+
+    assert sorted(dist.computations) == sorted(cg.node_names())
+    for agent in dist.agents:
+        assert len(dist.computations_hosted(agent)) <= 3
+
+
+def test_zero_hosting_cost_computations_are_fixed():
+    cg = ring_graph(6)
+    agents = [
+        AgentDef("a1", capacity=10, default_hosting_cost=1, hosting_costs={"v2": 0}),
+        AgentDef("a2", capacity=10, default_hosting_cost=1),
+    ]
+
+    dist = gh_cgdp.distribute(
+        cg, agents, computation_memory=memory, communication_load=load
+    )
+
+    assert dist.agent_for("v2") == "a1"
+
+
+def test_neighbours_placed_on_cheap_routes():
+    cg = ring_graph(2)
+    agents = [
+        AgentDef("a1", capacity=1, default_hosting_cost=1),
+        AgentDef("a2", capacity=1, default_hosting_cost=5, routes={"a1": 10}),
+        AgentDef("a3", capacity=1, default_hosting_cost=5, routes={"a1": 0.1}),
+    ]
+
+    dist = gh_cgdp.distribute(
+        cg, agents, computation_memory=memory, communication_load=load
+    )
+
+    assert {dist.agent_for("v0"), dist.agent_for("v1")} == {"a1", "a3"}
+
+
+def test_same_seed_same_distribution():
+    cg = ring_graph(30)
+    agents = [AgentDef(f"a{i}", capacity=4, default_hosting_cost=1) for i in range(8)]
+
+    distributions = []
+    for _ in range(2):
+        random.seed(42)
+        dist = gh_cgdp.distribute(
+            cg, agents, computation_memory=memory, communication_load=load
+        )
+        distributions.append({a: dist.computations_hosted(a) for a in dist.agents})
+
+    assert distributions[0] == distributions[1]
+
+
+def test_raises_when_not_enough_capacity():
+    cg = ring_graph(6)
+    agents = [AgentDef(f"a{i}", capacity=2, default_hosting_cost=1) for i in range(2)]
+
+    with pytest.raises(ImpossibleDistributionException):
+        gh_cgdp.distribute(
+            cg, agents, computation_memory=memory, communication_load=load
+        )
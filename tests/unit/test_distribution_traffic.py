@@ -0,0 +1,182 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+
+import pickle
+
+import pytest
+
+from pydcop.computations_graph import constraints_hypergraph
+from pydcop.computations_graph.objects import ComputationNode
+from pydcop.dcop.dcop import DCOP
+from pydcop.dcop.objects import AgentDef, Domain, Variable
+from pydcop.dcop.relations import constraint_from_str
+from pydcop.distribution import _decomposition
+from pydcop.distribution._decomposition import distribute_by_parts
+from pydcop.distribution.objects import Distribution
+from pydcop.distribution.traffic import (
+    traffic_profile,
+    profile_communication_load,
+    save_traffic_profile,
+    load_traffic_profile,
+)
+
+
+def agt_metrics():
+    return {
+        "a1": {
+            "cycles": {"v1": 10, "v2": 10},
+            "count_link_msg": {"v1": {"v2": 10, "v3": 10}, "v2": {"v1": 10}},
+            "size_link_msg": {"v1": {"v2": 20, "v3": 40}, "v2": {"v1": 20}},
+        },
+        "a2": {
+            "cycles": {"v3": 8},
+            "count_link_msg": {"v3": {"v1": 8}},
+            "size_link_msg": {"v3": {"v1": 80}},
+        },
+    }
+
+
+def test_profile_merges_agents_metrics():
+    profile = traffic_profile(agt_metrics(), {"algo": "dsa"})
+
+    assert profile["cycles"] == 10
+    assert profile["count"] == {
+        "v1": {"v2": 10, "v3": 10}, "v2": {"v1": 10}, "v3": {"v1": 8}}
+    assert profile["size"]["v3"] == {"v1": 80}
+    assert profile["inputs"] == {"algo": "dsa"}
+
+
+def test_profile_without_link_metrics():
+    profile = traffic_profile({"a1": {"cycles": {"v1": 3}}})
+
+    assert profile == {"cycles": 3, "count": {}, "size": {}}
+
+
+def test_communication_load_per_cycle():
+    load = profile_communication_load(traffic_profile(agt_metrics()))
+
+    assert load(ComputationNode("v1"), "v3") == 4
+    assert load(ComputationNode("v3"), "v1") == 8
+    # no message on this link:
+    assert load(ComputationNode("v2"), "v3") == 0
+    # computation not in the profile
+    assert load(ComputationNode("v4"), "v1") == 0
+
+
+def test_communication_load_default_for_unknown_computations():
+    load = profile_communication_load(
+        traffic_profile(agt_metrics()), default=lambda c, t: 100
+    )
+
+    assert load(ComputationNode("v2"), "v3") == 0
+    assert load(ComputationNode("v4"), "v1") == 100
+
+
+def test_save_and_load_profile(tmpdir):
+    filename = str(tmpdir.join("profile.yaml"))
+    profile = traffic_profile(agt_metrics(), {"algo": "dsa", "dcop": ["f.yaml"]})
+
+    save_traffic_profile(filename, profile)
+
+    assert load_traffic_profile(filename) == profile
+
+
+def test_load_invalid_profile(tmpdir):
+    filename = str(tmpdir.join("profile.yaml"))
+    with open(filename, mode="w") as f:
+        f.write("distribution: {a1: [v1]}")
+
+    with pytest.raises(ValueError):
+        load_traffic_profile(filename)
+
+
+def test_communication_load_can_be_pickled():
+    load = profile_communication_load(traffic_profile(agt_metrics()))
+
+    unpickled = pickle.loads(pickle.dumps(load))
+
+    assert unpickled(ComputationNode("v1"), "v3") == 4
+    assert unpickled(ComputationNode("v4"), "v1") == 0
+
+
+def memory(computation):
+    return 1
+
+
+def chain_graph(count):
+    d = Domain("d", "", [0, 1])
+    variables = [Variable(f"v{i}", d) for i in range(count)]
+    dcop = DCOP("chain")
+    for v1, v2 in zip(variables, variables[1:]):
+        dcop.add_constraint(
+            constraint_from_str(
+                f"c_{v1.name}_{v2.name}", f"1 if {v1.name} == {v2.name} else 0",
+                [v1, v2]
+            )
+        )
+    return constraints_hypergraph.build_computation_graph(dcop)
+
+
+def loaded_links_part(computation_graph, agentsdef, communication_load=None,
+                      **kwargs):
+    # Sub-problem solved in another process: checks that the profile is
+    # available there and hosts all computations on the first agent.
+    for node in computation_graph.nodes:
+        for neighbor in node.neighbors:
+            if communication_load(node, neighbor) != 2:
+                raise ValueError(f"Invalid load for {node.name} -> {neighbor}")
+    agents = list(agentsdef)
+    return Distribution({agents[0].name: computation_graph.node_names()})
+
+
+def test_profile_used_to_distribute_by_parts(monkeypatch):
+    monkeypatch.setattr(_decomposition, "MAX_PROCESSES", 2)
+    count = _decomposition.MAX_PART_SIZE + 20
+    cg = chain_graph(count)
+    profile = {
+        "cycles": 2,
+        "size": {
+            f"v{i}": {f"v{j}": 4 for j in (i - 1, i + 1) if 0 <= j < count}
+            for i in range(count)
+        },
+    }
+    # several agents are needed to host the graph: it is split in
+    # sub-problems solved in other processes.
+    agents = [AgentDef(f"a{i}", capacity=30, default_hosting_cost=1)
+              for i in range(6)]
+
+    dist = distribute_by_parts(
+        loaded_links_part, cg, agents, computation_memory=memory,
+        communication_load=profile_communication_load(profile),
+    )
+
+    assert sorted(dist.computations) == sorted(cg.node_names())
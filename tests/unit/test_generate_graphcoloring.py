@@ -1,7 +1,12 @@
+import io
+
+import numpy as np
 import pytest
 
 from pydcop.commands.generators.graphcoloring import generate_grid_graph, \
-    generate_scalefree_graph
+    generate_scalefree_graph, grid_graph_edges, random_graph_edges, \
+    scalefree_graph_edges, is_connected, write_graph_coloring
+from pydcop.dcop.yamldcop import load_dcop
 
 
 def test_grid_graph_raises_with_invalide_size():
@@ -17,4 +22,72 @@ def test_grid_graph():
 
 def test_generate_scale_free():
     graph = generate_scalefree_graph(10, 2, False)
-    assert len(graph.nodes) == 10
\ No newline at end of file
+    assert len(graph.nodes) == 10
+
+
+def test_grid_graph_edges():
+    edges = grid_graph_edges(16)
+    assert edges.shape == (24, 2)
+    assert {tuple(sorted(e)) for e in edges.tolist()} == {
+        (r * 4 + c, n1 * 4 + n2)
+        for (r, c), (n1, n2) in (
+            sorted(e) for e in generate_grid_graph(16).edges
+        )
+    }
+
+    with pytest.raises(ValueError):
+        grid_graph_edges(5)
+
+
+def test_random_graph_edges():
+    edges = random_graph_edges(10, 1, allow_subgraph=True)
+    assert len(edges) == 45
+    assert {tuple(e) for e in edges.tolist()} == {
+        (i, j) for j in range(10) for i in range(j)
+    }
+
+    edges = random_graph_edges(1000, 0.01, allow_subgraph=True)
+    assert (edges[:, 0] < edges[:, 1]).all()
+    assert edges.max() < 1000
+    assert len({tuple(e) for e in edges.tolist()}) == len(edges)
+    assert 4000 < len(edges) < 6000
+
+
+def test_random_graph_edges_connected():
+    edges = random_graph_edges(50, 0.1, allow_subgraph=False)
+    assert is_connected(50, edges)
+
+
+def test_scalefree_graph_edges():
+    edges = scalefree_graph_edges(100, 2)
+    assert len(edges) == 196
+    assert is_connected(100, edges)
+    assert len({tuple(sorted(e)) for e in edges.tolist()}) == len(edges)
+
+
+def test_is_connected():
+    assert is_connected(3, np.array([[0, 1], [2, 1]]))
+    assert not is_connected(4, np.array([[0, 1], [2, 3]]))
+    assert not is_connected(3, np.empty((0, 2), dtype=int))
+
+
+@pytest.mark.parametrize(
+    "soft, intentional", [(False, False), (False, True), (True, False)]
+)
+def test_write_graph_coloring(soft, intentional):
+    out = io.StringIO()
+    write_graph_coloring(
+        out, "test", 9, grid_graph_edges(9), ["R", "G", "B"], soft, intentional
+    )
+
+    dcop = load_dcop(out.getvalue())
+
+    assert len(dcop.variables) == 9
+    assert len(dcop.agents) == 9
+    assert len(dcop.constraints) == 12
+    c = dcop.constraint("c0")
+    if soft:
+        assert 0 <= c(v00="R", v01="G") <= 9
+    else:
+        assert c(v00="R", v01="R") == 1000
+        assert c(v00="R", v01="G") == 0
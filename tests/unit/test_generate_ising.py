@@ -1,4 +1,7 @@
+import io
+
 import networkx as nx
+import pytest
 
 from pydcop.commands.generators.ising import (
     generate_unary_extensive_constraint,
@@ -6,7 +9,9 @@ from pydcop.commands.generators.ising import (
     generate_unary_constraints,
     generate_binary_intentional_constraint,
     generate_binary_variables,
-    generate_binary_constraints, generate_binary_extensive_constraint)
+    generate_binary_constraints, generate_binary_extensive_constraint, generate_ising,
+    ising_edges, ising_fg_mapping, write_ising)
+from pydcop.dcop.yamldcop import load_dcop
 from pydcop.dcop.objects import Variable, Domain
 from pydcop.dcop.relations import NAryMatrixRelation, Constraint, NAryFunctionRelation
 
@@ -118,3 +123,59 @@ def check_binary_constraint(constraint, bin_range):
     assert constraint(**{v1.name:1, v2.name:1}) == value
     assert constraint(**{v1.name:0, v2.name:1}) == -value
     assert constraint(**{v1.name:1, v2.name:0}) == -value
+
+
+@pytest.mark.parametrize("row_count, col_count",
+                         [(3, 4), (2, 5), (2, 2), (1, 4), (1, 1)])
+def test_ising_edges(row_count, col_count):
+    grid_graph = nx.grid_2d_graph(row_count, col_count, periodic=True)
+
+    edges = ising_edges(row_count, col_count).tolist()
+
+    assert len(edges) == len(grid_graph.edges)
+    assert {tuple(e) for e in edges} == {
+        (r1, c1, r2, c2) for (r1, c1), (r2, c2) in map(sorted, grid_graph.edges)
+    }
+
+
+def test_write_ising_2xn_has_no_duplicate_constraint():
+    out = io.StringIO()
+
+    write_ising(out, 2, 3, 1.6, 0.05, extensive=True, agents=False)
+
+    names = [line.strip()[:-1] for line in out.getvalue().splitlines()
+             if line.strip().startswith("cb_")]
+    assert len(names) == len(set(names)) == 9
+    written = load_dcop(out.getvalue())
+    assert len([c for c in written.constraints if c.startswith("cb_")]) == 9
+
+
+def test_write_ising():
+    dcop, _, fg_mapping = generate_ising(
+        3, 4, 1.6, 0.05, True, no_agents=False, fg_dist=True, var_dist=False
+    )
+    out = io.StringIO()
+
+    write_ising(out, 3, 4, 1.6, 0.05, extensive=True)
+
+    written = load_dcop(out.getvalue())
+    assert written.name == dcop.name
+    assert set(written.variables) == set(dcop.variables)
+    assert set(written.constraints) == set(dcop.constraints)
+    assert set(written.agents) == set(dcop.agents)
+    assert dict(ising_fg_mapping(3, 4)) == fg_mapping
+    constraint = written.constraint("cb_v_0_0_v_0_3")
+    assert -1.6 <= constraint(0, 0) <= 1.6
+    assert constraint(0, 0) == -constraint(1, 0)
+
+
+def test_write_ising_intentional():
+    out = io.StringIO()
+
+    write_ising(out, 3, 3, 1.6, 0.05, extensive=False, agents=False)
+
+    written = load_dcop(out.getvalue())
+    assert not written.agents
+    constraint = written.constraint("cu_v_1_2")
+    assert -0.05 <= constraint(0) <= 0.05
+    assert constraint(0) == -constraint(1)
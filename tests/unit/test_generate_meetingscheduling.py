@@ -1,9 +1,20 @@
+import io
+import itertools
+
 from pydcop.commands.generators.meetingscheduling import (
     generate_resources,
     generate_events,
     generate_problem_definition,
     peav_variables_for_resource,
+    peav_intra_table,
+    peav_intra_extensive_constraint_value,
+    peav_model,
+    resource_values_for_event,
+    resource_value_for_event,
+    write_peav_model,
 )
+from pydcop.dcop.relations import generate_assignment_as_dict
+from pydcop.dcop.yamldcop import load_dcop
 
 
 def test_generate_resources():
@@ -54,3 +65,62 @@ def test_generate_variables():
         evt for evt in events.values() if resource.id in evt.resources
     ]
     assert len(variables) == len(events_with_resource)
+
+
+def test_intra_table():
+    slots, events, resources = generate_problem_definition(
+        slots_count=6,
+        resources_count=3,
+        max_resource_value=10,
+        events_count=6,
+        max_length_event=3,
+        max_resources_event=3,
+    )
+    penalty = 100
+
+    for resource in resources.values():
+        resource_events = [
+            evt for evt in events.values() if resource.id in evt.resources
+        ]
+        for event1, event2 in itertools.combinations(resource_events, 2):
+            values1 = resource_values_for_event(resource, event1, 6)
+            values2 = resource_values_for_event(resource, event2, 6)
+            for t in range(len(values1)):
+                assert values1[t] == resource_value_for_event(resource, event1, t)
+
+            table = peav_intra_table(
+                values1,
+                event1.length,
+                values2,
+                event2.length,
+                penalty,
+                len(resource_events),
+            )
+            for t1, t2 in itertools.product(range(len(values1)), range(len(values2))):
+                assert table[t1, t2] == peav_intra_extensive_constraint_value(
+                    resource, event1, event2, penalty, len(resource_events), t1, t2
+                )
+
+
+def test_write_peav_model():
+    slots, events, resources = generate_problem_definition(
+        slots_count=5,
+        resources_count=4,
+        max_resource_value=10,
+        events_count=5,
+        max_length_event=2,
+        max_resources_event=3,
+    )
+    variables, constraints, agents = peav_model(slots, events, resources, 200)
+    out = io.StringIO()
+
+    write_peav_model(out, slots, events, resources, 200, agents_kw={"capacity": 50})
+
+    dcop = load_dcop(out.getvalue())
+    assert set(dcop.variables) == {v.name for v in variables.values()}
+    assert set(dcop.constraints) == set(constraints)
+    assert set(dcop.agents) == set(agents)
+    for name, constraint in constraints.items():
+        written = dcop.constraint(name)
+        for assignment in generate_assignment_as_dict(constraint.dimensions):
+            assert written(**assignment) == constraint(**assignment)
@@ -164,6 +164,19 @@ def test_add_computation_after_start(agent):
     assert not agent.computation(ping.name).is_running
 
 
+def test_add_computations(agents):
+    agt_dir, agt1, agt2 = agents
+
+    pings = [PingComputation('c{}'.format(i)) for i in range(3)]
+    agt1.add_computations(pings)
+    wait_run()
+
+    for ping in pings:
+        assert agt1.computation(ping.name) == ping
+        assert not ping.is_running
+        assert agt_dir.discovery.computation_agent(ping.name) == 'agt1'
+
+
 def test_run_computation(agent):
     ping = PingComputation('agt1')
     ping.on_start = MagicMock()
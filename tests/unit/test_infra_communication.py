@@ -40,7 +40,9 @@ import requests
 
 from pydcop.infrastructure.communication import Messaging, \
     InProcessCommunicationLayer, \
-    MPCHttpHandler, HttpCommunicationLayer, ComputationMessage, \
+    MPCHttpHandler, HttpCommunicationLayer, IpcCommunicationLayer, \
+    IpcEndpoint, \
+    ComputationMessage, \
     UnreachableAgent, MSG_MGT, UnknownAgent, UnknownComputation, MSG_ALGO
 from pydcop.infrastructure.computations import Message
 from pydcop.infrastructure.discovery import Discovery
@@ -188,6 +190,37 @@ class TestMessaging(object):
         assert local_messaging.count_all_ext_msg == 0
         assert local_messaging.size_all_ext_msg == 0
 
+    def test_link_metrics_disabled_by_default(self, local_messaging):
+        local_messaging.discovery.register_computation('c1', 'a1')
+        local_messaging.discovery.register_computation('c2', 'a1')
+
+        msg = MagicMock()
+        msg.size = 42
+        local_messaging.post_msg('c1', 'c2', msg)
+
+        assert local_messaging.count_link_msg is None
+        assert local_messaging.size_link_msg is None
+
+    def test_link_metrics_local_and_ext_msg(self, local_messaging):
+        local_messaging.enable_link_metrics()
+        local_messaging.discovery.register_computation('c1', 'a1')
+        local_messaging.discovery.register_computation('c2', 'a2', 'addr2')
+        local_messaging.discovery.register_computation('c3', 'a1')
+        local_messaging._comm.send_msg = MagicMock()
+
+        msg, msg2, msg3 = MagicMock(), MagicMock(), MagicMock()
+        msg.size, msg2.size, msg3.size = 42, 12, 5
+
+        local_messaging.post_msg('c1', 'c2', msg)
+        local_messaging.post_msg('c1', 'c2', msg2)
+        local_messaging.post_msg('c1', 'c3', msg3)
+        local_messaging.post_msg('c3', 'c1', msg3, msg_type=MSG_MGT)
+
+        assert local_messaging.count_link_msg == {'c1': {'c2': 2, 'c3': 1}}
+        assert local_messaging.size_link_msg == {'c1': {'c2': 54, 'c3': 5}}
+        # local messages are still not counted as external messages
+        assert local_messaging.count_all_ext_msg == 2
+
 
 class TestInProcessCommunictionLayer(object):
 
@@ -503,3 +536,162 @@ class TestHttpCommLayer(object):
         assert comm1.send_msg(
             'a1', 'a2',
             ComputationMessage('c1', 'c2', Message('a1', 't'), MSG_ALGO))
+
+
+@pytest.fixture
+def ipc_comms():
+    comm1 = IpcCommunicationLayer()
+    comm1.discovery = Discovery('a1', comm1.address)
+    Messaging('a1', comm1)
+
+    comm2 = IpcCommunicationLayer()
+    comm2.discovery = Discovery('a2', comm2.address)
+    Messaging('a2', comm2)
+    comm2.messaging.post_msg = MagicMock()
+
+    yield comm1, comm2
+    comm1.shutdown()
+    comm2.shutdown()
+
+
+class TestIpcCommLayer(object):
+
+    def test_address(self):
+        comm = IpcCommunicationLayer()
+        assert isinstance(comm.address, str)
+        comm.shutdown()
+
+    def test_one_message_between_two(self, ipc_comms):
+        comm1, comm2 = ipc_comms
+
+        comm1.discovery.register_computation('c2', 'a2', comm2.address)
+        comm2.discovery.register_computation('c1', 'a1', comm1.address)
+
+        assert comm1.send_msg(
+            'a1', 'a2',
+            ComputationMessage('c1', 'c2', Message('test', 'test'), MSG_ALGO))
+        sleep(0.2)
+
+        comm2.messaging.post_msg.assert_called_with(
+            'c1', 'c2', Message('test', 'test'), MSG_ALGO)
+
+    def test_several_messages_between_two_keep_order(self, ipc_comms):
+        comm1, comm2 = ipc_comms
+
+        comm1.discovery.register_computation('c2', 'a2', comm2.address)
+
+        for i, msg_type in enumerate([MSG_ALGO, MSG_ALGO, MSG_MGT, MSG_ALGO]):
+            comm1.send_msg(
+                'a1', 'a2',
+                ComputationMessage('c1', 'c2', Message('test', i), msg_type))
+        sleep(0.2)
+
+        comm2.messaging.post_msg.assert_has_calls([
+            call('c1', 'c2', Message('test', 0), MSG_ALGO),
+            call('c1', 'c2', Message('test', 1), MSG_ALGO),
+            call('c1', 'c2', Message('test', 2), MSG_MGT),
+            call('c1', 'c2', Message('test', 3), MSG_ALGO),
+            ])
+
+    def test_cycle_id_is_kept(self, ipc_comms):
+        # Set by synchronous computations, but not part of simple_repr
+        comm1, comm2 = ipc_comms
+        comm1.discovery.register_computation('c2', 'a2', comm2.address)
+
+        msg = Message('test', 'test')
+        msg.cycle_id = 3
+        comm1.send_msg('a1', 'a2',
+                       ComputationMessage('c1', 'c2', msg, MSG_ALGO))
+        sleep(0.2)
+
+        received = comm2.messaging.post_msg.call_args[0][2]
+        assert received.cycle_id == 3
+
+    def test_msg_to_unknown_agent_fail_mode(self, ipc_comms):
+        comm1, comm2 = ipc_comms
+        with pytest.raises(UnknownAgent):
+            comm1.send_msg(
+                'a1', 'a2',
+                ComputationMessage('c1', 'c2', Message('a1', 't1'), MSG_ALGO),
+                on_error='fail')
+
+    def test_msg_to_unreachable_agent_fail_mode(self, ipc_comms):
+        comm1, comm2 = ipc_comms
+        comm1.discovery.register_computation('c2', 'a2', comm2.address)
+        comm2.shutdown()
+
+        with pytest.raises(UnreachableAgent):
+            comm1.send_msg(
+                'a1', 'a2',
+                ComputationMessage('c1', 'c2', Message('a1', '1'), MSG_ALGO),
+                on_error='fail')
+
+    def test_msg_to_unreachable_agent_ignore_mode(self, ipc_comms):
+        comm1, comm2 = ipc_comms
+        comm1.discovery.register_computation('c2', 'a2', comm2.address)
+        comm2.shutdown()
+
+        assert comm1.send_msg(
+            'a1', 'a2',
+            ComputationMessage('c1', 'c2', Message('a1', 't'), MSG_ALGO))
+
+
+class TestIpcSharedEndpoint(object):
+
+    def test_layers_sharing_an_endpoint_have_the_same_address(self):
+        endpoint = IpcEndpoint()
+        comm1 = IpcCommunicationLayer(endpoint=endpoint)
+        comm2 = IpcCommunicationLayer(endpoint=endpoint)
+
+        assert comm1.address == comm2.address == endpoint.address
+        endpoint.unregister_layer('a1')
+
+    def test_local_delivery_between_agents_sharing_an_endpoint(self):
+        endpoint = IpcEndpoint()
+        comm1 = IpcCommunicationLayer(endpoint=endpoint)
+        comm1.discovery = Discovery('a1', comm1.address)
+        Messaging('a1', comm1)
+        comm2 = IpcCommunicationLayer(endpoint=endpoint)
+        comm2.discovery = Discovery('a2', comm2.address)
+        Messaging('a2', comm2)
+        comm2.messaging.post_msg = MagicMock()
+        comm1.discovery.register_computation('c2', 'a2', comm2.address)
+
+        msg = Message('test', 'test')
+        assert comm1.send_msg(
+            'a1', 'a2', ComputationMessage('c1', 'c2', msg, MSG_ALGO))
+
+        # Delivered synchronously and without serialization
+        comm2.messaging.post_msg.assert_called_once_with(
+            'c1', 'c2', msg, MSG_ALGO)
+        assert comm2.messaging.post_msg.call_args[0][2] is msg
+        comm1.shutdown()
+        comm2.shutdown()
+
+    def test_remote_msg_dispatched_to_agent_on_shared_endpoint(self):
+        endpoint = IpcEndpoint()
+        comm2 = IpcCommunicationLayer(endpoint=endpoint)
+        comm2.discovery = Discovery('a2', comm2.address)
+        Messaging('a2', comm2)
+        comm2.messaging.post_msg = MagicMock()
+        comm3 = IpcCommunicationLayer(endpoint=endpoint)
+        comm3.discovery = Discovery('a3', comm3.address)
+        Messaging('a3', comm3)
+        comm3.messaging.post_msg = MagicMock()
+
+        comm1 = IpcCommunicationLayer()
+        comm1.discovery = Discovery('a1', comm1.address)
+        Messaging('a1', comm1)
+        comm1.discovery.register_computation('c3', 'a3', comm3.address)
+
+        comm1.send_msg(
+            'a1', 'a3',
+            ComputationMessage('c1', 'c3', Message('test', 'test'), MSG_ALGO))
+        sleep(0.2)
+
+        comm3.messaging.post_msg.assert_called_once_with(
+            'c1', 'c3', Message('test', 'test'), MSG_ALGO)
+        comm2.messaging.post_msg.assert_not_called()
+        comm1.shutdown()
+        comm2.shutdown()
+        comm3.shutdown()
@@ -503,6 +503,53 @@ def test_unsubscribe_computation_no_cb(directory_discovery):
     assert agt2.discovery.computation_agent('c1') == agt1.name
 
 
+def test_register_computations(directory_discovery):
+    agt_dir, agt1, agt2 = directory_discovery
+
+    agt1.discovery.register_computations(['c1', 'c2', 'c3'])
+    wait_run()
+
+    for c in ['c1', 'c2', 'c3']:
+        assert agt1.discovery.computation_agent(c) == agt1.name
+        assert agt_dir.discovery.computation_agent(c) == agt1.name
+
+
+def test_subscribe_computations_already_registered(directory_discovery):
+    agt_dir, agt1, agt2 = directory_discovery
+
+    agt1.discovery.register_computations(['c1', 'c2'])
+    wait_run()
+    cb = agt2.discovery.subscribe_computations(['c1', 'c2', 'c3'],
+                                               MagicMock())
+    wait_run()
+
+    cb.assert_has_calls([call('computation_added', 'c1', agt1.name),
+                         call('computation_added', 'c2', agt1.name)],
+                        any_order=True)
+    assert cb.call_count == 2
+    assert agt2.discovery.computation_agent('c2') == agt1.name
+    with pytest.raises(UnknownComputation):
+        agt2.discovery.computation_agent('c3')
+
+
+def test_register_computations_single_notification(directory_discovery):
+    agt_dir, agt1, agt2 = directory_discovery
+
+    cb = agt2.discovery.subscribe_computations(['c1', 'c2', 'c3'],
+                                               MagicMock())
+    wait_run()
+    agt2.discovery.discovery_computation.on_message = MagicMock(
+        side_effect=agt2.discovery.discovery_computation.on_message)
+    agt1.discovery.register_computations(['c1', 'c2', 'c3', 'c4'])
+    wait_run()
+
+    # One message for the 3 computations agt2 subscribed to
+    agt2.discovery.discovery_computation.on_message.assert_called_once()
+    assert cb.call_count == 3
+    for c in ['c1', 'c2', 'c3']:
+        assert agt2.discovery.computation_agent(c) == agt1.name
+
+
 def test_register_replica_for_unknown_replication_should_raise(
         directory_discovery):
     agt_dir, agt1, agt2 = directory_discovery
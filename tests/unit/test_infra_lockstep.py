@@ -0,0 +1,233 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+
+from collections import defaultdict
+from time import sleep
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from pydcop.infrastructure.agents import Agent
+from pydcop.infrastructure.communication import InProcessCommunicationLayer
+from pydcop.infrastructure.computations import MessagePassingComputation, \
+    SynchronousComputationMixin, SynchronizationMsg, message_type, register
+from pydcop.infrastructure.discovery import Directory
+from pydcop.infrastructure.lockstep import LockstepExecutor
+
+FooMsg = message_type("FooMsg", ["data"])
+
+
+class CountC(SynchronousComputationMixin, MessagePassingComputation):
+    """
+    Sends its cycle to all its neighbors at each cycle and stops after
+    `nb_cycles` cycles.
+    """
+
+    def __init__(self, name, neighbors, nb_cycles=3):
+        super().__init__(name)
+        self._neighbors = neighbors
+        self.nb_cycles = nb_cycles
+        self.received = []
+
+    @property
+    def neighbors(self):
+        return self._neighbors
+
+    @register("FooMsg")
+    def on_foo(self, sender, msg, t):
+        pass
+
+    def on_start(self):
+        for n in self.neighbors:
+            self.post_msg(n, FooMsg(0))
+
+    def on_new_cycle(self, messages, cycle_id):
+        self.received.append(
+            (cycle_id, {s: m.data for s, (m, _) in messages.items()}))
+        if cycle_id + 1 == self.nb_cycles:
+            self.stop()
+            return []
+        return [(n, FooMsg(cycle_id + 1)) for n in self.neighbors]
+
+
+def fake_messaging():
+    return SimpleNamespace(count_ext_msg=defaultdict(int),
+                           size_ext_msg=defaultdict(int),
+                           count_link_msg=None,
+                           post_msg=MagicMock())
+
+
+def wait_stopped(*computations):
+    for _ in range(50):
+        if not any(c.is_running for c in computations):
+            return
+        sleep(0.05)
+
+
+def test_only_synchronous_local_computations_are_accepted():
+    executor = LockstepExecutor(["c1", "c2"])
+
+    assert executor.accepts(CountC("c1", ["c2"]))
+    assert not executor.accepts(CountC("c3", ["c2"]))
+    assert not executor.accepts(MessagePassingComputation("c2"))
+
+
+def test_local_computations_run_in_lockstep():
+    executor = LockstepExecutor(["c1", "c2"])
+    m1, m2 = fake_messaging(), fake_messaging()
+    c1, c2 = CountC("c1", ["c2"]), CountC("c2", ["c1"])
+    c1.message_sender = executor.add(c1, "a1", m1)
+    c2.message_sender = executor.add(c2, "a2", m2)
+
+    c1.start()
+    sleep(0.1)
+    # Rounds only start once all computations of the process have started
+    assert c1.received == []
+
+    c2.start()
+    wait_stopped(c1, c2)
+
+    assert c1.received == [(0, {"c2": 0}), (1, {"c2": 1}), (2, {"c2": 2})]
+    assert c2.received == [(0, {"c1": 0}), (1, {"c1": 1}), (2, {"c1": 2})]
+    assert c1.current_cycle == 3
+    # No message, and in particular no synchronization message, goes
+    # through the agents' messaging.
+    m1.post_msg.assert_not_called()
+    m2.post_msg.assert_not_called()
+    # Messages between computations hosted on different agents are
+    # still counted.
+    assert m1.count_ext_msg["c1"] == 3
+
+
+def test_messages_on_the_same_agent_are_not_counted():
+    executor = LockstepExecutor(["c1", "c2"])
+    m1 = fake_messaging()
+    c1, c2 = CountC("c1", ["c2"]), CountC("c2", ["c1"])
+    c1.message_sender = executor.add(c1, "a1", m1)
+    c2.message_sender = executor.add(c2, "a1", m1)
+
+    c1.start()
+    c2.start()
+    wait_stopped(c1, c2)
+
+    assert c1.received[-1] == (2, {"c2": 2})
+    assert m1.count_ext_msg["c1"] == 0
+
+
+def test_neighbors_of_a_stopped_computation_stop_running():
+    executor = LockstepExecutor(["c1", "c2", "c3"])
+    m1 = fake_messaging()
+    c1 = CountC("c1", ["c2"], nb_cycles=1)
+    c2 = CountC("c2", ["c1", "c3"], nb_cycles=10)
+    c3 = CountC("c3", ["c2"], nb_cycles=10)
+    for c in [c1, c2, c3]:
+        c.message_sender = executor.add(c, "a1", m1)
+        c.start()
+    sleep(0.3)
+
+    # c2 never gets c1's message for cycle 1, and c3 then never gets c2's
+    # message for cycle 2.
+    assert [cycle for cycle, _ in c1.received] == [0]
+    assert [cycle for cycle, _ in c2.received] == [0, 1]
+    assert [cycle for cycle, _ in c3.received] == [0, 1, 2]
+
+
+def test_cross_process_links_are_synchronized_with_messages():
+    # c2 is hosted in another process
+    executor = LockstepExecutor(["c1"])
+    m1 = fake_messaging()
+    c1 = CountC("c1", ["c2"], nb_cycles=2)
+    c1.on_new_cycle = MagicMock(side_effect=[[], []])
+    c1.message_sender = executor.add(c1, "a1", m1)
+
+    c1.start()
+    msg = m1.post_msg.call_args[0][2]
+    assert msg.data == 0 and msg.cycle_id == 0
+
+    # The cycle only runs once the messages from other processes for
+    # this cycle have been received.
+    sleep(0.1)
+    c1.on_new_cycle.assert_not_called()
+    remote_msg = FooMsg(5)
+    remote_msg.cycle_id = 0
+    c1.on_message("c2", remote_msg, 1)
+    sleep(0.2)
+    c1.on_new_cycle.assert_called_once_with({"c2": (remote_msg, 1)}, 0)
+
+    # c1 did not send any message to c2 during that cycle
+    msg = m1.post_msg.call_args[0][2]
+    assert isinstance(msg, SynchronizationMsg) and msg.cycle_id == 1
+
+    sync_msg = SynchronizationMsg()
+    sync_msg.cycle_id = 1
+    c1.on_message("c2", sync_msg, 2)
+    sleep(0.2)
+    c1.on_new_cycle.assert_called_with({}, 1)
+    c1.stop()
+
+
+@pytest.fixture
+def directory_agent():
+    agt_dir = Agent('agt_dir', InProcessCommunicationLayer())
+    directory = Directory(agt_dir.discovery)
+    agt_dir.add_computation(directory.directory_computation)
+    agt_dir.discovery.use_directory('agt_dir', agt_dir.address)
+    agt_dir.start()
+    agt_dir.run(directory.directory_computation.name)
+    yield agt_dir
+    agt_dir.stop()
+
+
+def test_agents_sharing_an_executor(directory_agent):
+    executor = LockstepExecutor(["c1", "c2"])
+    agents = []
+    for name in ["a1", "a2"]:
+        agt = Agent(name, InProcessCommunicationLayer(), lockstep=executor)
+        agt.discovery.use_directory('agt_dir', directory_agent.address)
+        agt.start()
+        agents.append(agt)
+    c1, c2 = CountC("c1", ["c2"]), CountC("c2", ["c1"])
+    agents[0].add_computation(c1)
+    agents[1].add_computation(c2)
+    agents[0].run()
+    agents[1].run()
+    wait_stopped(c1, c2)
+
+    assert c1.received == [(0, {"c2": 0}), (1, {"c2": 1}), (2, {"c2": 2})]
+    assert c2.received == [(0, {"c1": 0}), (1, {"c1": 1}), (2, {"c1": 2})]
+    metrics = agents[0].metrics()
+    assert metrics["cycles"] == {"c1": 3}
+    assert metrics["count_ext_msg"]["c1"] == 3
+
+    for agt in agents:
+        agt.stop()
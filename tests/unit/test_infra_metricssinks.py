@@ -0,0 +1,117 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import csv
+from queue import Queue
+
+from pydcop.infrastructure.metricssinks import CsvMetricsSink, \
+    NpzMetricsSink, MetricsCollector, load_npz_metrics, metrics_sink
+
+COLUMNS = ['time', 'cost', 'status']
+
+
+def metrics(i):
+    return {'time': i, 'cost': 10 - i, 'status': 'RUNNING',
+            'assignment': {}}
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_csv_sink_flushes_by_size(tmpdir):
+    path = str(tmpdir.join('run.csv'))
+    sink = CsvMetricsSink(path, COLUMNS, flush_rows=3, flush_period=1000)
+
+    sink.write(metrics(0))
+    sink.write(metrics(1))
+    assert read_csv(path) == [COLUMNS]
+
+    sink.write(metrics(2))
+    assert len(read_csv(path)) == 4
+
+    sink.write(metrics(3))
+    sink.close()
+    assert read_csv(path)[-1] == ['3', '7', 'RUNNING']
+
+
+def test_csv_sink_flushes_by_time(tmpdir):
+    path = str(tmpdir.join('run.csv'))
+    sink = CsvMetricsSink(path, COLUMNS, flush_rows=1000, flush_period=0)
+
+    sink.write(metrics(0))
+    assert len(read_csv(path)) == 2
+    sink.close()
+
+
+def test_npz_sink_chunks(tmpdir):
+    path = str(tmpdir.join('run.npz'))
+    sink = NpzMetricsSink(path, COLUMNS, chunk_rows=4)
+    for i in range(10):
+        sink.write(metrics(i))
+    sink.write({'time': 10, 'cost': None, 'status': 'FINISHED'})
+    sink.close()
+
+    assert tmpdir.join('run.0.npz').check()
+    assert tmpdir.join('run.2.npz').check()
+    assert not tmpdir.join('run.3.npz').check()
+
+    loaded = load_npz_metrics(path)
+    assert list(loaded['time']) == list(range(11))
+    assert list(loaded['cost'][:10]) == list(range(10, 0, -1))
+    assert loaded['cost'][10] != loaded['cost'][10]  # nan
+    assert loaded['status'][-1] == 'FINISHED'
+
+
+def test_metrics_sink_from_extension(tmpdir):
+    csv_sink = metrics_sink(str(tmpdir.join('run.csv')), COLUMNS)
+    npz_sink = metrics_sink(str(tmpdir.join('run.npz')), COLUMNS)
+    assert isinstance(csv_sink, CsvMetricsSink)
+    assert isinstance(npz_sink, NpzMetricsSink)
+    csv_sink.close()
+    npz_sink.close()
+
+
+def test_collector_writes_all_metrics_on_stop(tmpdir):
+    path = str(tmpdir.join('run.csv'))
+    queue = Queue()
+    sink = CsvMetricsSink(path, COLUMNS, flush_period=1000)
+    collector = MetricsCollector(queue, [sink])
+    collector.start()
+
+    for i in range(5):
+        queue.put((i, metrics(i)))
+    collector.stop({'time': 5, 'cost': 0, 'status': 'FINISHED'})
+
+    rows = read_csv(path)
+    assert len(rows) == 7
+    assert rows[-1] == ['5', '0', 'FINISHED']
+    assert not collector.is_alive()
@@ -0,0 +1,106 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import pytest
+
+from pydcop.infrastructure.metricsstore import MetricsStore, MetricsSummary
+
+
+def summary(i):
+    return MetricsSummary(i, i, 0, 0, 0, 0)
+
+
+def test_set_value():
+    store = MetricsStore(['v1', 'v2'])
+    store.set_value('v1', 'R', 2)
+
+    assert store.value('v1') == ('R', 2)
+    assert store.assignment() == {'v1': 'R'}
+    with pytest.raises(KeyError):
+        store.value('v2')
+
+
+def test_set_value_for_unknown_computation():
+    store = MetricsStore(['v1'])
+    store.set_value('r1', 1, 0)
+
+    assert store.assignment() == {'r1': 1}
+
+
+def test_cycle_values_only_applied_at_end_of_cycle():
+    store = MetricsStore(['v1', 'v2'])
+    store.set_cycle_value(0, 'v1', 'R', 0)
+    store.set_cycle_value(0, 'v2', 'R', 0)
+    store.set_cycle_value(1, 'v1', 'G', 0)
+    store.set_cycle_value(2, 'v2', 'B', 0)
+    assert store.assignment() == {}
+
+    assert store.end_cycle(1) == [('v1', 'R'), ('v2', 'R'), ('v1', 'G')]
+    assert store.assignment() == {'v1': 'G', 'v2': 'R'}
+
+    assert store.end_cycle(2) == [('v2', 'B')]
+    assert store.assignment() == {'v1': 'G', 'v2': 'B'}
+    assert store.end_cycle(3) == []
+
+
+def test_changes_since_last_call():
+    store = MetricsStore(['v1', 'v2', 'v3'])
+    store.set_value('v1', 'R', 0)
+    store.set_value('v2', 'R', 0)
+    store.set_value('v1', 'G', 0)
+
+    assert store.changes() == {'v1': 'G', 'v2': 'R'}
+    assert store.changes() == {}
+
+    store.set_cycle_value(1, 'v3', 'B', 0)
+    assert store.changes() == {}
+    store.end_cycle(1)
+    assert store.changes() == {'v3': 'B'}
+
+
+def test_recent_summaries_are_bounded():
+    store = MetricsStore([], ring_size=3)
+    for i in range(10):
+        store.add_summary(summary(i))
+
+    assert [s.cycle for s in store.recent()] == [7, 8, 9]
+
+
+def test_history_is_downsampled():
+    store = MetricsStore([], history_size=10)
+    for i in range(1000):
+        store.add_summary(summary(i))
+
+    history = [s.cycle for s in store.history()]
+    assert len(history) <= 10
+    assert history[0] == 0
+    # summaries are evenly spaced over the whole run
+    assert history == list(range(0, 1000, history[1]))
+    assert history[-1] > 1000 - history[1]
@@ -38,11 +38,14 @@ from pydcop.algorithms import AlgorithmDef, ComputationDef
 from pydcop.computations_graph.constraints_hypergraph import \
     VariableComputationNode
 from pydcop.dcop.objects import AgentDef, Variable
+from pydcop.dcop.relations import constraint_from_str
 from pydcop.infrastructure.communication import InProcessCommunicationLayer
 from pydcop.infrastructure.computations import MessagePassingComputation
 from pydcop.infrastructure.orchestrator import DeployMessage, RunAgentMessage, \
-    PauseMessage, StopAgentMessage
+    PauseMessage, StopAgentMessage, MetricsDigestMessage, \
+    ComputationFinishedMessage, DeployComputationsMessage
 from pydcop.infrastructure.orchestratedagents import OrchestratedAgent
+from pydcop.utils.simple_repr import simple_repr, from_repr
 
 
 ################################################################################
@@ -60,6 +63,17 @@ def orchestrated_agent():
     agt.stop()
 
 
+@pytest.fixture
+def digest_agent():
+    a1_def = AgentDef('a1')
+    agt = OrchestratedAgent(a1_def, InProcessCommunicationLayer(),
+                            MagicMock(), digest_period=10)
+    # Catch messages sent to the orchestrator
+    agt._mgt_computation.send_to_orchestrator = MagicMock()
+    yield agt
+    agt.stop()
+
+
 ################################################################################
 # Tests cases
 
@@ -96,6 +110,49 @@ def test_deploy_computation_request(orchestrated_agent):
     assert not computation.is_running
 
 
+def test_deploy_computations_batch_request(orchestrated_agent):
+    orchestrated_agent.start()
+    orchestrated_agent.add_computations = MagicMock()
+
+    mgt = orchestrated_agent._mgt_computation
+    v1 = Variable('v1', [1, 2, 3])
+    v2 = Variable('v2', [1, 2, 3])
+    algo = AlgorithmDef.build_with_default_param('dsa')
+    comp_defs = [ComputationDef(VariableComputationNode(v1, []), algo),
+                 ComputationDef(VariableComputationNode(v2, []), algo)]
+    mgt.on_message('orchestrator', DeployComputationsMessage(comp_defs), 0)
+
+    # All computations are deployed at once, but not started, on the agent
+    orchestrated_agent.add_computations.assert_called_once()
+    _, args, _ = orchestrated_agent.add_computations.mock_calls[0]
+    computations = args[0]
+    assert [c.name for c in computations] == ['v1', 'v2']
+    assert all(not c.is_running for c in computations)
+
+
+def test_deploy_computations_message_dedup_constraints():
+    v1 = Variable('v1', [1, 2, 3])
+    v2 = Variable('v2', [1, 2, 3])
+    v3 = Variable('v3', [1, 2, 3])
+    c1 = constraint_from_str('c1', 'v1 + v2', [v1, v2, v3])
+    c2 = constraint_from_str('c2', 'v2 * v3', [v1, v2, v3])
+    algo = AlgorithmDef.build_with_default_param('dsa')
+    comp_defs = [
+        ComputationDef(VariableComputationNode(v1, [c1]), algo),
+        ComputationDef(VariableComputationNode(v2, [c1, c2]), algo),
+        ComputationDef(VariableComputationNode(v3, [c2]), algo)]
+    msg = DeployComputationsMessage(comp_defs)
+
+    r = simple_repr(msg)
+    # Each constraint is only serialized once
+    assert len(r['constraints']) == 2
+
+    obtained = from_repr(r)
+    assert obtained == msg
+    assert [c.node.constraints for c in obtained.comp_defs] == \
+           [[c1], [c1, c2], [c2]]
+
+
 def test_run_computations(orchestrated_agent):
 
     orchestrated_agent.start()
@@ -132,3 +189,59 @@ def test_stop_agent(orchestrated_agent):
 
     sleep(0.1)
     assert not orchestrated_agent.is_running
+
+
+def test_digest_coalesces_value_changes(digest_agent):
+    mgt = digest_agent._mgt_computation
+    send = mgt.send_to_orchestrator
+
+    mgt.on_computation_value_changed('c1', 1, 0, 1)
+    mgt.on_computation_value_changed('c1', 2, 0, 2)
+    mgt.on_computation_value_changed('c2', 3, 1, 2)
+    send.assert_not_called()
+
+    mgt.send_digest()
+    send.assert_called_once()
+    msg = send.call_args[0][0]
+    assert isinstance(msg, MetricsDigestMessage)
+    assert msg.agent == 'a1'
+    # Only the last value of each computation is reported
+    assert sorted(msg.values) == [('c1', 2, 0, 2), ('c2', 3, 1, 2)]
+
+    # Nothing has changed since the last digest: nothing is sent
+    send.reset_mock()
+    mgt.send_digest()
+    send.assert_not_called()
+
+
+def test_digest_only_contains_changed_metrics(digest_agent):
+    mgt = digest_agent._mgt_computation
+    send = mgt.send_to_orchestrator
+    metrics = {'count_ext_msg': {'c1': 2, 'c2': 3},
+               'size_ext_msg': {'c1': 20, 'c2': 30},
+               'activity_ratio': 0.5}
+    digest_agent.metrics = MagicMock(return_value=metrics)
+
+    mgt.send_metrics()
+    assert send.call_args[0][0].metrics == metrics
+
+    digest_agent.metrics.return_value = \
+        {'count_ext_msg': {'c1': 2, 'c2': 4},
+         'size_ext_msg': {'c1': 20, 'c2': 40},
+         'activity_ratio': 0.5}
+    mgt.send_metrics()
+    assert send.call_args[0][0].metrics == \
+        {'count_ext_msg': {'c2': 4}, 'size_ext_msg': {'c2': 40}}
+
+
+def test_digest_flushed_before_computation_finished(digest_agent):
+    mgt = digest_agent._mgt_computation
+    send = mgt.send_to_orchestrator
+
+    mgt.on_computation_value_changed('c1', 1, 0, 1)
+    mgt.on_computation_finished('c1')
+
+    sent = [c[0][0] for c in send.call_args_list]
+    assert isinstance(sent[0], MetricsDigestMessage)
+    assert sent[0].values == [('c1', 1, 0, 1)]
+    assert isinstance(sent[1], ComputationFinishedMessage)
@@ -0,0 +1,143 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from queue import Queue
+from unittest.mock import MagicMock
+
+import pytest
+
+from pydcop.algorithms import AlgorithmDef
+from pydcop.computations_graph import constraints_hypergraph
+from pydcop.dcop.dcop import DCOP
+from pydcop.dcop.objects import Domain, Variable
+from pydcop.dcop.relations import constraint_from_str
+from pydcop.distribution.objects import Distribution
+from pydcop.infrastructure.orchestrator import AgentsMgt, \
+    MetricsDigestMessage, MetricsMessage, ValueChangeMessage
+
+
+################################################################################
+#  Tests Fixtures
+
+def agents_mgt(collector, collect_moment='period'):
+    d = Domain('d', '', [0, 1, 2])
+    v1, v2 = Variable('v1', d), Variable('v2', d)
+    dcop = DCOP('test')
+    dcop.add_constraint(constraint_from_str('c1', 'v1 + v2', [v1, v2]))
+    cg = constraints_hypergraph.build_computation_graph(dcop)
+    dist = Distribution({'a1': ['v1'], 'a2': ['v2']})
+    return AgentsMgt(AlgorithmDef.build_with_default_param('dsa'), cg, dist,
+                     dcop, MagicMock(), MagicMock(), collector=collector,
+                     collect_moment=collect_moment, collect_period=1)
+
+
+def collected(collector):
+    rows = []
+    while not collector.empty():
+        rows.append(collector.get())
+    return rows
+
+
+# Value changes of each agent, during each metrics period
+CHANGES = {'a1': [[('v1', 1), ('v1', 2)], [], [('v1', 0)]],
+           'a2': [[('v2', 1)], [('v2', 2), ('v2', 0)], []]}
+
+
+################################################################################
+# Tests cases
+
+@pytest.mark.parametrize("digests_per_period", [1, 2, 10])
+def test_period_mode_digests_do_not_change_metrics_count(digests_per_period):
+    # Without digests: value changes and periodic metrics messages
+    collector = Queue()
+    mgt = agents_mgt(collector)
+    t = 0
+    for period in range(3):
+        for agt, changes in CHANGES.items():
+            for i, (var, value) in enumerate(changes[period]):
+                mgt._on_value_change_msg(
+                    agt, ValueChangeMessage(agt, var, value, 0, i, {}), t)
+            t += 1
+            mgt._on_metrics_msg(agt, MetricsMessage(agt, {}), t)
+    expected = collected(collector)
+    assert len(expected) == 6
+
+    # With digests: the number of digests sent during each period, which
+    # depends on the digest period, must not change the metrics emitted.
+    collector = Queue()
+    mgt = agents_mgt(collector)
+    t = 0
+    for period in range(3):
+        for agt, changes in CHANGES.items():
+            for _ in range(digests_per_period):
+                values = [(var, value, 0, i)
+                          for i, (var, value) in enumerate(changes[period])]
+                mgt._on_metrics_digest_msg(
+                    agt, MetricsDigestMessage(agt, values, [], {}, False), t)
+            t += 1
+            mgt._on_metrics_digest_msg(
+                agt, MetricsDigestMessage(agt, [], [], {}, True), t)
+    rows = collected(collector)
+
+    assert len(rows) == len(expected)
+    assert [(t, m['assignment_changes']) for t, m in rows] == \
+        [(t, m['assignment_changes']) for t, m in expected]
+
+
+def test_value_change_mode_digests_emit_metrics():
+    collector = Queue()
+    mgt = agents_mgt(collector, 'value_change')
+
+    mgt._on_metrics_digest_msg(
+        'a1', MetricsDigestMessage('a1', [('v1', 1, 0, 1)], [], {}, False), 1)
+    mgt._on_metrics_digest_msg(
+        'a1', MetricsDigestMessage('a1', [], [], {}, True), 2)
+
+    rows = collected(collector)
+    assert len(rows) == 1
+    assert rows[0][1]['assignment_changes'] == {'v1': 1}
+
+
+def test_running_metrics_only_contain_changed_values():
+    collector = Queue()
+    mgt = agents_mgt(collector, 'value_change')
+
+    assignment = {}
+    for i, (agt, var, value) in enumerate([('a1', 'v1', 1), ('a2', 'v2', 2),
+                                           ('a1', 'v1', 0)]):
+        mgt._on_value_change_msg(
+            agt, ValueChangeMessage(agt, var, value, 0, i, {}), i)
+        _, metrics = collector.get()
+        assert 'assignment' not in metrics
+        assert metrics['assignment_changes'] == {var: value}
+        assignment.update(metrics['assignment_changes'])
+
+    assert assignment == mgt.global_metrics('END', 3)['assignment']
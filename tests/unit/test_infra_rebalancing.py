@@ -0,0 +1,129 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import pytest
+
+from pydcop.computations_graph import constraints_hypergraph
+from pydcop.dcop.dcop import DCOP
+from pydcop.dcop.objects import Domain, create_variables, AgentDef
+from pydcop.infrastructure.rebalancing import LoadRebalancer
+
+
+@pytest.fixture
+def ring_graph():
+    dcop = DCOP('ring')
+    d = Domain('color', '', ['R', 'G', 'B'])
+    variables = create_variables('v', [str(i) for i in range(6)], d)
+    for i in range(6):
+        v1, v2 = 'v{}'.format(i), 'v{}'.format((i + 1) % 6)
+        dcop += 'c{}'.format(i), '10 if {} == {} else 0'.format(v1, v2), \
+            variables
+    return constraints_hypergraph.build_computation_graph(dcop)
+
+
+def agents(*names, capacity=None):
+    return [AgentDef(n, capacity=capacity) for n in names]
+
+
+def test_loads_since_previous_call(ring_graph):
+    rebalancer = LoadRebalancer(ring_graph, agents('a1', 'a2'))
+
+    assert rebalancer.loads({'a1': 1, 'a2': 1}, 10) == {}
+    loads = rebalancer.loads({'a1': 6, 'a2': 2, 'a3': 1}, 20)
+    assert loads == {'a1': pytest.approx(0.5), 'a2': pytest.approx(0.1)}
+
+
+def test_no_migration_on_first_call(ring_graph):
+    rebalancer = LoadRebalancer(ring_graph, agents('a1', 'a2'))
+    hosted = {'a1': ['v0', 'v1', 'v2', 'v3', 'v4'], 'a2': ['v5']}
+
+    assert rebalancer.plan(hosted, {'a1': 10, 'a2': 0}, {}, 10) == []
+
+
+def test_no_migration_when_balanced(ring_graph):
+    rebalancer = LoadRebalancer(ring_graph, agents('a1', 'a2'))
+    hosted = {'a1': ['v0', 'v1', 'v2'], 'a2': ['v3', 'v4', 'v5']}
+    rebalancer.plan(hosted, {'a1': 0, 'a2': 0}, {}, 0)
+
+    assert rebalancer.plan(hosted, {'a1': 5, 'a2': 4}, {}, 10) == []
+
+
+def test_no_migration_for_low_loads(ring_graph):
+    rebalancer = LoadRebalancer(ring_graph, agents('a1', 'a2'))
+    hosted = {'a1': ['v0', 'v1', 'v2', 'v3', 'v4'], 'a2': ['v5']}
+    rebalancer.plan(hosted, {'a1': 0, 'a2': 0}, {}, 0)
+
+    assert rebalancer.plan(hosted, {'a1': 1, 'a2': 0}, {}, 10) == []
+
+
+def test_migrate_to_least_loaded_neighbor(ring_graph):
+    rebalancer = LoadRebalancer(ring_graph, agents('a1', 'a2', 'a3'))
+    hosted = {'a1': ['v0', 'v1', 'v2', 'v3'], 'a2': ['v4'], 'a3': ['v5']}
+    rebalancer.plan(hosted, {'a1': 0, 'a2': 0, 'a3': 0}, {}, 0)
+
+    moves = rebalancer.plan(hosted, {'a1': 8, 'a2': 2, 'a3': 1}, {}, 10)
+
+    # v0 is the computation of a1 with a neighbor on a3
+    assert moves == [('v0', 'a1', 'a3')]
+
+
+def test_migration_respects_capacity(ring_graph):
+    rebalancer = LoadRebalancer(ring_graph, agents('a1', 'a2', capacity=2),
+                                computation_memory=lambda _: 1)
+    full = {'a1': ['v0', 'v1', 'v2', 'v3'], 'a2': ['v4', 'v5']}
+    rebalancer.plan(full, {'a1': 0, 'a2': 0}, {}, 0)
+    assert rebalancer.plan(full, {'a1': 8, 'a2': 1}, {}, 10) == []
+
+    hosted = {'a1': ['v0', 'v1', 'v2', 'v3', 'v4'], 'a2': ['v5']}
+    assert rebalancer.plan(hosted, {'a1': 16, 'a2': 2}, {}, 20) == \
+        [('v0', 'a1', 'a2')]
+
+
+def test_queue_size_triggers_migration(ring_graph):
+    rebalancer = LoadRebalancer(ring_graph, agents('a1', 'a2'),
+                                max_queue_size=10)
+    hosted = {'a1': ['v0', 'v1', 'v2', 'v3'], 'a2': ['v4', 'v5']}
+    rebalancer.plan(hosted, {'a1': 0, 'a2': 0}, {}, 0)
+
+    # a1 is busier than a2, but not enough to be overloaded ...
+    assert rebalancer.plan(hosted, {'a1': 6, 'a2': 3}, {'a1': 5}, 10) == []
+    # ... unless messages are waiting in its queue
+    assert rebalancer.plan(hosted, {'a1': 12, 'a2': 6}, {'a1': 50}, 20) == \
+        [('v0', 'a1', 'a2')]
+
+
+def test_reset(ring_graph):
+    rebalancer = LoadRebalancer(ring_graph, agents('a1', 'a2'))
+    hosted = {'a1': ['v0', 'v1', 'v2', 'v3', 'v4'], 'a2': ['v5']}
+    rebalancer.plan(hosted, {'a1': 0, 'a2': 0}, {}, 0)
+    rebalancer.reset()
+
+    assert rebalancer.plan(hosted, {'a1': 10, 'a2': 0}, {}, 10) == []
@@ -0,0 +1,147 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from time import sleep
+from unittest.mock import MagicMock
+
+import pytest
+
+from pydcop.infrastructure.agents import Agent
+from pydcop.infrastructure.communication import InProcessCommunicationLayer
+from pydcop.infrastructure.computations import MessagePassingComputation, \
+    message_type
+from pydcop.infrastructure.runtime import CooperativeRuntime
+
+
+@pytest.fixture
+def runtime():
+    rt = CooperativeRuntime(2)
+    yield rt
+    rt.stop()
+
+
+PingMessage = message_type('ping', ['count'])
+
+
+class PingComputation(MessagePassingComputation):
+
+    def __init__(self, name: str, target: str=None, max_count: int=10):
+        super().__init__(name)
+        self.target = target
+        self.max_count = max_count
+        self.ping_count = 0
+        self._msg_handlers = {
+            'ping': self._on_ping
+        }
+
+    def on_start(self):
+        if self.target is not None:
+            self.post_msg(self.target, PingMessage(1))
+
+    def _on_ping(self, sender, msg, t):
+        self.ping_count = msg.count
+        if msg.count < self.max_count:
+            self.post_msg(sender, PingMessage(msg.count + 1))
+
+
+def test_start_agent_on_runtime(runtime):
+    agent = Agent('agt1', InProcessCommunicationLayer())
+    agent.start(runtime)
+    sleep(0.1)
+
+    assert agent.is_running
+    assert runtime.agents_count == 1
+    # The discovery computation is deployed when starting the agent
+    assert set(c.name for c in agent.computations(include_technical=True)) \
+        == {'_discovery_agt1'}
+
+    agent.stop()
+    agent.join()
+    assert not agent.is_running
+    assert runtime.agents_count == 0
+
+
+def test_ping_pong_between_agents_on_runtime(runtime):
+    agt1 = Agent('agt1', InProcessCommunicationLayer())
+    agt2 = Agent('agt2', InProcessCommunicationLayer())
+    agt1.discovery.register_agent('agt2', agt2.address)
+    agt2.discovery.register_agent('agt1', agt1.address)
+
+    ping1 = PingComputation('ping1', target='ping2')
+    ping2 = PingComputation('ping2')
+    agt1.add_computation(ping1)
+    agt2.add_computation(ping2)
+    agt1.discovery.register_computation('ping2', 'agt2', publish=False)
+    agt2.discovery.register_computation('ping1', 'agt1', publish=False)
+
+    agt1.start(runtime)
+    agt2.start(runtime)
+    agt2.run()
+    agt1.run()
+    sleep(0.3)
+
+    assert ping1.ping_count == 10
+    assert ping2.ping_count == 9
+
+    agt1.stop()
+    agt2.stop()
+    agt1.join()
+    agt2.join()
+
+
+def test_periodic_action_on_runtime(runtime):
+    mock = MagicMock()
+    agent = Agent('agt1', InProcessCommunicationLayer())
+
+    agent.set_periodic_action(0.1, lambda: mock())
+    agent.start(runtime)
+    sleep(0.25)
+    agent.stop()
+    agent.join()
+
+    # Depending on the start instant, the cb might be called 2 or 3 times:
+    assert 2 <= len(mock.mock_calls) <= 3
+
+
+def test_many_agents_on_few_workers(runtime):
+    agents = [Agent('a{}'.format(i), InProcessCommunicationLayer())
+              for i in range(50)]
+    for a in agents:
+        a.start(runtime)
+    sleep(0.1)
+    assert runtime.agents_count == 50
+    assert all(a.is_running for a in agents)
+
+    for a in agents:
+        a.stop()
+    for a in agents:
+        a.join()
+    assert runtime.agents_count == 0
@@ -0,0 +1,245 @@
+# BSD-3-Clause License
+#
+# Copyright 2017 Orange
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from queue import Queue
+
+import pytest
+
+from pydcop.algorithms import AlgorithmDef, load_algorithm_module
+from pydcop.computations_graph import constraints_hypergraph, factor_graph
+from pydcop.dcop.dcop import DCOP
+from pydcop.dcop.objects import Domain, create_variables, create_agents
+from pydcop.distribution import oneagent
+from pydcop.distribution.objects import Distribution
+from pydcop.infrastructure.simulation import SimulationEngine
+
+
+def ring_coloring(size=8):
+    dcop = DCOP('ring')
+    d = Domain('color', '', ['R', 'G', 'B'])
+    names = [str(i) for i in range(size)]
+    variables = create_variables('v', names, d)
+    for i in range(size):
+        v1, v2 = 'v{}'.format(i), 'v{}'.format((i + 1) % size)
+        dcop += 'c{}'.format(i), '10 if {} == {} else 0'.format(v1, v2), \
+            variables
+    for agt in create_agents('a', names).values():
+        dcop.add_agents(agt)
+    return dcop
+
+
+def build_engine(algo_name, params=None, dcop=None, dist=None, **kwargs):
+    dcop = ring_coloring() if dcop is None else dcop
+    cg = constraints_hypergraph.build_computation_graph(dcop)
+    if dist is None:
+        dist = oneagent.distribute(cg, dcop.agents.values())
+    algo_module = load_algorithm_module(algo_name)
+    algo = AlgorithmDef.build_with_default_param(
+        algo_name, params if params else {},
+        parameters_definitions=algo_module.algo_params)
+    engine = SimulationEngine(algo, cg, dist, dcop, **kwargs)
+    engine.deploy_computations()
+    return engine
+
+
+def test_deploy_builds_all_computations():
+    engine = build_engine('dsa', {'stop_cycle': 10})
+
+    assert set(engine.computations) == {'v{}'.format(i) for i in range(8)}
+
+
+@pytest.mark.parametrize("algo", ['dsa', 'mgm'])
+def test_stop_cycle_finishes_simulation(algo):
+    engine = build_engine(algo, {'stop_cycle': 20}, seed=1)
+    engine.run()
+    metrics = engine.end_metrics()
+
+    assert engine.status == 'FINISHED'
+    assert metrics['cycle'] == 20
+    assert metrics['cost'] is not None
+    assert set(metrics['assignment']) == {'v{}'.format(i) for i in range(8)}
+
+
+def test_cycle_is_the_maximum_over_agents():
+    engine = build_engine('dsa', {'stop_cycle': 20}, seed=1)
+    engine.run()
+    # The computation hosted on the last agent lags behind
+    last_agent = list(engine.distribution.agents)[-1]
+    lagging, = engine.distribution.computations_hosted(last_agent)
+    engine.computations[lagging].__cycle_count__ = 19
+
+    assert engine.end_metrics()['cycle'] == 20
+
+
+def test_same_seed_gives_same_run():
+    runs = []
+    for _ in range(2):
+        engine = build_engine('dsa', {'stop_cycle': 30}, seed=42)
+        engine.run()
+        m = engine.end_metrics()
+        runs.append((m['assignment'], m['cost'], m['msg_count'],
+                     m['msg_size'], m['time']))
+
+    assert runs[0] == runs[1]
+
+
+def test_messages_only_counted_between_agents():
+    dcop = ring_coloring()
+    cg = constraints_hypergraph.build_computation_graph(dcop)
+    # All computations on the same agent: no external message
+    dist = Distribution({'a0': [n.name for n in cg.nodes]})
+    engine = build_engine('dsa', {'stop_cycle': 5}, dcop=dcop, dist=dist)
+    engine.run()
+    assert engine.end_metrics()['msg_count'] == 0
+
+    # One computation per agent: in DSA each variable sends its value to
+    # its 2 neighbors at each cycle.
+    engine = build_engine('dsa', {'stop_cycle': 5}, dcop=dcop)
+    engine.run()
+    metrics = engine.end_metrics()
+    assert metrics['msg_count'] > 0
+    assert set(metrics['agt_metrics']) == set(dcop.agents)
+
+
+def test_link_metrics_include_local_messages():
+    dcop = ring_coloring()
+    cg = constraints_hypergraph.build_computation_graph(dcop)
+    dist = Distribution({'a0': [n.name for n in cg.nodes]})
+    engine = build_engine('dsa', {'stop_cycle': 5}, dcop=dcop, dist=dist,
+                          link_metrics=True)
+    engine.run()
+
+    agt_metrics = engine.end_metrics()['agt_metrics']['a0']
+    assert set(agt_metrics['count_link_msg']['v0']) == {'v1', 'v7'}
+    assert agt_metrics['count_link_msg']['v0']['v1'] > 0
+    assert 'count_link_msg' not in build_engine('dsa').agents_metrics()['a0']
+
+
+def test_time_is_logical():
+    engine = build_engine('dsa', {'stop_cycle': 10}, latency=1)
+    engine.run()
+
+    # one message delay for each DSA cycle
+    assert engine.end_metrics()['time'] == 10
+
+
+def test_collect_on_cycle_change():
+    collector = Queue()
+    engine = build_engine('mgm', {'stop_cycle': 10}, seed=1,
+                          collector=collector,
+                          collect_moment='cycle_change')
+    engine.run()
+
+    cycles = []
+    assignment = {}
+    while not collector.empty():
+        _, metrics = collector.get()
+        cycles.append(metrics['cycle'])
+        assignment.update(metrics['assignment_changes'])
+        assert len(assignment) == 8
+    assert cycles
+    assert cycles == sorted(cycles)
+
+
+@pytest.mark.parametrize("algo, collect_moment", [
+    ('dsa', 'value_change'), ('mgm', 'cycle_change'), ('dsa', 'period')])
+def test_running_metrics_are_incremental(algo, collect_moment):
+    collector = Queue()
+    engine = build_engine(algo, {'stop_cycle': 10}, seed=1,
+                          collector=collector,
+                          collect_moment=collect_moment,
+                          collect_period=0.002)
+    engine.run()
+
+    rows = []
+    while not collector.empty():
+        rows.append(collector.get()[1])
+    assert rows
+    # Same metrics as the orchestrator, changed values only
+    assert set(rows[-1]) == {'status', 'cost', 'violation', 'time',
+                             'msg_count', 'msg_size', 'cycle',
+                             'assignment_changes'}
+    assignment = {}
+    for metrics in rows:
+        assignment.update(metrics['assignment_changes'])
+        if len(assignment) == 8:
+            assert (metrics['violation'], metrics['cost']) == \
+                engine.dcop.solution_cost(assignment, float('inf'))
+        else:
+            assert metrics['cost'] is None
+
+    if collect_moment != 'period':
+        assert assignment == engine.end_metrics()['assignment']
+    assert [m['msg_count'] for m in rows] == \
+        sorted(m['msg_count'] for m in rows)
+
+
+def test_periodic_action_in_simulated_time():
+    engine = build_engine('dsa', {'stop_cycle': 100}, latency=1)
+    calls = []
+    engine.set_periodic_action(10, lambda: calls.append(engine.now))
+    engine.run()
+
+    # 100 cycles of 1 second, the action is called every 10 seconds
+    # (timers are handled before messages delivered at the same time).
+    assert calls == list(range(10, 101, 10))
+
+
+def test_stop_request():
+    engine = build_engine('dsa')
+    engine.set_periodic_action(1, engine.stop_agents)
+    engine.run()
+
+    assert engine.now == pytest.approx(1)
+
+
+def test_synchronous_computations_run_in_lockstep():
+    dcop = ring_coloring()
+    cg = factor_graph.build_computation_graph(dcop)
+    dist = Distribution({n.name: [n.name] for n in cg.nodes})
+
+    results = {}
+    for lockstep in [False, True]:
+        algo_module = load_algorithm_module('maxsum')
+        algo = AlgorithmDef.build_with_default_param(
+            'maxsum', {}, parameters_definitions=algo_module.algo_params)
+        engine = SimulationEngine(algo, cg, dist, dcop, latency=1, seed=1,
+                                  lockstep=lockstep)
+        engine.deploy_computations()
+        engine.run(max_time=30)
+        results[lockstep] = engine.end_metrics()
+
+    # maxsum is deterministic: same results, with or without lock-step,
+    # but no synchronization message is needed in lock-step mode.
+    assert results[True]['assignment'] == results[False]['assignment']
+    assert results[True]['cycle'] == results[False]['cycle'] == 30
+    assert results[True]['time'] == results[False]['time'] == 30
+    assert results[True]['msg_count'] < results[False]['msg_count']
@@ -29,10 +29,13 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
+from itertools import product
+
 from pydcop.dcop.objects import create_binary_variables, BinaryVariable
 from pydcop.reparation import create_computation_hosted_constraint, \
     create_agent_capacity_constraint, create_agent_hosting_constraint, \
     create_agent_comp_comm_constraint
+from pydcop.utils.simple_repr import simple_repr, from_repr
 
 
 def test_create_hosted_constraint_for_computation():
@@ -137,3 +140,128 @@ def test_create_comm_constraint_for_agent_single_var():
     assert comm_c(x_c1_a1=0, x_c4_a2=0, x_c4_a3=1) == 0
     assert comm_c(x_c1_a1=0, x_c4_a2=1, x_c4_a3=0) == 0
 
+
+def test_capacity_constraint_same_as_footprint_sum():
+    candidates = ['c1', 'c2', 'c3', 'c4']
+    footprints = {'c1': 10, 'c2': 25, 'c3': 30, 'c4': 5}
+    bin_vars = create_binary_variables('x_', (candidates, ['a1']))
+
+    capa_c = create_agent_capacity_constraint('a1', 40, footprints.get,
+                                              bin_vars)
+
+    for values in product([0, 1], repeat=len(candidates)):
+        footprint = sum(footprints[c] * x for c, x in zip(candidates, values))
+        expected = 0 if footprint <= 40 else 10000
+        assert capa_c(*values) == expected
+        assert capa_c(**{'x_{}_a1'.format(c): x
+                         for c, x in zip(candidates, values)}) == expected
+
+
+def test_hosted_constraint_same_as_hosted_once():
+    agents = ['a1', 'a2', 'a3', 'a4']
+    bin_vars = create_binary_variables('v_', (['c1'], agents))
+
+    constraint = create_computation_hosted_constraint('c1', bin_vars)
+
+    for values in product([0, 1], repeat=len(agents)):
+        expected = 0 if sum(values) == 1 else 10000
+        assert constraint(*values) == expected
+        assert constraint(**{'v_c1_{}'.format(a): x
+                             for a, x in zip(agents, values)}) == expected
+
+
+def test_comm_constraint_same_as_comm_sum():
+    repair_info = (['a1', 'a2'],
+                   {'c3': 'a2', 'c5': 'a3'},
+                   {'c4': ['a2', 'a3'], 'c6': ['a1', 'a3']})
+    costs = {('c3', 'a2'): 1, ('c5', 'a3'): 2, ('c4', 'a2'): 4,
+             ('c4', 'a3'): 8, ('c6', 'a1'): 16, ('c6', 'a3'): 32}
+
+    def comm(comp1, comp2, agt2):
+        return costs[(comp2, agt2)]
+
+    bin_vars = create_binary_variables('x_', (['c1'], ['a1']))
+    for vm, ams in repair_info[2].items():
+        bin_vars.update(create_binary_variables('x_', ([vm], ams)))
+    comm_c = create_agent_comp_comm_constraint('a1', 'c1', repair_info,
+                                               comm, bin_vars)
+
+    names = [v.name for v in comm_c.dimensions]
+    for values in product([0, 1], repeat=len(names)):
+        assignment = dict(zip(names, values))
+        expected = 0
+        if assignment['x_c1_a1']:
+            expected = 1 + 2 + sum(
+                cost * assignment['x_{}_{}'.format(c, a)]
+                for (c, a), cost in costs.items() if c in repair_info[2])
+        assert comm_c(**assignment) == expected
+        assert comm_c(*values) == expected
+
+
+def test_slice_hosted_constraint():
+    bin_vars = create_binary_variables('v_', (['c1'], ['a1', 'a2', 'a3']))
+    constraint = create_computation_hosted_constraint('c1', bin_vars)
+
+    sliced = constraint.slice({'v_c1_a1': 1})
+    assert [v.name for v in sliced.dimensions] == ['v_c1_a2', 'v_c1_a3']
+    assert sliced(v_c1_a2=0, v_c1_a3=0) == 0
+    assert sliced(v_c1_a2=1, v_c1_a3=0) != 0
+
+    sliced = constraint.slice({'v_c1_a1': 0, 'v_c1_a2': 0})
+    assert sliced(v_c1_a3=1) == 0
+    assert sliced(v_c1_a3=0) != 0
+
+
+def test_slice_capacity_constraint():
+    bin_vars = create_binary_variables('x_', (['c1', 'c2', 'c3'], ['a1']))
+    capa_c = create_agent_capacity_constraint('a1', 50, lambda _: 25,
+                                              bin_vars)
+
+    sliced = capa_c.slice({'x_c1_a1': 1})
+    assert sliced(x_c2_a1=1, x_c3_a1=0) == 0
+    assert sliced(x_c2_a1=1, x_c3_a1=1) != 0
+
+
+def test_slice_comm_constraint():
+    repair_info = (['a1', 'a2'], {'c3': 'a2'}, {'c4': ['a2', 'a3']})
+    costs = {'c3': 5, 'c4': 10}
+    bin_vars = create_binary_variables('x_', (['c1'], ['a1']))
+    bin_vars.update(create_binary_variables('x_', (['c4'], ['a2', 'a3'])))
+
+    comm_c = create_agent_comp_comm_constraint(
+        'a1', 'c1', repair_info, lambda c1, c2, a: costs[c2], bin_vars)
+
+    assert comm_c(x_c1_a1=1, x_c4_a2=1, x_c4_a3=0) == 15
+    assert comm_c(1, 1, 1) == 25
+
+    hosted = comm_c.slice({'x_c1_a1': 1})
+    assert [v.name for v in hosted.dimensions] == ['x_c4_a2', 'x_c4_a3']
+    assert hosted(x_c4_a2=0, x_c4_a3=1) == 15
+
+    not_hosted = comm_c.slice({'x_c1_a1': 0, 'x_c4_a2': 1})
+    assert not_hosted(x_c4_a3=1) == 0
+
+    sliced = comm_c.slice({'x_c4_a2': 1})
+    assert sliced(x_c1_a1=1, x_c4_a3=0) == 15
+    assert sliced(x_c1_a1=0, x_c4_a3=0) == 0
+
+
+def test_reparation_constraints_simple_repr():
+    repair_info = (['a1', 'a2'], {'c3': 'a2'}, {'c4': ['a2', 'a3']})
+    bin_vars = create_binary_variables('x_', (['c1', 'c2'], ['a1']))
+    bin_vars.update(create_binary_variables('x_', (['c4'], ['a2', 'a3'])))
+    candidate_vars = {k: v for k, v in bin_vars.items() if k[1] == 'a1'}
+
+    constraints = [
+        create_computation_hosted_constraint('c1', candidate_vars),
+        create_agent_capacity_constraint('a1', 50, lambda _: 25,
+                                         candidate_vars),
+        create_agent_hosting_constraint('a1', lambda _: 3, candidate_vars),
+        create_agent_comp_comm_constraint(
+            'a1', 'c1', repair_info, lambda c1, c2, a: 10, bin_vars),
+    ]
+
+    for constraint in constraints:
+        obtained = from_repr(simple_repr(constraint))
+        assert obtained == constraint
+        assert obtained.dimensions == constraint.dimensions
@@ -28,8 +28,13 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 import json
+from unittest.mock import MagicMock
 
-from pydcop.replication.dist_ucs_hostingcosts import UCSReplicateMessage
+from pydcop.algorithms import AlgorithmDef, ComputationDef
+from pydcop.computations_graph.objects import ComputationNode
+from pydcop.dcop.objects import AgentDef
+from pydcop.replication.dist_ucs_hostingcosts import UCSReplicateMessage, \
+    UCSReplicateBatchMessage, UCSReplication
 from pydcop.replication.dist_ucs_hostingcosts import ReplicationTracker
 from pydcop.replication.path_utils import Path, PathsTable
 from pydcop.utils.simple_repr import simple_repr, from_repr
@@ -111,3 +116,62 @@ def test_unserialization_msg():
     assert obtained
 
     assert obtained == msg
+
+
+def test_batch_message_serialization():
+    table = PathsTable([(3, ("1", "2"))])
+    msg = UCSReplicateBatchMessage([
+        UCSReplicateMessage("replicate_request", 1, 0, ("1", "2"), table,
+                            ["1"], None, 5, 2, []),
+        UCSReplicateMessage("replicate_request", 2, 0, ("1", "2"), table,
+                            ["1"], None, 3, 2, []),
+    ])
+
+    r = json.loads(json.dumps(simple_repr(msg)))
+    obtained = from_repr(r)
+
+    assert obtained.type == "ucs_replicate_batch"
+    assert [m.footprint for m in obtained.messages] == [5, 3]
+    assert obtained.messages[0].paths == table
+
+
+def replication_computation(name, routes, computations):
+    agent = MagicMock()
+    agent.name = name
+    agent.agent_def = AgentDef(name, capacity=100, routes=routes)
+    discovery = MagicMock()
+    discovery.computation_agent = lambda c: "a_" + c
+    replication = UCSReplication(agent, discovery)
+    algo = AlgorithmDef.build_with_default_param("dsa")
+    for c, neighbors in computations.items():
+        node = ComputationNode(c, "test", neighbors=neighbors)
+        replication.add_computation(ComputationDef(node, algo), 1)
+    replication.post_msg = MagicMock()
+    return replication
+
+
+def test_replicate_all_computations_in_a_single_message():
+    replication = replication_computation(
+        "a1", {"a_v2": 1, "a_v3": 2}, {"v1": ["v2", "v3"], "v4": ["v2"]})
+
+    replication.replicate(2)
+
+    # The two computations are sent to the closest neighbor, at once
+    replication.post_msg.assert_called_once()
+    target, msg, _ = replication.post_msg.call_args[0]
+    assert target == "_replication_a_v2"
+    assert msg.type == "ucs_replicate_batch"
+    assert {m.computation_def.name for m in msg.messages} == {"v1", "v4"}
+    assert all(m.rq_path == ("a1", "a_v2") for m in msg.messages)
+    assert not replication._replication_in_progress.is_empty()
+
+
+def test_replicate_single_computation_is_not_batched():
+    replication = replication_computation(
+        "a1", {"a_v2": 1, "a_v3": 2}, {"v1": ["v2", "v3"], "v4": ["v2"]})
+
+    replication.replicate(2, "v1")
+
+    target, msg, _ = replication.post_msg.call_args[0]
+    assert target == "_replication_a_v2"
+    assert msg.type == "ucs_replicate"
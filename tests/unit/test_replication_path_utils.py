@@ -29,9 +29,12 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
+import json
+
 import pytest
 
 from pydcop.replication.path_utils import (
+    cheapest_path_to,
     filter_missing_agents_paths,
     PathsTable,
     head,
@@ -367,3 +370,103 @@ def test_bench_affordable_path_from(benchmark):
 def test_2():
 
     roots = ["a2", "a5"]
+
+
+def test_pathstable_iter_sorted():
+    table = PathsTable([(3, ("a2", "a4")), (1, ("a2", "a3")), (3, ("a1",))])
+
+    assert len(table) == 3
+    assert list(table) == [(1, ("a2", "a3")), (3, ("a1",)), (3, ("a2", "a4"))]
+    assert ("a2", "a4") in table
+    assert table.cost(("a2", "a4")) == 3
+
+
+def test_pathstable_add_existing_path_replaces_cost():
+    table = PathsTable([(3, ("a2", "a4"))])
+    table.add(2, ("a2", "a4"))
+
+    assert list(table) == [(2, ("a2", "a4"))]
+
+
+def test_pathstable_remove():
+    table = PathsTable([(3, ("a2", "a4")), (1, ("a2", "a3"))])
+
+    assert table.remove(("a2", "a3"))
+    assert not table.remove(("a2", "a3"))
+    assert list(table) == [(3, ("a2", "a4"))]
+    assert table.starting_with(("a2", "a3")) == []
+    assert table.cheapest_to("a3") == (float("inf"), ())
+
+
+def test_pathstable_cheapest():
+    table = PathsTable([(3, ("a2", "a4")), (1, ("a2", "a3")), (2, ("a5",))])
+
+    assert table.cheapest() == (1, ("a2", "a3"))
+    assert table.cheapest(exclude=("a2", "a3")) == (2, ("a5",))
+
+    table.remove(("a2", "a3"))
+    assert table.cheapest() == (2, ("a5",))
+    assert PathsTable().cheapest() == (float("inf"), ())
+
+
+def test_pathstable_cheapest_to():
+    table = PathsTable(
+        [(3, ("a2", "a4")), (1, ("a2", "a3", "a4")), (2, ("a5", "a3"))])
+
+    assert table.cheapest_to("a4") == (1, ("a2", "a3", "a4"))
+    assert cheapest_path_to("a3", table) == (2, ("a5", "a3"))
+    assert cheapest_path_to("a8", table) == (float("inf"), ())
+
+
+def test_pathstable_affordable_path_from():
+    table = PathsTable(
+        [
+            (3, ("a2", "a9", "a4", "a8")),
+            (2, ("a2", "a3")),
+            (3, ("a2", "a3", "a4")),
+            (6, ("a5", "a3", "a4")),
+            (4, ("a2", "a3", "a4", "a12")),
+            (3, ("a2", "a3", "a4", "a8")),
+            (3, ("a1", "a3", "a4")),
+        ]
+    )
+
+    paths = affordable_path_from(("a2", "a3"), 3, table)
+
+    assert paths == [(), ("a4",), ("a4", "a8")]
+
+
+def test_pathstable_same_results_as_list():
+    paths = [
+        (3, ("a2", "a9", "a4", "a8")),
+        (2, ("a2", "a3")),
+        (3, ("a2", "a3", "a4")),
+        (6, ("a5", "a3", "a4")),
+        (4, ("a2", "a3", "a4", "a12")),
+        (9, ("a2", "a4", "a4")),
+        (3, ("a1", "a3", "a4")),
+    ]
+    paths.sort()
+    table = PathsTable(paths)
+
+    remove_path(paths, ("a2", "a3", "a4"))
+    remove_path(table, ("a2", "a3", "a4"))
+    assert table == paths
+    for node in ["a3", "a4", "a8", "a12"]:
+        assert cheapest_path_to(node, table) == cheapest_path_to(node, paths)
+    assert list(affordable_path_from(("a2",), 4, table)) == \
+        list(affordable_path_from(("a2",), 4, paths))
+    filtered = filter_missing_agents_paths(table, {"a4"})
+    assert isinstance(filtered, PathsTable)
+    assert filtered == filter_missing_agents_paths(paths, {"a4"})
+
+
+def test_pathstable_serialization():
+    table = PathsTable([(2, ("a2", "a3")), (3, ("a2", "a4"))])
+
+    r = simple_repr(table)
+    obtained = from_repr(json.loads(json.dumps(r)))
+
+    assert isinstance(obtained, PathsTable)
+    assert obtained == table
+    assert obtained.cheapest_to("a4") == (3, ("a2", "a4"))
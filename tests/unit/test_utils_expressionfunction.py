@@ -29,6 +29,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
+import pickle
 import unittest
 from functools import partial
 
@@ -185,4 +186,14 @@ def test_type_error_on_excessive_assignment():
     f = ExpressionFunction('a / b ')
 
     with pytest.raises(TypeError):
-        f(a=4, b=3, c=2)
\ No newline at end of file
+        f(a=4, b=3, c=2)
+
+
+def test_pickle():
+    f = ExpressionFunction('a + b * c', c=2)
+
+    f2 = pickle.loads(pickle.dumps(f))
+
+    assert f2 == f
+    assert f2(a=1, b=3) == 7
+    assert f2.variable_names == f.variable_names